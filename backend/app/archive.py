@@ -0,0 +1,38 @@
+"""Archive settled expenses in every group from the command line.
+
+Run from ``backend/`` (cron, off-peak)::
+
+    python -m app.archive                        # settled for longer than ARCHIVE_AFTER_DAYS
+    python -m app.archive --older-than-days 365  # settled expenses created over a year ago
+
+Runs are idempotent: a second run finds nothing left to archive.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from .config import get_settings
+from .crud.archive import archive_settled_expenses
+
+logger = logging.getLogger("signup_app.archive")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--older-than-days", type=int, help="age in days (default ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, help="rows per transaction (default ARCHIVE_BATCH_SIZE)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    settings = get_settings()
+    started = time.perf_counter()
+    result = archive_settled_expenses(args.older_than_days, args.batch_size or settings.archive_batch_size)
+    logger.info("Archive run took %.0f ms", (time.perf_counter() - started) * 1000)
+    print(f"{result.expenses} expenses archived in {len(result.groups)} groups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, TypeVar
+
+from pydantic import TypeAdapter
+
+from .config import Settings, get_settings
+from .external_services.redis import RedisClient, RedisError
+
+logger = logging.getLogger("signup_app.cache")
+
+T = TypeVar("T")
+
+# Bump whenever the shape of a cached payload changes so stale entries written by
+# older tasks during a rolling deploy are never decoded by newer ones.
+CACHE_KEY_VERSION = 1
+KEY_PREFIX = f"es:v{CACHE_KEY_VERSION}"
+INVALIDATION_CHANNEL = f"{KEY_PREFIX}:invalidate"
+
+USERS = "users"
+USER_GROUPS = "user_groups"
+GROUP_DETAIL = "group_detail"
+MEMBERSHIP = "membership"
+
+
+def cache_key(namespace: str, ident: str) -> str:
+    return f"{KEY_PREFIX}:{namespace}:{ident}"
+
+
+class CacheBackend:
+    """Byte-oriented cache interface shared by every backend."""
+
+    enabled = True
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def invalidate(self, keys: list[str]) -> None:
+        raise NotImplementedError
+
+    def version(self, key: str) -> Optional[int]:
+        """Current value of a monotonic counter, or ``None`` when it cannot be read."""
+        raise NotImplementedError
+
+    def bump(self, key: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        return None
+
+
+class NullCache(CacheBackend):
+    enabled = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        return None
+
+    def invalidate(self, keys: list[str]) -> None:
+        return None
+
+    def version(self, key: str) -> Optional[int]:
+        return 0
+
+    def bump(self, key: str) -> Optional[int]:
+        return 0
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU with per-entry TTL. Only safe on its own for a single worker."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        # Counters are tiny and must never be evicted, so they live outside the LRU.
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def version(self, key: str) -> Optional[int]:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, key: str) -> Optional[int]:
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            return self._versions[key]
+
+
+class RedisCache(CacheBackend):
+    """Shared Redis tier fronted by a short-lived per-process near cache.
+
+    Invalidations delete the shared entry and are broadcast on
+    ``INVALIDATION_CHANNEL`` so every worker drops its near copy as well.
+    Redis outages degrade to cache misses instead of failing requests.
+    """
+
+    def __init__(self, client: RedisClient, ttl_seconds: int, near_cache: LRUCache) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.near_cache = near_cache
+        self._subscription = client.subscribe(INVALIDATION_CHANNEL, self._on_invalidation)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.near_cache.get(key)
+        if value is not None:
+            return value
+        try:
+            value = self.client.get(key)
+        except RedisError as exc:
+            logger.warning("Cache read for %s failed: %s", key, exc)
+            return None
+        if value is not None:
+            self.near_cache.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.near_cache.set(key, value)
+        try:
+            self.client.set(key, value, ttl_seconds=self.ttl_seconds)
+        except RedisError as exc:
+            logger.warning("Cache write for %s failed: %s", key, exc)
+
+    def invalidate(self, keys: list[str]) -> None:
+        self.near_cache.invalidate(keys)
+        try:
+            self.client.delete(*keys)
+            self.client.publish(INVALIDATION_CHANNEL, "\n".join(keys))
+        except RedisError as exc:
+            logger.warning("Cache invalidation for %s failed: %s", keys, exc)
+
+    def version(self, key: str) -> Optional[int]:
+        try:
+            return int(self.client.get(key) or 0)
+        except RedisError as exc:
+            logger.warning("Version read for %s failed: %s", key, exc)
+            return None
+
+    def bump(self, key: str) -> Optional[int]:
+        try:
+            return self.client.incr(key)
+        except RedisError as exc:
+            logger.warning("Version bump for %s failed: %s", key, exc)
+            return None
+
+    def wait_until_subscribed(self, timeout: float = 2.0) -> bool:
+        return self._subscription.ready.wait(timeout)
+
+    def _on_invalidation(self, message: bytes) -> None:
+        self.near_cache.invalidate(message.decode("utf-8").split("\n"))
+
+    def close(self) -> None:
+        self._subscription.stop()
+        self.client.close()
+
+
+def build_cache(settings: Settings) -> CacheBackend:
+    backend = settings.cache_backend
+    if backend in {"", "none", "off"}:
+        return NullCache()
+    if backend == "local":
+        return LRUCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+    if backend == "redis":
+        return RedisCache(
+            RedisClient(settings.cache_url),
+            ttl_seconds=settings.cache_ttl_seconds,
+            near_cache=LRUCache(settings.cache_max_entries, settings.cache_near_ttl_seconds),
+        )
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r}")
+
+
+_state_lock = threading.Lock()
+_state: Optional[tuple[Settings, CacheBackend]] = None
+
+
+def get_cache() -> CacheBackend:
+    """Return the process-wide cache, rebuilding it when the settings object changes."""
+    global _state
+    settings = get_settings()
+    state = _state
+    if state is not None and state[0] is settings:
+        return state[1]
+    with _state_lock:
+        if _state is None or _state[0] is not settings:
+            if _state is not None:
+                _state[1].close()
+            _state = (settings, build_cache(settings))
+        return _state[1]
+
+
+def cached(namespace: str, ident: str, adapter: TypeAdapter[T], loader: Callable[[], T]) -> T:
+    cache = get_cache()
+    if not cache.enabled:
+        return loader()
+    key = cache_key(namespace, ident)
+    payload = cache.get(key)
+    if payload is not None:
+        return adapter.validate_json(payload)
+    value = loader()
+    cache.set(key, adapter.dump_json(value))
+    return value
+
+
+def invalidate(*entries: tuple[str, str]) -> None:
+    if entries:
+        get_cache().invalidate([cache_key(namespace, ident) for namespace, ident in entries])
+
+
+def get_version(namespace: str, ident: str) -> Optional[int]:
+    return get_cache().version(cache_key(namespace, ident))
+
+
+def bump_version(namespace: str, ident: str) -> Optional[int]:
+    return get_cache().bump(cache_key(namespace, ident))
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from .cache import KEY_PREFIX
+from .config import Settings, get_settings
+from .external_services.redis import RedisClient, RedisError
+
+logger = logging.getLogger("signup_app.change_feed")
+
+EXPENSE_ADDED = "expense.added"
+EXPENSE_UPDATED = "expense.updated"
+EXPENSE_DELETED = "expense.deleted"
+# Several expenses added at once (recurring schedules): one event per group and batch.
+EXPENSES_ADDED = "expenses.added"
+# Settled expenses moved to the archive; balances are unchanged.
+EXPENSES_ARCHIVED = "expenses.archived"
+MEMBER_ADDED = "member.added"
+# Sent when deltas were lost (slow consumer, gap after reconnect): refetch the full detail.
+RESYNC = "resync"
+
+FEED_CHANNEL = f"{KEY_PREFIX}:group-events"
+HEARTBEAT_SECONDS = 15.0
+RECONNECT_MILLIS = 3000
+
+Event = dict[str, Any]
+
+
+class Subscription:
+    """One SSE client's queue. Filled from any thread, drained on the event loop."""
+
+    def __init__(self, group_id: str, loop: asyncio.AbstractEventLoop, max_queue: int) -> None:
+        self.group_id = group_id
+        self._loop = loop
+        self._queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=max_queue)
+
+    def offer(self, event: Event) -> None:
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Event) -> None:
+        if self._queue.full():
+            # Too far behind to catch up with deltas; collapse the backlog into one resync.
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            event = {"type": RESYNC, "group_id": self.group_id, "seq": event.get("seq")}
+        self._queue.put_nowait(event)
+
+    async def get(self) -> Event:
+        return await self._queue.get()
+
+
+class ChangeFeed:
+    """In-process fan-out of group change events, with a short replay history per group."""
+
+    def __init__(self, history: int = 100, max_queue: int = 100) -> None:
+        self.history = history
+        self.max_queue = max_queue
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._recent: dict[str, deque[Event]] = {}
+        self._sequences: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, group_id: str) -> Subscription:
+        subscription = Subscription(group_id, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(group_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.group_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.group_id]
+
+    def subscriber_count(self, group_id: Optional[str] = None) -> int:
+        with self._lock:
+            if group_id is not None:
+                return len(self._subscribers.get(group_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event: Event) -> None:
+        """Stamp the event with the group's next sequence number and deliver it."""
+        event["seq"] = self._next_seq(event["group_id"])
+        self.dispatch(event)
+
+    def dispatch(self, event: Event) -> None:
+        group_id = event["group_id"]
+        with self._lock:
+            self._recent.setdefault(group_id, deque(maxlen=self.history)).append(event)
+            subscribers = list(self._subscribers.get(group_id, ()))
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def replay(self, group_id: str, after_seq: int) -> Optional[list[Event]]:
+        """Events newer than ``after_seq``, or ``None`` when some were already evicted."""
+        with self._lock:
+            recent = list(self._recent.get(group_id, ()))
+        newer = [event for event in recent if event["seq"] > after_seq]
+        if newer and newer[0]["seq"] != after_seq + 1:
+            return None
+        return newer
+
+    def close(self) -> None:
+        return None
+
+    def _next_seq(self, group_id: str) -> int:
+        with self._lock:
+            self._sequences[group_id] = self._sequences.get(group_id, 0) + 1
+            return self._sequences[group_id]
+
+
+class RedisChangeFeed(ChangeFeed):
+    """Publishes through Redis pub/sub so SSE clients on every worker see every change.
+
+    Sequence numbers come from a Redis counter per group, so they are ordered
+    across workers. If Redis is unreachable events are still delivered locally.
+    """
+
+    def __init__(self, client: RedisClient, history: int = 100, max_queue: int = 100) -> None:
+        super().__init__(history=history, max_queue=max_queue)
+        self.client = client
+        self._subscription = client.subscribe(FEED_CHANNEL, self._on_message)
+
+    def publish(self, event: Event) -> None:
+        try:
+            event["seq"] = self.client.incr(f"{KEY_PREFIX}:group-events:seq:{event['group_id']}")
+            self.client.publish(FEED_CHANNEL, json.dumps(event))
+        except RedisError as exc:
+            logger.warning("Change feed publish for group %s failed: %s", event["group_id"], exc)
+            event["seq"] = event.get("seq") or self._next_seq(event["group_id"])
+            self.dispatch(event)
+
+    def wait_until_subscribed(self, timeout: float = 2.0) -> bool:
+        return self._subscription.ready.wait(timeout)
+
+    def _on_message(self, message: bytes) -> None:
+        try:
+            self.dispatch(json.loads(message))
+        except (ValueError, KeyError) as exc:
+            logger.warning("Dropping malformed change feed message: %s", exc)
+
+    def close(self) -> None:
+        self._subscription.stop()
+        self.client.close()
+
+
+def build_change_feed(settings: Settings) -> ChangeFeed:
+    if settings.change_feed_backend == "local":
+        return ChangeFeed()
+    if settings.change_feed_backend == "redis":
+        return RedisChangeFeed(RedisClient(settings.change_feed_url or settings.cache_url))
+    raise ValueError(f"Unknown CHANGE_FEED_BACKEND {settings.change_feed_backend!r}")
+
+
+_state_lock = threading.Lock()
+_state: Optional[tuple[Settings, ChangeFeed]] = None
+
+
+def get_change_feed() -> ChangeFeed:
+    """Return the process-wide feed, rebuilding it when the settings object changes."""
+    global _state
+    settings = get_settings()
+    state = _state
+    if state is not None and state[0] is settings:
+        return state[1]
+    with _state_lock:
+        if _state is None or _state[0] is not settings:
+            if _state is not None:
+                _state[1].close()
+            _state = (settings, build_change_feed(settings))
+        return _state[1]
+
+
+def publish_group_change(group_id: str, event_type: str, **data: Any) -> None:
+    """Publish a compact delta; never lets a feed failure fail the mutation that caused it."""
+    try:
+        get_change_feed().publish({"type": event_type, "group_id": group_id, **data})
+    except Exception:  # noqa: BLE001 - the write already committed
+        logger.exception("Unable to publish %s for group %s", event_type, group_id)
+
+
+def format_sse(event: Event) -> str:
+    data = json.dumps(event, separators=(",", ":"), default=str)
+    return f"id: {event.get('seq', '')}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream_group_events(
+    feed: ChangeFeed,
+    group_id: str,
+    last_event_id: Optional[str],
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[str]:
+    """Server-Sent Events for one group: replay after ``Last-Event-ID``, then live deltas."""
+    subscription = feed.subscribe(group_id)
+    try:
+        yield f"retry: {RECONNECT_MILLIS}\n\n"
+        last_seq = 0
+        if last_event_id and last_event_id.isdigit():
+            last_seq = int(last_event_id)
+            missed = feed.replay(group_id, last_seq)
+            if missed is None:
+                yield format_sse({"type": RESYNC, "group_id": group_id})
+            else:
+                for event in missed:
+                    last_seq = event["seq"]
+                    yield format_sse(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                # Comment line: keeps proxies (and the ALB idle timeout) from closing the stream.
+                yield ": keepalive\n\n"
+                continue
+            seq = event.get("seq")
+            if event["type"] != RESYNC and isinstance(seq, int):
+                if seq <= last_seq:
+                    continue  # already sent during replay
+                last_seq = seq
+            yield format_sse(event)
+    finally:
+        feed.unsubscribe(subscription)
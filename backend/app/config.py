@@ -4,7 +4,7 @@ import os
 from dataclasses import dataclass, field
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -15,6 +15,14 @@ load_dotenv(ENV_FILE)
 
 APP_ENV = os.getenv("APP_ENV", "dev").lower()
 DEFAULT_USE_FILE_STORAGE = APP_ENV != "prod"
+DEFAULT_RATE_LIMITS = "auth=5/20,list=2/10,upload=1/5,export=2/10,write=20/50,read=50/100"
+# Each in-flight export holds its own MySQL connection, so ``export`` also caps those per worker.
+DEFAULT_CONCURRENCY_LIMITS = "auth=8,list=2,upload=4,export=2,write=8,read=16"
+# Dev servers and tests hash inline; prod offloads KDF work to a process pool.
+DEFAULT_PASSWORD_HASH_WORKERS = str(min(4, os.cpu_count() or 1)) if APP_ENV == "prod" else "0"
+DEFAULT_AVATAR_PROCESSING_WORKERS = str(min(2, os.cpu_count() or 1)) if APP_ENV == "prod" else "0"
+# Public, so tokens signed with it are forgeable; refused when APP_ENV=prod.
+DEV_SESSION_SECRET = "dev-session-secret-change-me"
 
 
 def _env_str(name: str, default: str) -> str:
@@ -25,10 +33,20 @@ def _env_int(name: str, default: str) -> int:
     return int(os.getenv(name, default))
 
 
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
 def _env_bool(name: str, default: bool) -> bool:
     return _str_to_bool(os.getenv(name), default)
 
 
+def _beside_data_file(name: str) -> str:
+    """Default location for file-mode state that should live next to ``DATA_FILE_PATH``."""
+    data_file = Path(_env_str("DATA_FILE_PATH", str(BASE_DIR / "data" / "users.json")))
+    return str(data_file.parent / name)
+
+
 def _str_to_bool(raw_value: Optional[str], default: bool) -> bool:
     if raw_value is None:
         return default
@@ -42,6 +60,28 @@ def _parse_origins(raw_value: Optional[str]) -> list[str]:
     return origins or ["*"]
 
 
+def _parse_rate_limits(raw_value: str) -> Dict[str, Tuple[float, int]]:
+    """Parse ``class=rate/burst`` pairs, e.g. ``auth=5/20,read=50/100``."""
+    limits: Dict[str, Tuple[float, int]] = {}
+    for entry in raw_value.split(","):
+        if not entry.strip():
+            continue
+        name, _, spec = entry.partition("=")
+        rate, _, burst = spec.partition("/")
+        limits[name.strip()] = (float(rate), int(burst or rate))
+    return limits
+
+
+def _parse_concurrency_limits(raw_value: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for entry in raw_value.split(","):
+        if not entry.strip():
+            continue
+        name, _, limit = entry.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
 @dataclass(frozen=True)
 class Settings:
     project_name: str = "Signup API"
@@ -54,6 +94,17 @@ class Settings:
     db_password: str = field(default_factory=lambda: _env_str("DB_PASSWORD", "a)#~_@pC]Y2DZvbpBP+d"))
     db_name: str = field(default_factory=lambda: _env_str("DB_NAME", "expense_settlement"))
     db_pool_size: int = field(default_factory=lambda: _env_int("DB_POOL_SIZE", "5"))
+    # Ping pooled connections, start hashing workers and prime caches before /ready passes.
+    warmup_enabled: bool = field(default_factory=lambda: _env_bool("WARMUP_ENABLED", True))
+    # /ready reports not-ready once this share of the worker's pool is checked out.
+    readiness_max_pool_saturation: float = field(
+        default_factory=lambda: _env_float("READINESS_MAX_POOL_SATURATION", "0.9")
+    )
+    # Statements slower than this are logged with their parameter shapes; 0 disables the log.
+    slow_query_ms: float = field(default_factory=lambda: _env_float("SLOW_QUERY_MS", "200"))
+    # SQL statements allowed per request (0 = unlimited); strict mode fails the request instead of logging.
+    query_budget: int = field(default_factory=lambda: _env_int("QUERY_BUDGET", "0"))
+    query_budget_strict: bool = field(default_factory=lambda: _env_bool("QUERY_BUDGET_STRICT", False))
     use_file_storage: bool = field(
         default_factory=lambda: _env_bool("USE_FILE_STORAGE", DEFAULT_USE_FILE_STORAGE)
     )
@@ -65,15 +116,133 @@ class Settings:
         default_factory=lambda: _env_str("GROUPS_FILE_PATH", str(BASE_DIR / "data" / "groups.json"))
     )
     log_level: str = field(default_factory=lambda: _env_str("LOG_LEVEL", "INFO"))
+    # Bearer token for /metrics and /metrics/limiter; unset, they are open outside prod and 404 in prod.
+    metrics_token: str = field(default_factory=lambda: _env_str("METRICS_TOKEN", ""))
+    # Opt-in request profiling: X-Profile-Token matching PROFILE_SECRET, or a sampled share of requests.
+    profiling_enabled: bool = field(default_factory=lambda: _env_bool("PROFILING_ENABLED", False))
+    profile_secret: str = field(default_factory=lambda: _env_str("PROFILE_SECRET", ""))
+    profile_sample_rate: float = field(default_factory=lambda: _env_float("PROFILE_SAMPLE_RATE", "0"))
+    profile_dir: str = field(default_factory=lambda: _env_str("PROFILE_DIR", _beside_data_file("profiles")))
+    # Retention for PROFILE_DIR, applied after each write; 0 turns a limit off.
+    profile_max_files: int = field(default_factory=lambda: _env_int("PROFILE_MAX_FILES", "200"))
+    profile_max_age_hours: float = field(default_factory=lambda: _env_float("PROFILE_MAX_AGE_HOURS", "168"))
+    outbox_worker_enabled: bool = field(
+        default_factory=lambda: _env_bool("OUTBOX_WORKER_ENABLED", True)
+    )
+    # log: hand events to the email/notification services; memory: record them (tests, local dev)
+    outbox_sink: str = field(default_factory=lambda: _env_str("OUTBOX_SINK", "log").lower())
+    outbox_file_path: str = field(
+        default_factory=lambda: _env_str("OUTBOX_FILE_PATH", _beside_data_file("outbox.jsonl"))
+    )
+    outbox_batch_size: int = field(default_factory=lambda: _env_int("OUTBOX_BATCH_SIZE", "50"))
+    outbox_poll_seconds: float = field(default_factory=lambda: _env_float("OUTBOX_POLL_SECONDS", "1.0"))
+    outbox_max_attempts: int = field(default_factory=lambda: _env_int("OUTBOX_MAX_ATTEMPTS", "8"))
+    outbox_backoff_seconds: float = field(
+        default_factory=lambda: _env_float("OUTBOX_BACKOFF_SECONDS", "2.0")
+    )
+    # Background thread adding due recurring expenses; `python -m app.recurring` runs the same job once.
+    recurring_scheduler_enabled: bool = field(
+        default_factory=lambda: _env_bool("RECURRING_SCHEDULER_ENABLED", True)
+    )
+    recurring_interval_seconds: float = field(
+        default_factory=lambda: _env_float("RECURRING_INTERVAL_SECONDS", "3600")
+    )
+    recurring_batch_size: int = field(default_factory=lambda: _env_int("RECURRING_BATCH_SIZE", "200"))
+    # Settled (paid/refunded) expenses older than this move to the archive; see crud/archive.py.
+    archive_after_days: int = field(default_factory=lambda: _env_int("ARCHIVE_AFTER_DAYS", "90"))
+    archive_batch_size: int = field(default_factory=lambda: _env_int("ARCHIVE_BATCH_SIZE", "1000"))
+    # File mode: one JSON-lines file of archived expenses per group.
+    archive_dir: str = field(default_factory=lambda: _env_str("ARCHIVE_DIR", _beside_data_file("archive")))
+    # CSV of dated FX rates (date,currency,rate per USD), read in both storage modes; see crud/fx_rates.py.
+    fx_rates_path: str = field(
+        default_factory=lambda: _env_str("FX_RATES_PATH", _beside_data_file("fx_rates.csv"))
+    )
     s3_bucket_name: Optional[str] = field(
         default_factory=lambda: os.getenv("MEDIA_S3_BUCKET")
     )
     s3_public_base_url: Optional[str] = field(
         default_factory=lambda: os.getenv("MEDIA_S3_BASE_URL")
     )
+    # Point at MinIO or another S3-compatible endpoint instead of AWS.
+    s3_endpoint_url: Optional[str] = field(
+        default_factory=lambda: os.getenv("MEDIA_S3_ENDPOINT_URL")
+    )
+    s3_max_pool_connections: int = field(
+        default_factory=lambda: _env_int("S3_MAX_POOL_CONNECTIONS", "20")
+    )
+    s3_multipart_threshold: int = field(
+        default_factory=lambda: _env_int("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024))
+    )
+    avatar_max_bytes: int = field(
+        default_factory=lambda: _env_int("AVATAR_MAX_BYTES", str(5 * 1024 * 1024))
+    )
+    avatar_upload_ttl_seconds: int = field(
+        default_factory=lambda: _env_int("AVATAR_UPLOAD_TTL_SECONDS", "900")
+    )
+    # Staging area for signed direct uploads in file-storage mode (kept outside MEDIA_ROOT).
+    avatar_upload_dir: str = field(
+        default_factory=lambda: _env_str("AVATAR_UPLOAD_DIR", _beside_data_file("avatar-uploads"))
+    )
+    avatar_processing_workers: int = field(
+        default_factory=lambda: _env_int("AVATAR_PROCESSING_WORKERS", DEFAULT_AVATAR_PROCESSING_WORKERS)
+    )
+    avatar_processing_max_pending: int = field(
+        default_factory=lambda: _env_int("AVATAR_PROCESSING_MAX_PENDING", "16")
+    )
+    cache_backend: str = field(default_factory=lambda: _env_str("CACHE_BACKEND", "none").lower())
+    cache_url: str = field(default_factory=lambda: _env_str("CACHE_URL", "redis://127.0.0.1:6379/0"))
+    cache_ttl_seconds: int = field(default_factory=lambda: _env_int("CACHE_TTL_SECONDS", "300"))
+    cache_near_ttl_seconds: int = field(default_factory=lambda: _env_int("CACHE_NEAR_TTL_SECONDS", "30"))
+    cache_max_entries: int = field(default_factory=lambda: _env_int("CACHE_MAX_ENTRIES", "10000"))
+    # local: SSE clients only see changes made by their own worker; redis: all workers
+    change_feed_backend: str = field(
+        default_factory=lambda: _env_str("CHANGE_FEED_BACKEND", "local").lower()
+    )
+    change_feed_url: Optional[str] = field(default_factory=lambda: os.getenv("CHANGE_FEED_URL"))
+    password_kdf: str = field(default_factory=lambda: _env_str("PASSWORD_KDF", "scrypt").lower())
+    password_scrypt_n: int = field(default_factory=lambda: _env_int("PASSWORD_SCRYPT_N", "32768"))
+    password_scrypt_r: int = field(default_factory=lambda: _env_int("PASSWORD_SCRYPT_R", "8"))
+    password_scrypt_p: int = field(default_factory=lambda: _env_int("PASSWORD_SCRYPT_P", "1"))
+    password_pbkdf2_iterations: int = field(
+        default_factory=lambda: _env_int("PASSWORD_PBKDF2_ITERATIONS", "600000")
+    )
+    password_hash_workers: int = field(
+        default_factory=lambda: _env_int("PASSWORD_HASH_WORKERS", DEFAULT_PASSWORD_HASH_WORKERS)
+    )
+    password_hash_max_pending: int = field(
+        default_factory=lambda: _env_int("PASSWORD_HASH_MAX_PENDING", "32")
+    )
+    password_hash_wait_seconds: float = field(
+        default_factory=lambda: _env_float("PASSWORD_HASH_WAIT_SECONDS", "5")
+    )
+    session_secret: str = field(
+        default_factory=lambda: _env_str("SESSION_SECRET", DEV_SESSION_SECRET)
+    )
+    session_ttl_seconds: int = field(default_factory=lambda: _env_int("SESSION_TTL_SECONDS", "43200"))
+    rate_limit_enabled: bool = field(default_factory=lambda: _env_bool("RATE_LIMIT_ENABLED", True))
+    rate_limit_backend: str = field(
+        default_factory=lambda: _env_str("RATE_LIMIT_BACKEND", "memory").lower()
+    )
+    rate_limit_url: str = field(
+        default_factory=lambda: _env_str("RATE_LIMIT_URL", _env_str("CACHE_URL", "redis://127.0.0.1:6379/0"))
+    )
+    rate_limits: Dict[str, Tuple[float, int]] = field(
+        default_factory=lambda: _parse_rate_limits(_env_str("RATE_LIMITS", DEFAULT_RATE_LIMITS))
+    )
+    concurrency_limits: Dict[str, int] = field(
+        default_factory=lambda: _parse_concurrency_limits(
+            _env_str("CONCURRENCY_LIMITS", DEFAULT_CONCURRENCY_LIMITS)
+        )
+    )
+    # Behind the ALB the client address is the last X-Forwarded-For hop.
+    rate_limit_trust_forwarded: bool = field(
+        default_factory=lambda: _env_bool("RATE_LIMIT_TRUST_FORWARDED", APP_ENV == "prod")
+    )
     cors_allow_origins: List[str] = None  # type: ignore[assignment]
 
     def __post_init__(self) -> None:  # type: ignore[misc]
+        if self.environment == "prod" and self.session_secret in ("", DEV_SESSION_SECRET):
+            raise RuntimeError("SESSION_SECRET must be set when APP_ENV=prod")
         object.__setattr__(
             self,
             "cors_allow_origins",
@@ -0,0 +1,219 @@
+"""Per-group spend rollups, kept in step with every expense mutation.
+
+A rollup cell is ``(month, payer_id, status) -> (expense_count, total_amount)``,
+with amounts converted to the group's base currency at the rate of the expense's day.
+MySQL keeps the cells in ``group_expense_rollups`` and updates them in the
+mutation's transaction. File mode keeps them in the group record's ``rollups``
+map, written by the same save as the ledger. Reads aggregate cells only, so
+their cost follows months x payers x statuses, not the number of expenses.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from ..config import get_settings
+from ..database import get_connection
+from ..metrics import timed
+from ..schemas.expense import DEFAULT_CURRENCY
+from ..schemas.group import GroupAnalytics, MemberSpend, MonthlySpend, StatusSpend
+from .exceptions import GroupNotFoundError
+from .expense_index import group_record, payer_details
+from .file_storage import ExpenseRecord, GroupRecord
+from .fx_rates import convert_amount, convert_amounts
+
+# (month, payer_id, status, expense_count, total_amount)
+RollupCell = tuple[str, str, str, int, float]
+
+_UPSERT_ROLLUP = """
+    INSERT INTO group_expense_rollups (group_id, month, payer_id, status, expense_count, total_amount)
+    VALUES (%s, %s, %s, %s, %s, %s) AS delta
+    ON DUPLICATE KEY UPDATE
+        expense_count = group_expense_rollups.expense_count + delta.expense_count,
+        total_amount = group_expense_rollups.total_amount + delta.total_amount
+"""
+
+
+@timed("analytics.get_group_analytics")
+def get_group_analytics(group_id: str) -> GroupAnalytics:
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _get_group_analytics_file(group_id)
+    return _get_group_analytics_db(group_id)
+
+
+@timed("analytics.apply_rollup_db")
+def apply_rollup_db(
+    cursor: Any, group_id: str, created_at: Any, payer_id: str, status: str, amount: float, count: int
+) -> None:
+    """Add (``count=1``) or remove (``count=-1``) one expense, ``amount`` in the group's base currency.
+
+    Removals pass the expense's stored ``base_amount``, so they undo exactly what was added.
+    """
+    cursor.execute(
+        _UPSERT_ROLLUP,
+        (group_id, _expense_month(created_at), payer_id, status, count, round(amount * count, 2)),
+    )
+
+
+@timed("analytics.apply_rollups_db")
+def apply_rollups_db(cursor: Any, cells: dict[tuple[str, str, str, str], list[float]]) -> None:
+    """Add pre-aggregated ``(group_id, month, payer_id, status) -> [count, amount]`` cells in one batch."""
+    if cells:
+        cursor.executemany(
+            _UPSERT_ROLLUP,
+            [(*key, int(count), round(amount, 2)) for key, (count, amount) in cells.items()],
+        )
+
+
+@timed("analytics.apply_rollup_file")
+def apply_rollup_file(
+    group: GroupRecord, expense: ExpenseRecord, count: int, base_amount: Optional[float] = None
+) -> None:
+    """Add or remove one expense; call it before the expense enters or leaves ``group["expenses"]``.
+
+    Pass ``base_amount`` when the caller has already converted the amount (batch inserts).
+    Otherwise the expense's stored ``base_amount`` is used, and converted only when missing,
+    so a later change to the FX table cannot unbalance the rollups.
+    """
+    rollups = file_rollups(group)
+    if base_amount is None:
+        base_amount = expense.get("base_amount")
+    if base_amount is None:
+        base_amount = convert_amount(
+            expense["amount"],
+            expense.get("currency", DEFAULT_CURRENCY),
+            expense["created_at"],
+            group.get("base_currency", DEFAULT_CURRENCY),
+        )
+    expense["base_amount"] = base_amount
+    _add_to_rollups(rollups, expense, base_amount, count)
+
+
+@timed("analytics.file_rollups")
+def file_rollups(group: GroupRecord) -> dict[str, list[float]]:
+    """The group's rollup map, built from its expenses the first time (data written before rollups)."""
+    rollups = group.get("rollups")
+    if rollups is None:
+        rollups = {}
+        expenses = group.get("expenses", [])
+        base_amounts = convert_amounts(
+            [
+                (expense["amount"], expense.get("currency", DEFAULT_CURRENCY), expense["created_at"])
+                for expense in expenses
+            ],
+            group.get("base_currency", DEFAULT_CURRENCY),
+        )
+        for expense, base_amount in zip(expenses, base_amounts):
+            _add_to_rollups(rollups, expense, expense.setdefault("base_amount", base_amount), 1)
+        group["rollups"] = rollups
+    return rollups
+
+
+def _add_to_rollups(
+    rollups: dict[str, list[float]], expense: ExpenseRecord, base_amount: float, count: int
+) -> None:
+    key = "|".join(
+        (_expense_month(expense["created_at"]), expense["payer_id"], expense.get("status", "assigned"))
+    )
+    cell = rollups.setdefault(key, [0, 0.0])
+    cell[0] += count
+    cell[1] = round(cell[1] + base_amount * count, 2)
+    if cell[0] <= 0:
+        del rollups[key]
+
+
+def _expense_month(created_at: Any) -> str:
+    """``YYYY-MM`` of a stored (naive UTC) timestamp or its ISO string."""
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at.strftime("%Y-%m")
+
+
+# --- Database helpers -----------------------------------------------------
+
+
+@timed("analytics._get_group_analytics_db")
+def _get_group_analytics_db(group_id: str) -> GroupAnalytics:
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT base_currency FROM `groups` WHERE id = %s", (group_id,))
+        group_row = cursor.fetchone()
+        if group_row is None:
+            raise GroupNotFoundError
+        cursor.execute(
+            """
+            SELECT r.month, r.payer_id, r.status, r.expense_count, r.total_amount, u.name AS payer_name
+            FROM group_expense_rollups r
+            LEFT JOIN users u ON u.id = r.payer_id
+            WHERE r.group_id = %s AND r.expense_count > 0
+            """,
+            (group_id,),
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    cells = [
+        (row["month"], row["payer_id"], row["status"], int(row["expense_count"]), float(row["total_amount"]))
+        for row in rows
+    ]
+    names = {row["payer_id"]: row["payer_name"] for row in rows if row["payer_name"] is not None}
+    return _compose_analytics(group_id, group_row["base_currency"], cells, names)
+
+
+# --- File storage helpers -------------------------------------------------
+
+
+@timed("analytics._get_group_analytics_file")
+def _get_group_analytics_file(group_id: str) -> GroupAnalytics:
+    # The cached snapshot's record only gains its derived ``rollups`` map here.
+    group = group_record(group_id)
+    rollups = file_rollups(group)
+    cells = []
+    for key, (count, amount) in rollups.items():
+        month, payer_id, status = key.split("|")
+        cells.append((month, payer_id, status, int(count), amount))
+    names = {user_id: name for user_id, (name, _) in payer_details().items()}
+    return _compose_analytics(group_id, group.get("base_currency", DEFAULT_CURRENCY), cells, names)
+
+
+def _compose_analytics(
+    group_id: str, base_currency: str, cells: Iterable[RollupCell], names: dict[str, str]
+) -> GroupAnalytics:
+    by_month: dict[str, list[float]] = {}
+    by_member: dict[str, list[float]] = {}
+    by_status: dict[str, list[float]] = {}
+    total_count, total_amount = 0, 0.0
+    for month, payer_id, status, count, amount in cells:
+        for totals, key in ((by_month, month), (by_member, payer_id), (by_status, status)):
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += count
+            entry[1] += amount
+        total_count += count
+        total_amount += amount
+    return GroupAnalytics(
+        group_id=group_id,
+        base_currency=base_currency,
+        expense_count=total_count,
+        total_amount=round(total_amount, 2),
+        by_month=[
+            MonthlySpend(month=month, expense_count=count, total_amount=round(amount, 2))
+            for month, (count, amount) in sorted(by_month.items())
+        ],
+        by_member=[
+            MemberSpend(
+                user_id=payer_id,
+                name=names.get(payer_id, "Unknown"),
+                expense_count=count,
+                total_amount=round(amount, 2),
+            )
+            for payer_id, (count, amount) in sorted(by_member.items(), key=lambda item: -item[1][1])
+        ],
+        by_status=[
+            StatusSpend(status=status, expense_count=count, total_amount=round(amount, 2))
+            for status, (count, amount) in sorted(by_status.items(), key=lambda item: -item[1][1])
+        ],
+    )
@@ -0,0 +1,389 @@
+"""Moving settled expenses out of the live ledger, behind a per-group balance checkpoint.
+
+Settled (``paid``/``refunded``) expenses older than the cutoff move to
+``archived_expenses`` (MySQL) or ``<ARCHIVE_DIR>/<group_id>.jsonl`` (file mode).
+What they added to each payer's paid total, converted to the group's base
+currency at archive time, is added to the group's checkpoint in the same
+transaction or save. Group detail sums the checkpoint with the live expenses,
+so balances and totals are unchanged by archiving while the rows it loads,
+validates and sums are only the live ones. Analytics rollups keep counting
+archived expenses; archived history is read through :func:`list_archived_expenses`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from ..change_feed import EXPENSES_ARCHIVED, publish_group_change
+from ..config import get_settings
+from ..database import get_connection
+from ..metrics import timed
+from ..schemas.expense import DEFAULT_CURRENCY, ArchivedExpense, ArchivedExpensePage
+from ..schemas.group import GroupDetail
+from . import group as group_crud
+from .analytics import file_rollups
+from .exceptions import GroupNotFoundError, GroupOwnershipError
+from .expense_index import group_record, group_records, payer_details
+from .file_storage import (
+    ExpenseRecord,
+    append_archived_expenses,
+    archived_expense_offsets,
+    file_lock,
+    group_file_path,
+    load_groups,
+    read_archived_expenses,
+    save_groups,
+)
+from .fx_rates import convert_amounts
+
+SETTLED_STATUSES = ("paid", "refunded")
+
+_UPSERT_CHECKPOINT = """
+    INSERT INTO group_balance_checkpoints (group_id, payer_id, expense_count, total_amount)
+    VALUES (%s, %s, %s, %s) AS delta
+    ON DUPLICATE KEY UPDATE
+        expense_count = group_balance_checkpoints.expense_count + delta.expense_count,
+        total_amount = group_balance_checkpoints.total_amount + delta.total_amount
+"""
+
+
+@dataclass
+class ArchiveResult:
+    expenses: int = 0
+    groups: set[str] = field(default_factory=set)
+
+
+@timed("archive.archive_cutoff")
+def archive_cutoff(older_than_days: Optional[int] = None) -> datetime:
+    """Expenses created before this (naive UTC) moment are old enough to archive."""
+    if older_than_days is None:
+        older_than_days = get_settings().archive_after_days
+    return datetime.utcnow() - timedelta(days=older_than_days)
+
+
+@timed("archive.archive_group_expenses")
+def archive_group_expenses(
+    group_id: str, requester_id: str, older_than_days: Optional[int] = None
+) -> GroupDetail:
+    """Archive one group's settled expenses; only the group owner may."""
+    settings = get_settings()
+    before = archive_cutoff(older_than_days)
+    if settings.use_file_storage:
+        expense_ids = _archive_group_file(group_id, requester_id, before)
+    else:
+        expense_ids = _archive_group_db(group_id, requester_id, before, settings.archive_batch_size)
+    if not expense_ids:
+        return group_crud.get_group(group_id)
+    return _publish_archived(group_id, expense_ids)
+
+
+@timed("archive.archive_settled_expenses")
+def archive_settled_expenses(
+    older_than_days: Optional[int] = None, batch_size: Optional[int] = None
+) -> ArchiveResult:
+    """Archive the settled expenses of every group; safe to run repeatedly."""
+    settings = get_settings()
+    before = archive_cutoff(older_than_days)
+    batch_size = batch_size or settings.archive_batch_size
+    result = ArchiveResult()
+    if settings.use_file_storage:
+        group_ids = _groups_with_archivable_file(before)
+    else:
+        group_ids = _groups_with_archivable_db(before)
+    for group_id in group_ids:
+        try:
+            if settings.use_file_storage:
+                expense_ids = _archive_group_file(group_id, None, before)
+            else:
+                expense_ids = _archive_group_db(group_id, None, before, batch_size)
+        except GroupNotFoundError:
+            continue  # deleted since the candidate query
+        if expense_ids:
+            _publish_archived(group_id, expense_ids)
+            result.expenses += len(expense_ids)
+            result.groups.add(group_id)
+    return result
+
+
+@timed("archive.list_archived_expenses")
+def list_archived_expenses(group_id: str, limit: int = 50, offset: int = 0) -> ArchivedExpensePage:
+    """One page of a group's archived expenses, newest first."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _list_archived_expenses_file(group_id, limit, offset)
+    return _list_archived_expenses_db(group_id, limit, offset)
+
+
+def _publish_archived(group_id: str, expense_ids: list[str]) -> GroupDetail:
+    detail = group_crud.refresh_group(group_id)
+    publish_group_change(
+        group_id,
+        EXPENSES_ARCHIVED,
+        expense_ids=expense_ids,
+        archived_expense_count=detail.archived_expense_count,
+        total_expense=detail.total_expense,
+        balances=[balance.model_dump(mode="json") for balance in detail.balances],
+    )
+    return detail
+
+
+def _checkpoint_deltas(
+    rows: list[tuple[str, float, str, Any]], base_currency: str
+) -> dict[str, list[float]]:
+    """``payer_id -> [count, amount in base_currency]`` of ``(payer_id, amount, currency, created_at)``."""
+    base_amounts = convert_amounts(
+        [(amount, currency, created_at) for _, amount, currency, created_at in rows], base_currency
+    )
+    deltas: dict[str, list[float]] = {}
+    for (payer_id, _, _, _), base_amount in zip(rows, base_amounts):
+        delta = deltas.setdefault(payer_id, [0, 0.0])
+        delta[0] += 1
+        delta[1] += base_amount
+    return deltas
+
+
+# --- Database helpers -----------------------------------------------------
+
+
+@timed("archive._groups_with_archivable_db")
+def _groups_with_archivable_db(before: datetime) -> list[str]:
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT DISTINCT group_id FROM expenses WHERE status IN (%s, %s) AND created_at < %s",
+            (*SETTLED_STATUSES, before),
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@timed("archive._archive_group_db")
+def _archive_group_db(
+    group_id: str, requester_id: Optional[str], before: datetime, batch_size: int
+) -> list[str]:
+    """Archive in batches of ``batch_size``, one transaction each, so no lock is held for long."""
+    connection = get_connection()
+    cursor = connection.cursor()
+    archived: list[str] = []
+    try:
+        cursor.execute("SELECT owner_id, base_currency FROM `groups` WHERE id = %s", (group_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise GroupNotFoundError
+        owner_id, base_currency = row
+        if requester_id is not None and owner_id != requester_id:
+            raise GroupOwnershipError
+        while True:
+            expense_ids = _archive_batch_db(cursor, group_id, base_currency, before, batch_size)
+            connection.commit()
+            archived.extend(expense_ids)
+            if len(expense_ids) < batch_size:
+                return archived
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@timed("archive._archive_batch_db")
+def _archive_batch_db(
+    cursor: Any, group_id: str, base_currency: str, before: datetime, batch_size: int
+) -> list[str]:
+    # Locking the rows keeps a concurrent edit from un-settling an expense as it is archived.
+    cursor.execute(
+        """
+        SELECT e.id, e.payer_id, e.amount, e.currency, e.note, e.status, e.created_at
+        FROM expenses e
+        WHERE e.group_id = %s AND e.status IN (%s, %s) AND e.created_at < %s
+        ORDER BY e.created_at, e.id
+        LIMIT %s
+        FOR UPDATE OF e
+        """,
+        (group_id, *SETTLED_STATUSES, before, batch_size),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    archived_at = datetime.utcnow()
+    cursor.executemany(
+        "INSERT INTO archived_expenses "
+        "(id, group_id, payer_id, amount, currency, note, status, created_at, archived_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        [
+            (expense_id, group_id, payer_id, amount, currency, note, status, created_at, archived_at)
+            for expense_id, payer_id, amount, currency, note, status, created_at in rows
+        ],
+    )
+    deltas = _checkpoint_deltas(
+        [
+            (payer_id, float(amount), currency, created_at)
+            for _, payer_id, amount, currency, _, _, created_at in rows
+        ],
+        base_currency,
+    )
+    cursor.executemany(
+        _UPSERT_CHECKPOINT,
+        [(group_id, payer_id, int(count), round(amount, 2)) for payer_id, (count, amount) in deltas.items()],
+    )
+    cursor.execute(
+        "UPDATE `groups` SET archived_expense_count = archived_expense_count + %s WHERE id = %s",
+        (len(rows), group_id),
+    )
+    expense_ids = [row[0] for row in rows]
+    # expense_groups and recurring_occurrences rows go with them (ON DELETE CASCADE).
+    cursor.execute(
+        f"DELETE FROM expenses WHERE id IN ({', '.join(['%s'] * len(expense_ids))})",
+        expense_ids,
+    )
+    return expense_ids
+
+
+@timed("archive._list_archived_expenses_db")
+def _list_archived_expenses_db(group_id: str, limit: int, offset: int) -> ArchivedExpensePage:
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT archived_expense_count FROM `groups` WHERE id = %s", (group_id,))
+        group_row = cursor.fetchone()
+        if group_row is None:
+            raise GroupNotFoundError
+        rows: list[dict] = []
+        if group_row["archived_expense_count"]:
+            cursor.execute(
+                """
+                SELECT a.id, a.group_id, a.payer_id, a.amount, a.currency, a.note, a.status,
+                       a.created_at, a.archived_at, u.name AS payer_name, u.email AS payer_email
+                FROM archived_expenses a
+                LEFT JOIN users u ON u.id = a.payer_id
+                WHERE a.group_id = %s
+                ORDER BY a.created_at DESC, a.id DESC
+                LIMIT %s OFFSET %s
+                """,
+                (group_id, limit, offset),
+            )
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    expenses = [
+        ArchivedExpense(
+            id=row["id"],
+            group_id=row["group_id"],
+            payer_id=row["payer_id"],
+            payer_name=row["payer_name"] or "Unknown",
+            payer_email=row["payer_email"] or "unknown@example.com",
+            amount=float(row["amount"]),
+            currency=row["currency"],
+            note=row["note"],
+            status=row["status"],
+            created_at=row["created_at"],
+            archived_at=row["archived_at"],
+        )
+        for row in rows
+    ]
+    # The group's counter is kept in step with the table, so the total costs no COUNT(*).
+    return ArchivedExpensePage(
+        total=int(group_row["archived_expense_count"]), limit=limit, offset=offset, expenses=expenses
+    )
+
+
+# --- File storage helpers -------------------------------------------------
+
+
+@timed("archive._groups_with_archivable_file")
+def _groups_with_archivable_file(before: datetime) -> list[str]:
+    # Checked on the cached snapshot; each group is re-read under the lock before it changes.
+    return [
+        group_id
+        for group_id, group in group_records().items()
+        if any(_is_archivable(expense, before) for expense in group.get("expenses", []))
+    ]
+
+
+@timed("archive._archive_group_file")
+def _archive_group_file(group_id: str, requester_id: Optional[str], before: datetime) -> list[str]:
+    """Archive with one append and one save; groups.json is rewritten whole, so batching saves nothing."""
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        if requester_id is not None and group["owner_id"] != requester_id:
+            raise GroupOwnershipError
+        expenses = group.get("expenses", [])
+        selected = [expense for expense in expenses if _is_archivable(expense, before)]
+        if not selected:
+            return []
+        # Rollups built lazily from the ledger must be built while it still holds these expenses.
+        file_rollups(group)
+        archived_at = datetime.utcnow().isoformat()
+        # Appended first: a crash before the save leaves them in both places, never in neither.
+        append_archived_expenses(
+            group_id, [{**expense, "group_id": group_id, "archived_at": archived_at} for expense in selected]
+        )
+        deltas = _checkpoint_deltas(
+            [
+                (expense["payer_id"], expense["amount"], expense.get("currency", DEFAULT_CURRENCY),
+                 expense["created_at"])
+                for expense in selected
+            ],
+            group.get("base_currency", DEFAULT_CURRENCY),
+        )
+        checkpoint = group.setdefault("checkpoint", {})
+        for payer_id, (count, amount) in deltas.items():
+            cell = checkpoint.setdefault(payer_id, [0, 0.0])
+            cell[0] += int(count)
+            cell[1] = round(cell[1] + amount, 2)
+        expense_ids = {expense["id"] for expense in selected}
+        group["expenses"] = [expense for expense in expenses if expense["id"] not in expense_ids]
+        save_groups(groups)
+    return [expense["id"] for expense in selected]
+
+
+def _is_archivable(expense: ExpenseRecord, before: datetime) -> bool:
+    created_at = expense["created_at"]
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return expense.get("status", "assigned") in SETTLED_STATUSES and created_at < before
+
+
+@timed("archive._list_archived_expenses_file")
+def _list_archived_expenses_file(group_id: str, limit: int, offset: int) -> ArchivedExpensePage:
+    group_record(group_id)  # raises GroupNotFoundError
+    offsets = archived_expense_offsets(group_id)
+    payers = payer_details()
+    expenses = []
+    for entry in read_archived_expenses(group_id, offsets[offset:offset + limit]):
+        name, email = payers.get(entry["payer_id"], ("Unknown", "unknown@example.com"))
+        expenses.append(
+            ArchivedExpense(
+                id=entry["id"],
+                group_id=group_id,
+                payer_id=entry["payer_id"],
+                payer_name=name,
+                payer_email=email,
+                amount=entry["amount"],
+                currency=entry.get("currency", DEFAULT_CURRENCY),
+                note=entry.get("note"),
+                status=entry.get("status", "assigned"),
+                created_at=entry["created_at"],
+                archived_at=entry["archived_at"],
+            )
+        )
+    return ArchivedExpensePage(total=len(offsets), limit=limit, offset=offset, expenses=expenses)
+
+
+__all__ = [
+    "archive_group_expenses",
+    "archive_settled_expenses",
+    "list_archived_expenses",
+    "archive_cutoff",
+    "ArchiveResult",
+    "SETTLED_STATUSES",
+    "GroupNotFoundError",
+    "GroupOwnershipError",
+]
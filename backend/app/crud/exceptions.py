@@ -28,3 +28,22 @@ class GroupMembershipError(Exception):
 class ExpenseNotFoundError(Exception):
     """Raised when an expense cannot be located for a group."""
 
+
+class RecurringExpenseNotFoundError(Exception):
+    """Raised when a recurring expense schedule cannot be located for a group."""
+
+
+class ExchangeRateNotFoundError(ValueError):
+    """Raised when the FX rate table has no rates for a currency that needs converting."""
+
+    def __init__(self, currency: str) -> None:
+        super().__init__(f"No exchange rate for {currency}")
+        self.currency = currency
+
+
+class StorageError(Exception):
+    """Raised when the storage backend fails; the driver error is chained as ``__cause__``."""
+
+
+class DuplicateKeyError(StorageError):
+    """Raised when a write violates a unique key."""
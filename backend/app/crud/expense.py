@@ -1,52 +1,122 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Any
 from uuid import uuid4
 
+from ..change_feed import EXPENSE_ADDED, EXPENSE_DELETED, EXPENSE_UPDATED, publish_group_change
 from ..config import get_settings
 from ..database import get_connection
-from ..schemas.expense import ExpenseCreate, ExpenseUpdate
+from ..metrics import timed
+from ..schemas.expense import (
+    DEFAULT_CURRENCY,
+    Expense,
+    ExpenseCreate,
+    ExpenseSearch,
+    ExpenseSearchResult,
+    ExpenseUpdate,
+)
+from ..schemas.group import GroupDetail
 from . import group as group_crud
+from .analytics import apply_rollup_db, apply_rollup_file
 from .exceptions import (
+    ExchangeRateNotFoundError,
     ExpenseNotFoundError,
     GroupMembershipError,
     GroupNotFoundError,
     UserNotFoundError,
 )
-from .file_storage import ExpenseRecord, GroupRecord, load_groups, load_users, save_groups
+from .expense_index import group_index, naive_utc, note_tokens, payer_details
+from .file_storage import (
+    ExpenseRecord,
+    GroupRecord,
+    file_lock,
+    group_file_path,
+    load_groups,
+    load_users,
+    save_groups,
+)
+from .fx_rates import check_convertible, convert_amount
 
 
-def add_expense_to_group(group_id: str, payload: ExpenseCreate):
+@timed("expense.add_expense_to_group")
+def add_expense_to_group(group_id: str, payload: ExpenseCreate) -> GroupDetail:
     settings = get_settings()
     if settings.use_file_storage:
-        return _add_expense_to_group_file(group_id, payload)
-    return _add_expense_to_group_db(group_id, payload)
+        expense_id = _add_expense_to_group_file(group_id, payload)
+    else:
+        expense_id = _add_expense_to_group_db(group_id, payload)
+    return _publish_expense_change(group_id, EXPENSE_ADDED, expense_id)
 
 
-def update_expense_in_group(group_id: str, expense_id: str, payload: ExpenseUpdate):
+@timed("expense.update_expense_in_group")
+def update_expense_in_group(group_id: str, expense_id: str, payload: ExpenseUpdate) -> GroupDetail:
     settings = get_settings()
     if settings.use_file_storage:
-        return _update_expense_in_group_file(group_id, expense_id, payload)
-    return _update_expense_in_group_db(group_id, expense_id, payload)
+        _update_expense_in_group_file(group_id, expense_id, payload)
+    else:
+        _update_expense_in_group_db(group_id, expense_id, payload)
+    return _publish_expense_change(group_id, EXPENSE_UPDATED, expense_id)
 
 
-def delete_expense_from_group(group_id: str, expense_id: str):
+@timed("expense.delete_expense_from_group")
+def delete_expense_from_group(group_id: str, expense_id: str) -> GroupDetail:
     settings = get_settings()
     if settings.use_file_storage:
-        return _delete_expense_from_group_file(group_id, expense_id)
-    return _delete_expense_from_group_db(group_id, expense_id)
+        _delete_expense_from_group_file(group_id, expense_id)
+    else:
+        _delete_expense_from_group_db(group_id, expense_id)
+    return _publish_expense_change(group_id, EXPENSE_DELETED, expense_id)
+
+
+@timed("expense.search_expenses")
+def search_expenses(group_id: str, filters: ExpenseSearch) -> ExpenseSearchResult:
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _search_expenses_file(group_id, filters)
+    return _search_expenses_db(group_id, filters)
+
+
+def _publish_expense_change(group_id: str, event_type: str, expense_id: str) -> GroupDetail:
+    """Reload the group after a mutation and broadcast the delta to change-feed clients."""
+    detail = group_crud.refresh_group(group_id)
+    data: dict[str, Any] = {
+        "total_expense": detail.total_expense,
+        "balances": [balance.model_dump(mode="json") for balance in detail.balances],
+    }
+    if event_type == EXPENSE_DELETED:
+        data["expense_id"] = expense_id
+    else:
+        expense = next((entry for entry in detail.expenses if entry.id == expense_id), None)
+        data["expense"] = expense.model_dump(mode="json") if expense else None
+    publish_group_change(group_id, event_type, **data)
+    return detail
 
 
 # --- Database helpers -----------------------------------------------------
 
+# The expense row and its group's base currency; only the expense row is locked.
+_SELECT_FOR_CHANGE = """
+    SELECT e.payer_id, e.amount, e.currency, e.base_amount, e.status, e.created_at, g.base_currency
+    FROM expenses e
+    INNER JOIN `groups` g ON g.id = e.group_id
+    WHERE e.id = %s AND e.group_id = %s
+    FOR UPDATE OF e
+"""
 
-def _add_expense_to_group_db(group_id: str, payload: ExpenseCreate):
+
+@timed("expense._add_expense_to_group_db")
+def _add_expense_to_group_db(group_id: str, payload: ExpenseCreate) -> str:
     connection = get_connection()
     cursor = connection.cursor()
     try:
-        cursor.execute("SELECT id FROM `groups` WHERE id = %s", (group_id,))
-        if cursor.fetchone() is None:
+        cursor.execute("SELECT base_currency FROM `groups` WHERE id = %s", (group_id,))
+        group_row = cursor.fetchone()
+        if group_row is None:
             raise GroupNotFoundError
+        base_currency = group_row[0]
+        currency = payload.currency or base_currency
+        check_convertible(currency, base_currency)
         cursor.execute(
             "SELECT id, name, email FROM users WHERE email = %s",
             (payload.payer_email,),
@@ -64,15 +134,20 @@ def _add_expense_to_group_db(group_id: str, payload: ExpenseCreate):
         expense_id = str(uuid4())
         created_at = datetime.utcnow()
         status = payload.status or "assigned"
+        base_amount = convert_amount(float(payload.amount), currency, created_at, base_currency)
         cursor.execute(
             """
-            INSERT INTO expenses (id, payer_id, amount, note, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO expenses
+                (id, group_id, payer_id, amount, currency, base_amount, note, status, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
             (
                 expense_id,
+                group_id,
                 payer_id,
                 float(payload.amount),
+                currency,
+                round(base_amount, 2),
                 payload.note,
                 status,
                 created_at,
@@ -82,40 +157,46 @@ def _add_expense_to_group_db(group_id: str, payload: ExpenseCreate):
             "INSERT INTO expense_groups (expense_id, group_id) VALUES (%s, %s)",
             (expense_id, group_id),
         )
+        apply_rollup_db(cursor, group_id, created_at, payer_id, status, base_amount, 1)
         connection.commit()
     finally:
         cursor.close()
         connection.close()
-    return group_crud.get_group(group_id)
+    return expense_id
 
 
-def _update_expense_in_group_db(group_id: str, expense_id: str, payload: ExpenseUpdate):
+@timed("expense._update_expense_in_group_db")
+def _update_expense_in_group_db(group_id: str, expense_id: str, payload: ExpenseUpdate) -> None:
     connection = get_connection()
     cursor = connection.cursor()
     try:
-        cursor.execute(
-            """
-            SELECT e.id
-            FROM expenses e
-            INNER JOIN expense_groups eg ON eg.expense_id = e.id
-            WHERE e.id = %s AND eg.group_id = %s
-            """,
-            (expense_id, group_id),
-        )
-        if cursor.fetchone() is None:
+        cursor.execute(_SELECT_FOR_CHANGE, (expense_id, group_id))
+        current = cursor.fetchone()
+        if current is None:
             raise ExpenseNotFoundError
+        payer_id, amount, currency, stored_base, status, created_at, base_currency = current
+        new_payer_id, new_amount, new_currency, new_status = payer_id, float(amount), currency, status
+        old_base = _stored_base_amount(amount, currency, stored_base, created_at, base_currency)
+        new_base = old_base
 
         updates = []
         params: list = []
         if payload.amount is not None:
             updates.append("amount = %s")
             params.append(float(payload.amount))
+            new_amount = float(payload.amount)
+        if payload.currency is not None:
+            check_convertible(payload.currency, base_currency)
+            updates.append("currency = %s")
+            params.append(payload.currency)
+            new_currency = payload.currency
         if payload.note is not None:
             updates.append("note = %s")
             params.append(payload.note)
         if payload.status is not None:
             updates.append("status = %s")
             params.append(payload.status)
+            new_status = payload.status
         if payload.payer_email is not None:
             cursor.execute(
                 "SELECT id FROM users WHERE email = %s",
@@ -133,6 +214,10 @@ def _update_expense_in_group_db(group_id: str, expense_id: str, payload: Expense
                 raise GroupMembershipError
             updates.append("payer_id = %s")
             params.append(new_payer_id)
+        if (new_amount, new_currency) != (float(amount), currency):
+            new_base = convert_amount(new_amount, new_currency, created_at, base_currency)
+            updates.append("base_amount = %s")
+            params.append(round(new_base, 2))
 
         if updates:
             params.append(expense_id)
@@ -141,118 +226,252 @@ def _update_expense_in_group_db(group_id: str, expense_id: str, payload: Expense
                 f"UPDATE expenses SET {set_clause} WHERE id = %s",
                 params,
             )
+            changed = (new_payer_id, new_amount, new_currency, new_status)
+            if changed != (payer_id, float(amount), currency, status):
+                apply_rollup_db(cursor, group_id, created_at, payer_id, status, old_base, -1)
+                apply_rollup_db(cursor, group_id, created_at, new_payer_id, new_status, new_base, 1)
             connection.commit()
     finally:
         cursor.close()
         connection.close()
-    return group_crud.get_group(group_id)
 
 
-def _delete_expense_from_group_db(group_id: str, expense_id: str):
+@timed("expense._delete_expense_from_group_db")
+def _delete_expense_from_group_db(group_id: str, expense_id: str) -> None:
     connection = get_connection()
     cursor = connection.cursor()
     try:
+        cursor.execute(_SELECT_FOR_CHANGE, (expense_id, group_id))
+        current = cursor.fetchone()
+        if current is None:
+            raise ExpenseNotFoundError
+        payer_id, amount, currency, stored_base, status, created_at, base_currency = current
+        cursor.execute("DELETE FROM expenses WHERE id = %s", (expense_id,))
+        base_amount = _stored_base_amount(amount, currency, stored_base, created_at, base_currency)
+        apply_rollup_db(cursor, group_id, created_at, payer_id, status, base_amount, -1)
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _stored_base_amount(
+    amount: Any, currency: str, stored_base: Any, created_at: Any, base_currency: str
+) -> float:
+    """What the expense added to the rollups; rows written before ``base_amount`` are converted now."""
+    if stored_base is not None:
+        return float(stored_base)
+    return convert_amount(float(amount), currency, created_at, base_currency)
+
+
+@timed("expense._search_expenses_db")
+def _search_expenses_db(group_id: str, filters: ExpenseSearch) -> ExpenseSearchResult:
+    # Every filter follows e.group_id, so the idx_expenses_group_* indexes serve the search.
+    conditions = ["e.group_id = %s"]
+    params: list[Any] = [group_id]
+    if filters.status:
+        conditions.append(f"e.status IN ({', '.join(['%s'] * len(filters.status))})")
+        params.extend(filters.status)
+    if filters.payer_id is not None:
+        conditions.append("e.payer_id = %s")
+        params.append(filters.payer_id)
+    if filters.min_amount is not None:
+        conditions.append("e.amount >= %s")
+        params.append(filters.min_amount)
+    if filters.max_amount is not None:
+        conditions.append("e.amount <= %s")
+        params.append(filters.max_amount)
+    if filters.created_from is not None:
+        conditions.append("e.created_at >= %s")
+        params.append(naive_utc(filters.created_from))
+    if filters.created_to is not None:
+        conditions.append("e.created_at <= %s")
+        params.append(naive_utc(filters.created_to))
+    tokens = note_tokens(filters.q)
+    if tokens:
+        # ft_expenses_note; every word must match, as a prefix.
+        conditions.append("MATCH (e.note) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(" ".join(f"+{token}*" for token in tokens))
+    where = " AND ".join(conditions)
+
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id FROM `groups` WHERE id = %s", (group_id,))
+        if cursor.fetchone() is None:
+            raise GroupNotFoundError
         cursor.execute(
-            """
-            SELECT e.id
+            f"""
+            SELECT COUNT(*) AS total
             FROM expenses e
-            INNER JOIN expense_groups eg ON eg.expense_id = e.id
-            WHERE e.id = %s AND eg.group_id = %s
+            WHERE {where}
             """,
-            (expense_id, group_id),
+            params,
         )
-        if cursor.fetchone() is None:
-            raise ExpenseNotFoundError
-        cursor.execute("DELETE FROM expenses WHERE id = %s", (expense_id,))
-        connection.commit()
+        total = cursor.fetchone()["total"]
+        cursor.execute(
+            f"""
+            SELECT e.id,
+                   e.group_id,
+                   e.payer_id,
+                   e.amount,
+                   e.currency,
+                   e.note,
+                   e.status,
+                   e.created_at,
+                   u.name AS payer_name,
+                   u.email AS payer_email
+            FROM expenses e
+            INNER JOIN users u ON u.id = e.payer_id
+            WHERE {where}
+            ORDER BY e.created_at DESC, e.id DESC
+            LIMIT %s OFFSET %s
+            """,
+            [*params, filters.limit, filters.offset],
+        )
+        rows = cursor.fetchall()
     finally:
         cursor.close()
         connection.close()
-    return group_crud.get_group(group_id)
+    return ExpenseSearchResult(
+        total=total,
+        limit=filters.limit,
+        offset=filters.offset,
+        expenses=[group_crud._expense_from_db_row(row) for row in rows],
+    )
 
 
 # --- File storage helpers -------------------------------------------------
 
 
-def _add_expense_to_group_file(group_id: str, payload: ExpenseCreate):
-    groups = load_groups()
-    users = load_users()
-    group = next((g for g in groups if g["id"] == group_id), None)
-    if not group:
-        raise GroupNotFoundError
-    payer = next(
-        (user for user in users if user["email"].lower() == payload.payer_email.lower()),
-        None,
-    )
-    if not payer:
-        raise UserNotFoundError
-    members = group.setdefault("members", [])
-    if payer["id"] not in members:
-        raise GroupMembershipError
-    expense: ExpenseRecord = {
-        "id": str(uuid4()),
-        "group_id": group_id,
-        "payer_id": payer["id"],
-        "amount": float(payload.amount),
-        "note": payload.note,
-        "status": payload.status or "assigned",
-        "created_at": datetime.utcnow().isoformat(),
-    }
-    group.setdefault("expenses", []).insert(0, expense)
-    save_groups(groups)
-    return group_crud.get_group(group_id)
-
-
-def _update_expense_in_group_file(group_id: str, expense_id: str, payload: ExpenseUpdate):
-    groups = load_groups()
-    users = load_users()
-    group = next((g for g in groups if g["id"] == group_id), None)
-    if not group:
-        raise GroupNotFoundError
-    expenses = group.setdefault("expenses", [])
-    expense = next((entry for entry in expenses if entry["id"] == expense_id), None)
-    if not expense:
-        raise ExpenseNotFoundError
-
-    if payload.payer_email is not None:
+@timed("expense._add_expense_to_group_file")
+def _add_expense_to_group_file(group_id: str, payload: ExpenseCreate) -> str:
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        users = load_users()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
         payer = next(
             (user for user in users if user["email"].lower() == payload.payer_email.lower()),
             None,
         )
         if not payer:
             raise UserNotFoundError
-        if payer["id"] not in group.get("members", []):
+        members = group.setdefault("members", [])
+        if payer["id"] not in members:
             raise GroupMembershipError
-        expense["payer_id"] = payer["id"]
-    if payload.amount is not None:
-        expense["amount"] = float(payload.amount)
-    if payload.note is not None:
-        expense["note"] = payload.note
-    if payload.status is not None:
-        expense["status"] = payload.status
-
-    save_groups(groups)
-    return group_crud.get_group(group_id)
-
-
-def _delete_expense_from_group_file(group_id: str, expense_id: str):
-    groups = load_groups()
-    group = next((g for g in groups if g["id"] == group_id), None)
-    if not group:
-        raise GroupNotFoundError
-    expenses = group.setdefault("expenses", [])
-    index = next((idx for idx, entry in enumerate(expenses) if entry["id"] == expense_id), None)
-    if index is None:
-        raise ExpenseNotFoundError
-    expenses.pop(index)
-    save_groups(groups)
-    return group_crud.get_group(group_id)
+        base_currency = group.get("base_currency", DEFAULT_CURRENCY)
+        currency = payload.currency or base_currency
+        check_convertible(currency, base_currency)
+        expense: ExpenseRecord = {
+            "id": str(uuid4()),
+            "group_id": group_id,
+            "payer_id": payer["id"],
+            "amount": float(payload.amount),
+            "currency": currency,
+            "note": payload.note,
+            "status": payload.status or "assigned",
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        apply_rollup_file(group, expense, 1)
+        group.setdefault("expenses", []).insert(0, expense)
+        save_groups(groups)
+        return expense["id"]
+
+
+@timed("expense._update_expense_in_group_file")
+def _update_expense_in_group_file(group_id: str, expense_id: str, payload: ExpenseUpdate) -> None:
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        users = load_users()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        expenses = group.setdefault("expenses", [])
+        expense = next((entry for entry in expenses if entry["id"] == expense_id), None)
+        if not expense:
+            raise ExpenseNotFoundError
+
+        payer = None
+        if payload.payer_email is not None:
+            payer = next(
+                (user for user in users if user["email"].lower() == payload.payer_email.lower()),
+                None,
+            )
+            if not payer:
+                raise UserNotFoundError
+            if payer["id"] not in group.get("members", []):
+                raise GroupMembershipError
+        if payload.currency is not None:
+            check_convertible(payload.currency, group.get("base_currency", DEFAULT_CURRENCY))
+
+        apply_rollup_file(group, expense, -1)
+        if payer is not None:
+            expense["payer_id"] = payer["id"]
+        if payload.amount is not None or payload.currency is not None:
+            expense.pop("base_amount", None)  # converted again when it is added back
+        if payload.amount is not None:
+            expense["amount"] = float(payload.amount)
+        if payload.currency is not None:
+            expense["currency"] = payload.currency
+        if payload.note is not None:
+            expense["note"] = payload.note
+        if payload.status is not None:
+            expense["status"] = payload.status
+        apply_rollup_file(group, expense, 1)
+
+        save_groups(groups)
+
+
+@timed("expense._delete_expense_from_group_file")
+def _delete_expense_from_group_file(group_id: str, expense_id: str) -> None:
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        expenses = group.setdefault("expenses", [])
+        index = next((idx for idx, entry in enumerate(expenses) if entry["id"] == expense_id), None)
+        if index is None:
+            raise ExpenseNotFoundError
+        apply_rollup_file(group, expenses[index], -1)
+        expenses.pop(index)
+        save_groups(groups)
+
+
+@timed("expense._search_expenses_file")
+def _search_expenses_file(group_id: str, filters: ExpenseSearch) -> ExpenseSearchResult:
+    index = group_index(group_id)
+    total, page = index.search(filters)
+    payers = payer_details()
+    expenses = []
+    for expense_id in page:
+        entry = index.records[expense_id]
+        payer_name, payer_email = payers.get(entry["payer_id"], ("Unknown", "unknown@example.com"))
+        expenses.append(
+            Expense(
+                id=entry["id"],
+                group_id=group_id,
+                payer_id=entry["payer_id"],
+                payer_name=payer_name,
+                payer_email=payer_email,
+                amount=entry["amount"],
+                currency=entry.get("currency", DEFAULT_CURRENCY),
+                note=entry.get("note"),
+                status=entry.get("status", "assigned"),
+                created_at=index.created[expense_id],
+            )
+        )
+    return ExpenseSearchResult(total=total, limit=filters.limit, offset=filters.offset, expenses=expenses)
 
 
 __all__ = [
     "add_expense_to_group",
     "update_expense_in_group",
     "delete_expense_from_group",
+    "search_expenses",
+    "ExchangeRateNotFoundError",
     "ExpenseNotFoundError",
     "GroupMembershipError",
     "GroupNotFoundError",
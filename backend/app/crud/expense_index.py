@@ -0,0 +1,213 @@
+"""In-memory search index and snapshot of the file-storage ledger.
+
+Each group's expenses get postings (note words, status, payer) and sorted
+``created_at``/``amount`` keys, so a search intersects candidate sets and
+bisects ranges instead of scanning the group. Indexes are rebuilt lazily, per
+group, after ``groups.json`` changes on disk; every save, from any process,
+replaces the file.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from ..schemas.expense import ExpenseSearch
+from .exceptions import GroupNotFoundError
+from .file_storage import ExpenseRecord, GroupRecord, group_file_path, load_groups, load_users, user_file_path
+
+_WORD = re.compile(r"\w+")
+# What ft_expenses_note leaves out with MySQL's defaults (innodb_ft_min_token_size and
+# the InnoDB stopword list); dropped in both modes so a query matches the same notes.
+MIN_NOTE_TOKEN_LENGTH = 3
+NOTE_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or that the this to was what "
+    "when where who will with und www".split()
+)
+
+_lock = threading.Lock()
+# (inode, mtime_ns, size) of the file each snapshot was read from; saves replace the inode.
+_groups_state: Optional[tuple[tuple[int, ...], dict[str, GroupRecord], dict[str, GroupExpenseIndex]]] = None
+_users_state: Optional[tuple[tuple[int, ...], dict[str, tuple[str, str]]]] = None
+
+
+def note_tokens(text: Optional[str]) -> list[str]:
+    """Lower-cased words of a note or query; punctuation, operators, short words and stopwords are dropped."""
+    if not text:
+        return []
+    return [
+        word
+        for word in _WORD.findall(text.lower())
+        if len(word) >= MIN_NOTE_TOKEN_LENGTH and word not in NOTE_STOPWORDS
+    ]
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC; convert aware query bounds to match."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class GroupExpenseIndex:
+    """Postings and sorted keys for one group's expenses."""
+
+    def __init__(self, expenses: list[ExpenseRecord]) -> None:
+        self.records: dict[str, ExpenseRecord] = {}
+        self.created: dict[str, datetime] = {}
+        self.by_status: dict[str, set[str]] = {}
+        self.by_payer: dict[str, set[str]] = {}
+        self.postings: dict[str, set[str]] = {}
+        for expense in expenses:
+            expense_id = expense["id"]
+            self.records[expense_id] = expense
+            self.created[expense_id] = _as_datetime(expense["created_at"])
+            self.by_status.setdefault(expense.get("status", "assigned"), set()).add(expense_id)
+            self.by_payer.setdefault(expense["payer_id"], set()).add(expense_id)
+            for token in set(note_tokens(expense.get("note"))):
+                self.postings.setdefault(token, set()).add(expense_id)
+        self.vocabulary = sorted(self.postings)
+        # Ascending (created_at, id); newest-first order is this list reversed.
+        newest_last = sorted((created, expense_id) for expense_id, created in self.created.items())
+        self.created_keys = [created for created, _ in newest_last]
+        self.created_ids = [expense_id for _, expense_id in newest_last]
+        by_amount = sorted((float(expense["amount"]), expense["id"]) for expense in expenses)
+        self.amount_keys = [amount for amount, _ in by_amount]
+        self.amount_ids = [expense_id for _, expense_id in by_amount]
+
+    def search(self, filters: ExpenseSearch) -> tuple[int, list[str]]:
+        """``(total, ids)`` for the requested page, newest first (``created_at`` then id, descending)."""
+        candidates: Optional[set[str]] = None
+        if filters.status:
+            statuses = set().union(*(self.by_status.get(status, ()) for status in filters.status))
+            candidates = _narrow(candidates, statuses)
+        if filters.payer_id is not None:
+            candidates = _narrow(candidates, self.by_payer.get(filters.payer_id, set()))
+        for token in note_tokens(filters.q):
+            candidates = _narrow(candidates, self._prefix_postings(token))
+
+        created_from = naive_utc(filters.created_from) if filters.created_from else None
+        created_to = naive_utc(filters.created_to) if filters.created_to else None
+        end = filters.offset + filters.limit
+        amount_range = filters.min_amount is not None or filters.max_amount is not None
+        if candidates is None and not amount_range:
+            # Only a date range (or nothing): the answer is a slice of the sorted keys.
+            start = bisect_left(self.created_keys, created_from) if created_from else 0
+            stop = bisect_right(self.created_keys, created_to) if created_to else len(self.created_keys)
+            stop = max(start, stop)  # an inverted range matches nothing
+            page = self.created_ids[max(start, stop - end):max(start, stop - filters.offset)]
+            return stop - start, page[::-1]
+
+        if candidates is None:
+            start = bisect_left(self.amount_keys, filters.min_amount) if filters.min_amount is not None else 0
+            stop = (
+                bisect_right(self.amount_keys, filters.max_amount)
+                if filters.max_amount is not None
+                else len(self.amount_keys)
+            )
+            candidates = set(self.amount_ids[start:stop])
+        if not amount_range and created_from is None and created_to is None:
+            matches = candidates
+        else:
+            low, high = filters.min_amount, filters.max_amount
+            matches = {
+                expense_id
+                for expense_id in candidates
+                if _in_range(float(self.records[expense_id]["amount"]), low, high)
+                and _in_range(self.created[expense_id], created_from, created_to)
+            }
+        if len(matches) * 4 >= len(self.created_ids):
+            # Dense result: walking newest-first finds a match every few steps on average.
+            newest = []
+            for expense_id in reversed(self.created_ids):
+                if expense_id in matches:
+                    newest.append(expense_id)
+                    if len(newest) == end:
+                        break
+        else:
+            # Sparse result: order only the requested page, not every match.
+            created = self.created
+            newest = heapq.nlargest(end, matches, key=lambda expense_id: (created[expense_id], expense_id))
+        return len(matches), newest[filters.offset:]
+
+    def _prefix_postings(self, token: str) -> set[str]:
+        """Ids whose note has a word starting with ``token`` (``+token*`` in MySQL boolean mode)."""
+        matched: set[str] = set()
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            matched |= self.postings[self.vocabulary[position]]
+            position += 1
+        return matched
+
+
+def group_index(group_id: str) -> GroupExpenseIndex:
+    """The current index for a group, rebuilding it if ``groups.json`` changed since it was built."""
+    with _lock:
+        groups, indexes = _groups_snapshot()
+        index = indexes.get(group_id)
+        if index is None:
+            index = indexes[group_id] = GroupExpenseIndex(_record(groups, group_id).get("expenses", []))
+        return index
+
+
+def group_record(group_id: str) -> GroupRecord:
+    """The group as last read from ``groups.json``; shared between readers, so never mutate the ledger."""
+    with _lock:
+        groups, _ = _groups_snapshot()
+        return _record(groups, group_id)
+
+
+def group_records() -> dict[str, GroupRecord]:
+    """Every group as last read from ``groups.json``, keyed by id; read-only, like :func:`group_record`."""
+    with _lock:
+        groups, _ = _groups_snapshot()
+        return groups
+
+
+def payer_details() -> dict[str, tuple[str, str]]:
+    """``user_id -> (name, email)``, re-read only after ``users.json`` changes."""
+    global _users_state
+    signature = _signature(user_file_path())
+    with _lock:
+        if _users_state is None or _users_state[0] != signature:
+            users = {user["id"]: (user["name"], user["email"]) for user in load_users()}
+            _users_state = (signature, users)
+        return _users_state[1]
+
+
+def _groups_snapshot() -> tuple[dict[str, GroupRecord], dict[str, GroupExpenseIndex]]:
+    # Caller holds _lock.
+    global _groups_state
+    signature = _signature(group_file_path())
+    if _groups_state is None or _groups_state[0] != signature:
+        _groups_state = (signature, {group["id"]: group for group in load_groups()}, {})
+    return _groups_state[1], _groups_state[2]
+
+
+def _record(groups: dict[str, GroupRecord], group_id: str) -> GroupRecord:
+    group = groups.get(group_id)
+    if group is None:
+        raise GroupNotFoundError
+    return group
+
+
+def _signature(path: Path) -> tuple[int, ...]:
+    stat = path.stat()
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _narrow(candidates: Optional[set[str]], ids: set[str]) -> set[str]:
+    return ids if candidates is None else candidates & ids
+
+
+def _in_range(value: Any, low: Any, high: Any) -> bool:
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def _as_datetime(value: Any) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
@@ -0,0 +1,214 @@
+"""Row streams for ledger exports, read without materialising the ledger.
+
+MySQL mode reads through an unbuffered cursor in ``fetchmany`` batches, so rows
+leave the server as the client consumes them. Each export opens its own connection
+outside the pool: a download lasts as long as the slowest client, and a pooled
+connection held that long would be taken from request traffic. File mode parses ``groups.json``
+incrementally (:func:`~.file_storage.iter_group_ledgers`). Either way memory
+stays flat however many expenses are exported. Archived expenses follow the live
+ones, with ``archived_at`` set.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+from ..config import get_settings
+from ..database import open_dedicated_connection
+from ..metrics import timed
+from ..schemas.expense import DEFAULT_CURRENCY
+from .exceptions import GroupNotFoundError
+from .expense_index import payer_details
+from .file_storage import (
+    ExpenseRecord,
+    archived_expense_offsets,
+    archived_group_ids,
+    iter_group_ledgers,
+    read_archived_expenses,
+)
+
+EXPORT_COLUMNS = (
+    "group_id", "expense_id", "created_at", "payer_id", "payer_email", "amount", "currency", "status", "note",
+    "archived_at",
+)
+ExportRow = tuple[str, str, str, str, Optional[str], float, str, str, Optional[str], Optional[str]]
+
+FETCH_BATCH_ROWS = 1000
+# A slow client stalls the server-side send; MySQL's 60 s default would abort a long export.
+NET_WRITE_TIMEOUT_SECONDS = 3600
+
+_EXPORT_QUERY = """
+    SELECT eg.group_id, e.id, e.created_at, e.payer_id, u.email, e.amount, e.currency, e.status, e.note, NULL
+    FROM expense_groups eg
+    INNER JOIN expenses e ON e.id = eg.expense_id
+    LEFT JOIN users u ON u.id = e.payer_id
+"""
+_ARCHIVED_EXPORT_QUERY = """
+    SELECT a.group_id, a.id, a.created_at, a.payer_id, u.email, a.amount, a.currency, a.status, a.note,
+           a.archived_at
+    FROM archived_expenses a
+    LEFT JOIN users u ON u.id = a.payer_id
+"""
+
+
+def export_group_expenses(group_id: str) -> Iterator[ExportRow]:
+    """One group's live then archived expenses, each newest first.
+
+    Raises ``GroupNotFoundError`` before returning, not mid-stream.
+    """
+    settings = get_settings()
+    if settings.use_file_storage:
+        rows = _export_group_file(group_id)
+    else:
+        live = f"{_EXPORT_QUERY} WHERE eg.group_id = %s ORDER BY e.created_at DESC, e.id DESC"
+        archived = f"{_ARCHIVED_EXPORT_QUERY} WHERE a.group_id = %s ORDER BY a.created_at DESC, a.id DESC"
+        queries = [(live, (group_id,)), (archived, (group_id,))]
+        rows = _export_db(queries, group_id)
+    next(rows)  # run up to the group lookup
+    return rows
+
+
+def export_all_expenses() -> Iterator[ExportRow]:
+    """Every group's live expenses grouped by group, then every group's archived expenses likewise."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        rows = _export_all_file()
+    else:
+        # Each follows an index (idx_expense_groups_group, idx_archived_group_created), so MySQL
+        # streams without sorting the whole table first.
+        queries = [
+            (f"{_EXPORT_QUERY} ORDER BY eg.group_id, eg.expense_id", ()),
+            (f"{_ARCHIVED_EXPORT_QUERY} ORDER BY a.group_id, a.created_at, a.id", ()),
+        ]
+        rows = _export_db(queries)
+    next(rows)
+    return rows
+
+
+def _export_row(
+    group_id: str,
+    expense_id: str,
+    created_at: Any,
+    payer_id: str,
+    payer_email: Optional[str],
+    amount: Any,
+    currency: Optional[str],
+    status: Optional[str],
+    note: Optional[str],
+    archived_at: Any = None,
+) -> ExportRow:
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    if isinstance(archived_at, datetime):
+        archived_at = archived_at.isoformat()
+    return (
+        group_id,
+        expense_id,
+        str(created_at).replace(" ", "T", 1),
+        payer_id,
+        payer_email,
+        float(amount),
+        currency or DEFAULT_CURRENCY,
+        status or "assigned",
+        note,
+        str(archived_at).replace(" ", "T", 1) if archived_at is not None else None,
+    )
+
+
+# --- Database helpers -----------------------------------------------------
+# The generators below yield ``None`` once their checks pass and before the first row;
+# the public functions consume it, so lookup errors surface before a response starts.
+# ``@timed`` on them covers the whole stream, so the public functions are not timed themselves.
+
+
+@timed("export._export_db")
+def _export_db(queries: list[tuple[str, tuple[Any, ...]]], group_id: Optional[str] = None) -> Iterator[Any]:
+    connection = open_dedicated_connection()
+    streaming = False
+    try:
+        if group_id is not None:
+            cursor = connection.cursor()
+            cursor.execute("SELECT id FROM `groups` WHERE id = %s", (group_id,))
+            found = cursor.fetchall()
+            cursor.close()
+            if not found:
+                raise GroupNotFoundError
+        yield None
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION net_write_timeout = %s", (NET_WRITE_TIMEOUT_SECONDS,))
+        cursor.close()
+        for query, params in queries:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params)
+            streaming = True
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+                if not batch:
+                    break
+                for row in batch:
+                    yield _export_row(*row)
+            streaming = False
+            cursor.close()
+    finally:
+        if streaming:
+            # Abandoned mid-result (client went away): drop the session rather than drain the unread rows.
+            connection.discard()
+        else:
+            connection.close()
+
+
+# --- File storage helpers -------------------------------------------------
+
+
+@timed("export._export_group_file")
+def _export_group_file(group_id: str) -> Iterator[Any]:
+    for ledger_group_id, expenses in iter_group_ledgers():
+        if ledger_group_id == group_id:
+            emails = _payer_emails()
+            yield None
+            # New expenses are inserted at the front, so ledger order is newest first.
+            for expense in expenses:
+                yield _file_row(group_id, expense, emails)
+            for expense in _iter_archived_file(group_id):
+                yield _file_row(group_id, expense, emails)
+            return
+    raise GroupNotFoundError
+
+
+@timed("export._export_all_file")
+def _export_all_file() -> Iterator[Any]:
+    emails = _payer_emails()
+    yield None
+    for group_id, expenses in iter_group_ledgers():
+        for expense in expenses:
+            yield _file_row(group_id, expense, emails)
+    for group_id in archived_group_ids():
+        for expense in _iter_archived_file(group_id):
+            yield _file_row(group_id, expense, emails)
+
+
+def _iter_archived_file(group_id: str) -> Iterator[ExpenseRecord]:
+    """The group's archived expenses, newest first, read ``FETCH_BATCH_ROWS`` lines at a time."""
+    offsets = archived_expense_offsets(group_id)
+    for start in range(0, len(offsets), FETCH_BATCH_ROWS):
+        yield from read_archived_expenses(group_id, offsets[start:start + FETCH_BATCH_ROWS])
+
+
+def _payer_emails() -> dict[str, str]:
+    return {user_id: email for user_id, (_, email) in payer_details().items()}
+
+
+def _file_row(group_id: str, expense: ExpenseRecord, emails: dict[str, str]) -> ExportRow:
+    return _export_row(
+        group_id,
+        expense["id"],
+        expense["created_at"],
+        expense["payer_id"],
+        emails.get(expense["payer_id"]),
+        expense["amount"],
+        expense.get("currency"),
+        expense.get("status"),
+        expense.get("note"),
+        expense.get("archived_at"),
+    )
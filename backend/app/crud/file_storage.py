@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+import fcntl
 import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, TypedDict
+from typing import IO, Any, Iterator, Optional, TypedDict
 
 from ..config import get_settings
+from ..metrics import record_file_io, timed
+from .exceptions import StorageError
+
+logger = logging.getLogger("signup_app.file_storage")
+
+_archive_lock = threading.Lock()
+# archive path -> (inode, bytes indexed, id -> (created_at, offset), offsets newest first)
+_archive_indexes: dict[str, tuple[int, int, dict[str, tuple[str, int]], list[int]]] = {}
 
 
 class UserRecord(TypedDict, total=False):
@@ -26,8 +40,32 @@ class ExpenseRecord(TypedDict, total=False):
     group_id: str
     payer_id: str
     amount: float
+    currency: str  # absent on expenses saved before currencies: USD
+    # amount in the group's base currency as added to the rollups, so it is reversed exactly
+    base_amount: float
+    note: Optional[str]
+    status: str
+    created_at: str
+    # Set on expenses added by a recurring schedule: which one, and for which date.
+    recurring_id: str
+    occurs_on: str
+    # Set in the archive file only.
+    archived_at: str
+
+
+class RecurringRecord(TypedDict, total=False):
+    id: str
+    group_id: str
+    payer_id: str
+    amount: float
+    currency: str
     note: Optional[str]
     status: str
+    frequency: str
+    interval: int
+    starts_on: str
+    ends_on: Optional[str]
+    next_due_on: Optional[str]
     created_at: str
 
 
@@ -37,8 +75,14 @@ class GroupRecord(TypedDict, total=False):
     owner_id: str
     description: Optional[str]
     created_at: str
+    base_currency: str  # absent on groups saved before currencies: USD
     members: list[str]
     expenses: list[ExpenseRecord]
+    # "YYYY-MM|payer_id|status" -> [expense_count, total_amount in base_currency]; see crud/analytics.py
+    rollups: dict[str, list[float]]
+    recurring_expenses: list[RecurringRecord]
+    # payer_id -> [expense_count, total_amount in base_currency] of archived expenses; see crud/archive.py
+    checkpoint: dict[str, list[float]]
 
 
 def _ensure_file(path: Path, default: str) -> Path:
@@ -48,6 +92,41 @@ def _ensure_file(path: Path, default: str) -> Path:
     return path
 
 
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on ``<path>.lock``, held across threads and worker processes."""
+    lock_path = path.with_name(f"{path.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def lock_is_held(path: Path) -> bool:
+    """True when another holder has the :func:`file_lock` for ``path`` right now."""
+    lock_path = path.with_name(f"{path.name}.lock")
+    if not lock_path.exists():
+        return False
+    with lock_path.open("a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        return False
+
+
+def _replace_file(path: Path, data: bytes) -> None:
+    """Write via a temporary file and rename, so concurrent readers never see a half-written document."""
+    prefix = f".{path.name}."
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=prefix, suffix=".tmp", delete=False) as handle:
+        handle.write(data)
+    os.replace(handle.name, path)
+
+
 def user_file_path() -> Path:
     settings = get_settings()
     return _ensure_file(Path(settings.data_file_path), "[]")
@@ -58,28 +137,231 @@ def group_file_path() -> Path:
     return _ensure_file(Path(settings.groups_file_path), "[]")
 
 
+@timed("file_storage.load_users")
 def load_users() -> list[UserRecord]:
-    path = user_file_path()
+    data = user_file_path().read_bytes()
+    record_file_io("read", "users", len(data))
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(data)
     except json.JSONDecodeError:
+        logger.error("Users file is not valid JSON; treating it as empty (see /ready)")
         return []
 
 
+@timed("file_storage.save_users")
 def save_users(users: list[UserRecord]) -> None:
-    path = user_file_path()
-    path.write_text(json.dumps(users, indent=2), encoding="utf-8")
+    """Callers hold ``file_lock(user_file_path())`` from their ``load_users()`` to here."""
+    data = json.dumps(users, indent=2).encode("utf-8")
+    _replace_file(user_file_path(), data)
+    record_file_io("written", "users", len(data))
 
 
+@timed("file_storage.load_groups")
 def load_groups() -> list[GroupRecord]:
-    path = group_file_path()
+    data = group_file_path().read_bytes()
+    record_file_io("read", "groups", len(data))
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(data)
     except json.JSONDecodeError:
+        logger.error("Groups file is not valid JSON; treating it as empty (see /ready)")
         return []
 
 
+@timed("file_storage.save_groups")
 def save_groups(groups: list[GroupRecord]) -> None:
-    path = group_file_path()
-    path.write_text(json.dumps(groups, indent=2), encoding="utf-8")
+    """Callers hold ``file_lock(group_file_path())`` from their ``load_groups()`` to here."""
+    data = json.dumps(groups, indent=2).encode("utf-8")
+    _replace_file(group_file_path(), data)
+    record_file_io("written", "groups", len(data))
+
+
+def archive_file_path(group_id: str) -> Path:
+    return Path(get_settings().archive_dir) / f"{group_id}.jsonl"
+
+
+def archived_group_ids() -> list[str]:
+    """Groups with an archive file, sorted by id."""
+    return sorted(path.stem for path in Path(get_settings().archive_dir).glob("*.jsonl"))
+
+
+@timed("file_storage.append_archived_expenses")
+def append_archived_expenses(group_id: str, expenses: list[ExpenseRecord]) -> None:
+    """Append to the group's archive file; call it before the expenses leave ``groups.json``."""
+    path = archive_file_path(group_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = "".join(json.dumps(expense) + "\n" for expense in expenses).encode("utf-8")
+    with path.open("ab") as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    record_file_io("written", "archive", len(data))
+
+
+@timed("file_storage.archived_expense_offsets")
+def archived_expense_offsets(group_id: str) -> list[int]:
+    """Byte offsets of the group's archived expenses, newest ``created_at`` first.
+
+    Kept per worker and extended with the lines appended since the last call, so a
+    page of history never rereads or re-sorts the whole file. An id appended twice
+    (crash before the save) counts once, at its last offset.
+    """
+    path = archive_file_path(group_id)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return []
+    with _archive_lock:
+        inode, indexed, entries, offsets = _archive_indexes.get(str(path), (stat.st_ino, 0, {}, []))
+        if inode != stat.st_ino or stat.st_size < indexed:
+            indexed, entries, offsets = 0, {}, []  # replaced or truncated: index it from the start
+        if stat.st_size == indexed:
+            return offsets
+        start = indexed
+        with path.open("rb") as handle:
+            handle.seek(start)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # an append still being written; indexed on a later call
+                offset, indexed = indexed, indexed + len(line)
+                try:
+                    expense = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line torn by a crash mid-append
+                entries[expense["id"]] = (expense["created_at"], offset)
+        record_file_io("read", "archive", indexed - start)
+        ordered = sorted(entries.items(), key=lambda item: (item[1][0], item[0]), reverse=True)
+        offsets = [offset for _, (_, offset) in ordered]
+        _archive_indexes[str(path)] = (stat.st_ino, indexed, entries, offsets)
+    return offsets
+
+
+def read_archived_expenses(group_id: str, offsets: list[int]) -> list[ExpenseRecord]:
+    """The archived expenses at ``offsets`` (from :func:`archived_expense_offsets`), in that order."""
+    expenses: list[ExpenseRecord] = []
+    if not offsets:
+        return expenses
+    size = 0
+    with archive_file_path(group_id).open("rb") as handle:
+        for offset in offsets:
+            handle.seek(offset)
+            line = handle.readline()
+            size += len(line)
+            expenses.append(json.loads(line))
+    record_file_io("read", "archive", size)
+    return expenses
+
+
+def iter_group_ledgers(chunk_size: int = 64 * 1024) -> Iterator[tuple[str, Iterator[ExpenseRecord]]]:
+    """``(group_id, expenses)`` per group, parsed from ``groups.json`` a chunk at a time.
+
+    Only the current expense is held in memory, however large the file. Like
+    :func:`itertools.groupby`, each ``expenses`` iterator is only valid until the
+    next group is requested. Saves replace the file, so the open handle keeps
+    reading the version that was current when iteration started.
+    """
+    with group_file_path().open(encoding="utf-8") as handle:
+        reader = _JsonReader(handle, chunk_size)
+        try:
+            reader.expect("[")
+            for _ in reader.items("]"):
+                reader.expect("{")
+                group_id: Optional[str] = None
+                held: list[ExpenseRecord] = []
+                streamed = False
+                for _ in reader.items("}"):
+                    key = reader.value()
+                    reader.expect(":")
+                    if key == "id":
+                        group_id = reader.value()
+                    elif key == "expenses" and group_id is not None:
+                        reader.expect("[")
+                        expenses = reader.values("]")
+                        yield group_id, expenses
+                        streamed = True
+                        for _ in expenses:  # whatever the caller left unread
+                            pass
+                    elif key == "expenses":
+                        # "id" after "expenses" (a hand-edited file): hold this group's list.
+                        held = reader.value()
+                    else:
+                        reader.value()
+                if group_id is None:
+                    raise StorageError("Group record without an id in the groups file")
+                if not streamed:
+                    yield group_id, iter(held)
+        finally:
+            record_file_io("read", "groups", reader.consumed)
+
+
+class _JsonReader:
+    """Pull parser for the outer structure of a JSON document; leaf values come from ``raw_decode``."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, handle: IO[str], chunk_size: int) -> None:
+        self._handle = handle
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.consumed = 0
+
+    def expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise StorageError(f"Groups file is not valid JSON: expected {char!r}, found {found!r}")
+        self._pos += 1
+
+    def items(self, close: str) -> Iterator[None]:
+        """Yield once per element of the open array or object; the caller reads each element."""
+        if self._peek() == close:
+            self._pos += 1
+            return
+        while True:
+            yield
+            separator = self._peek()
+            self._pos += 1
+            if separator == close:
+                return
+            if separator != ",":
+                raise StorageError(f"Groups file is not valid JSON: expected ',' or {close!r}")
+
+    def values(self, close: str) -> Iterator[Any]:
+        for _ in self.items(close):
+            yield self.value()
+
+    def value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as err:
+                if not self._fill():
+                    raise StorageError(f"Groups file is not valid JSON: {err.msg}") from err
+                continue
+            # A number running to the end of the buffer may continue in the next chunk.
+            if end < len(self._buffer) or not self._fill():
+                self._pos = end
+                return value
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
 
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Read at least as much as is buffered, so one large value costs O(n), not O(n^2).
+        chunk = self._handle.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self.consumed += len(chunk)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
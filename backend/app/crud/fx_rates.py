@@ -0,0 +1,155 @@
+"""Dated FX rates from a local CSV file, cached in memory.
+
+``FX_RATES_PATH`` holds ``date,currency,rate`` rows: ``rate`` units of
+``currency`` per US dollar, from ``date`` until the currency's next row. Days
+before a currency's first row use its first rate. The file is parsed once per
+worker and re-read only after it changes.
+
+Conversion is batched: :func:`convert_amounts` resolves each distinct
+(currency, day) once, walking a currency's sorted days alongside its rate dates,
+then scales every amount in one pass.
+"""
+
+from __future__ import annotations
+
+import csv
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence
+
+from ..config import get_settings
+from ..metrics import timed
+from .exceptions import ExchangeRateNotFoundError, StorageError
+
+# Every rate is quoted against this currency, so it converts without a row of its own.
+PIVOT_CURRENCY = "USD"
+
+# (amount, currency, created_at); created_at is a naive UTC datetime or its ISO string.
+Amount = tuple[float, str, Any]
+
+_lock = threading.Lock()
+# ((path, inode, mtime_ns, size), table); an empty signature means there is no file.
+_state: Optional[tuple[tuple[Any, ...], RateTable]] = None
+
+
+class RateTable:
+    """Each currency's rate change dates, ascending, and the rate in force from each one."""
+
+    def __init__(self, rows: Iterable[tuple[date, str, float]]) -> None:
+        series: dict[str, dict[date, float]] = {}
+        for day, currency, rate in rows:
+            series.setdefault(currency, {})[day] = rate
+        self.dates: dict[str, list[date]] = {}
+        self.rates: dict[str, list[float]] = {}
+        for currency, by_day in series.items():
+            ordered = sorted(by_day.items())
+            self.dates[currency] = [day for day, _ in ordered]
+            self.rates[currency] = [rate for _, rate in ordered]
+
+    def supports(self, currency: str) -> bool:
+        return currency == PIVOT_CURRENCY or currency in self.dates
+
+    def rates_on(self, currency: str, days: Sequence[date]) -> list[float]:
+        """Units of ``currency`` per US dollar on each of the ascending ``days``."""
+        if currency == PIVOT_CURRENCY:
+            return [1.0] * len(days)
+        if currency not in self.dates:
+            raise ExchangeRateNotFoundError(currency)
+        if not days:
+            return []
+        dates, rates = self.dates[currency], self.rates[currency]
+        position = max(0, bisect_right(dates, days[0]) - 1)
+        result = []
+        for day in days:
+            while position + 1 < len(dates) and dates[position + 1] <= day:
+                position += 1
+            result.append(rates[position])
+        return result
+
+
+@timed("fx_rates.rate_table")
+def rate_table() -> RateTable:
+    """The table in ``FX_RATES_PATH``; empty (only US dollars convert) when there is no file."""
+    global _state
+    path = Path(get_settings().fx_rates_path)
+    try:
+        stat = path.stat()
+        signature: tuple[Any, ...] = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        signature = ()
+    with _lock:
+        if _state is None or _state[0] != signature:
+            _state = (signature, _load_rate_table(path) if signature else RateTable(()))
+        return _state[1]
+
+
+@timed("fx_rates.check_convertible")
+def check_convertible(currency: str, to_currency: str) -> None:
+    """Raise ``ExchangeRateNotFoundError`` unless amounts in ``currency`` can be converted."""
+    if currency == to_currency:
+        return
+    table = rate_table()
+    for code in (currency, to_currency):
+        if not table.supports(code):
+            raise ExchangeRateNotFoundError(code)
+
+
+@timed("fx_rates.convert_amounts")
+def convert_amounts(amounts: Sequence[Amount], to_currency: str) -> list[float]:
+    """Every amount in ``to_currency``, each at the rate of its own UTC day; unrounded."""
+    keys = [
+        None if currency == to_currency else (currency, _as_day(created_at))
+        for _, currency, created_at in amounts
+    ]
+    days: dict[str, set[date]] = {}
+    for key in keys:
+        if key is not None:
+            days.setdefault(key[0], set()).add(key[1])
+    if not days:
+        return [float(amount) for amount, _, _ in amounts]
+
+    table = rate_table()
+    all_days = sorted(set().union(*days.values()))
+    target = dict(zip(all_days, table.rates_on(to_currency, all_days)))
+    factors: dict[tuple[str, date], float] = {}
+    for currency, currency_days in days.items():
+        ordered = sorted(currency_days)
+        for day, rate in zip(ordered, table.rates_on(currency, ordered)):
+            factors[(currency, day)] = target[day] / rate
+    return [
+        float(amount) if key is None else float(amount) * factors[key]
+        for (amount, _, _), key in zip(amounts, keys)
+    ]
+
+
+@timed("fx_rates.convert_amount")
+def convert_amount(amount: float, currency: str, created_at: Any, to_currency: str) -> float:
+    return convert_amounts([(amount, currency, created_at)], to_currency)[0]
+
+
+def _as_day(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _load_rate_table(path: Path) -> RateTable:
+    rows: list[tuple[date, str, float]] = []
+    try:
+        with path.open(newline="", encoding="utf-8") as handle:
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                try:
+                    rate = float(row["rate"])
+                    if rate <= 0:
+                        raise ValueError("rate must be positive")
+                    day = date.fromisoformat(row["date"].strip())
+                    rows.append((day, row["currency"].strip().upper(), rate))
+                except (KeyError, TypeError, ValueError, AttributeError) as exc:
+                    raise StorageError(f"Invalid FX rate on line {line} of {path}: {exc}") from exc
+    except OSError as exc:
+        raise StorageError(f"Unable to read FX rates from {path}") from exc
+    return RateTable(rows)
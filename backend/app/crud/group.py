@@ -1,14 +1,29 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from itertools import chain
+from typing import Any, Iterable, Optional
 from uuid import uuid4
 
-from mysql.connector.errors import IntegrityError
-
+import orjson
+from pydantic import TypeAdapter
+
+from ..cache import (
+    GROUP_DETAIL,
+    MEMBERSHIP,
+    USER_GROUPS,
+    USERS,
+    bump_version,
+    cache_key,
+    cached,
+    get_cache,
+    invalidate,
+)
+from ..change_feed import MEMBER_ADDED, publish_group_change
 from ..config import get_settings
 from ..database import get_connection
-from ..schemas.expense import Expense
+from ..metrics import timed
+from ..schemas.expense import DEFAULT_CURRENCY, Expense
 from ..schemas.group import (
     GroupBalance,
     GroupCreate,
@@ -18,54 +33,183 @@ from ..schemas.group import (
 )
 from ..utils.validation import normalize_name
 from .exceptions import (
+    DuplicateKeyError,
     GroupMembershipError,
     GroupNotFoundError,
     GroupOwnershipError,
     UserNotFoundError,
 )
-from .file_storage import ExpenseRecord, GroupRecord, UserRecord, load_groups, load_users, save_groups
+from .expense_index import group_record
+from .file_storage import (
+    ExpenseRecord,
+    GroupRecord,
+    UserRecord,
+    file_lock,
+    group_file_path,
+    load_groups,
+    load_users,
+    save_groups,
+)
+from .fx_rates import convert_amounts
+
+# payer_id -> (expense_count, total_amount in the base currency) of a group's archived expenses.
+Checkpoint = dict[str, tuple[int, float]]
+
+_GROUP_LIST_ADAPTER = TypeAdapter(list[GroupPublic])
+_GROUP_DETAIL_ADAPTER = TypeAdapter(GroupDetail)
 
 
+@timed("group.list_user_groups")
 def list_user_groups(user_id: str) -> list[GroupPublic]:
+    return cached(USER_GROUPS, user_id, _GROUP_LIST_ADAPTER, lambda: _load_user_groups(user_id))
+
+
+@timed("group.list_groups_by_user")
+def list_groups_by_user() -> dict[str, list[GroupPublic]]:
+    """Every user's groups in one pass, for listings that would otherwise load them user by user."""
     settings = get_settings()
     if settings.use_file_storage:
-        _ensure_user_exists_file(user_id)
-        return _list_user_groups_file(user_id)
-    _ensure_user_exists_db(user_id)
-    return _list_user_groups_db(user_id)
+        return _list_groups_by_user_file()
+    return _list_groups_by_user_db()
+
+
+@timed("group.recent_group_ids")
+def recent_group_ids(limit: int) -> list[str]:
+    """Ids of the ``limit`` most recently created groups, newest first."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _recent_group_ids_file(limit)
+    return _recent_group_ids_db(limit)
 
 
+@timed("group.create_group")
 def create_group(payload: GroupCreate) -> GroupDetail:
     settings = get_settings()
     if settings.use_file_storage:
-        return _create_group_file(payload)
-    return _create_group_db(payload)
+        detail = _create_group_file(payload)
+    else:
+        detail = _create_group_db(payload)
+    invalidate_memberships([payload.owner_id])
+    return detail
 
 
+@timed("group.get_group")
 def get_group(group_id: str) -> GroupDetail:
+    return cached(GROUP_DETAIL, group_id, _GROUP_DETAIL_ADAPTER, lambda: _load_group(group_id))
+
+
+@timed("group.get_group_json")
+def get_group_json(group_id: str) -> bytes:
+    """Return the ``GroupDetail`` JSON document for a group.
+
+    Cache hits are returned as stored, skipping Pydantic model construction and
+    response re-validation. The bytes are shared with :func:`get_group`, so a miss
+    validates the storage rows before caching them; without a cache they are
+    encoded straight from plain dicts with orjson.
+    """
+    cache = get_cache()
+    if not cache.enabled:
+        return orjson.dumps(_load_group_payload(group_id))
+    key = cache_key(GROUP_DETAIL, group_id)
+    payload = cache.get(key)
+    if payload is None:
+        detail = _GROUP_DETAIL_ADAPTER.validate_python(_load_group_payload(group_id))
+        payload = _GROUP_DETAIL_ADAPTER.dump_json(detail)
+        cache.set(key, payload)
+    return payload
+
+
+@timed("group.refresh_group")
+def refresh_group(group_id: str) -> GroupDetail:
+    """Drop the cached detail after a mutation and return the reloaded group."""
+    invalidate((GROUP_DETAIL, group_id))
+    return get_group(group_id)
+
+
+@timed("group.ensure_group_exists")
+def ensure_group_exists(group_id: str) -> None:
+    """Raise ``GroupNotFoundError`` for an unknown group without loading its ledger."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        group_record(group_id)
+        return
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM `groups` WHERE id = %s", (group_id,))
+        if cursor.fetchone() is None:
+            raise GroupNotFoundError
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@timed("group.add_member_to_group")
+def add_member_to_group(group_id: str, requester_id: str, user_email: str) -> GroupDetail:
+    settings = get_settings()
+    if settings.use_file_storage:
+        detail = _add_member_to_group_file(group_id, requester_id, user_email)
+    else:
+        detail = _add_member_to_group_db(group_id, requester_id, user_email)
+    # member_count changes for every member, so all of their group lists are stale.
+    invalidate((GROUP_DETAIL, group_id))
+    invalidate_memberships([member.id for member in detail.members])
+    member = next((entry for entry in detail.members if entry.email.lower() == user_email.lower()), None)
+    publish_group_change(
+        group_id,
+        MEMBER_ADDED,
+        member=member.model_dump(mode="json") if member else None,
+        member_count=detail.member_count,
+        balances=[balance.model_dump(mode="json") for balance in detail.balances],
+    )
+    return detail
+
+
+@timed("group.invalidate_memberships")
+def invalidate_memberships(user_ids: list[str]) -> None:
+    """Drop cached membership views and advance the version carried by session tokens."""
+    entries: list[tuple[str, str]] = []
+    for user_id in user_ids:
+        entries.append((USERS, user_id))
+        entries.append((USER_GROUPS, user_id))
+        bump_version(MEMBERSHIP, user_id)
+    invalidate(*entries)
+
+
+def _load_user_groups(user_id: str) -> list[GroupPublic]:
+    settings = get_settings()
+    if settings.use_file_storage:
+        _ensure_user_exists_file(user_id)
+        return _list_user_groups_file(user_id)
+    _ensure_user_exists_db(user_id)
+    return _list_user_groups_db(user_id)
+
+
+def _load_group(group_id: str) -> GroupDetail:
     settings = get_settings()
     if settings.use_file_storage:
         return _get_group_file(group_id)
     return _get_group_db(group_id)
 
 
-def add_member_to_group(group_id: str, requester_id: str, user_email: str) -> GroupDetail:
+def _load_group_payload(group_id: str) -> dict[str, Any]:
     settings = get_settings()
     if settings.use_file_storage:
-        return _add_member_to_group_file(group_id, requester_id, user_email)
-    return _add_member_to_group_db(group_id, requester_id, user_email)
+        return _get_group_payload_file(group_id)
+    return _get_group_payload_db(group_id)
 
 
 # --- Database helpers -----------------------------------------------------
 
 
+@timed("group._list_user_groups_db")
 def _list_user_groups_db(user_id: str) -> list[GroupPublic]:
     connection = get_connection()
     cursor = connection.cursor(dictionary=True)
     try:
         cursor.execute(
             """
-            SELECT g.id, g.name, g.description, g.owner_id, g.created_at,
+            SELECT g.id, g.name, g.description, g.owner_id, g.created_at, g.base_currency,
                    (SELECT COUNT(*) FROM user_groups ug2 WHERE ug2.group_id = g.id) AS member_count
             FROM `groups` g
             INNER JOIN user_groups ug ON ug.group_id = g.id
@@ -81,6 +225,47 @@ def _list_user_groups_db(user_id: str) -> list[GroupPublic]:
     return [_group_public_from_row(row) for row in rows]
 
 
+@timed("group._list_groups_by_user_db")
+def _list_groups_by_user_db() -> dict[str, list[GroupPublic]]:
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT ug.user_id, g.id, g.name, g.description, g.owner_id, g.created_at, g.base_currency,
+                   counts.member_count
+            FROM user_groups ug
+            INNER JOIN `groups` g ON g.id = ug.group_id
+            INNER JOIN (
+                SELECT group_id, COUNT(*) AS member_count FROM user_groups GROUP BY group_id
+            ) counts ON counts.group_id = g.id
+            ORDER BY g.name
+            """
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    grouped: dict[str, list[GroupPublic]] = {}
+    for row in rows:
+        grouped.setdefault(row["user_id"], []).append(_group_public_from_row(row))
+    return grouped
+
+
+@timed("group._recent_group_ids_db")
+def _recent_group_ids_db(limit: int) -> list[str]:
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM `groups` ORDER BY created_at DESC, id LIMIT %s", (limit,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    return [row[0] for row in rows]
+
+
+@timed("group._create_group_db")
 def _create_group_db(payload: GroupCreate) -> GroupDetail:
     connection = get_connection()
     cursor = connection.cursor()
@@ -91,13 +276,15 @@ def _create_group_db(payload: GroupCreate) -> GroupDetail:
         if cursor.fetchone() is None:
             raise UserNotFoundError
         cursor.execute(
-            "INSERT INTO `groups` (id, name, description, owner_id, created_at) VALUES (%s, %s, %s, %s, %s)",
+            "INSERT INTO `groups` (id, name, description, owner_id, created_at, base_currency) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
             (
                 group_id,
                 normalize_name(payload.name),
                 payload.description,
                 payload.owner_id,
                 created_at,
+                payload.base_currency,
             ),
         )
         cursor.execute(
@@ -105,7 +292,7 @@ def _create_group_db(payload: GroupCreate) -> GroupDetail:
             (payload.owner_id, group_id),
         )
         connection.commit()
-    except IntegrityError as err:
+    except DuplicateKeyError as err:
         connection.rollback()
         raise ValueError("Group with this name already exists") from err
     finally:
@@ -114,19 +301,66 @@ def _create_group_db(payload: GroupCreate) -> GroupDetail:
     return _get_group_db(group_id)
 
 
+@timed("group._get_group_db")
 def _get_group_db(group_id: str) -> GroupDetail:
+    row, member_rows, expense_rows, checkpoint = _fetch_group_rows_db(group_id)
+    return _compose_group_detail(
+        group_id=row["id"],
+        name=row["name"],
+        description=row["description"],
+        owner_id=row["owner_id"],
+        created_at=row["created_at"],
+        base_currency=row["base_currency"],
+        members=[GroupMember(**member) for member in member_rows],
+        expenses=[_expense_from_db_row(expense) for expense in expense_rows],
+        checkpoint=checkpoint,
+    )
+
+
+@timed("group._get_group_payload_db")
+def _get_group_payload_db(group_id: str) -> dict[str, Any]:
+    row, members, expense_rows, checkpoint = _fetch_group_rows_db(group_id)
+    expenses = [
+        {
+            "id": expense["id"],
+            "group_id": expense["group_id"],
+            "payer_id": expense["payer_id"],
+            "payer_name": expense["payer_name"],
+            "payer_email": expense["payer_email"],
+            "amount": float(expense["amount"]),
+            "currency": expense["currency"],
+            "note": expense.get("note"),
+            "status": expense.get("status") or "assigned",
+            "created_at": expense["created_at"],
+        }
+        for expense in expense_rows
+    ]
+    return _compose_group_payload(
+        group_id=row["id"],
+        name=row["name"],
+        description=row["description"],
+        owner_id=row["owner_id"],
+        created_at=row["created_at"],
+        base_currency=row["base_currency"],
+        members=members,
+        expenses=expenses,
+        checkpoint=checkpoint,
+    )
+
+
+@timed("group._fetch_group_rows_db")
+def _fetch_group_rows_db(group_id: str) -> tuple[dict, list[dict], list[dict], Checkpoint]:
     connection = get_connection()
-    cursor = connection.cursor()
+    cursor = connection.cursor(dictionary=True)
     try:
         cursor.execute(
-            "SELECT id, name, description, owner_id, created_at FROM `groups` WHERE id = %s",
+            "SELECT id, name, description, owner_id, created_at, base_currency, archived_expense_count "
+            "FROM `groups` WHERE id = %s",
             (group_id,),
         )
         row = cursor.fetchone()
         if not row:
             raise GroupNotFoundError
-        cursor.close()
-        cursor = connection.cursor(dictionary=True)
         cursor.execute(
             """
             SELECT u.id, u.name, u.email
@@ -137,41 +371,46 @@ def _get_group_db(group_id: str) -> GroupDetail:
             """,
             (group_id,),
         )
-        members = [GroupMember(**member) for member in cursor.fetchall()]
+        members = cursor.fetchall()
         cursor.execute(
             """
             SELECT e.id,
-                   eg.group_id,
+                   e.group_id,
                    e.payer_id,
                    e.amount,
+                   e.currency,
                    e.note,
                    e.status,
                    e.created_at,
                    u.name AS payer_name,
                    u.email AS payer_email
             FROM expenses e
-            INNER JOIN expense_groups eg ON eg.expense_id = e.id
             INNER JOIN users u ON u.id = e.payer_id
-            WHERE eg.group_id = %s
+            WHERE e.group_id = %s
             ORDER BY e.created_at DESC
             """,
             (group_id,),
         )
-        expenses = [_expense_from_db_row(expense) for expense in cursor.fetchall()]
+        expenses = cursor.fetchall()
+        checkpoint: Checkpoint = {}
+        # Only groups that have archived expenses have a checkpoint to read.
+        if row["archived_expense_count"]:
+            cursor.execute(
+                "SELECT payer_id, expense_count, total_amount FROM group_balance_checkpoints "
+                "WHERE group_id = %s",
+                (group_id,),
+            )
+            checkpoint = {
+                entry["payer_id"]: (int(entry["expense_count"]), float(entry["total_amount"]))
+                for entry in cursor.fetchall()
+            }
     finally:
         cursor.close()
         connection.close()
-    return _compose_group_detail(
-        group_id=row[0],
-        name=row[1],
-        description=row[2],
-        owner_id=row[3],
-        created_at=row[4],
-        members=members,
-        expenses=expenses,
-    )
+    return row, members, expenses, checkpoint
 
 
+@timed("group._add_member_to_group_db")
 def _add_member_to_group_db(group_id: str, requester_id: str, user_email: str) -> GroupDetail:
     connection = get_connection()
     cursor = connection.cursor()
@@ -210,6 +449,7 @@ def _add_member_to_group_db(group_id: str, requester_id: str, user_email: str) -
     return _get_group_db(group_id)
 
 
+@timed("group._ensure_user_exists_db")
 def _ensure_user_exists_db(user_id: str) -> None:
     connection = get_connection()
     cursor = connection.cursor()
@@ -230,6 +470,7 @@ def _group_public_from_row(row: dict) -> GroupPublic:
         description=row.get("description"),
         created_at=row["created_at"],
         member_count=row.get("member_count"),
+        base_currency=row.get("base_currency") or DEFAULT_CURRENCY,
     )
 
 
@@ -239,10 +480,13 @@ def _compose_group_detail(
     description: Optional[str],
     owner_id: str,
     created_at: datetime,
+    base_currency: str,
     members: list[GroupMember],
     expenses: list[Expense],
+    checkpoint: Optional[Checkpoint] = None,
 ) -> GroupDetail:
-    balances, total_amount = _calculate_balances(members, expenses)
+    checkpoint = checkpoint or {}
+    balances, total_amount = _calculate_balances(members, expenses, base_currency, checkpoint)
     return GroupDetail(
         id=group_id,
         name=name,
@@ -250,11 +494,48 @@ def _compose_group_detail(
         owner_id=owner_id,
         created_at=created_at,
         member_count=len(members),
+        base_currency=base_currency,
         members=members,
         expenses=expenses,
         total_expense=total_amount,
         balances=balances,
+        archived_expense_count=sum(count for count, _ in checkpoint.values()),
+    )
+
+
+def _compose_group_payload(
+    group_id: str,
+    name: str,
+    description: Optional[str],
+    owner_id: str,
+    created_at: Any,
+    base_currency: str,
+    members: list[dict],
+    expenses: list[dict],
+    checkpoint: Optional[Checkpoint] = None,
+) -> dict[str, Any]:
+    """Plain-dict twin of :func:`_compose_group_detail`; keys follow ``GroupDetail`` field order."""
+    checkpoint = checkpoint or {}
+    base_amounts = convert_amounts(
+        [(expense["amount"], expense["currency"], expense["created_at"]) for expense in expenses],
+        base_currency,
     )
+    payments = zip((expense["payer_id"] for expense in expenses), base_amounts)
+    balances, total_amount = _balance_rows(members, chain(payments, _checkpoint_payments(checkpoint)))
+    return {
+        "id": group_id,
+        "name": name,
+        "owner_id": owner_id,
+        "description": description,
+        "created_at": created_at,
+        "member_count": len(members),
+        "base_currency": base_currency,
+        "members": members,
+        "expenses": expenses,
+        "total_expense": total_amount,
+        "balances": balances,
+        "archived_expense_count": sum(count for count, _ in checkpoint.values()),
+    }
 
 
 def _expense_from_db_row(row: dict) -> Expense:
@@ -265,6 +546,7 @@ def _expense_from_db_row(row: dict) -> Expense:
         payer_name=row["payer_name"],
         payer_email=row["payer_email"],
         amount=float(row["amount"]),
+        currency=row["currency"],
         note=row.get("note"),
         status=row.get("status", "assigned"),
         created_at=row["created_at"],
@@ -272,39 +554,57 @@ def _expense_from_db_row(row: dict) -> Expense:
 
 
 def _calculate_balances(
-    members: list[GroupMember], expenses: list[Expense]
+    members: list[GroupMember],
+    expenses: list[Expense],
+    base_currency: str,
+    checkpoint: Optional[Checkpoint] = None,
 ) -> tuple[list[GroupBalance], float]:
-    if not members:
-        total_amount = round(sum(float(exp.amount) for exp in expenses), 2)
-        return [], total_amount
+    """Balances and total in ``base_currency``; every expense is converted in one batched pass."""
+    base_amounts = convert_amounts(
+        [(expense.amount, expense.currency, expense.created_at) for expense in expenses], base_currency
+    )
+    payments = zip((expense.payer_id for expense in expenses), base_amounts)
+    rows, total_amount = _balance_rows(
+        [{"id": member.id, "name": member.name, "email": member.email} for member in members],
+        chain(payments, _checkpoint_payments(checkpoint or {})),
+    )
+    return [GroupBalance(**row) for row in rows], total_amount
 
-    paid_map = {member.id: 0.0 for member in members}
-    owed_map = {member.id: 0.0 for member in members}
-    total_amount = 0.0
+
+def _checkpoint_payments(checkpoint: Checkpoint) -> Iterable[tuple[str, float]]:
+    # Balances are linear in the amounts, so each payer's archived total counts like one expense.
+    return ((payer_id, amount) for payer_id, (_, amount) in checkpoint.items())
+
+
+def _balance_rows(
+    members: list[dict], payments: Iterable[tuple[str, float]]
+) -> tuple[list[dict], float]:
+    paid_map = {member["id"]: 0.0 for member in members}
     member_count = len(members)
+    total_amount = 0.0
+    # Every member owes the same share of every expense, so one running sum suffices.
+    owed_share = 0.0
 
-    for expense in expenses:
-        amount = float(expense.amount)
+    for payer_id, amount in payments:
         total_amount += amount
-        share = amount / member_count if member_count else 0.0
-        for member in members:
-            owed_map[member.id] += share
-        if expense.payer_id in paid_map:
-            paid_map[expense.payer_id] += amount
+        if member_count:
+            owed_share += amount / member_count
+        if payer_id in paid_map:
+            paid_map[payer_id] += amount
 
     balances = []
+    owed_value = round(owed_share, 2)
     for member in members:
-        paid_value = round(paid_map[member.id], 2)
-        owed_value = round(owed_map[member.id], 2)
+        paid_value = round(paid_map[member["id"]], 2)
         balances.append(
-            GroupBalance(
-                user_id=member.id,
-                name=member.name,
-                email=member.email,
-                paid=paid_value,
-                owed=owed_value,
-                balance=round(owed_value - paid_value, 2),
-            )
+            {
+                "user_id": member["id"],
+                "name": member["name"],
+                "email": member["email"],
+                "paid": paid_value,
+                "owed": owed_value,
+                "balance": round(owed_value - paid_value, 2),
+            }
         )
     return balances, round(total_amount, 2)
 
@@ -312,28 +612,32 @@ def _calculate_balances(
 # --- File storage helpers -------------------------------------------------
 
 
+@timed("group._create_group_file")
 def _create_group_file(payload: GroupCreate) -> GroupDetail:
-    users = load_users()
-    if not any(user["id"] == payload.owner_id for user in users):
-        raise UserNotFoundError
-    groups = load_groups()
-    if any(group["name"].lower() == payload.name.lower() for group in groups):
-        raise ValueError("Group with this name already exists")
-    created_at = datetime.utcnow()
-    record: GroupRecord = {
-        "id": str(uuid4()),
-        "name": payload.name.strip(),
-        "owner_id": payload.owner_id,
-        "description": payload.description,
-        "created_at": created_at.isoformat(),
-        "members": [payload.owner_id],
-        "expenses": [],
-    }
-    groups.append(record)
-    save_groups(groups)
+    with file_lock(group_file_path()):
+        users = load_users()
+        if not any(user["id"] == payload.owner_id for user in users):
+            raise UserNotFoundError
+        groups = load_groups()
+        if any(group["name"].lower() == payload.name.lower() for group in groups):
+            raise ValueError("Group with this name already exists")
+        created_at = datetime.utcnow()
+        record: GroupRecord = {
+            "id": str(uuid4()),
+            "name": payload.name.strip(),
+            "owner_id": payload.owner_id,
+            "description": payload.description,
+            "created_at": created_at.isoformat(),
+            "base_currency": payload.base_currency,
+            "members": [payload.owner_id],
+            "expenses": [],
+        }
+        groups.append(record)
+        save_groups(groups)
     return _group_detail_from_record(record)
 
 
+@timed("group._get_group_file")
 def _get_group_file(group_id: str) -> GroupDetail:
     groups = load_groups()
     for group in groups:
@@ -342,6 +646,17 @@ def _get_group_file(group_id: str) -> GroupDetail:
     raise GroupNotFoundError
 
 
+@timed("group._get_group_payload_file")
+def _get_group_payload_file(group_id: str) -> dict[str, Any]:
+    groups = load_groups()
+    for group in groups:
+        if group["id"] == group_id:
+            users = {user["id"]: user for user in load_users()}
+            return _group_payload_from_record(group, users)
+    raise GroupNotFoundError
+
+
+@timed("group._list_user_groups_file")
 def _list_user_groups_file(user_id: str) -> list[GroupPublic]:
     groups = load_groups()
     result = [
@@ -352,25 +667,44 @@ def _list_user_groups_file(user_id: str) -> list[GroupPublic]:
     return sorted(result, key=lambda g: g.name.lower())
 
 
+@timed("group._list_groups_by_user_file")
+def _list_groups_by_user_file() -> dict[str, list[GroupPublic]]:
+    grouped: dict[str, list[GroupPublic]] = {}
+    for record in sorted(load_groups(), key=lambda group: group["name"].lower()):
+        group = _group_public_from_record(record)
+        for member_id in record.get("members", []):
+            grouped.setdefault(member_id, []).append(group)
+    return grouped
+
+
+@timed("group._recent_group_ids_file")
+def _recent_group_ids_file(limit: int) -> list[str]:
+    groups = sorted(load_groups(), key=lambda record: record.get("created_at", ""), reverse=True)
+    return [record["id"] for record in groups[:limit]]
+
+
+@timed("group._add_member_to_group_file")
 def _add_member_to_group_file(group_id: str, requester_id: str, user_email: str) -> GroupDetail:
-    users = load_users()
-    email_map = {user["email"].lower(): user for user in users}
-    groups = load_groups()
-    group = next((g for g in groups if g["id"] == group_id), None)
-    if not group:
-        raise GroupNotFoundError
-    if group["owner_id"] != requester_id:
-        raise GroupOwnershipError
-    target = email_map.get(user_email.lower())
-    if not target:
-        raise UserNotFoundError
-    members = group.setdefault("members", [])
-    if target["id"] not in members:
-        members.append(target["id"])
-    save_groups(groups)
+    with file_lock(group_file_path()):
+        users = load_users()
+        email_map = {user["email"].lower(): user for user in users}
+        groups = load_groups()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        if group["owner_id"] != requester_id:
+            raise GroupOwnershipError
+        target = email_map.get(user_email.lower())
+        if not target:
+            raise UserNotFoundError
+        members = group.setdefault("members", [])
+        if target["id"] not in members:
+            members.append(target["id"])
+        save_groups(groups)
     return _group_detail_from_record(group)
 
 
+@timed("group._ensure_user_exists_file")
 def _ensure_user_exists_file(user_id: str) -> None:
     users = load_users()
     if not any(user["id"] == user_id for user in users):
@@ -391,12 +725,16 @@ def _group_public_from_record(record: GroupRecord) -> GroupPublic:
         description=record.get("description"),
         created_at=created_at_dt,
         member_count=len(record.get("members", [])),
+        base_currency=record.get("base_currency", DEFAULT_CURRENCY),
     )
 
 
-def _group_detail_from_record(record: GroupRecord) -> GroupDetail:
+def _group_detail_from_record(
+    record: GroupRecord, users: Optional[dict[str, UserRecord]] = None
+) -> GroupDetail:
     members: list[GroupMember] = []
-    users = {user["id"]: user for user in load_users()}
+    if users is None:
+        users = {user["id"]: user for user in load_users()}
     for member_id in record.get("members", []):
         user = users.get(member_id)
         if user:
@@ -422,6 +760,7 @@ def _group_detail_from_record(record: GroupRecord) -> GroupDetail:
                 payer_name=payer_name,
                 payer_email=payer_email,
                 amount=entry["amount"],
+                currency=entry.get("currency", DEFAULT_CURRENCY),
                 note=entry.get("note"),
                 status=entry.get("status", "assigned"),
                 created_at=created_at_dt,
@@ -434,16 +773,63 @@ def _group_detail_from_record(record: GroupRecord) -> GroupDetail:
         description=public.description,
         owner_id=public.owner_id,
         created_at=public.created_at,
+        base_currency=public.base_currency,
         members=members,
         expenses=expenses,
+        checkpoint=_checkpoint_from_record(record),
     )
 
 
+def _group_payload_from_record(record: GroupRecord, users: dict[str, UserRecord]) -> dict[str, Any]:
+    members = []
+    for member_id in record.get("members", []):
+        user = users.get(member_id)
+        if user:
+            members.append({"id": user["id"], "name": user["name"], "email": user["email"]})
+    expenses = []
+    for entry in record.get("expenses", []):
+        payer = users.get(entry["payer_id"])
+        expenses.append(
+            {
+                "id": entry["id"],
+                "group_id": record["id"],
+                "payer_id": entry["payer_id"],
+                "payer_name": payer["name"] if payer else "Unknown",
+                "payer_email": payer["email"] if payer else "unknown@example.com",
+                "amount": float(entry["amount"]),
+                "currency": entry.get("currency", DEFAULT_CURRENCY),
+                "note": entry.get("note"),
+                "status": entry.get("status", "assigned"),
+                "created_at": entry["created_at"],
+            }
+        )
+    return _compose_group_payload(
+        group_id=record["id"],
+        name=record["name"],
+        description=record.get("description"),
+        owner_id=record["owner_id"],
+        created_at=record["created_at"],
+        base_currency=record.get("base_currency", DEFAULT_CURRENCY),
+        members=members,
+        expenses=expenses,
+        checkpoint=_checkpoint_from_record(record),
+    )
+
+
+def _checkpoint_from_record(record: GroupRecord) -> Checkpoint:
+    checkpoint = record.get("checkpoint", {})
+    return {payer_id: (int(count), amount) for payer_id, (count, amount) in checkpoint.items()}
+
+
 __all__ = [
     "add_member_to_group",
     "create_group",
     "get_group",
+    "get_group_json",
+    "invalidate_memberships",
     "list_user_groups",
+    "refresh_group",
+    "ensure_group_exists",
     "GroupNotFoundError",
     "GroupMembershipError",
     "GroupOwnershipError",
@@ -0,0 +1,577 @@
+"""Recurring expense schedules and the batch job that turns due occurrences into expenses.
+
+A schedule adds one expense per occurrence, dated that day (midnight UTC).
+:func:`materialize_due_expenses` works through the due schedules of every group
+in batches. Each batch is one transaction (MySQL) or one save (file mode), and
+the per-group work (rollups, cached detail, change-feed event) happens once per
+group per batch rather than once per expense. Occurrences are recorded with
+their date, so running the job twice, or in two workers at once, adds each
+occurrence exactly once. A schedule whose currency has no exchange rate is
+skipped, and left due, without holding up the rest of its batch.
+"""
+
+from __future__ import annotations
+
+import calendar
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Optional
+from uuid import uuid4
+
+from ..change_feed import EXPENSES_ADDED, publish_group_change
+from ..config import get_settings
+from ..database import get_connection
+from ..metrics import timed
+from ..schemas.expense import DEFAULT_CURRENCY, RecurringExpense, RecurringExpenseCreate
+from . import group as group_crud
+from .analytics import apply_rollup_file, apply_rollups_db
+from .exceptions import (
+    ExchangeRateNotFoundError,
+    GroupMembershipError,
+    GroupNotFoundError,
+    RecurringExpenseNotFoundError,
+    UserNotFoundError,
+)
+from .expense_index import group_record, group_records
+from .file_storage import (
+    ExpenseRecord,
+    RecurringRecord,
+    file_lock,
+    group_file_path,
+    load_groups,
+    load_users,
+    save_groups,
+)
+from .fx_rates import Amount, check_convertible, convert_amounts
+
+logger = logging.getLogger("signup_app.recurring")
+
+DEFAULT_BATCH_SIZE = 200
+# Occurrences added per schedule and batch; a schedule that is far behind catches up over several batches.
+MAX_CATCH_UP = 366
+
+_SCHEDULE_COLUMNS = (
+    "id, group_id, payer_id, amount, currency, note, status, frequency, interval_count, "
+    "starts_on, ends_on, next_due_on, created_at"
+)
+
+
+@dataclass
+class MaterializeResult:
+    schedules: int = 0
+    expenses: int = 0
+    groups: set[str] = field(default_factory=set)
+    # Schedules left due because their amounts could not be converted; not claimed again this run.
+    skipped: set[str] = field(default_factory=set)
+
+
+@timed("recurring.create_recurring_expense")
+def create_recurring_expense(group_id: str, payload: RecurringExpenseCreate) -> RecurringExpense:
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _create_recurring_expense_file(group_id, payload)
+    return _create_recurring_expense_db(group_id, payload)
+
+
+@timed("recurring.list_recurring_expenses")
+def list_recurring_expenses(group_id: str) -> list[RecurringExpense]:
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _list_recurring_expenses_file(group_id)
+    return _list_recurring_expenses_db(group_id)
+
+
+@timed("recurring.delete_recurring_expense")
+def delete_recurring_expense(group_id: str, recurring_id: str) -> None:
+    """Stop a schedule; expenses it already added stay in the ledger."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        _delete_recurring_expense_file(group_id, recurring_id)
+    else:
+        _delete_recurring_expense_db(group_id, recurring_id)
+
+
+@timed("recurring.materialize_due_expenses")
+def materialize_due_expenses(
+    today: Optional[date] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> MaterializeResult:
+    """Add every occurrence due on or before ``today`` (UTC) in all groups; safe to run repeatedly."""
+    today = today or datetime.utcnow().date()
+    settings = get_settings()
+    result = MaterializeResult()
+    while True:
+        if settings.use_file_storage:
+            claimed, added = _materialize_batch_file(today, batch_size, result.skipped)
+        else:
+            claimed, added = _materialize_batch_db(today, batch_size, result.skipped)
+        for group_id, expense_ids in added.items():
+            _publish_materialized(group_id, expense_ids)
+        result.schedules += claimed
+        result.expenses += sum(len(expense_ids) for expense_ids in added.values())
+        result.groups.update(added)
+        # Every claimed schedule moves past ``today``, MAX_CATCH_UP occurrences ahead, or into
+        # ``skipped``, so this ends.
+        if claimed < batch_size:
+            return result
+
+
+def _publish_materialized(group_id: str, expense_ids: list[str]) -> None:
+    """One cache refresh and one change-feed event for everything a batch added to the group."""
+    detail = group_crud.refresh_group(group_id)
+    added = set(expense_ids)
+    publish_group_change(
+        group_id,
+        EXPENSES_ADDED,
+        expenses=[expense.model_dump(mode="json") for expense in detail.expenses if expense.id in added],
+        total_expense=detail.total_expense,
+        balances=[balance.model_dump(mode="json") for balance in detail.balances],
+    )
+
+
+def _occurrence_on(frequency: str, interval: int, starts_on: date, index: int) -> date:
+    if frequency == "daily":
+        return starts_on + timedelta(days=interval * index)
+    if frequency == "weekly":
+        return starts_on + timedelta(weeks=interval * index)
+    # Monthly occurrences keep the start's day of month, clamped to shorter months (31st -> 30th, 28th).
+    months = starts_on.month - 1 + interval * index
+    year, month = starts_on.year + months // 12, months % 12 + 1
+    return date(year, month, min(starts_on.day, calendar.monthrange(year, month)[1]))
+
+
+def _due_occurrences(
+    frequency: str,
+    interval: int,
+    starts_on: date,
+    ends_on: Optional[date],
+    next_due_on: date,
+    through: date,
+) -> tuple[list[date], Optional[date]]:
+    """Occurrences from ``next_due_on`` through ``through``, and the next one after them (None when ended)."""
+    if frequency == "monthly":
+        months = (next_due_on.year - starts_on.year) * 12 + next_due_on.month - starts_on.month
+        index = max(0, months // interval)
+    else:
+        step = interval * (7 if frequency == "weekly" else 1)
+        index = max(0, (next_due_on - starts_on).days // step)
+    while _occurrence_on(frequency, interval, starts_on, index) < next_due_on:
+        index += 1
+    dates: list[date] = []
+    while True:
+        occurs_on = _occurrence_on(frequency, interval, starts_on, index)
+        if ends_on is not None and occurs_on > ends_on:
+            return dates, None
+        if occurs_on > through or len(dates) == MAX_CATCH_UP:
+            return dates, occurs_on
+        dates.append(occurs_on)
+        index += 1
+
+
+def _convert_schedule(
+    schedule_id: str, amounts: list[Amount], base_currency: str, skipped: set[str]
+) -> Optional[list[float]]:
+    """One schedule's occurrence amounts in the group's base currency; None (and skipped) without a rate."""
+    try:
+        return convert_amounts(amounts, base_currency)
+    except ExchangeRateNotFoundError as exc:
+        logger.warning("Skipping recurring expense %s until its rate is available: %s", schedule_id, exc)
+        skipped.add(schedule_id)
+        return None
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# --- Database helpers -----------------------------------------------------
+
+
+@timed("recurring._create_recurring_expense_db")
+def _create_recurring_expense_db(group_id: str, payload: RecurringExpenseCreate) -> RecurringExpense:
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT base_currency FROM `groups` WHERE id = %s", (group_id,))
+        group_row = cursor.fetchone()
+        if group_row is None:
+            raise GroupNotFoundError
+        currency = payload.currency or group_row[0]
+        check_convertible(currency, group_row[0])
+        cursor.execute("SELECT id FROM users WHERE email = %s", (payload.payer_email,))
+        payer_row = cursor.fetchone()
+        if not payer_row:
+            raise UserNotFoundError
+        payer_id = payer_row[0]
+        cursor.execute(
+            "SELECT 1 FROM user_groups WHERE user_id = %s AND group_id = %s",
+            (payer_id, group_id),
+        )
+        if cursor.fetchone() is None:
+            raise GroupMembershipError
+        schedule = RecurringExpense(
+            id=str(uuid4()),
+            group_id=group_id,
+            payer_id=payer_id,
+            amount=float(payload.amount),
+            currency=currency,
+            note=payload.note,
+            status=payload.status,
+            frequency=payload.frequency,
+            interval=payload.interval,
+            starts_on=payload.starts_on,
+            ends_on=payload.ends_on,
+            next_due_on=payload.starts_on,
+            created_at=datetime.utcnow(),
+        )
+        cursor.execute(
+            f"INSERT INTO recurring_expenses ({_SCHEDULE_COLUMNS}) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (
+                schedule.id,
+                group_id,
+                payer_id,
+                schedule.amount,
+                schedule.currency,
+                schedule.note,
+                schedule.status,
+                schedule.frequency,
+                schedule.interval,
+                schedule.starts_on,
+                schedule.ends_on,
+                schedule.next_due_on,
+                schedule.created_at,
+            ),
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    return schedule
+
+
+@timed("recurring._list_recurring_expenses_db")
+def _list_recurring_expenses_db(group_id: str) -> list[RecurringExpense]:
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id FROM `groups` WHERE id = %s", (group_id,))
+        if cursor.fetchone() is None:
+            raise GroupNotFoundError
+        cursor.execute(
+            f"SELECT {_SCHEDULE_COLUMNS} FROM recurring_expenses WHERE group_id = %s ORDER BY created_at, id",
+            (group_id,),
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    return [_recurring_from_db_row(row) for row in rows]
+
+
+@timed("recurring._delete_recurring_expense_db")
+def _delete_recurring_expense_db(group_id: str, recurring_id: str) -> None:
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "DELETE FROM recurring_expenses WHERE id = %s AND group_id = %s",
+            (recurring_id, group_id),
+        )
+        deleted = cursor.rowcount
+        if not deleted:
+            cursor.execute("SELECT id FROM `groups` WHERE id = %s", (group_id,))
+            if cursor.fetchone() is None:
+                raise GroupNotFoundError
+            raise RecurringExpenseNotFoundError
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@timed("recurring._materialize_batch_db")
+def _materialize_batch_db(
+    today: date, batch_size: int, skipped: set[str]
+) -> tuple[int, dict[str, list[str]]]:
+    """Claim up to ``batch_size`` due schedules and add their occurrences in one transaction."""
+    connection = get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        excluded = f" AND id NOT IN ({', '.join(['%s'] * len(skipped))})" if skipped else ""
+        # SKIP LOCKED: concurrent runs (every worker's scheduler, a cron job) claim disjoint schedules.
+        cursor.execute(
+            f"SELECT {_SCHEDULE_COLUMNS} FROM recurring_expenses WHERE next_due_on <= %s{excluded} "
+            "ORDER BY next_due_on, id LIMIT %s FOR UPDATE SKIP LOCKED",
+            (today, *sorted(skipped), batch_size),
+        )
+        schedules = cursor.fetchall()
+        if not schedules:
+            connection.commit()
+            return 0, {}
+        placeholders = ", ".join(["%s"] * len(schedules))
+        cursor.execute(
+            "SELECT recurring_id, occurs_on FROM recurring_occurrences "
+            f"WHERE recurring_id IN ({placeholders}) AND occurs_on >= %s",
+            (*(row["id"] for row in schedules), min(_as_date(row["next_due_on"]) for row in schedules)),
+        )
+        recorded = {(row["recurring_id"], _as_date(row["occurs_on"])) for row in cursor.fetchall()}
+        group_ids = sorted({row["group_id"] for row in schedules})
+        cursor.execute(
+            f"SELECT id, base_currency FROM `groups` WHERE id IN ({', '.join(['%s'] * len(group_ids))})",
+            group_ids,
+        )
+        base_currencies = {row["id"]: row["base_currency"] for row in cursor.fetchall()}
+
+        expenses: list[tuple[Any, ...]] = []
+        links: list[tuple[str, str]] = []
+        occurrences: list[tuple[str, date, str]] = []
+        advances: list[tuple[Optional[date], str]] = []
+        cells: dict[tuple[str, str, str, str], list[float]] = {}
+        added: dict[str, list[str]] = {}
+        for row in schedules:
+            dates, next_due_on = _due_occurrences(
+                row["frequency"],
+                int(row["interval_count"]),
+                _as_date(row["starts_on"]),
+                _as_date(row["ends_on"]),
+                _as_date(row["next_due_on"]),
+                today,
+            )
+            group_id, payer_id, status = row["group_id"], row["payer_id"], row["status"]
+            amount, currency = float(row["amount"]), row["currency"]
+            due = [occurs_on for occurs_on in dates if (row["id"], occurs_on) not in recorded]
+            base_amounts = _convert_schedule(
+                row["id"],
+                [(amount, currency, datetime.combine(occurs_on, time())) for occurs_on in due],
+                base_currencies[group_id],
+                skipped,
+            )
+            if base_amounts is None:
+                continue
+            for occurs_on, base_amount in zip(due, base_amounts):
+                expense_id = str(uuid4())
+                created_at = datetime.combine(occurs_on, time())
+                expenses.append(
+                    (
+                        expense_id,
+                        group_id,
+                        payer_id,
+                        amount,
+                        currency,
+                        round(base_amount, 2),
+                        row["note"],
+                        status,
+                        created_at,
+                    )
+                )
+                links.append((expense_id, group_id))
+                occurrences.append((row["id"], occurs_on, expense_id))
+                cell = cells.setdefault((group_id, occurs_on.strftime("%Y-%m"), payer_id, status), [0, 0.0])
+                cell[0] += 1
+                cell[1] += base_amount
+                added.setdefault(group_id, []).append(expense_id)
+            advances.append((next_due_on, row["id"]))
+
+        if expenses:
+            cursor.executemany(
+                "INSERT INTO expenses "
+                "(id, group_id, payer_id, amount, currency, base_amount, note, status, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                expenses,
+            )
+            cursor.executemany("INSERT INTO expense_groups (expense_id, group_id) VALUES (%s, %s)", links)
+            cursor.executemany(
+                "INSERT INTO recurring_occurrences (recurring_id, occurs_on, expense_id) VALUES (%s, %s, %s)",
+                occurrences,
+            )
+            apply_rollups_db(cursor, cells)
+        if advances:
+            cursor.executemany("UPDATE recurring_expenses SET next_due_on = %s WHERE id = %s", advances)
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    return len(schedules), added
+
+
+def _recurring_from_db_row(row: dict) -> RecurringExpense:
+    return RecurringExpense(
+        id=row["id"],
+        group_id=row["group_id"],
+        payer_id=row["payer_id"],
+        amount=float(row["amount"]),
+        currency=row["currency"],
+        note=row["note"],
+        status=row["status"],
+        frequency=row["frequency"],
+        interval=int(row["interval_count"]),
+        starts_on=_as_date(row["starts_on"]),
+        ends_on=_as_date(row["ends_on"]),
+        next_due_on=_as_date(row["next_due_on"]),
+        created_at=row["created_at"],
+    )
+
+
+# --- File storage helpers -------------------------------------------------
+
+
+@timed("recurring._create_recurring_expense_file")
+def _create_recurring_expense_file(group_id: str, payload: RecurringExpenseCreate) -> RecurringExpense:
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        users = load_users()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        payer = next(
+            (user for user in users if user["email"].lower() == payload.payer_email.lower()),
+            None,
+        )
+        if not payer:
+            raise UserNotFoundError
+        if payer["id"] not in group.get("members", []):
+            raise GroupMembershipError
+        base_currency = group.get("base_currency", DEFAULT_CURRENCY)
+        currency = payload.currency or base_currency
+        check_convertible(currency, base_currency)
+        record: RecurringRecord = {
+            "id": str(uuid4()),
+            "group_id": group_id,
+            "payer_id": payer["id"],
+            "amount": float(payload.amount),
+            "currency": currency,
+            "note": payload.note,
+            "status": payload.status,
+            "frequency": payload.frequency,
+            "interval": payload.interval,
+            "starts_on": payload.starts_on.isoformat(),
+            "ends_on": payload.ends_on.isoformat() if payload.ends_on else None,
+            "next_due_on": payload.starts_on.isoformat(),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        group.setdefault("recurring_expenses", []).append(record)
+        save_groups(groups)
+        return RecurringExpense.model_validate(record)
+
+
+@timed("recurring._list_recurring_expenses_file")
+def _list_recurring_expenses_file(group_id: str) -> list[RecurringExpense]:
+    group = group_record(group_id)
+    return [RecurringExpense.model_validate(record) for record in group.get("recurring_expenses", [])]
+
+
+@timed("recurring._delete_recurring_expense_file")
+def _delete_recurring_expense_file(group_id: str, recurring_id: str) -> None:
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        group = next((g for g in groups if g["id"] == group_id), None)
+        if not group:
+            raise GroupNotFoundError
+        schedules = group.get("recurring_expenses", [])
+        index = next((idx for idx, entry in enumerate(schedules) if entry["id"] == recurring_id), None)
+        if index is None:
+            raise RecurringExpenseNotFoundError
+        schedules.pop(index)
+        save_groups(groups)
+
+
+@timed("recurring._materialize_batch_file")
+def _materialize_batch_file(
+    today: date, batch_size: int, skipped: set[str]
+) -> tuple[int, dict[str, list[str]]]:
+    """Add the occurrences of up to ``batch_size`` due schedules with one save of ``groups.json``."""
+    # Most runs find nothing due: check the cached snapshot before locking and re-reading the file.
+    if not any(
+        _schedule_is_due(schedule, today) and schedule["id"] not in skipped
+        for group in group_records().values()
+        for schedule in group.get("recurring_expenses", [])
+    ):
+        return 0, {}
+    claimed = 0
+    added: dict[str, list[str]] = {}
+    # Concurrent runs take turns, and each one sees the next_due_on values the previous one saved.
+    with file_lock(group_file_path()):
+        groups = load_groups()
+        for group in groups:
+            due = [
+                s for s in group.get("recurring_expenses", [])
+                if _schedule_is_due(s, today) and s["id"] not in skipped
+            ]
+            due = due[:batch_size - claimed]
+            if not due:
+                continue
+            claimed += len(due)
+            expenses = group.setdefault("expenses", [])
+            recorded = {(e["recurring_id"], e["occurs_on"]) for e in expenses if e.get("recurring_id")}
+            base_currency = group.get("base_currency", DEFAULT_CURRENCY)
+            new_expenses: list[ExpenseRecord] = []
+            for schedule in due:
+                dates, next_due_on = _due_occurrences(
+                    schedule["frequency"],
+                    schedule["interval"],
+                    date.fromisoformat(schedule["starts_on"]),
+                    _as_date(schedule.get("ends_on")),
+                    date.fromisoformat(schedule["next_due_on"]),
+                    today,
+                )
+                schedule_expenses: list[ExpenseRecord] = []
+                for occurs_on in dates:
+                    if (schedule["id"], occurs_on.isoformat()) in recorded:
+                        continue
+                    expense: ExpenseRecord = {
+                        "id": str(uuid4()),
+                        "group_id": group["id"],
+                        "payer_id": schedule["payer_id"],
+                        "amount": float(schedule["amount"]),
+                        "currency": schedule.get("currency", DEFAULT_CURRENCY),
+                        "note": schedule.get("note"),
+                        "status": schedule.get("status", "assigned"),
+                        "created_at": datetime.combine(occurs_on, time()).isoformat(),
+                        "recurring_id": schedule["id"],
+                        "occurs_on": occurs_on.isoformat(),
+                    }
+                    schedule_expenses.append(expense)
+                base_amounts = _convert_schedule(
+                    schedule["id"],
+                    [(e["amount"], e["currency"], e["created_at"]) for e in schedule_expenses],
+                    base_currency,
+                    skipped,
+                )
+                if base_amounts is None:
+                    continue
+                for expense, base_amount in zip(schedule_expenses, base_amounts):
+                    apply_rollup_file(group, expense, 1, base_amount)
+                new_expenses.extend(schedule_expenses)
+                schedule["next_due_on"] = next_due_on.isoformat() if next_due_on else None
+            if new_expenses:
+                # The ledger is newest first.
+                new_expenses.sort(key=lambda expense: expense["created_at"], reverse=True)
+                expenses[:0] = new_expenses
+                added[group["id"]] = [expense["id"] for expense in new_expenses]
+            if claimed == batch_size:
+                break
+        if claimed:
+            save_groups(groups)
+    return claimed, added
+
+
+def _schedule_is_due(schedule: RecurringRecord, today: date) -> bool:
+    next_due_on = schedule.get("next_due_on")
+    return next_due_on is not None and date.fromisoformat(next_due_on) <= today
+
+
+__all__ = [
+    "create_recurring_expense",
+    "list_recurring_expenses",
+    "delete_recurring_expense",
+    "materialize_due_expenses",
+    "MaterializeResult",
+    "ExchangeRateNotFoundError",
+    "GroupMembershipError",
+    "GroupNotFoundError",
+    "RecurringExpenseNotFoundError",
+    "UserNotFoundError",
+]
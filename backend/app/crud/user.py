@@ -5,24 +5,51 @@ from datetime import datetime
 from typing import List, Optional, Tuple
 from uuid import uuid4
 
-from mysql.connector import errorcode
-from mysql.connector.errors import IntegrityError
+from pydantic import TypeAdapter
 
+from ..cache import GROUP_DETAIL, MEMBERSHIP, USERS, cached, get_version, invalidate
 from ..config import get_settings
 from ..database import get_connection
-from ..external_services.email import send_welcome_email
-from ..external_services.notification import notify_admin
+from ..metrics import timed
+from ..outbox import (
+    ADMIN_NOTIFICATION,
+    WELCOME_EMAIL,
+    OutboxEvent,
+    enqueue_db,
+    enqueue_file,
+    new_event,
+    wake_worker,
+)
 from ..schemas.group import GroupPublic
-from ..schemas.user import UserLogin, UserProfileUpdate, UserPublic, UserSignup
-from ..utils.authentication import hash_password, verify_password
+from ..schemas.user import (
+    SessionPublic,
+    UserLogin,
+    UserProfileUpdate,
+    UserPublic,
+    UserSession,
+    UserSignup,
+)
+from ..utils.authentication import (
+    SessionClaims,
+    hash_password,
+    issue_session_token,
+    needs_rehash,
+    verify_password,
+)
+from ..utils.files import AvatarStorageError, StoredAvatar, save_avatar_variants
+from ..utils.images import ImageProcessingError
+from ..utils.process_pool import PoolBusyError
 from ..utils.validation import normalize_name
 from . import group as group_crud
-from .exceptions import DuplicateEmailError, InvalidCredentialsError, UserNotFoundError
-from .file_storage import UserRecord, load_users, save_users
+from .exceptions import DuplicateEmailError, DuplicateKeyError, InvalidCredentialsError, UserNotFoundError
+from .file_storage import UserRecord, file_lock, load_users, save_users, user_file_path
 
 logger = logging.getLogger("signup_app.crud.user")
 
+_USER_ADAPTER = TypeAdapter(UserPublic)
 
+
+@timed("user.create_user")
 def create_user(payload: UserSignup) -> UserPublic:
     settings = get_settings()
     normalized_name = normalize_name(payload.name)
@@ -32,39 +59,104 @@ def create_user(payload: UserSignup) -> UserPublic:
     else:
         user = _create_user_db(payload, normalized_name)
         logger.info("Created user %s via MySQL storage", payload.email)
-    send_welcome_email(user.email)
-    notify_admin(f"New signup: {user.email}")
     return user
 
 
-def authenticate_user(credentials: UserLogin) -> UserPublic:
+@timed("user.authenticate_user")
+def authenticate_user(credentials: UserLogin) -> UserSession:
     settings = get_settings()
     if settings.use_file_storage:
-        return _authenticate_user_file(credentials)
-    return _authenticate_user_db(credentials)
+        user = _authenticate_user_file(credentials)
+    else:
+        user = _authenticate_user_db(credentials)
+    token = issue_session_token(user.id, user.role, get_version(MEMBERSHIP, user.id) or 0)
+    return UserSession(**user.model_dump(), access_token=token)
+
+
+@timed("user.get_session")
+def get_session(claims: SessionClaims) -> SessionPublic:
+    """Serve a verified session without reloading the user row.
+
+    Group membership comes from the user-group cache, which is only reloaded
+    from storage after a membership change invalidated it. When that change
+    happened after the token was issued, a refreshed token is returned too.
+    """
+    current_version = get_version(MEMBERSHIP, claims.user_id)
+    groups = group_crud.list_user_groups(claims.user_id)
+    refreshed_token = None
+    if current_version is not None and current_version != claims.membership_version:
+        refreshed_token = issue_session_token(claims.user_id, claims.role, current_version)
+    return SessionPublic(
+        user_id=claims.user_id,
+        role=claims.role,
+        membership_version=claims.membership_version if current_version is None else current_version,
+        groups=groups,
+        access_token=refreshed_token,
+    )
 
 
+@timed("user.get_user")
 def get_user(user_id: str) -> UserPublic:
-    settings = get_settings()
-    if settings.use_file_storage:
-        return _get_user_file(user_id)
-    return _get_user_db(user_id)
+    return cached(USERS, user_id, _USER_ADAPTER, lambda: _load_user(user_id))
 
 
+@timed("user.update_user_profile")
 def update_user_profile(user_id: str, payload: UserProfileUpdate) -> UserPublic:
     settings = get_settings()
     if settings.use_file_storage:
-        return _update_user_file(user_id, payload)
-    return _update_user_db(user_id, payload)
+        user = _update_user_file(user_id, payload)
+    else:
+        user = _update_user_db(user_id, payload)
+    entries = [(USERS, user_id)]
+    if payload.name is not None:
+        # Group details embed member and payer names.
+        entries.extend((GROUP_DETAIL, group.id) for group in user.groups or [])
+    invalidate(*entries)
+    return user
 
 
+@timed("user.update_user_avatar")
 def update_user_avatar(user_id: str, avatar_url: str) -> UserPublic:
     settings = get_settings()
     if settings.use_file_storage:
-        return _update_avatar_file(user_id, avatar_url)
-    return _update_avatar_db(user_id, avatar_url)
+        user = _update_avatar_file(user_id, avatar_url)
+    else:
+        user = _update_avatar_db(user_id, avatar_url)
+    invalidate((USERS, user_id))
+    return user
 
 
+@timed("user.replace_user_avatar")
+def replace_user_avatar(user_id: str, current_url: str, avatar_url: str) -> bool:
+    """Swap ``current_url`` for ``avatar_url`` unless the user uploaded another avatar meanwhile."""
+    settings = get_settings()
+    if settings.use_file_storage:
+        replaced = _replace_avatar_file(user_id, current_url, avatar_url)
+    else:
+        replaced = _replace_avatar_db(user_id, current_url, avatar_url)
+    if replaced:
+        invalidate((USERS, user_id))
+    return replaced
+
+
+@timed("user.process_avatar")
+def process_avatar(user_id: str, stored: StoredAvatar) -> None:
+    """Background stage after an upload: render WebP variants and point the user at one."""
+    settings = get_settings()
+    try:
+        variant_url = save_avatar_variants(stored, settings)
+    except (ImageProcessingError, AvatarStorageError, PoolBusyError, OSError) as exc:
+        logger.warning("Avatar processing for user %s failed, keeping original: %s", user_id, exc)
+        return
+    try:
+        replaced = replace_user_avatar(user_id, stored.url, variant_url)
+    except UserNotFoundError:
+        return
+    if not replaced:
+        logger.info("Avatar for user %s changed during processing; variant not applied", user_id)
+
+
+@timed("user.list_users")
 def list_users() -> List[UserPublic]:
     settings = get_settings()
     if settings.use_file_storage:
@@ -72,10 +164,27 @@ def list_users() -> List[UserPublic]:
     return _list_users_db()
 
 
+def _signup_events(email: str) -> list[OutboxEvent]:
+    return [
+        new_event(WELCOME_EMAIL, {"email": email}),
+        new_event(ADMIN_NOTIFICATION, {"message": f"New signup: {email}"}),
+    ]
+
+
+def _load_user(user_id: str) -> UserPublic:
+    settings = get_settings()
+    if settings.use_file_storage:
+        return _get_user_file(user_id)
+    return _get_user_db(user_id)
+
+
 # --- Database helpers -----------------------------------------------------
 
 
+@timed("user._create_user_db")
 def _create_user_db(payload: UserSignup, normalized_name: str) -> UserPublic:
+    # Hash before checking out a connection so the KDF never holds a pool slot.
+    password_hash = hash_password(payload.password)
     connection = get_connection()
     cursor = connection.cursor()
     created_at = datetime.utcnow()
@@ -90,7 +199,7 @@ def _create_user_db(payload: UserSignup, normalized_name: str) -> UserPublic:
                 user_id,
                 normalized_name,
                 payload.email,
-                hash_password(payload.password),
+                password_hash,
                 created_at,
                 "user",
                 None,
@@ -100,15 +209,16 @@ def _create_user_db(payload: UserSignup, normalized_name: str) -> UserPublic:
                 None,
             ),
         )
+        # Same transaction as the insert: the emails go out if and only if the user exists.
+        enqueue_db(cursor, _signup_events(payload.email))
         connection.commit()
-    except IntegrityError as err:
+    except DuplicateKeyError as err:
         connection.rollback()
-        if err.errno == errorcode.ER_DUP_ENTRY:
-            raise DuplicateEmailError from err
-        raise
+        raise DuplicateEmailError from err
     finally:
         cursor.close()
         connection.close()
+    wake_worker()
 
     return UserPublic(
         id=user_id,
@@ -120,6 +230,7 @@ def _create_user_db(payload: UserSignup, normalized_name: str) -> UserPublic:
     )
 
 
+@timed("user._authenticate_user_db")
 def _authenticate_user_db(credentials: UserLogin) -> UserPublic:
     connection = get_connection()
     cursor = connection.cursor(dictionary=True)
@@ -141,10 +252,31 @@ def _authenticate_user_db(credentials: UserLogin) -> UserPublic:
         raise InvalidCredentialsError
 
     logger.info("Login success for %s via MySQL storage", credentials.email)
+    if needs_rehash(row["password_hash"]):
+        _rehash_password_db(row["id"], row["password_hash"], credentials.password)
     groups = group_crud.list_user_groups(row["id"])
     return _user_public_from_db_row(row, groups=groups)
 
 
+@timed("user._rehash_password_db")
+def _rehash_password_db(user_id: str, old_hash: str, raw_password: str) -> None:
+    new_hash = hash_password(raw_password)
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        # Guard on the old hash so a concurrent password change is never overwritten.
+        cursor.execute(
+            "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+            (new_hash, user_id, old_hash),
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    logger.info("Upgraded password hash for user %s via MySQL storage", user_id)
+
+
+@timed("user._get_user_db")
 def _get_user_db(user_id: str) -> UserPublic:
     connection = get_connection()
     cursor = connection.cursor(dictionary=True)
@@ -164,6 +296,7 @@ def _get_user_db(user_id: str) -> UserPublic:
     return _user_public_from_db_row(row, groups=groups)
 
 
+@timed("user._update_user_db")
 def _update_user_db(user_id: str, payload: UserProfileUpdate) -> UserPublic:
     updates = {}
     if payload.name is not None:
@@ -196,6 +329,23 @@ def _update_user_db(user_id: str, payload: UserProfileUpdate) -> UserPublic:
     return _get_user_db(user_id)
 
 
+@timed("user._replace_avatar_db")
+def _replace_avatar_db(user_id: str, current_url: str, avatar_url: str) -> bool:
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "UPDATE users SET avatar_url = %s WHERE id = %s AND avatar_url = %s",
+            (avatar_url, user_id, current_url),
+        )
+        connection.commit()
+        return cursor.rowcount > 0
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@timed("user._update_avatar_db")
 def _update_avatar_db(user_id: str, avatar_url: str) -> UserPublic:
     connection = get_connection()
     cursor = connection.cursor()
@@ -212,6 +362,7 @@ def _update_avatar_db(user_id: str, avatar_url: str) -> UserPublic:
     return _get_user_db(user_id)
 
 
+@timed("user._list_users_db")
 def _list_users_db() -> List[UserPublic]:
     connection = get_connection()
     cursor = connection.cursor(dictionary=True)
@@ -224,11 +375,9 @@ def _list_users_db() -> List[UserPublic]:
         cursor.close()
         connection.close()
 
-    users = []
-    for row in rows:
-        groups = group_crud.list_user_groups(row["id"])
-        users.append(_user_public_from_db_row(row, groups=groups))
-    return users
+    # One query for every membership instead of two per user.
+    groups_by_user = group_crud.list_groups_by_user()
+    return [_user_public_from_db_row(row, groups=groups_by_user.get(row["id"], [])) for row in rows]
 
 
 def _user_public_from_db_row(row: dict, groups: Optional[list[GroupPublic]] = None) -> UserPublic:
@@ -250,31 +399,37 @@ def _user_public_from_db_row(row: dict, groups: Optional[list[GroupPublic]] = No
 # --- File storage helpers -------------------------------------------------
 
 
+@timed("user._create_user_file")
 def _create_user_file(payload: UserSignup, normalized_name: str) -> UserPublic:
-    users = load_users()
-    email_key = payload.email.lower()
-    if any(user["email"].lower() == email_key for user in users):
-        raise DuplicateEmailError
-
-    created_at = datetime.utcnow()
-    record: UserRecord = {
-        "id": str(uuid4()),
-        "name": normalized_name,
-        "email": payload.email,
-        "password_hash": hash_password(payload.password),
-        "created_at": created_at.isoformat(),
-        "role": "user",
-        "age": None,
-        "gender": None,
-        "address": None,
-        "bio": None,
-        "avatar_url": None,
-    }
-    users.append(record)
-    save_users(users)
+    # Hash first so the load/save window on the users file stays short.
+    password_hash = hash_password(payload.password)
+    with file_lock(user_file_path()):
+        users = load_users()
+        email_key = payload.email.lower()
+        if any(user["email"].lower() == email_key for user in users):
+            raise DuplicateEmailError
+
+        created_at = datetime.utcnow()
+        record: UserRecord = {
+            "id": str(uuid4()),
+            "name": normalized_name,
+            "email": payload.email,
+            "password_hash": password_hash,
+            "created_at": created_at.isoformat(),
+            "role": "user",
+            "age": None,
+            "gender": None,
+            "address": None,
+            "bio": None,
+            "avatar_url": None,
+        }
+        users.append(record)
+        save_users(users)
+    enqueue_file(_signup_events(payload.email))
     return _user_public_from_record(record)
 
 
+@timed("user._authenticate_user_file")
 def _authenticate_user_file(credentials: UserLogin) -> UserPublic:
     users = load_users()
     email_key = credentials.email.lower()
@@ -283,40 +438,73 @@ def _authenticate_user_file(credentials: UserLogin) -> UserPublic:
         logger.warning("Login failed for %s via file storage", credentials.email)
         raise InvalidCredentialsError
     logger.info("Login success for %s via file storage", credentials.email)
+    if needs_rehash(record["password_hash"]):
+        _rehash_password_file(record["id"], record["password_hash"], credentials.password)
     return _user_public_from_record(record)
 
 
+@timed("user._rehash_password_file")
+def _rehash_password_file(user_id: str, old_hash: str, raw_password: str) -> None:
+    new_hash = hash_password(raw_password)
+    with file_lock(user_file_path()):
+        users = load_users()
+        record = next((user for user in users if user["id"] == user_id), None)
+        if record is None or record["password_hash"] != old_hash:
+            return
+        record["password_hash"] = new_hash
+        save_users(users)
+    logger.info("Upgraded password hash for user %s via file storage", user_id)
+
+
+@timed("user._get_user_file")
 def _get_user_file(user_id: str) -> UserPublic:
     _, record = _get_file_record(user_id)
     return _user_public_from_record(record)
 
 
+@timed("user._update_user_file")
 def _update_user_file(user_id: str, payload: UserProfileUpdate) -> UserPublic:
-    users, record = _get_file_record(user_id)
-    if payload.name is not None:
-        record["name"] = normalize_name(payload.name)
-    if payload.age is not None:
-        record["age"] = payload.age
-    if payload.gender is not None:
-        record["gender"] = payload.gender
-    if payload.address is not None:
-        record["address"] = payload.address
-    if payload.bio is not None:
-        record["bio"] = payload.bio
-    save_users(users)
+    with file_lock(user_file_path()):
+        users, record = _get_file_record(user_id)
+        if payload.name is not None:
+            record["name"] = normalize_name(payload.name)
+        if payload.age is not None:
+            record["age"] = payload.age
+        if payload.gender is not None:
+            record["gender"] = payload.gender
+        if payload.address is not None:
+            record["address"] = payload.address
+        if payload.bio is not None:
+            record["bio"] = payload.bio
+        save_users(users)
     return _user_public_from_record(record)
 
 
+@timed("user._update_avatar_file")
 def _update_avatar_file(user_id: str, avatar_url: str) -> UserPublic:
-    users, record = _get_file_record(user_id)
-    record["avatar_url"] = avatar_url
-    save_users(users)
+    with file_lock(user_file_path()):
+        users, record = _get_file_record(user_id)
+        record["avatar_url"] = avatar_url
+        save_users(users)
     return _user_public_from_record(record)
 
 
+@timed("user._replace_avatar_file")
+def _replace_avatar_file(user_id: str, current_url: str, avatar_url: str) -> bool:
+    with file_lock(user_file_path()):
+        users, record = _get_file_record(user_id)
+        if record.get("avatar_url") != current_url:
+            return False
+        record["avatar_url"] = avatar_url
+        save_users(users)
+    return True
+
+
+@timed("user._list_users_file")
 def _list_users_file() -> List[UserPublic]:
     users = sorted(load_users(), key=lambda entry: entry["created_at"], reverse=True)
-    return [_user_public_from_record(record) for record in users]
+    groups_by_user = group_crud.list_groups_by_user()
+    return [_user_public_from_record(record, groups_by_user.get(record["id"], [])) for record in users]
 
 
 def _get_file_record(user_id: str) -> Tuple[list[UserRecord], UserRecord]:
@@ -327,14 +515,15 @@ def _get_file_record(user_id: str) -> Tuple[list[UserRecord], UserRecord]:
     raise UserNotFoundError
 
 
-def _user_public_from_record(record: UserRecord) -> UserPublic:
+def _user_public_from_record(record: UserRecord, groups: Optional[list[GroupPublic]] = None) -> UserPublic:
     created_at_value = record["created_at"]
     if isinstance(created_at_value, str):
         normalized = created_at_value.replace("Z", "+00:00") if created_at_value.endswith("Z") else created_at_value
         created_at_dt = datetime.fromisoformat(normalized)
     else:
         created_at_dt = created_at_value
-    groups = group_crud.list_user_groups(record["id"])
+    if groups is None:
+        groups = group_crud.list_user_groups(record["id"])
     return UserPublic(
         id=record["id"],
         name=record["name"],
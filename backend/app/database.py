@@ -1,31 +1,322 @@
 from __future__ import annotations
 
-from typing import Optional
-
-from mysql.connector import pooling
-from mysql.connector.connection import MySQLConnection
+import logging
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, NoReturn, Optional
 
 from .config import get_settings
+from .crud.exceptions import DuplicateKeyError, StorageError
+from .metrics import DB_POOL_WAIT, current_request_stats, record_query
+
+if TYPE_CHECKING:
+    from mysql.connector.pooling import MySQLConnectionPool
+
+logger = logging.getLogger("signup_app.database")
+
+_pool_lock = threading.Lock()
+_connection_pool: Optional[MySQLConnectionPool] = None
+_pool_pid: Optional[int] = None
+_usage_lock = threading.Lock()
+_checked_out = 0
+
+MAX_LOGGED_STATEMENT_CHARS = 500
+
+
+class QueryBudgetExceededError(RuntimeError):
+    """A request ran more SQL statements than ``QUERY_BUDGET`` allows (strict mode only)."""
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times each statement, logs slow ones and counts it against the current request."""
+
+    def __init__(self, cursor: Any, slow_query_seconds: float = 0.0) -> None:
+        self._cursor = cursor
+        self._slow_query_seconds = slow_query_seconds
+
+    def execute(self, operation: Any, params: Any = None, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(operation, params, *args, **kwargs)
+        except Exception as exc:
+            self._observe(operation, param_shape(params), time.perf_counter() - started, failed=True)
+            _reraise(exc)
+        self._observe(operation, param_shape(params), time.perf_counter() - started)
+        return result
+
+    def executemany(self, operation: Any, seq_params: Any, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        rows = seq_params if isinstance(seq_params, (list, tuple)) else ()
+        shape = f"{len(rows)} x {param_shape(rows[0])}" if rows else "rows"
+        try:
+            result = self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        except Exception as exc:
+            self._observe(operation, shape, time.perf_counter() - started, failed=True)
+            _reraise(exc)
+        self._observe(operation, shape, time.perf_counter() - started)
+        return result
+
+    def _observe(self, operation: Any, shape: str, seconds: float, failed: bool = False) -> None:
+        """Record the statement; in strict mode, fail a successful one that is over the budget.
+
+        A failed statement is still counted, but its own error is what the caller sees.
+        """
+        record_query(seconds, operation)
+        if self._slow_query_seconds > 0 and seconds >= self._slow_query_seconds:
+            logger.warning(
+                "Slow query (%.1f ms, params %s): %s", seconds * 1000, shape, _statement_text(operation)
+            )
+        stats = current_request_stats()
+        if stats is None or not stats.query_budget or stats.queries <= stats.query_budget:
+            return
+        if stats.strict_budget and not failed:
+            raise QueryBudgetExceededError(
+                f"{stats.queries} queries exceed the budget of {stats.query_budget}: {_statement_text(operation)}"
+            )
+        if stats.queries == stats.query_budget + 1:
+            logger.warning(
+                "Request exceeded its query budget of %s at: %s", stats.query_budget, _statement_text(operation)
+            )
+
+    # Reads can fail too (a connection lost mid-result): they surface as StorageError like statements.
+    def fetchone(self) -> Any:
+        return _guarded(self._cursor.fetchone)
+
+    def fetchall(self) -> Any:
+        return _guarded(self._cursor.fetchall)
+
+    def fetchmany(self, *args: Any, **kwargs: Any) -> Any:
+        return _guarded(self._cursor.fetchmany, *args, **kwargs)
+
+    def __iter__(self) -> Any:
+        rows = _guarded(iter, self._cursor)
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            except Exception as exc:
+                _reraise(exc)
+            yield row
+
+    def __enter__(self) -> InstrumentedCursor:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._cursor.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Driver connection whose cursors report to :mod:`app.metrics`; everything else is passed through."""
+
+    def __init__(
+        self,
+        connection: Any,
+        slow_query_seconds: float = 0.0,
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._connection = connection
+        self._slow_query_seconds = slow_query_seconds
+        self._on_close = on_close
+
+    def cursor(self, *args: Any, **kwargs: Any) -> InstrumentedCursor:
+        cursor = _guarded(self._connection.cursor, *args, **kwargs)
+        return InstrumentedCursor(cursor, self._slow_query_seconds)
+
+    def commit(self) -> None:
+        _guarded(self._connection.commit)
+
+    def rollback(self) -> None:
+        _guarded(self._connection.rollback)
+
+    def close(self) -> None:
+        """Return the connection to the pool (or close a dedicated one); safe to call twice."""
+        on_close, self._on_close = self._on_close, None
+        try:
+            self._connection.close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+    def discard(self) -> None:
+        """Drop the server session, then return the connection; the pool reconnects it on next checkout.
+
+        For abandoning an unbuffered result part-way: ``close()`` alone fails on the unread rows.
+        """
+        try:
+            self._connection.disconnect()
+        finally:
+            try:
+                self.close()
+            except Exception:  # noqa: BLE001 - the pool resets a dropped session by reconnecting
+                logger.debug("Discarded connection could not reset its session", exc_info=True)
 
-_settings = get_settings()
-_connection_pool: Optional[pooling.MySQLConnectionPool] = None
+    def __enter__(self) -> InstrumentedConnection:
+        return self
 
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
-def get_connection_pool() -> pooling.MySQLConnectionPool:
-    global _connection_pool
-    if _connection_pool is None:
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+
+def init_pool() -> MySQLConnectionPool:
+    """Build this process's pool now; all ``DB_POOL_SIZE`` connections are opened up front.
+
+    Called from the app lifespan so each worker opens its own sockets before it
+    serves traffic. A pool inherited across a fork is dropped, never reused.
+    """
+    global _connection_pool, _pool_pid, _checked_out
+    # Imported here so file-storage workers never load the MySQL driver.
+    from mysql.connector import pooling
+
+    settings = get_settings()
+    with _pool_lock:
+        if _connection_pool is not None and _pool_pid == os.getpid():
+            return _connection_pool
         _connection_pool = pooling.MySQLConnectionPool(
             pool_name="signup_pool",
-            pool_size=_settings.db_pool_size,
+            pool_size=settings.db_pool_size,
             autocommit=False,
-            host=_settings.db_host,
-            port=_settings.db_port,
-            user=_settings.db_user,
-            password=_settings.db_password,
-            database=_settings.db_name,
+            host=settings.db_host,
+            port=settings.db_port,
+            user=settings.db_user,
+            password=settings.db_password,
+            database=settings.db_name,
         )
-    return _connection_pool
+        _pool_pid = os.getpid()
+        with _usage_lock:
+            _checked_out = 0
+        return _connection_pool
+
+
+def get_connection_pool() -> MySQLConnectionPool:
+    pool = _connection_pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+    # Scripts and tests that skip the lifespan get a pool on first use.
+    return init_pool()
+
+
+def close_pool() -> None:
+    """Close this process's idle pooled connections (lifespan shutdown)."""
+    global _connection_pool, _pool_pid
+    with _pool_lock:
+        if _connection_pool is not None and _pool_pid == os.getpid():
+            _connection_pool._remove_connections()
+        _connection_pool = None
+        _pool_pid = None
+
+
+def warm_pool() -> int:
+    """Check out every pooled connection once and ping it; returns how many answered."""
+    connections = []
+    try:
+        for _ in range(get_settings().db_pool_size):
+            try:
+                connections.append(get_connection())
+            except StorageError:
+                break  # pool exhausted: the remaining connections are already serving requests
+        for connection in connections:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def get_connection() -> InstrumentedConnection:
+    global _checked_out
+    try:
+        pool = get_connection_pool()
+        started = time.perf_counter()
+        connection = pool.get_connection()
+    except Exception as exc:
+        _reraise(exc)
+    DB_POOL_WAIT.observe(time.perf_counter() - started)
+    with _usage_lock:
+        _checked_out += 1
+    return InstrumentedConnection(connection, get_settings().slow_query_ms / 1000, on_close=_release)
+
+
+def open_dedicated_connection() -> InstrumentedConnection:
+    """A connection outside the pool, for long streams that must not starve request traffic."""
+    from mysql.connector import connect
+
+    settings = get_settings()
+    try:
+        connection = connect(
+            autocommit=False,
+            host=settings.db_host,
+            port=settings.db_port,
+            user=settings.db_user,
+            password=settings.db_password,
+            database=settings.db_name,
+        )
+    except Exception as exc:
+        _reraise(exc)
+    return InstrumentedConnection(connection, settings.slow_query_ms / 1000)
+
+
+def pool_usage() -> tuple[int, int]:
+    """``(checked_out, pool_size)`` for this worker's pool."""
+    with _usage_lock:
+        return _checked_out, get_settings().db_pool_size
+
+
+def _release() -> None:
+    global _checked_out
+    with _usage_lock:
+        _checked_out -= 1
+
+
+def _guarded(method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    try:
+        return method(*args, **kwargs)
+    except Exception as exc:
+        _reraise(exc)
+
+
+def _reraise(exc: Exception) -> NoReturn:
+    """Re-raise a MySQL driver error as a :class:`StorageError`; anything else unchanged."""
+    driver = sys.modules.get("mysql.connector")
+    if driver is None or not isinstance(exc, driver.Error):
+        raise exc
+    if exc.errno == driver.errorcode.ER_DUP_ENTRY:
+        raise DuplicateKeyError(str(exc)) from exc
+    raise StorageError(str(exc)) from exc
+
+
+def param_shape(params: Any) -> str:
+    """Describe bind parameters by type and size only, so values never reach the logs."""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {_value_shape(value)}" for key, value in params.items()) + "}"
+    if not isinstance(params, (list, tuple)):
+        return _value_shape(params)
+    shapes = [_value_shape(value) for value in params]
+    if len(shapes) > 5 and len(set(shapes)) == 1:
+        return f"({len(shapes)} x {shapes[0]})"
+    return "(" + ", ".join(shapes) + ")"
+
+
+def _value_shape(value: Any) -> str:
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
 
 
-def get_connection() -> MySQLConnection:
-    return get_connection_pool().get_connection()
+def _statement_text(operation: Any) -> str:
+    if isinstance(operation, bytes):
+        operation = operation.decode("utf-8", "replace")
+    return " ".join(str(operation).split())[:MAX_LOGGED_STATEMENT_CHARS]
@@ -1,8 +1,45 @@
 from __future__ import annotations
 
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
 from .config import Settings, get_settings
+from .utils.authentication import InvalidSessionTokenError, SessionClaims, decode_session_token
 
 
 def get_settings_dependency() -> Settings:
     """Return cached Settings instance for dependency injection."""
     return get_settings()
+
+
+def get_session_claims(authorization: Optional[str] = Header(default=None)) -> SessionClaims:
+    """Validate the ``Authorization: Bearer`` session token without touching storage."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=401, detail="Missing session token", headers={"WWW-Authenticate": "Bearer"}
+        )
+    try:
+        return decode_session_token(token.strip())
+    except InvalidSessionTokenError as err:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired session token",
+            headers={"WWW-Authenticate": "Bearer"},
+        ) from err
+
+
+def require_metrics_token(authorization: Optional[str] = Header(default=None)) -> None:
+    """Guard the metrics endpoints with ``Authorization: Bearer <METRICS_TOKEN>``."""
+    settings = get_settings()
+    if not settings.metrics_token:
+        if settings.environment == "prod":
+            raise HTTPException(status_code=404, detail="Not Found")
+        return
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), settings.metrics_token.encode()):
+        raise HTTPException(
+            status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"}
+        )
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, Literal, Optional
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+from .crud.export import EXPORT_COLUMNS, ExportRow
+
+ExportFormat = Literal["csv", "ndjson"]
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+# Rows are encoded into chunks of about this size: large enough to keep per-chunk
+# overhead (a thread hop, a socket write) negligible, small enough to keep memory flat.
+CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def encode_rows(rows: Iterable[ExportRow], export_format: ExportFormat) -> Iterator[bytes]:
+    """CSV (with a header row) or one JSON object per line, in chunks of about ``CHUNK_BYTES``."""
+    if export_format == "ndjson":
+        return _chunked(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+    return _csv_chunks(rows)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a byte stream as it is produced; the output is a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(
+    rows: Iterator[ExportRow], export_format: ExportFormat, filename: str, accept_encoding: Optional[str]
+) -> StreamingResponse:
+    """Stream ``rows`` as an attachment, gzipped on the fly when the client accepts it."""
+    body = encode_rows(rows, export_format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{export_format}"',
+        "Vary": "Accept-Encoding",
+        "X-Accel-Buffering": "no",
+    }
+    if "gzip" in (accept_encoding or "").lower():
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers)
+
+
+def _csv_chunks(rows: Iterable[ExportRow]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _chunked(lines: Iterable[bytes]) -> Iterator[bytes]:
+    pending: list[bytes] = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield b"".join(pending)
+            pending.clear()
+            size = 0
+    if pending:
+        yield b"".join(pending)
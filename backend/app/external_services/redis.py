@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import logging
+import queue
+import socket
+import threading
+from typing import Any, Callable, Optional, Union
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger("signup_app.redis")
+
+Arg = Union[str, bytes, int, float]
+
+
+class RedisError(Exception):
+    """Raised when the Redis server cannot be reached or rejects a command."""
+
+
+class RedisReplyError(RedisError):
+    """Raised for error replies; the connection itself is still usable."""
+
+
+def _encode_command(args: tuple[Arg, ...]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def _read_reply(stream) -> Any:
+    line = stream.readline()
+    if not line:
+        raise RedisError("Connection closed by Redis server")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode("utf-8")
+    if prefix == b"-":
+        raise RedisReplyError(payload.decode("utf-8"))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        return stream.read(length + 2)[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [_read_reply(stream) for _ in range(length)]
+    raise RedisError(f"Unexpected reply prefix {prefix!r}")
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: Optional[float]) -> None:
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    def send(self, *args: Arg) -> None:
+        self.sock.sendall(_encode_command(args))
+
+    def execute(self, *args: Arg) -> Any:
+        self.send(*args)
+        return _read_reply(self.stream)
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisClient:
+    """Minimal thread-safe RESP client with a small connection pool.
+
+    Only the handful of commands used by the cache and limiter tiers are wrapped;
+    anything else can go through :meth:`execute`.
+    """
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 1.0) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme not in {"redis", ""}:
+            raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme}")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        path = parsed.path.lstrip("/")
+        self.db = int(path) if path else 0
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[_Connection] = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self, timeout: Optional[float]) -> _Connection:
+        try:
+            connection = _Connection(self.host, self.port, timeout)
+            if self.password:
+                connection.execute("AUTH", self.password)
+            if self.db:
+                connection.execute("SELECT", self.db)
+        except OSError as exc:
+            raise RedisError(f"Unable to connect to Redis at {self.host}:{self.port}") from exc
+        return connection
+
+    def execute(self, *args: Arg) -> Any:
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect(self.timeout)
+        try:
+            reply = connection.execute(*args)
+        except RedisReplyError:
+            self._release(connection)
+            raise
+        except (RedisError, OSError) as exc:
+            connection.close()
+            raise RedisError(f"Redis command {args[0]!r} failed") from exc
+        self._release(connection)
+        return reply
+
+    def _release(self, connection: _Connection) -> None:
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def ping(self) -> bool:
+        return self.execute("PING") == "PONG"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: Arg, ttl_seconds: Optional[int] = None) -> None:
+        if ttl_seconds:
+            self.execute("SET", key, value, "EX", ttl_seconds)
+        else:
+            self.execute("SET", key, value)
+
+    def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return self.execute("DEL", *keys)
+
+    def incr(self, key: str) -> int:
+        return self.execute("INCR", key)
+
+    def publish(self, channel: str, message: Arg) -> int:
+        return self.execute("PUBLISH", channel, message)
+
+    def subscribe(self, channel: str, handler: Callable[[bytes], None]) -> "RedisSubscription":
+        subscription = RedisSubscription(self, channel, handler)
+        subscription.start()
+        return subscription
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class RedisSubscription:
+    """Background listener that feeds channel messages to a handler and reconnects on failure."""
+
+    def __init__(
+        self,
+        client: RedisClient,
+        channel: str,
+        handler: Callable[[bytes], None],
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.channel = channel
+        self.handler = handler
+        self.reconnect_delay = reconnect_delay
+        self.ready = threading.Event()
+        self._stopped = threading.Event()
+        self._connection: Optional[_Connection] = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"redis-subscribe-{channel}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._connection is not None:
+            try:
+                self._connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._connection.close()
+        self._thread.join(timeout=2)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._connection = self.client._connect(timeout=None)
+                self._connection.send("SUBSCRIBE", self.channel)
+                self._listen(self._connection)
+            except (RedisError, OSError, ValueError) as exc:
+                if self._stopped.is_set():
+                    break
+                logger.warning("Redis subscription to %s dropped: %s", self.channel, exc)
+            finally:
+                self.ready.clear()
+                if self._connection is not None:
+                    self._connection.close()
+            self._stopped.wait(self.reconnect_delay)
+
+    def _listen(self, connection: _Connection) -> None:
+        while not self._stopped.is_set():
+            reply = _read_reply(connection.stream)
+            if not isinstance(reply, list) or len(reply) < 3:
+                continue
+            kind = reply[0]
+            if kind == b"subscribe":
+                self.ready.set()
+            elif kind == b"message":
+                try:
+                    self.handler(reply[2])
+                except Exception:  # pragma: no cover - handler bugs must not kill the listener
+                    logger.exception("Redis subscription handler failed for %s", self.channel)
@@ -1,15 +1,28 @@
 from __future__ import annotations
 
 import logging
-
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from .config import get_settings
+from .database import close_pool, init_pool
+from .dependencies import require_metrics_token
+from .metrics import CONTENT_TYPE, LimiterCollector, RequestMetricsMiddleware, render_latest
+from .middleware.body_limit import BodySizeLimitMiddleware
+from .middleware.profiling import ProfilingMiddleware
+from .middleware.rate_limit import STREAMING_SUFFIXES, RateLimitMiddleware, build_rate_limiter
+from .outbox import build_outbox_worker
+from .readiness import check_readiness
+from .recurring import build_recurring_scheduler
 from .routers import api_router
+from .utils.files import ImmutableStaticFiles
+from .warmup import start_warmup
 
 settings = get_settings()
 
@@ -22,8 +35,48 @@ logger = logging.getLogger("signup_app")
 storage_mode = "file" if settings.use_file_storage else "mysql"
 logger.info("Starting FastAPI app using %s storage backend", storage_mode)
 
-app = FastAPI(title=settings.project_name, version=settings.version)
+outbox_worker = build_outbox_worker(settings) if settings.outbox_worker_enabled else None
+recurring_scheduler = build_recurring_scheduler(settings) if settings.recurring_scheduler_enabled else None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    if not settings.use_file_storage:
+        # Per worker process, after any fork: connections are opened here, never inherited.
+        try:
+            await run_in_threadpool(init_pool)
+        except Exception:  # noqa: BLE001 - keep serving; /ready fails and the pool is retried on use
+            logger.exception("Could not open the database pool at startup")
+    if settings.warmup_enabled:
+        start_warmup(settings)
+    if outbox_worker is not None:
+        outbox_worker.start()
+    if recurring_scheduler is not None:
+        recurring_scheduler.start()
+    try:
+        yield
+    finally:
+        if recurring_scheduler is not None:
+            recurring_scheduler.stop()
+        if outbox_worker is not None:
+            outbox_worker.stop()
+        if not settings.use_file_storage:
+            close_pool()
+
+
+app = FastAPI(title=settings.project_name, version=settings.version, lifespan=lifespan)
 
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.avatar_max_bytes)
+
+rate_limiter = build_rate_limiter(settings) if settings.rate_limit_enabled else None
+if rate_limiter is not None:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        trust_forwarded=settings.rate_limit_trust_forwarded,
+    )
+
+# Added last so it wraps everything and 429/503 responses still carry CORS headers.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_allow_origins,
@@ -32,11 +85,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Not registered at all unless enabled, so unprofiled deployments pay nothing for it.
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=settings.profile_dir,
+        secret=settings.profile_secret,
+        sample_rate=settings.profile_sample_rate,
+        max_profiles=settings.profile_max_files,
+        max_age_seconds=settings.profile_max_age_hours * 3600,
+    )
+
+# Outermost: latency includes the limiter and CORS. SSE streams would only skew the histograms.
+app.add_middleware(
+    RequestMetricsMiddleware,
+    skip_suffixes=STREAMING_SUFFIXES,
+    query_budget=settings.query_budget,
+    strict_budget=settings.query_budget_strict,
+)
+
 app.include_router(api_router)
 Path(settings.media_root).mkdir(parents=True, exist_ok=True)
-app.mount("/media", StaticFiles(directory=settings.media_root), name="media")
+app.mount("/media", ImmutableStaticFiles(directory=settings.media_root), name="media")
 
 
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """Load-balancer readiness: fails while the pool is saturated or storage is unusable."""
+    report = check_readiness(settings)
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+
+@app.get("/metrics/limiter", dependencies=[Depends(require_metrics_token)])
+def limiter_metrics() -> dict[str, dict[str, int]]:
+    return rate_limiter.snapshot() if rate_limiter is not None else {}
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+def metrics() -> Response:
+    collectors = (LimiterCollector(rate_limiter.snapshot),) if rate_limiter is not None else ()
+    return Response(render_latest(collectors), media_type=CONTENT_TYPE)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ["method", "route", "status"],
+)
+CRUD_LATENCY = Histogram(
+    "crud_operation_duration_seconds",
+    "Time spent in crud and file-storage functions.",
+    ["operation"],
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while serving one request.",
+    ["route"],
+    buckets=QUERY_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Latency of individual SQL statements.")
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a connection from the MySQL pool."
+)
+FILE_BYTES = Counter(
+    "file_storage_bytes_total",
+    "Bytes read from and written to the JSON storage files.",
+    ["direction", "file"],
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+class RequestStats:
+    """Mutable per-request tallies; shared by reference with threadpool workers.
+
+    ``trace`` is only set while a request is being profiled (see
+    :mod:`app.middleware.profiling`); it also receives each statement and file read.
+    """
+
+    __slots__ = ("queries", "query_budget", "strict_budget", "trace")
+
+    def __init__(self, query_budget: int = 0, strict_budget: bool = False) -> None:
+        self.queries = 0
+        self.query_budget = query_budget
+        self.strict_budget = strict_budget
+        self.trace: Any = None
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def request_stats(query_budget: int = 0, strict_budget: bool = False) -> Iterator[RequestStats]:
+    """Bind fresh tallies for the duration of a request (or a test)."""
+    stats = RequestStats(query_budget, strict_budget)
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+def record_query(seconds: float, statement: Any = None) -> None:
+    DB_QUERY_LATENCY.observe(seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        if stats.trace is not None:
+            stats.trace.add_statement(statement, seconds)
+
+
+def record_file_io(direction: str, name: str, size: int) -> None:
+    FILE_BYTES.labels(direction, name).inc(size)
+    stats = _request_stats.get()
+    if stats is not None and stats.trace is not None:
+        stats.trace.add_file_io(direction, name, size)
+
+
+def timed(operation: str) -> Callable[[F], F]:
+    """Time calls into ``CRUD_LATENCY`` as ``operation``, e.g. ``@timed("group.get_group")``.
+
+    Crud modules decorate their public functions and ``*_db`` / ``*_file`` helpers.
+    Per-row converters are left alone; timing them would cost more than they do.
+    A generator function is timed from its first step until it is exhausted or closed.
+    """
+    histogram = CRUD_LATENCY.labels(operation)
+
+    def decorator(func: F) -> F:
+        if inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+
+            return generator_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                stats = _request_stats.get()
+                if stats is not None and stats.trace is not None:
+                    return stats.trace.run(func, args, kwargs)
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """Latency per route template and status, plus SQL statements per request."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        skip_suffixes: tuple[str, ...] = (),
+        query_budget: int = 0,
+        strict_budget: bool = False,
+    ) -> None:
+        self.app = app
+        self.skip_suffixes = skip_suffixes
+        self.query_budget = query_budget
+        self.strict_budget = strict_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (self.skip_suffixes and scope["path"].endswith(self.skip_suffixes)):
+            await self.app(scope, receive, send)
+            return
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        with request_stats(self.query_budget, self.strict_budget) as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_label(scope)
+                REQUEST_LATENCY.labels(scope["method"], route, status).observe(time.perf_counter() - started)
+                DB_QUERIES_PER_REQUEST.labels(route).observe(stats.queries)
+
+
+def route_label(scope: Scope) -> str:
+    # FastAPI records the matched route on the scope; templates keep label cardinality bounded.
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if path_format:
+        return path_format
+    if scope["path"].startswith("/media/"):
+        return "/media"
+    return "unmatched"
+
+
+class LimiterCollector:
+    """Exposes the rate limiter's counters and in-flight gauges at scrape time."""
+
+    def __init__(self, snapshot: Callable[[], dict[str, dict[str, int]]]) -> None:
+        self.snapshot = snapshot
+
+    def collect(self) -> Iterator[Any]:
+        decisions = CounterMetricFamily(
+            "rate_limit_decisions", "Requests admitted, rate limited or shed per route class.",
+            labels=["route_class", "outcome"],
+        )
+        in_flight = GaugeMetricFamily(
+            "rate_limit_in_flight", "Requests currently in flight per route class.", labels=["route_class"]
+        )
+        for route_class, values in self.snapshot().items():
+            for outcome in ("allowed", "rate_limited", "shed"):
+                decisions.add_metric([route_class, outcome], values.get(outcome, 0))
+            in_flight.add_metric([route_class], values.get("in_flight", 0))
+        yield decisions
+        yield in_flight
+
+
+def render_latest(extra_collectors: tuple[Any, ...] = ()) -> bytes:
+    """Prometheus text exposition; aggregates all workers when ``PROMETHEUS_MULTIPROC_DIR`` is set."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    output = generate_latest(registry)
+    if extra_collectors:
+        extra = CollectorRegistry()
+        for collector in extra_collectors:
+            extra.register(collector)
+        output += generate_latest(extra)
+    return output
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Multipart framing (boundaries, part headers) on top of the file bytes.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class BodySizeLimitMiddleware:
+    """Stop reading an upload as soon as its body exceeds ``max_bytes``.
+
+    A declared ``Content-Length`` over the limit is rejected before any byte is
+    read; otherwise the stream is counted as it arrives, so an oversized body is
+    never spooled to disk in full.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, path_suffixes: tuple[str, ...] = ("/avatar",)) -> None:
+        self.app = app
+        self.max_bytes = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.path_suffixes = path_suffixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in {"POST", "PUT"}
+            or not scope["path"].endswith(self.path_suffixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await _too_large()(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing unchanged.
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _too_large() -> JSONResponse:
+    return JSONResponse({"detail": "Upload too large"}, status_code=413)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..metrics import RequestStats, current_request_stats, route_label
+
+logger = logging.getLogger("signup_app.profiling")
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+MAX_STATEMENT_CHARS = 500
+TOP_FUNCTIONS = 25
+# From 3.12 cProfile sits on sys.monitoring: one profiler sees every thread, and a second
+# one enabled at the same time raises ValueError.
+PROFILER_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class ProfileTrace:
+    """Everything recorded for one profiled request.
+
+    :class:`ProfilingMiddleware` profiles the whole request. Before 3.12 that
+    profiler only sees the event loop thread, so the outermost crud call on each
+    threadpool thread (via :func:`app.metrics.timed`) gets a profiler of its own.
+    """
+
+    def __init__(self) -> None:
+        self.profiles: list[cProfile.Profile] = []
+        self.statements: list[dict[str, Any]] = []
+        self.file_io: list[dict[str, Any]] = []
+        self._threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def run(self, func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        if PROFILER_SEES_ALL_THREADS:
+            return func(*args, **kwargs)
+        ident = threading.get_ident()
+        with self._lock:
+            nested = ident in self._threads
+            self._threads.add(ident)
+        if nested:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            enabled = _enable(profiler)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if enabled:
+                    profiler.disable()
+                    self.add_profile(profiler)
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def add_profile(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self.profiles.append(profiler)
+
+    def add_statement(self, statement: Any, seconds: float) -> None:
+        if isinstance(statement, bytes):
+            statement = statement.decode("utf-8", "replace")
+        text = " ".join(str(statement).split())[:MAX_STATEMENT_CHARS]
+        with self._lock:
+            self.statements.append({"statement": text, "ms": round(seconds * 1000, 3)})
+
+    def add_file_io(self, direction: str, name: str, size: int) -> None:
+        with self._lock:
+            self.file_io.append({"direction": direction, "file": name, "bytes": size})
+
+    def summary(self) -> dict[str, Any]:
+        stats = self.merged_stats()
+        top: list[dict[str, Any]] = []
+        if stats is not None:
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)  # type: ignore[attr-defined]
+            for (filename, line, function), (_, calls, own, cumulative, _) in rows[:TOP_FUNCTIONS]:
+                top.append(
+                    {
+                        "function": f"{filename}:{line}({function})",
+                        "calls": calls,
+                        "own_ms": round(own * 1000, 3),
+                        "cumulative_ms": round(cumulative * 1000, 3),
+                    }
+                )
+        return {
+            "sql": {
+                "count": len(self.statements),
+                "total_ms": round(sum(item["ms"] for item in self.statements), 3),
+                "statements": self.statements,
+            },
+            "file_storage": self.file_io,
+            "top_functions": top,
+        }
+
+    def merged_stats(self) -> Optional[pstats.Stats]:
+        if not self.profiles:
+            return None
+        stats = pstats.Stats(self.profiles[0])
+        for profiler in self.profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+
+class ProfilingMiddleware:
+    """Profile selected requests and write ``<id>.prof`` plus ``<id>.json`` to ``directory``.
+
+    A request is selected when it carries ``X-Profile-Token`` matching ``secret``,
+    or by sampling at ``sample_rate``. Only register this middleware when profiling
+    is enabled; it sits inside :class:`app.metrics.RequestMetricsMiddleware` and
+    hangs its trace on that request's stats. Profiled requests run one at a time
+    per process; the profile also records whatever else the event loop ran
+    meanwhile. After each write the oldest profiles beyond ``max_profiles``, and
+    any older than ``max_age_seconds``, are deleted.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        directory: str,
+        secret: str = "",
+        sample_rate: float = 0.0,
+        max_profiles: int = 0,
+        max_age_seconds: float = 0.0,
+    ) -> None:
+        self.app = app
+        self.directory = Path(directory)
+        self.secret = secret.encode()
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self.max_age_seconds = max_age_seconds
+        self._serial = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stats = current_request_stats() if scope["type"] == "http" else None
+        if stats is None or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+        async with self._serial:
+            await self._profile(scope, receive, send, stats)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send, stats: RequestStats) -> None:
+        profiler = cProfile.Profile()
+        if not _enable(profiler):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+        trace = stats.trace = ProfileTrace()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile_id
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            trace.add_profile(profiler)
+            stats.trace = None
+            request = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_label(scope),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            await run_in_threadpool(self._write, profile_id, request, trace)
+
+    def _selected(self, scope: Scope) -> bool:
+        if self.secret:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.secret)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _write(self, profile_id: str, request: dict[str, Any], trace: ProfileTrace) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stats = trace.merged_stats()
+            if stats is not None:
+                stats.dump_stats(str(self.directory / f"{profile_id}.prof"))
+            summary = {**request, **trace.summary()}
+            (self.directory / f"{profile_id}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        except OSError:
+            logger.exception("Unable to write profile %s", profile_id)
+        else:
+            logger.info("Wrote profile %s for %s %s", profile_id, request["method"], request["path"])
+        self._prune()
+
+    def _prune(self) -> None:
+        """Apply retention; ids start with their timestamp, so they sort oldest first."""
+        if not self.max_profiles and not self.max_age_seconds:
+            return
+        try:
+            kept = sorted(self.directory.glob("*.json"))
+            expired = []
+            if self.max_age_seconds:
+                cutoff = time.time() - self.max_age_seconds
+                expired = [path for path in kept if path.stat().st_mtime < cutoff]
+                kept = [path for path in kept if path not in expired]
+            if self.max_profiles and len(kept) > self.max_profiles:
+                expired += kept[: len(kept) - self.max_profiles]
+            for path in expired:
+                path.with_suffix(".prof").unlink(missing_ok=True)
+                path.unlink(missing_ok=True)
+        except OSError:
+            logger.exception("Unable to prune profiles in %s", self.directory)
+
+
+def _enable(profiler: cProfile.Profile) -> bool:
+    """Start ``profiler``; False when another profiling tool (a debugger, coverage) is active."""
+    try:
+        profiler.enable()
+    except ValueError:
+        logger.warning("Another profiler is active; continuing without a profile")
+        return False
+    return True
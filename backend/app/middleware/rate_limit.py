@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..config import Settings
+from ..external_services.redis import RedisClient, RedisError
+
+logger = logging.getLogger("signup_app.rate_limit")
+
+EXEMPT_PREFIXES = ("/health", "/ready", "/metrics", "/media", "/docs", "/redoc", "/openapi.json")
+AUTH_PATHS = {"/login", "/signup"}
+# Long-lived streams idle on the event loop, not the DB pool: rate limited, never shed.
+STREAMING_SUFFIXES = ("/events",)
+# Exports open their own connection outside the pool, so only these classes share the pool cap.
+DB_POOL_CLASSES = frozenset({"auth", "list", "upload", "read", "write"})
+DB_POOL_KEY = "db_pool"
+
+
+def classify_route(method: str, path: str) -> str:
+    """Bucket a request into the route class its limits are configured for."""
+    if path in AUTH_PATHS:
+        return "auth"
+    if path.endswith("/avatar") or "/avatar/" in path:
+        return "upload"
+    if method == "GET" and path == "/users":
+        return "list"
+    if path.endswith("/export") or path.startswith("/exports/"):
+        return "export"
+    if method in {"GET", "HEAD"}:
+        return "read"
+    return "write"
+
+
+class MemoryRateStore:
+    """Per-process token buckets keyed by (route class, client)."""
+
+    shared = False
+
+    def __init__(self, limits: dict[str, tuple[float, int]], max_buckets: int = 100_000) -> None:
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self._buckets: dict[tuple[str, str], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, route_class: str, client_id: str) -> float:
+        """Consume one token; return 0 when allowed, else seconds until one frees up."""
+        rate, burst = self.limits[route_class]
+        key = (route_class, client_id)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._prune(now)
+                bucket = [float(burst), now]
+                self._buckets[key] = bucket
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+        return (1 - tokens) / rate if rate > 0 else 60.0
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled completely carry no state worth keeping.
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            rate, burst = self.limits[key[0]]
+            if tokens + (now - updated_at) * rate >= burst:
+                del self._buckets[key]
+
+
+class RedisRateStore:
+    """Fixed-window counters shared by every worker and task.
+
+    A window lasts ``burst / rate`` seconds and admits ``burst`` requests, which
+    keeps the long-run rate of the local token bucket. Redis failures fall back
+    to the per-process buckets rather than rejecting traffic.
+    """
+
+    shared = True
+
+    def __init__(self, client: RedisClient, limits: dict[str, tuple[float, int]]) -> None:
+        self.client = client
+        self.limits = limits
+        self.fallback = MemoryRateStore(limits)
+
+    def take(self, route_class: str, client_id: str) -> float:
+        rate, burst = self.limits[route_class]
+        window = max(1, math.ceil(burst / rate)) if rate > 0 else 60
+        now = time.time()
+        key = f"es:rl:{route_class}:{client_id}:{int(now // window)}"
+        try:
+            count = self.client.incr(key)
+            if count == 1:
+                self.client.execute("EXPIRE", key, window + 1)
+        except RedisError as exc:
+            logger.warning("Shared rate limit store unavailable: %s", exc)
+            return self.fallback.take(route_class, client_id)
+        if count <= burst:
+            return 0.0
+        return window - (now % window)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        store: MemoryRateStore | RedisRateStore,
+        concurrency_limits: dict[str, int],
+        db_pool_limit: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self.concurrency_limits = concurrency_limits
+        # Caps requests of every DB_POOL_CLASSES class together, so a burst is shed before the
+        # pool is exhausted (mysql-connector raises at once rather than waiting for a connection).
+        self.db_pool_limit = db_pool_limit
+        self._in_flight: dict[str, int] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self) -> bool:
+        return self.store.shared
+
+    def check_rate(self, route_class: str, client_id: str) -> float:
+        if route_class not in self.store.limits:
+            return 0.0
+        retry_after = self.store.take(route_class, client_id)
+        if retry_after > 0:
+            self._count(route_class, "rate_limited")
+        return retry_after
+
+    def enter(self, route_class: str) -> bool:
+        limit = self.concurrency_limits.get(route_class)
+        uses_pool = self.db_pool_limit is not None and route_class in DB_POOL_CLASSES
+        with self._lock:
+            in_flight = self._in_flight.get(route_class, 0)
+            pool_in_flight = self._in_flight.get(DB_POOL_KEY, 0)
+            if limit is not None and in_flight >= limit:
+                self._bump(route_class, "shed")
+                return False
+            if uses_pool and pool_in_flight >= self.db_pool_limit:
+                self._bump(route_class, "shed")
+                self._bump(DB_POOL_KEY, "shed")
+                return False
+            self._in_flight[route_class] = in_flight + 1
+            if uses_pool:
+                self._in_flight[DB_POOL_KEY] = pool_in_flight + 1
+            self._bump(route_class, "allowed")
+            return True
+
+    def exit(self, route_class: str) -> None:
+        with self._lock:
+            self._in_flight[route_class] -= 1
+            if self.db_pool_limit is not None and route_class in DB_POOL_CLASSES:
+                self._in_flight[DB_POOL_KEY] -= 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        limits = dict(self.concurrency_limits)
+        if self.db_pool_limit is not None:
+            limits[DB_POOL_KEY] = self.db_pool_limit
+        with self._lock:
+            classes = set(self._counters) | set(self._in_flight)
+            return {
+                route_class: {
+                    "allowed": self._counters.get(route_class, {}).get("allowed", 0),
+                    "rate_limited": self._counters.get(route_class, {}).get("rate_limited", 0),
+                    "shed": self._counters.get(route_class, {}).get("shed", 0),
+                    "in_flight": self._in_flight.get(route_class, 0),
+                    "concurrency_limit": limits.get(route_class, 0),
+                }
+                for route_class in sorted(classes)
+            }
+
+    def _count(self, route_class: str, outcome: str) -> None:
+        with self._lock:
+            self._bump(route_class, outcome)
+
+    def _bump(self, route_class: str, outcome: str) -> None:
+        counters = self._counters.setdefault(route_class, {})
+        counters[outcome] = counters.get(outcome, 0) + 1
+
+
+def build_rate_limiter(settings: Settings) -> RateLimiter:
+    if settings.rate_limit_backend == "redis":
+        store: MemoryRateStore | RedisRateStore = RedisRateStore(
+            RedisClient(settings.rate_limit_url), settings.rate_limits
+        )
+    elif settings.rate_limit_backend == "memory":
+        store = MemoryRateStore(settings.rate_limits)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {settings.rate_limit_backend!r}")
+    # File storage has no pool; in MySQL mode each admitted DB-bound request can hold a connection.
+    db_pool_limit = None if settings.use_file_storage else settings.db_pool_size
+    return RateLimiter(store, settings.concurrency_limits, db_pool_limit)
+
+
+class RateLimitMiddleware:
+    """Reject over-limit clients with 429 and shed excess concurrency with 503.
+
+    Both checks run before the request reaches a route, so a burst is turned
+    away before it can check out every DB pool connection.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter, trust_forwarded: bool = False) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        route_class = classify_route(scope["method"], path)
+        client_id = self._client_id(scope)
+        if self.limiter.shared:
+            retry_after = await run_in_threadpool(self.limiter.check_rate, route_class, client_id)
+        else:
+            retry_after = self.limiter.check_rate(route_class, client_id)
+        if retry_after > 0:
+            await _reject(429, "Too many requests", retry_after)(scope, receive, send)
+            return
+        if path.endswith(STREAMING_SUFFIXES):
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.enter(route_class):
+            await _reject(503, "Server busy, retry shortly", 1)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.exit(route_class)
+
+    def _client_id(self, scope: Scope) -> str:
+        if self.trust_forwarded:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[-1].strip()
+        client: Optional[tuple[str, int]] = scope.get("client")
+        return client[0] if client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+from uuid import uuid4
+
+from .config import Settings, get_settings
+from .crud.file_storage import file_lock
+from .database import get_connection
+from .external_services.email import send_welcome_email
+from .external_services.notification import notify_admin
+
+logger = logging.getLogger("signup_app.outbox")
+
+WELCOME_EMAIL = "welcome_email"
+ADMIN_NOTIFICATION = "admin_notification"
+
+PENDING = "pending"
+DONE = "done"
+DEAD = "dead"
+
+# Rewrite the file journal once this many delivered events have piled up in it.
+COMPACT_AFTER = 1000
+MAX_BACKOFF_SECONDS = 600.0
+
+
+@dataclass
+class OutboxEvent:
+    id: str
+    kind: str
+    payload: dict[str, Any]
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    available_at: float = field(default_factory=time.time)
+    status: str = PENDING
+    last_error: Optional[str] = None
+
+
+def new_event(kind: str, payload: dict[str, Any]) -> OutboxEvent:
+    return OutboxEvent(id=str(uuid4()), kind=kind, payload=payload)
+
+
+def enqueue_db(cursor: Any, events: list[OutboxEvent]) -> None:
+    """Insert events with the caller's cursor so they commit or roll back with its transaction."""
+    if not events:
+        return
+    cursor.executemany(
+        "INSERT INTO outbox_events (id, kind, payload, status, attempts, available_at, created_at) "
+        "VALUES (%s, %s, %s, %s, 0, %s, %s)",
+        [
+            (
+                event.id,
+                event.kind,
+                json.dumps(event.payload),
+                PENDING,
+                datetime.utcfromtimestamp(event.available_at),
+                datetime.utcfromtimestamp(event.created_at),
+            )
+            for event in events
+        ],
+    )
+
+
+def enqueue_file(events: list[OutboxEvent]) -> None:
+    if events:
+        FileOutboxStore(get_settings().outbox_file_path).append(events)
+    wake_worker()
+
+
+class OutboxStore:
+    """Claims due events with a lease so concurrent workers never deliver the same batch."""
+
+    def claim(self, limit: int, lease_seconds: float) -> list[OutboxEvent]:
+        raise NotImplementedError
+
+    def complete(self, event_ids: list[str]) -> None:
+        raise NotImplementedError
+
+    def retry(self, event: OutboxEvent, error: str, delay_seconds: float, dead: bool) -> None:
+        raise NotImplementedError
+
+
+class DatabaseOutboxStore(OutboxStore):
+    def claim(self, limit: int, lease_seconds: float) -> list[OutboxEvent]:
+        connection = get_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # SKIP LOCKED lets several workers claim disjoint batches without blocking.
+            cursor.execute(
+                "SELECT id, kind, payload, attempts, created_at FROM outbox_events "
+                "WHERE status = %s AND available_at <= UTC_TIMESTAMP(3) "
+                "ORDER BY available_at LIMIT %s FOR UPDATE SKIP LOCKED",
+                (PENDING, limit),
+            )
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ", ".join(["%s"] * len(rows))
+                cursor.execute(
+                    "UPDATE outbox_events SET attempts = attempts + 1, "
+                    "available_at = UTC_TIMESTAMP(3) + INTERVAL %s SECOND "
+                    f"WHERE id IN ({placeholders})",
+                    (lease_seconds, *(row["id"] for row in rows)),
+                )
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        return [
+            OutboxEvent(
+                id=row["id"],
+                kind=row["kind"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1,
+                # DATETIME columns come back naive; they hold UTC, not local time.
+                created_at=row["created_at"].replace(tzinfo=timezone.utc).timestamp(),
+            )
+            for row in rows
+        ]
+
+    def complete(self, event_ids: list[str]) -> None:
+        if not event_ids:
+            return
+        connection = get_connection()
+        cursor = connection.cursor()
+        try:
+            placeholders = ", ".join(["%s"] * len(event_ids))
+            cursor.execute(
+                "UPDATE outbox_events SET status = %s, processed_at = UTC_TIMESTAMP(3), last_error = NULL "
+                f"WHERE id IN ({placeholders})",
+                (DONE, *event_ids),
+            )
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def retry(self, event: OutboxEvent, error: str, delay_seconds: float, dead: bool) -> None:
+        connection = get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "UPDATE outbox_events SET status = %s, last_error = %s, "
+                "available_at = UTC_TIMESTAMP(3) + INTERVAL %s SECOND WHERE id = %s",
+                (DEAD if dead else PENDING, error[:1000], delay_seconds, event.id),
+            )
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+
+class FileOutboxStore(OutboxStore):
+    """Append-only JSON-lines journal: ``add`` records plus ``update`` records per state change."""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def append(self, events: list[OutboxEvent]) -> None:
+        with file_lock(self.path):
+            self._write([{"op": "add", **event.__dict__} for event in events])
+
+    def pending(self) -> list[OutboxEvent]:
+        with file_lock(self.path):
+            events, _ = self._replay()
+        return [event for event in events.values() if event.status == PENDING]
+
+    def claim(self, limit: int, lease_seconds: float) -> list[OutboxEvent]:
+        now = time.time()
+        with file_lock(self.path):
+            events, done = self._replay()
+            if done >= COMPACT_AFTER:
+                self._compact(events)
+            due = sorted(
+                (e for e in events.values() if e.status == PENDING and e.available_at <= now),
+                key=lambda e: e.available_at,
+            )[:limit]
+            for event in due:
+                event.attempts += 1
+                event.available_at = now + lease_seconds
+            self._write(
+                [
+                    {"op": "update", "id": e.id, "attempts": e.attempts, "available_at": e.available_at}
+                    for e in due
+                ]
+            )
+        return due
+
+    def complete(self, event_ids: list[str]) -> None:
+        with file_lock(self.path):
+            self._write([{"op": "update", "id": event_id, "status": DONE} for event_id in event_ids])
+
+    def retry(self, event: OutboxEvent, error: str, delay_seconds: float, dead: bool) -> None:
+        record = {
+            "op": "update",
+            "id": event.id,
+            "status": DEAD if dead else PENDING,
+            "last_error": error[:1000],
+            "available_at": time.time() + delay_seconds,
+        }
+        with file_lock(self.path):
+            self._write([record])
+
+    def _write(self, records: list[dict[str, Any]]) -> None:
+        if not records:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as journal:
+            journal.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def _replay(self) -> tuple[dict[str, OutboxEvent], int]:
+        events: dict[str, OutboxEvent] = {}
+        if not self.path.exists():
+            return events, 0
+        with self.path.open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact.
+                    continue
+                op = record.pop("op", None)
+                if op == "add":
+                    events[record["id"]] = OutboxEvent(**record)
+                elif op == "update" and record["id"] in events:
+                    event = events[record.pop("id")]
+                    for name, value in record.items():
+                        setattr(event, name, value)
+        done = sum(1 for event in events.values() if event.status == DONE)
+        return events, done
+
+    def _compact(self, events: dict[str, OutboxEvent]) -> None:
+        # Delivered events are dropped; dead ones stay as the dead-letter record.
+        live = {event_id: event for event_id, event in events.items() if event.status != DONE}
+        temporary = self.path.with_name(f".{self.path.name}.tmp")
+        with temporary.open("w", encoding="utf-8") as journal:
+            journal.write("".join(json.dumps({"op": "add", **e.__dict__}) + "\n" for e in live.values()))
+        temporary.replace(self.path)
+        events.clear()
+        events.update(live)
+
+
+class OutboxSink:
+    """Delivers one event. Raising marks it for retry; delivery is at-least-once."""
+
+    def deliver(self, event: OutboxEvent) -> None:
+        raise NotImplementedError
+
+
+class LoggingSink(OutboxSink):
+    """Hands events to the email and admin-notification services."""
+
+    def deliver(self, event: OutboxEvent) -> None:
+        if event.kind == WELCOME_EMAIL:
+            send_welcome_email(event.payload["email"])
+        elif event.kind == ADMIN_NOTIFICATION:
+            notify_admin(event.payload["message"])
+        else:
+            raise ValueError(f"Unknown outbox event kind {event.kind!r}")
+
+
+class MemorySink(OutboxSink):
+    """Local stand-in that records deliveries; ``fail_times`` makes the next N deliveries fail."""
+
+    def __init__(self, fail_times: int = 0) -> None:
+        self.delivered: list[OutboxEvent] = []
+        self.fail_times = fail_times
+        self._lock = threading.Lock()
+
+    def deliver(self, event: OutboxEvent) -> None:
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ConnectionError("memory sink failure")
+            self.delivered.append(event)
+
+
+class OutboxWorker:
+    """Background thread draining the outbox in batches with exponential backoff."""
+
+    def __init__(
+        self,
+        store: OutboxStore,
+        sink: OutboxSink,
+        batch_size: int = 50,
+        poll_seconds: float = 1.0,
+        max_attempts: int = 8,
+        backoff_seconds: float = 2.0,
+        lease_seconds: float = 60.0,
+        jitter: Callable[[], float] = random.random,
+    ) -> None:
+        self.store = store
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.jitter = jitter
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+        return delay * (0.5 + self.jitter() / 2)
+
+    def run_once(self) -> int:
+        """Deliver one batch of due events; return how many were claimed."""
+        events = self.store.claim(self.batch_size, self.lease_seconds)
+        delivered: list[str] = []
+        for event in events:
+            try:
+                self.sink.deliver(event)
+            except Exception as exc:  # noqa: BLE001 - any sink failure is retried
+                dead = event.attempts >= self.max_attempts
+                level = logging.ERROR if dead else logging.WARNING
+                logger.log(
+                    level, "Outbox event %s (%s) attempt %d failed: %s", event.id, event.kind, event.attempts, exc
+                )
+                self.store.retry(event, repr(exc), self.backoff(event.attempts), dead)
+            else:
+                delivered.append(event.id)
+        self.store.complete(delivered)
+        return len(events)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        _wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:  # noqa: BLE001 - keep draining after storage hiccups
+                logger.exception("Outbox poll failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                _wake.wait(self.poll_seconds)
+                _wake.clear()
+
+
+_wake = threading.Event()
+
+
+def wake_worker() -> None:
+    """Let an in-process worker pick up freshly committed events without waiting for the poll."""
+    _wake.set()
+
+
+def build_sink(settings: Settings) -> OutboxSink:
+    if settings.outbox_sink == "log":
+        return LoggingSink()
+    if settings.outbox_sink == "memory":
+        return MemorySink()
+    raise ValueError(f"Unknown OUTBOX_SINK {settings.outbox_sink!r}")
+
+
+def build_outbox_worker(settings: Settings) -> OutboxWorker:
+    store: OutboxStore
+    if settings.use_file_storage:
+        store = FileOutboxStore(settings.outbox_file_path)
+    else:
+        store = DatabaseOutboxStore()
+    return OutboxWorker(
+        store,
+        build_sink(settings),
+        batch_size=settings.outbox_batch_size,
+        poll_seconds=settings.outbox_poll_seconds,
+        max_attempts=settings.outbox_max_attempts,
+        backoff_seconds=settings.outbox_backoff_seconds,
+    )
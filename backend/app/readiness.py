@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from .config import Settings
+from .crud.exceptions import StorageError
+from .crud.file_storage import lock_is_held
+from .database import get_connection, pool_usage
+from .warmup import DONE, warmup_status
+
+# A lock held this long is treated as stuck rather than as a write in progress.
+LOCK_WAIT_SECONDS = 0.25
+LOCK_POLL_SECONDS = 0.05
+
+_parse_lock = threading.Lock()
+# path -> ((mtime_ns, size), error); files are only re-parsed after they change.
+_parse_results: dict[str, tuple[tuple[int, int], str | None]] = {}
+
+
+def check_readiness(settings: Settings) -> dict[str, Any]:
+    """Run the checks for the active storage backend; ``status`` is ``ready`` only if all pass."""
+    if settings.use_file_storage:
+        checks = {
+            "users_file": check_json_file(Path(settings.data_file_path)),
+            "groups_file": check_json_file(Path(settings.groups_file_path)),
+            "outbox_file": check_lock(Path(settings.outbox_file_path)),
+        }
+    else:
+        checks = {"database": check_database(settings.readiness_max_pool_saturation)}
+    status = warmup_status()
+    if status is not None:
+        checks["warmup"] = {"ok": status == DONE, "status": status}
+    ready = all(check["ok"] for check in checks.values())
+    return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+
+def check_database(max_saturation: float) -> dict[str, Any]:
+    in_use, size = pool_usage()
+    saturation = in_use / size if size else 1.0
+    result: dict[str, Any] = {"ok": True, "in_use": in_use, "size": size, "saturation": round(saturation, 3)}
+    if saturation > max_saturation:
+        # Skip the ping: it would take one of the last free connections.
+        result.update(ok=False, error="connection pool saturated")
+        return result
+    started = time.perf_counter()
+    try:
+        connection = get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+    except StorageError as exc:
+        result.update(ok=False, error=str(exc))
+    result["ping_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def check_json_file(path: Path) -> dict[str, Any]:
+    result = check_lock(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return result  # created empty on first use
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _parse_lock:
+        cached = _parse_results.get(str(path))
+    if cached is not None and cached[0] == signature:
+        error = cached[1]
+    else:
+        error = _parse_error(path)
+        with _parse_lock:
+            _parse_results[str(path)] = (signature, error)
+    result["bytes"] = stat.st_size
+    if error is not None:
+        result.update(ok=False, error=error)
+    return result
+
+
+def check_lock(path: Path) -> dict[str, Any]:
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while lock_is_held(path):
+        if time.monotonic() >= deadline:
+            return {"ok": False, "error": "file lock held"}
+        time.sleep(LOCK_POLL_SECONDS)
+    return {"ok": True}
+
+
+def _parse_error(path: Path) -> str | None:
+    try:
+        data = json.loads(path.read_bytes())
+    except (OSError, ValueError) as exc:
+        return f"unreadable: {exc}"
+    if not isinstance(data, list):
+        return "unreadable: expected a JSON array"
+    return None
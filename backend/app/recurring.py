@@ -0,0 +1,90 @@
+"""Run the recurring-expense job: in a background thread, or once from the command line.
+
+Run from ``backend/`` (cron, a one-off catch-up)::
+
+    python -m app.recurring                    # everything due today (UTC)
+    python -m app.recurring --date 2024-12-31  # everything due on or before that date
+
+Runs are idempotent, so a cron job and the in-process scheduler can coexist.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+import time
+from datetime import date
+from typing import Optional
+
+from .config import Settings, get_settings
+from .crud.recurring import MaterializeResult, materialize_due_expenses
+
+logger = logging.getLogger("signup_app.recurring")
+
+
+class RecurringScheduler:
+    """Background thread adding due recurring expenses every ``interval_seconds``, starting at once."""
+
+    def __init__(self, interval_seconds: float = 3600.0, batch_size: int = 200) -> None:
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, today: Optional[date] = None) -> MaterializeResult:
+        started = time.perf_counter()
+        result = materialize_due_expenses(today, self.batch_size)
+        if result.expenses:
+            logger.info(
+                "Added %d recurring expenses from %d schedules in %d groups (%.0f ms)",
+                result.expenses,
+                result.schedules,
+                len(result.groups),
+                (time.perf_counter() - started) * 1000,
+            )
+        return result
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="recurring-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:  # noqa: BLE001 - retried on the next tick
+                logger.exception("Recurring expense run failed")
+            self._stop.wait(self.interval_seconds)
+
+
+def build_recurring_scheduler(settings: Settings) -> RecurringScheduler:
+    return RecurringScheduler(
+        interval_seconds=settings.recurring_interval_seconds,
+        batch_size=settings.recurring_batch_size,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--date", type=date.fromisoformat, help="add occurrences due on or before this day")
+    parser.add_argument("--batch-size", type=int, help="schedules per batch (default RECURRING_BATCH_SIZE)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    settings = get_settings()
+    result = materialize_due_expenses(args.date, args.batch_size or settings.recurring_batch_size)
+    groups = len(result.groups)
+    print(f"{result.expenses} expenses added from {result.schedules} schedules in {groups} groups")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from mysql.connector import Error as MySQLError
+from datetime import datetime
+from typing import Optional
 
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from ..crud import archive as archive_crud
 from ..crud import expense as expense_crud
-from ..schemas.expense import ExpenseCreate, ExpenseUpdate
+from ..crud import recurring as recurring_crud
+from ..crud.exceptions import StorageError
+from ..schemas.expense import (
+    ArchivedExpensePage,
+    ExpenseCreate,
+    ExpenseSearch,
+    ExpenseSearchResult,
+    ExpenseStatus,
+    ExpenseUpdate,
+    RecurringExpense,
+    RecurringExpenseCreate,
+)
 from ..schemas.group import GroupDetail
 
 router = APIRouter(tags=["expenses"])
@@ -20,10 +36,62 @@ def add_group_expense(group_id: str, payload: ExpenseCreate):
         raise HTTPException(status_code=404, detail="User not found") from err
     except expense_crud.GroupMembershipError as err:
         raise HTTPException(status_code=403, detail="User must belong to the group") from err
-    except MySQLError as err:
+    except expense_crud.ExchangeRateNotFoundError as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to add expense") from err
 
 
+@router.get("/groups/{group_id}/expenses/search", response_model=ExpenseSearchResult)
+def search_group_expenses(
+    group_id: str,
+    q: Optional[str] = Query(default=None, max_length=255, description="Note words, matched as prefixes"),
+    status: Optional[list[ExpenseStatus]] = Query(default=None),
+    payer_id: Optional[str] = None,
+    min_amount: Optional[float] = Query(default=None, ge=0),
+    max_amount: Optional[float] = Query(default=None, ge=0),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    offset: int = Query(default=0, ge=0),
+) -> ExpenseSearchResult:
+    try:
+        filters = ExpenseSearch(
+            q=q,
+            status=status,
+            payer_id=payer_id,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            created_from=created_from,
+            created_to=created_to,
+            limit=limit,
+            offset=offset,
+        )
+    except ValidationError as err:
+        # Inverted ranges: a 422 like any other invalid query parameter.
+        raise RequestValidationError(err.errors(include_url=False, include_context=False)) from err
+    try:
+        return expense_crud.search_expenses(group_id, filters)
+    except expense_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to search expenses") from err
+
+
+@router.get("/groups/{group_id}/archived-expenses", response_model=ArchivedExpensePage)
+def list_archived_expenses(
+    group_id: str,
+    limit: int = Query(default=50, ge=1, le=200),
+    offset: int = Query(default=0, ge=0),
+) -> ArchivedExpensePage:
+    try:
+        return archive_crud.list_archived_expenses(group_id, limit, offset)
+    except archive_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to fetch archived expenses") from err
+
+
 @router.put("/groups/{group_id}/expenses/{expense_id}", response_model=GroupDetail)
 def update_group_expense(group_id: str, expense_id: str, payload: ExpenseUpdate):
     try:
@@ -36,7 +104,9 @@ def update_group_expense(group_id: str, expense_id: str, payload: ExpenseUpdate)
         raise HTTPException(status_code=404, detail="User not found") from err
     except expense_crud.GroupMembershipError as err:
         raise HTTPException(status_code=403, detail="User must belong to the group") from err
-    except MySQLError as err:
+    except expense_crud.ExchangeRateNotFoundError as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to update expense") from err
 
 
@@ -48,8 +118,47 @@ def delete_group_expense(group_id: str, expense_id: str):
         raise HTTPException(status_code=404, detail="Group not found") from err
     except expense_crud.ExpenseNotFoundError as err:
         raise HTTPException(status_code=404, detail="Expense not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to delete expense") from err
 
 
+@router.post("/groups/{group_id}/recurring-expenses", response_model=RecurringExpense, status_code=201)
+def create_recurring_expense(group_id: str, payload: RecurringExpenseCreate) -> RecurringExpense:
+    try:
+        return recurring_crud.create_recurring_expense(group_id, payload)
+    except recurring_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except recurring_crud.UserNotFoundError as err:
+        raise HTTPException(status_code=404, detail="User not found") from err
+    except recurring_crud.GroupMembershipError as err:
+        raise HTTPException(status_code=403, detail="User must belong to the group") from err
+    except recurring_crud.ExchangeRateNotFoundError as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to add recurring expense") from err
+
+
+@router.get("/groups/{group_id}/recurring-expenses", response_model=list[RecurringExpense])
+def list_recurring_expenses(group_id: str) -> list[RecurringExpense]:
+    try:
+        return recurring_crud.list_recurring_expenses(group_id)
+    except recurring_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to fetch recurring expenses") from err
+
+
+@router.delete("/groups/{group_id}/recurring-expenses/{recurring_id}", status_code=204)
+def delete_recurring_expense(group_id: str, recurring_id: str) -> Response:
+    try:
+        recurring_crud.delete_recurring_expense(group_id, recurring_id)
+    except recurring_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except recurring_crud.RecurringExpenseNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Recurring expense not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to delete recurring expense") from err
+    return Response(status_code=204)
+
+
 __all__ = ["router"]
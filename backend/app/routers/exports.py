@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+from ..crud import export as export_crud
+from ..crud.exceptions import StorageError
+from ..dependencies import get_session_claims
+from ..exports import ExportFormat, export_response
+from ..utils.authentication import SessionClaims
+
+router = APIRouter(tags=["exports"])
+
+
+@router.get("/groups/{group_id}/export", response_class=StreamingResponse)
+def export_group_ledger(
+    group_id: str,
+    format: ExportFormat = "csv",
+    accept_encoding: Optional[str] = Header(default=None),
+) -> StreamingResponse:
+    try:
+        rows = export_crud.export_group_expenses(group_id)
+    except export_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to export expenses") from err
+    return export_response(rows, format, f"group-{group_id}-expenses", accept_encoding)
+
+
+@router.get("/exports/expenses", response_class=StreamingResponse)
+def export_all_expenses(
+    format: ExportFormat = "csv",
+    accept_encoding: Optional[str] = Header(default=None),
+    claims: SessionClaims = Depends(get_session_claims),
+) -> StreamingResponse:
+    if claims.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required")
+    try:
+        rows = export_crud.export_all_expenses()
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to export expenses") from err
+    return export_response(rows, format, "expenses", accept_encoding)
+
+
+__all__ = ["router"]
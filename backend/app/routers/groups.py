@@ -1,10 +1,24 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from mysql.connector import Error as MySQLError
+from typing import Optional
 
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..change_feed import get_change_feed, stream_group_events
+from ..crud import analytics as analytics_crud
+from ..crud import archive as archive_crud
 from ..crud import group as group_crud
-from ..schemas.group import GroupCreate, GroupDetail, GroupMemberAdd, GroupPublic
+from ..crud.exceptions import StorageError
+from ..schemas.group import (
+    GroupAnalytics,
+    GroupArchiveRequest,
+    GroupCreate,
+    GroupDetail,
+    GroupMemberAdd,
+    GroupPublic,
+)
 
 router = APIRouter(tags=["groups"])
 
@@ -15,7 +29,7 @@ def get_user_groups(user_id: str) -> list[GroupPublic]:
         return group_crud.list_user_groups(user_id)
     except group_crud.UserNotFoundError as err:
         raise HTTPException(status_code=404, detail="User not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to fetch groups") from err
 
 
@@ -27,20 +41,52 @@ def create_group(payload: GroupCreate) -> GroupDetail:
         raise HTTPException(status_code=404, detail="Owner not found") from err
     except ValueError as err:
         raise HTTPException(status_code=400, detail=str(err)) from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to create group") from err
 
 
 @router.get("/groups/{group_id}", response_model=GroupDetail)
-def get_group(group_id: str) -> GroupDetail:
+def get_group(group_id: str) -> Response:
     try:
-        return group_crud.get_group(group_id)
+        # Already a GroupDetail document; returning a Response skips re-validation.
+        return Response(content=group_crud.get_group_json(group_id), media_type="application/json")
     except group_crud.GroupNotFoundError as err:
         raise HTTPException(status_code=404, detail="Group not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to fetch group") from err
 
 
+@router.get("/groups/{group_id}/analytics", response_model=GroupAnalytics)
+def get_group_analytics(group_id: str) -> GroupAnalytics:
+    try:
+        return analytics_crud.get_group_analytics(group_id)
+    except analytics_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to fetch analytics") from err
+
+
+@router.get("/groups/{group_id}/events")
+async def get_group_events(
+    group_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None),
+) -> StreamingResponse:
+    """Server-Sent Events feed of expense, member and balance deltas for one group."""
+    try:
+        # Clients reconnect often; check existence only, without loading the ledger.
+        await run_in_threadpool(group_crud.ensure_group_exists, group_id)
+    except group_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to fetch group") from err
+    return StreamingResponse(
+        stream_group_events(get_change_feed(), group_id, last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/groups/{group_id}/members", response_model=GroupDetail)
 def add_member_to_group(group_id: str, payload: GroupMemberAdd) -> GroupDetail:
     try:
@@ -51,9 +97,21 @@ def add_member_to_group(group_id: str, payload: GroupMemberAdd) -> GroupDetail:
         raise HTTPException(status_code=404, detail="User not found") from err
     except group_crud.GroupOwnershipError as err:
         raise HTTPException(status_code=403, detail="Only the group owner can add members") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to update group") from err
 
 
+@router.post("/groups/{group_id}/archive", response_model=GroupDetail)
+def archive_group_expenses(group_id: str, payload: GroupArchiveRequest) -> GroupDetail:
+    try:
+        return archive_crud.archive_group_expenses(group_id, payload.requester_id, payload.older_than_days)
+    except archive_crud.GroupNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Group not found") from err
+    except archive_crud.GroupOwnershipError as err:
+        raise HTTPException(status_code=403, detail="Only the group owner can archive expenses") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to archive expenses") from err
+
+
 __all__ = ["router"]
 
@@ -1,12 +1,36 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from mysql.connector import Error as MySQLError
+from dataclasses import asdict
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
 
 from ..crud import user as user_crud
-from ..dependencies import get_settings_dependency
-from ..schemas.user import UserLogin, UserProfileUpdate, UserPublic, UserSignup
-from ..utils.files import save_avatar_file
+from ..crud.exceptions import StorageError
+from ..dependencies import get_session_claims, get_settings_dependency
+from ..schemas.user import (
+    AvatarUploadComplete,
+    AvatarUploadRequest,
+    AvatarUploadTicket,
+    SessionPublic,
+    UserLogin,
+    UserProfileUpdate,
+    UserPublic,
+    UserSession,
+    UserSignup,
+)
+from ..utils import files
+from ..utils.authentication import InvalidUploadTokenError, PasswordHashingBusyError, SessionClaims
+from ..utils.files import AvatarStorageError, AvatarTooLargeError, save_avatar_file
 
 router = APIRouter(tags=["users"])
 
@@ -17,25 +41,43 @@ def signup(user: UserSignup) -> UserPublic:
         return user_crud.create_user(user)
     except user_crud.DuplicateEmailError as err:
         raise HTTPException(status_code=409, detail="Email already registered") from err
-    except MySQLError as err:
+    except PasswordHashingBusyError as err:
+        raise HTTPException(
+            status_code=503, detail="Signup is busy, please retry", headers={"Retry-After": "1"}
+        ) from err
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to create user") from err
 
 
-@router.post("/login", response_model=UserPublic)
-def login(credentials: UserLogin) -> UserPublic:
+@router.post("/login", response_model=UserSession)
+def login(credentials: UserLogin) -> UserSession:
     try:
         return user_crud.authenticate_user(credentials)
     except user_crud.InvalidCredentialsError as err:
         raise HTTPException(status_code=401, detail="Invalid email or password") from err
-    except MySQLError as err:
+    except PasswordHashingBusyError as err:
+        raise HTTPException(
+            status_code=503, detail="Login is busy, please retry", headers={"Retry-After": "1"}
+        ) from err
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to login") from err
 
 
+@router.get("/me", response_model=SessionPublic)
+def get_current_session(claims: SessionClaims = Depends(get_session_claims)) -> SessionPublic:
+    try:
+        return user_crud.get_session(claims)
+    except user_crud.UserNotFoundError as err:
+        raise HTTPException(status_code=401, detail="Session user no longer exists") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to fetch session") from err
+
+
 @router.get("/users", response_model=list[UserPublic])
 def list_users() -> list[UserPublic]:
     try:
         return user_crud.list_users()
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to fetch users") from err
 
 
@@ -45,7 +87,7 @@ def get_user_profile(user_id: str) -> UserPublic:
         return user_crud.get_user(user_id)
     except user_crud.UserNotFoundError as err:
         raise HTTPException(status_code=404, detail="User not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to fetch profile") from err
 
 
@@ -55,13 +97,14 @@ def update_user_profile(user_id: str, payload: UserProfileUpdate) -> UserPublic:
         return user_crud.update_user_profile(user_id, payload)
     except user_crud.UserNotFoundError as err:
         raise HTTPException(status_code=404, detail="User not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to update profile") from err
 
 
 @router.post("/users/{user_id}/avatar", response_model=UserPublic)
 def upload_avatar(  # noqa: ANN001
     user_id: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     settings=Depends(get_settings_dependency),
 ) -> UserPublic:
@@ -69,13 +112,90 @@ def upload_avatar(  # noqa: ANN001
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Unsupported image type")
 
-    avatar_url = save_avatar_file(user_id, file, settings)
     try:
-        return user_crud.update_user_avatar(user_id, avatar_url)
+        stored = save_avatar_file(user_id, file, settings)
+    except AvatarTooLargeError as err:
+        raise HTTPException(status_code=413, detail="Avatar too large") from err
+    except AvatarStorageError as err:
+        raise HTTPException(status_code=502, detail="Unable to store avatar") from err
+    try:
+        user = user_crud.update_user_avatar(user_id, stored.url)
+    except user_crud.UserNotFoundError as err:
+        raise HTTPException(status_code=404, detail="User not found") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to save avatar") from err
+    # The original is served until the resized variants are ready.
+    background_tasks.add_task(user_crud.process_avatar, user_id, stored)
+    return user
+
+
+@router.post("/users/{user_id}/avatar/uploads", response_model=AvatarUploadTicket, status_code=201)
+def create_avatar_upload(  # noqa: ANN001
+    user_id: str,
+    payload: AvatarUploadRequest,
+    request: Request,
+    settings=Depends(get_settings_dependency),
+) -> AvatarUploadTicket:
+    try:
+        user_crud.get_user(user_id)
+        ticket = files.create_avatar_upload(
+            user_id, payload.content_type, settings, str(request.url_for("receive_avatar_upload"))
+        )
+    except user_crud.UserNotFoundError as err:
+        raise HTTPException(status_code=404, detail="User not found") from err
+    except AvatarStorageError as err:
+        raise HTTPException(status_code=502, detail="Unable to prepare avatar upload") from err
+    except StorageError as err:
+        raise HTTPException(status_code=500, detail="Unable to prepare avatar upload") from err
+    return AvatarUploadTicket(**asdict(ticket))
+
+
+@router.post("/uploads/avatar", status_code=204, response_class=Response)
+def receive_avatar_upload(  # noqa: ANN001
+    token: str = Form(...),
+    content_type: str = Form(..., alias="Content-Type"),
+    file: UploadFile = File(...),
+    settings=Depends(get_settings_dependency),
+) -> Response:
+    """Signed upload target used instead of S3 when running on file storage."""
+    if not settings.use_file_storage and settings.s3_bucket_name:
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        files.receive_local_upload(token, content_type, file, settings)
+    except InvalidUploadTokenError as err:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload token") from err
+    except files.AvatarVerificationError as err:
+        raise HTTPException(status_code=400, detail=str(err)) from err
+    except AvatarTooLargeError as err:
+        raise HTTPException(status_code=413, detail="Avatar too large") from err
+    return Response(status_code=204)
+
+
+@router.post("/users/{user_id}/avatar/uploads/complete", response_model=UserPublic)
+def complete_avatar_upload(  # noqa: ANN001
+    user_id: str,
+    payload: AvatarUploadComplete,
+    background_tasks: BackgroundTasks,
+    settings=Depends(get_settings_dependency),
+) -> UserPublic:
+    try:
+        stored = files.complete_avatar_upload(user_id, payload.upload_token, settings)
+    except InvalidUploadTokenError as err:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload token") from err
+    except files.AvatarUploadNotFoundError as err:
+        raise HTTPException(status_code=404, detail="Upload not found") from err
+    except files.AvatarVerificationError as err:
+        raise HTTPException(status_code=422, detail=str(err)) from err
+    except AvatarStorageError as err:
+        raise HTTPException(status_code=502, detail="Unable to store avatar") from err
+    try:
+        user = user_crud.update_user_avatar(user_id, stored.url)
     except user_crud.UserNotFoundError as err:
         raise HTTPException(status_code=404, detail="User not found") from err
-    except MySQLError as err:
+    except StorageError as err:
         raise HTTPException(status_code=500, detail="Unable to save avatar") from err
+    background_tasks.add_task(user_crud.process_avatar, user_id, stored)
+    return user
 
 
 __all__ = ["router"]
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Literal, Optional
+from datetime import date, datetime, timezone
+from typing import Annotated, Literal, Optional
 
-from pydantic import BaseModel, EmailStr, Field, PositiveFloat
+from pydantic import BaseModel, EmailStr, Field, PositiveFloat, StringConstraints, model_validator
 
 ExpenseStatus = Literal["assigned", "paid", "refunded", "approved", "claimed", "denied"]
+# ISO 4217 code, upper-cased on input.
+CurrencyCode = Annotated[
+    str, StringConstraints(strip_whitespace=True, to_upper=True, pattern=r"^[A-Za-z]{3}$")
+]
+# Currency of groups and expenses stored before currencies existed.
+DEFAULT_CURRENCY = "USD"
 
 
 class Expense(BaseModel):
@@ -15,6 +21,7 @@ class Expense(BaseModel):
     payer_name: str
     payer_email: EmailStr
     amount: float
+    currency: str = DEFAULT_CURRENCY
     note: Optional[str] = None
     status: ExpenseStatus = "assigned"
     created_at: datetime
@@ -23,6 +30,8 @@ class Expense(BaseModel):
 class ExpenseCreate(BaseModel):
     payer_email: EmailStr
     amount: PositiveFloat
+    # Defaults to the group's base currency.
+    currency: Optional[CurrencyCode] = None
     note: Optional[str] = Field(default=None, max_length=255)
     status: ExpenseStatus = "assigned"
 
@@ -30,5 +39,93 @@ class ExpenseCreate(BaseModel):
 class ExpenseUpdate(BaseModel):
     payer_email: Optional[EmailStr] = None
     amount: Optional[PositiveFloat] = None
+    currency: Optional[CurrencyCode] = None
     note: Optional[str] = Field(default=None, max_length=255)
     status: Optional[ExpenseStatus] = None
+
+
+class ArchivedExpense(Expense):
+    archived_at: datetime
+
+
+class ArchivedExpensePage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    expenses: list[ArchivedExpense]
+
+
+class ExpenseSearch(BaseModel):
+    """Filters for ``GET /groups/{group_id}/expenses/search``; every filter that is set must match."""
+
+    q: Optional[str] = Field(default=None, max_length=255)
+    status: Optional[list[ExpenseStatus]] = None
+    payer_id: Optional[str] = None
+    min_amount: Optional[float] = Field(default=None, ge=0)
+    max_amount: Optional[float] = Field(default=None, ge=0)
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    limit: int = Field(default=50, ge=1, le=200)
+    offset: int = Field(default=0, ge=0)
+
+    @model_validator(mode="after")
+    def _ranges_are_ordered(self) -> ExpenseSearch:
+        if self.min_amount is not None and self.max_amount is not None and self.min_amount > self.max_amount:
+            raise ValueError("min_amount must not exceed max_amount")
+        if self.created_from is not None and self.created_to is not None:
+            # Bounds without an offset are UTC, like stored timestamps.
+            start, end = (
+                value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+                for value in (self.created_from, self.created_to)
+            )
+            if start > end:
+                raise ValueError("created_from must not be after created_to")
+        return self
+
+
+class ExpenseSearchResult(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    expenses: list[Expense]
+
+
+RecurrenceFrequency = Literal["daily", "weekly", "monthly"]
+
+
+class RecurringExpenseCreate(BaseModel):
+    """A schedule: one expense every ``interval`` days/weeks/months from ``starts_on``."""
+
+    payer_email: EmailStr
+    amount: PositiveFloat
+    # Defaults to the group's base currency.
+    currency: Optional[CurrencyCode] = None
+    note: Optional[str] = Field(default=None, max_length=255)
+    status: ExpenseStatus = "assigned"
+    frequency: RecurrenceFrequency
+    interval: int = Field(default=1, ge=1, le=366)
+    starts_on: date
+    ends_on: Optional[date] = None
+
+    @model_validator(mode="after")
+    def _ends_after_start(self) -> RecurringExpenseCreate:
+        if self.ends_on is not None and self.ends_on < self.starts_on:
+            raise ValueError("ends_on must not be before starts_on")
+        return self
+
+
+class RecurringExpense(BaseModel):
+    id: str
+    group_id: str
+    payer_id: str
+    amount: float
+    currency: str = DEFAULT_CURRENCY
+    note: Optional[str] = None
+    status: ExpenseStatus = "assigned"
+    frequency: RecurrenceFrequency
+    interval: int
+    starts_on: date
+    ends_on: Optional[date] = None
+    # The next occurrence still to be added; None once the schedule has ended.
+    next_due_on: Optional[date] = None
+    created_at: datetime
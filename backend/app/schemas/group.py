@@ -5,13 +5,15 @@ from typing import Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
-from .expense import Expense
+from .expense import DEFAULT_CURRENCY, CurrencyCode, Expense, ExpenseStatus
 
 
 class GroupCreate(BaseModel):
     owner_id: str = Field(..., min_length=1)
     name: str = Field(..., min_length=1, max_length=100)
     description: Optional[str] = Field(default=None, max_length=255)
+    # Balances, totals and analytics are reported in this currency.
+    base_currency: CurrencyCode = DEFAULT_CURRENCY
 
 
 class GroupPublic(BaseModel):
@@ -21,6 +23,7 @@ class GroupPublic(BaseModel):
     description: Optional[str] = None
     created_at: datetime
     member_count: Optional[int] = None
+    base_currency: str = DEFAULT_CURRENCY
 
 
 class GroupMember(BaseModel):
@@ -43,8 +46,42 @@ class GroupDetail(GroupPublic):
     expenses: list[Expense] = Field(default_factory=list)
     total_expense: float = 0.0
     balances: list[GroupBalance] = Field(default_factory=list)
+    # Archived expenses are not listed, but still count towards total_expense and balances.
+    archived_expense_count: int = 0
 
 
 class GroupMemberAdd(BaseModel):
     requester_id: str = Field(..., min_length=1)
     user_email: EmailStr
+
+
+class GroupArchiveRequest(BaseModel):
+    requester_id: str = Field(..., min_length=1)
+    # Settled expenses created more than this many days ago are archived; defaults to ARCHIVE_AFTER_DAYS.
+    older_than_days: Optional[int] = Field(default=None, ge=0)
+
+
+class SpendTotal(BaseModel):
+    expense_count: int
+    total_amount: float
+
+
+class MonthlySpend(SpendTotal):
+    month: str  # YYYY-MM, UTC
+
+
+class MemberSpend(SpendTotal):
+    user_id: str
+    name: str
+
+
+class StatusSpend(SpendTotal):
+    status: ExpenseStatus
+
+
+class GroupAnalytics(SpendTotal):
+    group_id: str
+    base_currency: str = DEFAULT_CURRENCY  # every total_amount is in this currency
+    by_month: list[MonthlySpend] = Field(default_factory=list)
+    by_member: list[MemberSpend] = Field(default_factory=list)
+    by_status: list[StatusSpend] = Field(default_factory=list)
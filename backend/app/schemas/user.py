@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
 from .group import GroupPublic
 
+AvatarContentType = Literal["image/jpeg", "image/png", "image/webp"]
+
 
 class UserSignup(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -33,6 +35,20 @@ class UserPublic(BaseModel):
     groups: Optional[list[GroupPublic]] = None
 
 
+class UserSession(UserPublic):
+    access_token: str
+    token_type: str = "bearer"
+
+
+class SessionPublic(BaseModel):
+    user_id: str
+    role: str
+    membership_version: int
+    groups: list[GroupPublic] = Field(default_factory=list)
+    # Only set when the membership version moved on and the token was reissued.
+    access_token: Optional[str] = None
+
+
 class UserProfileUpdate(BaseModel):
     name: Optional[str] = Field(default=None, min_length=1, max_length=100)
     age: Optional[int] = Field(default=None, ge=0, le=120)
@@ -40,3 +56,21 @@ class UserProfileUpdate(BaseModel):
     address: Optional[str] = Field(default=None, max_length=255)
     bio: Optional[str] = Field(default=None, max_length=500)
 
+
+class AvatarUploadRequest(BaseModel):
+    content_type: AvatarContentType
+
+
+class AvatarUploadTicket(BaseModel):
+    upload_id: str
+    # POST ``fields`` plus the file (as the last form part, named ``file``) to ``url``.
+    method: Literal["POST"] = "POST"
+    url: str
+    fields: dict[str, str]
+    upload_token: str
+    max_bytes: int
+    expires_at: int
+
+
+class AvatarUploadComplete(BaseModel):
+    upload_token: str
@@ -1,19 +1,265 @@
 from __future__ import annotations
 
+import base64
 import hashlib
+import hmac
+import json
 import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from ..config import Settings, get_settings
+from .process_pool import BoundedProcessPool, PoolBusyError
+
+SCRYPT = "scrypt"
+PBKDF2_SHA256 = "pbkdf2_sha256"
+# Pre-KDF format: ``<hex salt>$<sha256 hex digest>``. Still verified, rehashed on login.
+LEGACY_SHA256 = "sha256"
+SUPPORTED_KDFS = (SCRYPT, PBKDF2_SHA256)
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+SESSION_TOKEN_VERSION = "v1"
+UPLOAD_TOKEN_VERSION = "u1"
+
+PasswordHashingBusyError = PoolBusyError
+
+
+class InvalidSessionTokenError(Exception):
+    """Raised when a session token is malformed, forged or expired."""
+
+
+class InvalidUploadTokenError(Exception):
+    """Raised when an avatar upload token is malformed, forged or expired."""
+
+
+@dataclass(frozen=True)
+class SessionClaims:
+    user_id: str
+    role: str
+    membership_version: int
+    issued_at: int
+    expires_at: int
+
+
+@dataclass(frozen=True)
+class UploadClaims:
+    user_id: str
+    upload_id: str
+    content_type: str
+    max_bytes: int
+    expires_at: int
+
+
+_pool_lock = threading.Lock()
+_pool_state: Optional[tuple[Settings, BoundedProcessPool]] = None
 
 
 def hash_password(raw_password: str) -> str:
-    salt = secrets.token_hex(8)
-    digest = hashlib.sha256(f"{salt}{raw_password}".encode("utf-8")).hexdigest()
-    return f"{salt}${digest}"
+    settings = get_settings()
+    scheme = settings.password_kdf
+    params = _configured_params(settings)
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _hash_pool(settings).run(_derive_key, raw_password, scheme, params, salt)
+    fields = [scheme, *(str(value) for value in params), _b64encode(salt), _b64encode(key)]
+    return "$".join(fields)
 
 
 def verify_password(raw_password: str, stored: str) -> bool:
+    parsed = _parse_hash(stored)
+    if parsed is None:
+        return False
+    scheme, params, salt, expected = parsed
+    if scheme == LEGACY_SHA256:
+        candidate = hashlib.sha256(f"{salt}{raw_password}".encode("utf-8")).hexdigest()
+        return secrets.compare_digest(candidate, expected)
+    settings = get_settings()
+    candidate_key = _hash_pool(settings).run(_derive_key, raw_password, scheme, params, salt)
+    return secrets.compare_digest(candidate_key, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """True when a stored hash does not use the configured KDF and work factors."""
+    parsed = _parse_hash(stored)
+    if parsed is None:
+        return True
+    settings = get_settings()
+    scheme, params, _, _ = parsed
+    return scheme != settings.password_kdf or params != _configured_params(settings)
+
+
+def issue_session_token(user_id: str, role: str, membership_version: int) -> str:
+    """Return a stateless ``v1.<claims>.<hmac>`` token signed with ``SESSION_SECRET``."""
+    settings = get_settings()
+    issued_at = int(time.time())
+    claims = {
+        "sub": user_id,
+        "role": role,
+        "mv": membership_version,
+        "iat": issued_at,
+        "exp": issued_at + settings.session_ttl_seconds,
+    }
+    return _encode_signed(settings, SESSION_TOKEN_VERSION, claims)
+
+
+def decode_session_token(token: str) -> SessionClaims:
+    """Verify a session token using only the shared secret; never touches storage."""
+    try:
+        claims = _decode_signed(get_settings(), SESSION_TOKEN_VERSION, token)
+        session = SessionClaims(
+            user_id=str(claims["sub"]),
+            role=str(claims["role"]),
+            membership_version=int(claims["mv"]),
+            issued_at=int(claims["iat"]),
+            expires_at=int(claims["exp"]),
+        )
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidSessionTokenError from exc
+    if session.expires_at <= time.time():
+        raise InvalidSessionTokenError
+    return session
+
+
+def issue_upload_token(
+    user_id: str, upload_id: str, content_type: str, max_bytes: int
+) -> tuple[str, UploadClaims]:
+    """Sign a token binding a direct-to-storage upload to its user, content type and size cap."""
+    settings = get_settings()
+    claims = UploadClaims(
+        user_id=user_id,
+        upload_id=upload_id,
+        content_type=content_type,
+        max_bytes=max_bytes,
+        expires_at=int(time.time()) + settings.avatar_upload_ttl_seconds,
+    )
+    payload = {
+        "sub": claims.user_id,
+        "uid": claims.upload_id,
+        "ct": claims.content_type,
+        "max": claims.max_bytes,
+        "exp": claims.expires_at,
+    }
+    return _encode_signed(settings, UPLOAD_TOKEN_VERSION, payload), claims
+
+
+def decode_upload_token(token: str) -> UploadClaims:
     try:
-        salt, stored_digest = stored.split("$", 1)
+        payload = _decode_signed(get_settings(), UPLOAD_TOKEN_VERSION, token)
+        claims = UploadClaims(
+            user_id=str(payload["sub"]),
+            upload_id=str(payload["uid"]),
+            content_type=str(payload["ct"]),
+            max_bytes=int(payload["max"]),
+            expires_at=int(payload["exp"]),
+        )
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidUploadTokenError from exc
+    if claims.expires_at <= time.time():
+        raise InvalidUploadTokenError
+    return claims
+
+
+def _encode_signed(settings: Settings, version: str, claims: dict) -> str:
+    body = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    signing_input = f"{version}.{body}"
+    return f"{signing_input}.{_sign(settings, signing_input)}"
+
+
+def _decode_signed(settings: Settings, version: str, token: str) -> dict:
+    """Return the claims of a ``<version>.<claims>.<hmac>`` token; ValueError if forged or malformed."""
+    parts = token.split(".")
+    if len(parts) != 3 or parts[0] != version:
+        raise ValueError("Malformed token")
+    signing_input = f"{parts[0]}.{parts[1]}"
+    if not secrets.compare_digest(_sign(settings, signing_input), parts[2]):
+        raise ValueError("Bad token signature")
+    claims = json.loads(_b64decode(parts[1]))
+    if not isinstance(claims, dict):
+        raise ValueError("Malformed token claims")
+    return claims
+
+
+def _sign(settings: Settings, signing_input: str) -> str:
+    digest = hmac.new(
+        settings.session_secret.encode("utf-8"), signing_input.encode("ascii"), hashlib.sha256
+    ).digest()
+    return _b64encode(digest)
+
+
+def _configured_params(settings: Settings) -> tuple[int, ...]:
+    if settings.password_kdf == SCRYPT:
+        return (settings.password_scrypt_n, settings.password_scrypt_r, settings.password_scrypt_p)
+    if settings.password_kdf == PBKDF2_SHA256:
+        return (settings.password_pbkdf2_iterations,)
+    raise ValueError(f"Unsupported PASSWORD_KDF {settings.password_kdf!r}")
+
+
+def _parse_hash(
+    stored: str,
+) -> Optional[tuple[str, tuple[int, ...], Union[bytes, str], Union[bytes, str]]]:
+    parts = stored.split("$")
+    try:
+        if len(parts) == 2:
+            return LEGACY_SHA256, (), parts[0], parts[1]
+        if parts[0] == SCRYPT and len(parts) == 6:
+            params = (int(parts[1]), int(parts[2]), int(parts[3]))
+            return SCRYPT, params, _b64decode(parts[4]), _b64decode(parts[5])
+        if parts[0] == PBKDF2_SHA256 and len(parts) == 4:
+            return PBKDF2_SHA256, (int(parts[1]),), _b64decode(parts[2]), _b64decode(parts[3])
     except ValueError:
-        return False
-    candidate = hashlib.sha256(f"{salt}{raw_password}".encode("utf-8")).hexdigest()
-    return secrets.compare_digest(candidate, stored_digest)
+        return None
+    return None
+
+
+def _derive_key(raw_password: str, scheme: str, params: tuple[int, ...], salt: bytes) -> bytes:
+    """Runs inside the hashing pool workers, so it must stay a picklable top-level function."""
+    password = raw_password.encode("utf-8")
+    if scheme == SCRYPT:
+        n, r, p = params
+        maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=KEY_BYTES)
+    if scheme == PBKDF2_SHA256:
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", password, salt, iterations, dklen=KEY_BYTES)
+    raise ValueError(f"Unsupported password hash scheme {scheme!r}")
+
+
+def warm_hash_pool() -> None:
+    """Start the hashing workers and import this module in them before the first signup or login."""
+    _hash_pool(get_settings()).warm(_worker_ready)
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+def _hash_pool(settings: Settings) -> BoundedProcessPool:
+    global _pool_state
+    state = _pool_state
+    if state is not None and state[0] is settings:
+        return state[1]
+    with _pool_lock:
+        if _pool_state is None or _pool_state[0] is not settings:
+            if _pool_state is not None:
+                _pool_state[1].shutdown()
+            pool = BoundedProcessPool(
+                "password-hashing",
+                max_workers=settings.password_hash_workers,
+                max_pending=settings.password_hash_max_pending,
+                wait_seconds=settings.password_hash_wait_seconds,
+            )
+            _pool_state = (settings, pool)
+        return _pool_state[1]
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(encoded: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Malformed base64 value") from exc
@@ -1,59 +1,439 @@
 from __future__ import annotations
 
-import shutil
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
 from pathlib import Path
+from typing import IO, Any, Optional
 from uuid import uuid4
 
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
 from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import Response
+from starlette.types import Scope
 
 from ..config import Settings
+from .authentication import InvalidUploadTokenError, decode_upload_token, issue_upload_token
+from .images import AVATAR_VARIANT_SIZES, DEFAULT_AVATAR_VARIANT, render_in_pool
 
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+VARIANTS_DIR = "variants"
+UPLOADS_PREFIX = "avatars/uploads"
+AVATAR_CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+CHUNK_SIZE = 1024 * 1024
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Content-addressed names never change meaning, so they can be cached forever.
+HASHED_NAME_PATTERN = re.compile(r"-[0-9a-f]{16,64}\.[A-Za-z0-9]+$")
 
-def save_avatar_file(user_id: str, upload_file: UploadFile, settings: Settings) -> str:
-    if settings.use_file_storage or not settings.s3_bucket_name:
-        return _save_to_filesystem(user_id, upload_file, settings.media_root)
-    return _save_to_s3(user_id, upload_file, settings)
+_s3_lock = threading.Lock()
+_s3_client: Any = None
+_s3_client_key: Optional[tuple[str, Optional[str], int]] = None
 
 
-def _save_to_filesystem(user_id: str, upload_file: UploadFile, media_root: str) -> str:
-    media_path = Path(media_root)
-    media_path.mkdir(parents=True, exist_ok=True)
-    user_folder = media_path / user_id
-    user_folder.mkdir(parents=True, exist_ok=True)
+class AvatarTooLargeError(ValueError):
+    """Raised when an avatar upload exceeds ``AVATAR_MAX_BYTES``."""
 
-    original_suffix = Path(upload_file.filename or "avatar").suffix or ".bin"
-    filename = f"avatar{original_suffix}"
-    destination = user_folder / filename
 
-    with destination.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+class AvatarStorageError(RuntimeError):
+    """Raised when the avatar cannot be written to its storage backend."""
 
-    upload_file.file.seek(0)
-    return f"/media/{user_id}/{filename}"
 
+class AvatarUploadNotFoundError(LookupError):
+    """Raised when a direct upload is completed before its object was stored."""
+
+
+class AvatarVerificationError(ValueError):
+    """Raised when a directly uploaded object does not match its upload token."""
+
+
+@dataclass(frozen=True)
+class PresignedUpload:
+    """Where and how the client sends an avatar without streaming it through the API."""
+
+    upload_id: str
+    url: str
+    fields: dict[str, str]
+    upload_token: str
+    max_bytes: int
+    expires_at: int
+
+
+@dataclass(frozen=True)
+class StoredAvatar:
+    """An uploaded original: its public URL, content digest and storage location."""
+
+    url: str
+    digest: str
+    # Filesystem path, or object key when ``in_s3`` is set.
+    location: str
+    in_s3: bool = False
+
+
+def save_avatar_file(user_id: str, upload_file: UploadFile, settings: Settings) -> StoredAvatar:
+    spooled, digest, _ = _spool_upload(upload_file, settings.avatar_max_bytes)
+    suffix = _avatar_suffix(upload_file)
+    try:
+        if _uses_filesystem(settings):
+            return _save_to_filesystem(user_id, spooled, digest, suffix, settings.media_root)
+        return _save_to_s3(user_id, spooled, digest, suffix, upload_file.content_type, settings)
+    finally:
+        spooled.close()
+
+
+def create_avatar_upload(
+    user_id: str, content_type: str, settings: Settings, local_upload_url: str
+) -> PresignedUpload:
+    """Issue a form POST target for a direct upload.
+
+    In S3 mode this is a presigned POST policy that S3 itself enforces (size
+    range and content type). In file-storage mode the form goes to
+    ``local_upload_url`` and the signed ``token`` field carries the same limits,
+    so clients build the same multipart form in both modes.
+    """
+    upload_id = uuid4().hex
+    max_bytes = settings.avatar_max_bytes
+    token, claims = issue_upload_token(user_id, upload_id, content_type, max_bytes)
+    if _uses_filesystem(settings):
+        url = local_upload_url
+        fields = {"token": token, "Content-Type": content_type}
+    else:
+        try:
+            post = get_s3_client(settings).generate_presigned_post(
+                settings.s3_bucket_name,
+                _staging_key(upload_id),
+                Fields={"Content-Type": content_type},
+                Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+                ExpiresIn=settings.avatar_upload_ttl_seconds,
+            )
+        except _s3_errors() as exc:
+            raise AvatarStorageError("Unable to presign avatar upload") from exc
+        url, fields = post["url"], post["fields"]
+    return PresignedUpload(
+        upload_id=upload_id,
+        url=url,
+        fields=fields,
+        upload_token=token,
+        max_bytes=max_bytes,
+        expires_at=claims.expires_at,
+    )
+
+
+def receive_local_upload(
+    token: str, content_type: str, upload_file: UploadFile, settings: Settings
+) -> None:
+    """File-storage stand-in for the presigned POST: stage the upload if the token allows it."""
+    claims = decode_upload_token(token)
+    if content_type != claims.content_type:
+        raise AvatarVerificationError("Content type does not match the upload token")
+    spooled, _, _ = _spool_upload(upload_file, claims.max_bytes)
+    try:
+        staging_dir = Path(settings.avatar_upload_dir)
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(staging_dir / claims.upload_id, spooled)
+    finally:
+        spooled.close()
+
+
+def complete_avatar_upload(user_id: str, token: str, settings: Settings) -> StoredAvatar:
+    """Verify a staged direct upload and move it to its content-addressed location."""
+    claims = decode_upload_token(token)
+    if claims.user_id != user_id:
+        raise InvalidUploadTokenError
+    suffix = AVATAR_CONTENT_TYPES[claims.content_type]
+    if _uses_filesystem(settings):
+        return _complete_local_upload(user_id, claims.upload_id, claims.content_type, suffix, settings)
+    return _complete_s3_upload(
+        user_id, claims.upload_id, claims.content_type, suffix, claims.max_bytes, settings
+    )
+
+
+def avatar_variant_name(digest: str, size: int) -> str:
+    return f"avatar-{size}-{digest[:32]}.webp"
+
+
+def save_avatar_variants(stored: StoredAvatar, settings: Settings) -> str:
+    """Render the WebP variants of ``stored`` and return the default variant's URL.
+
+    Variants are keyed by the original's content digest and shared between
+    users, so an image that was already processed is never decoded again.
+    """
+    if _uses_filesystem(settings):
+        folder = Path(settings.media_root) / VARIANTS_DIR
+        paths = {size: folder / avatar_variant_name(stored.digest, size) for size in AVATAR_VARIANT_SIZES}
+        if not all(path.exists() for path in paths.values()):
+            variants = render_in_pool(Path(stored.location).read_bytes(), settings)
+            folder.mkdir(parents=True, exist_ok=True)
+            for size, payload in variants.items():
+                _write_atomic(paths[size], io.BytesIO(payload))
+        return f"/media/{VARIANTS_DIR}/{avatar_variant_name(stored.digest, DEFAULT_AVATAR_VARIANT)}"
+
+    client = get_s3_client(settings)
+    bucket = settings.s3_bucket_name
+    keys = {
+        size: f"avatars/{VARIANTS_DIR}/{avatar_variant_name(stored.digest, size)}"
+        for size in AVATAR_VARIANT_SIZES
+    }
+    try:
+        if not _s3_object_exists(client, bucket, keys[DEFAULT_AVATAR_VARIANT]):
+            original = client.get_object(Bucket=bucket, Key=stored.location)["Body"].read()
+            variants = render_in_pool(original, settings)
+            # The default variant goes last: its presence marks the set as complete.
+            for size in sorted(variants, key=lambda value: value == DEFAULT_AVATAR_VARIANT):
+                client.put_object(
+                    Bucket=bucket,
+                    Key=keys[size],
+                    Body=variants[size],
+                    ContentType="image/webp",
+                    CacheControl=AVATAR_CACHE_CONTROL,
+                )
+    except _s3_errors() as exc:
+        raise AvatarStorageError("Unable to store avatar variants in S3") from exc
+    return f"{s3_public_base_url(settings)}/{keys[DEFAULT_AVATAR_VARIANT]}"
+
+
+def get_s3_client(settings: Settings) -> Any:
+    """Return the process-wide S3 client.
+
+    boto3 clients are thread-safe once built, but building one (credential
+    resolution, endpoint setup) is slow and not thread-safe, so it happens once
+    under a lock and the client's connection pool is reused for every upload.
+    """
+    global _s3_client, _s3_client_key
+    key = (settings.aws_region, settings.s3_endpoint_url, settings.s3_max_pool_connections)
+    with _s3_lock:
+        if _s3_client is None or _s3_client_key != key:
+            import boto3
+            from botocore.config import Config
+
+            config = Config(
+                max_pool_connections=settings.s3_max_pool_connections,
+                retries={"max_attempts": 3, "mode": "standard"},
+                s3={"addressing_style": "path"} if settings.s3_endpoint_url else None,
+            )
+            _s3_client = boto3.session.Session().client(
+                "s3",
+                region_name=settings.aws_region,
+                endpoint_url=settings.s3_endpoint_url,
+                config=config,
+            )
+            _s3_client_key = key
+        return _s3_client
+
+
+def s3_public_base_url(settings: Settings) -> str:
+    if settings.s3_public_base_url:
+        return settings.s3_public_base_url.rstrip("/")
+    if settings.s3_endpoint_url:
+        return f"{settings.s3_endpoint_url.rstrip('/')}/{settings.s3_bucket_name}"
+    return _default_bucket_url(settings.s3_bucket_name, settings.aws_region)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that marks content-hashed files as cacheable forever."""
+
+    def file_response(
+        self, full_path: Any, stat_result: os.stat_result, scope: Scope, status_code: int = 200
+    ) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME_PATTERN.search(str(full_path)):
+            response.headers["Cache-Control"] = AVATAR_CACHE_CONTROL
+        return response
 
-def _save_to_s3(user_id: str, upload_file: UploadFile, settings: Settings) -> str:
-    original_suffix = Path(upload_file.filename or "avatar").suffix or ".bin"
-    filename = f"{uuid4().hex}{original_suffix}"
-    key = f"avatars/{user_id}/{filename}"
-    client = boto3.client("s3", region_name=settings.aws_region)
+
+def _spool_upload(upload_file: UploadFile, max_bytes: int) -> tuple[IO[bytes], str, int]:
+    """Copy the upload in chunks, hashing it and stopping as soon as it exceeds ``max_bytes``."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    digest = hashlib.sha256()
+    size = 0
     upload_file.file.seek(0)
+    try:
+        while True:
+            chunk = upload_file.file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise AvatarTooLargeError
+            digest.update(chunk)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    finally:
+        upload_file.file.seek(0)
+    spooled.seek(0)
+    return spooled, digest.hexdigest(), size
+
+
+def _staging_key(upload_id: str) -> str:
+    return f"{UPLOADS_PREFIX}/{upload_id}"
+
+
+def _check_signature(head: bytes, content_type: str) -> None:
+    """Reject objects whose leading bytes do not match the declared image type."""
+    if content_type == "image/jpeg":
+        valid = head.startswith(b"\xff\xd8\xff")
+    elif content_type == "image/png":
+        valid = head.startswith(b"\x89PNG\r\n\x1a\n")
+    else:
+        valid = head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    if not valid:
+        raise AvatarVerificationError(f"Uploaded object is not a {content_type} image")
+
+
+def _complete_local_upload(
+    user_id: str, upload_id: str, content_type: str, suffix: str, settings: Settings
+) -> StoredAvatar:
+    staged = Path(settings.avatar_upload_dir) / upload_id
+    try:
+        source = staged.open("rb")
+    except FileNotFoundError as exc:
+        raise AvatarUploadNotFoundError(upload_id) from exc
+    with source:
+        _check_signature(source.read(16), content_type)
+        source.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(0)
+        stored = _save_to_filesystem(user_id, source, digest.hexdigest(), suffix, settings.media_root)
+    staged.unlink(missing_ok=True)
+    return stored
+
+
+def _complete_s3_upload(
+    user_id: str, upload_id: str, content_type: str, suffix: str, max_bytes: int, settings: Settings
+) -> StoredAvatar:
+    client = get_s3_client(settings)
+    bucket = settings.s3_bucket_name
+    staging_key = _staging_key(upload_id)
+    try:
+        try:
+            head = client.head_object(Bucket=bucket, Key=staging_key)
+        except _client_error() as exc:
+            if exc.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                raise AvatarUploadNotFoundError(upload_id) from exc
+            raise
+        if not 0 < head["ContentLength"] <= max_bytes or head.get("ContentType") != content_type:
+            raise AvatarVerificationError("Uploaded object does not match the upload token")
+        # Hashed here, not taken from the ETag (MD5), so direct and proxied uploads share SHA-256 keys.
+        body = client.get_object(Bucket=bucket, Key=staging_key)["Body"]
+        leading = body.read(16)
+        _check_signature(leading, content_type)
+        sha256 = hashlib.sha256(leading)
+        for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+        key = f"avatars/{user_id}/avatar-{digest[:32]}{suffix}"
+        client.copy_object(
+            Bucket=bucket,
+            Key=key,
+            CopySource={"Bucket": bucket, "Key": staging_key},
+            ContentType=content_type,
+            CacheControl=AVATAR_CACHE_CONTROL,
+            MetadataDirective="REPLACE",
+        )
+        client.delete_object(Bucket=bucket, Key=staging_key)
+    except _s3_errors() as exc:
+        raise AvatarStorageError("Unable to verify avatar upload in S3") from exc
+    return StoredAvatar(url=f"{s3_public_base_url(settings)}/{key}", digest=digest, location=key, in_s3=True)
+
+
+def _s3_errors() -> tuple[type[Exception], ...]:
+    # botocore is only imported once S3 is actually used; file-storage workers never load it.
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    return BotoCoreError, ClientError
+
+
+def _client_error() -> type[Exception]:
+    from botocore.exceptions import ClientError
+
+    return ClientError
+
+
+def _uses_filesystem(settings: Settings) -> bool:
+    return settings.use_file_storage or not settings.s3_bucket_name
+
+
+def _s3_object_exists(client: Any, bucket: str, key: str) -> bool:
+    try:
+        client.head_object(Bucket=bucket, Key=key)
+    except _client_error() as exc:
+        if exc.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+            return False
+        raise
+    return True
+
+
+def _write_atomic(destination: Path, source: IO[bytes]) -> None:
+    temporary = destination.with_name(f".{destination.name}.tmp")
+    with temporary.open("wb") as buffer:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.write(chunk)
+    os.replace(temporary, destination)
+
+
+def _avatar_suffix(upload_file: UploadFile) -> str:
+    return (Path(upload_file.filename or "avatar").suffix or ".bin").lower()
+
+
+def _save_to_filesystem(
+    user_id: str, source: IO[bytes], digest: str, suffix: str, media_root: str
+) -> StoredAvatar:
+    user_folder = Path(media_root) / user_id
+    user_folder.mkdir(parents=True, exist_ok=True)
+
+    filename = f"avatar-{digest[:16]}{suffix}"
+    destination = user_folder / filename
+    if not destination.exists():
+        _write_atomic(destination, source)
+    for previous in user_folder.glob("avatar*"):
+        if previous.name != filename:
+            previous.unlink(missing_ok=True)
+    return StoredAvatar(url=f"/media/{user_id}/{filename}", digest=digest, location=str(destination))
+
+
+def _save_to_s3(
+    user_id: str,
+    source: IO[bytes],
+    digest: str,
+    suffix: str,
+    content_type: Optional[str],
+    settings: Settings,
+) -> StoredAvatar:
+    key = f"avatars/{user_id}/avatar-{digest[:32]}{suffix}"
+    from boto3.s3.transfer import TransferConfig
+
+    client = get_s3_client(settings)
+    # upload_fileobj switches to a parallel multipart upload above the threshold.
+    transfer_config = TransferConfig(
+        multipart_threshold=settings.s3_multipart_threshold,
+        multipart_chunksize=settings.s3_multipart_threshold,
+        max_concurrency=4,
+    )
     try:
         client.upload_fileobj(
-            upload_file.file,
+            source,
             settings.s3_bucket_name,
             key,
-            ExtraArgs={"ContentType": upload_file.content_type or "application/octet-stream"},
+            ExtraArgs={
+                "ContentType": content_type or "application/octet-stream",
+                "CacheControl": AVATAR_CACHE_CONTROL,
+            },
+            Config=transfer_config,
         )
-    except (BotoCoreError, ClientError) as exc:
-        raise RuntimeError("Unable to upload avatar to S3") from exc
-    finally:
-        upload_file.file.seek(0)
+    except _s3_errors() as exc:
+        raise AvatarStorageError("Unable to upload avatar to S3") from exc
 
-    base_url = settings.s3_public_base_url or _default_bucket_url(settings.s3_bucket_name, settings.aws_region)
-    return f"{base_url}/{key}"
+    return StoredAvatar(url=f"{s3_public_base_url(settings)}/{key}", digest=digest, location=key, in_s3=True)
 
 
 def _default_bucket_url(bucket: str, region: str) -> str:
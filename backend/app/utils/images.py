@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import io
+import threading
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from ..config import Settings
+from .process_pool import BoundedProcessPool
+
+AVATAR_VARIANT_SIZES = (48, 128, 512)
+DEFAULT_AVATAR_VARIANT = 128
+WEBP_QUALITY = 80
+# Refuse to decode anything larger than ~40 megapixels (decompression bombs).
+MAX_SOURCE_PIXELS = 40_000_000
+# Background jobs may queue for a while; request threads never wait on this pool.
+POOL_WAIT_SECONDS = 30.0
+
+
+class ImageProcessingError(ValueError):
+    """Raised when an uploaded avatar cannot be decoded as an image."""
+
+
+_pool_lock = threading.Lock()
+_pool_state: Optional[tuple[Settings, BoundedProcessPool]] = None
+
+
+def render_avatar_variants(data: bytes, sizes: tuple[int, ...] = AVATAR_VARIANT_SIZES) -> dict[int, bytes]:
+    """Decode once and return a square, metadata-free WebP per size.
+
+    Runs inside the image pool workers, so it must stay a picklable top-level function.
+    """
+    largest = max(sizes)
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            width, height = source.size
+            if width * height > MAX_SOURCE_PIXELS:
+                raise ImageProcessingError(f"Image is too large to process ({width}x{height})")
+            # JPEG sources are decoded at the smallest DCT scale that still covers ``largest``.
+            source.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ImageProcessingError("Avatar is not a readable image") from exc
+
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    current = image.crop((left, top, left + side, top + side))
+    variants: dict[int, bytes] = {}
+    # Resize largest first so each smaller variant starts from an already reduced image.
+    for size in sorted(sizes, reverse=True):
+        current = current.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        current.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def render_in_pool(data: bytes, settings: Settings) -> dict[int, bytes]:
+    return _image_pool(settings).run(render_avatar_variants, data, AVATAR_VARIANT_SIZES)
+
+
+def _image_pool(settings: Settings) -> BoundedProcessPool:
+    global _pool_state
+    state = _pool_state
+    if state is not None and state[0] is settings:
+        return state[1]
+    with _pool_lock:
+        if _pool_state is None or _pool_state[0] is not settings:
+            if _pool_state is not None:
+                _pool_state[1].shutdown()
+            pool = BoundedProcessPool(
+                "avatar-processing",
+                max_workers=settings.avatar_processing_workers,
+                max_pending=settings.avatar_processing_max_pending,
+                wait_seconds=POOL_WAIT_SECONDS,
+            )
+            _pool_state = (settings, pool)
+        return _pool_state[1]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when a bounded pool has no free slot within the allowed wait."""
+
+
+class BoundedProcessPool:
+    """Process pool for CPU-heavy work with a cap on queued jobs.
+
+    Callers block (up to ``wait_seconds``) for one of ``max_pending`` slots
+    before a job is queued, so a burst can never tie up more than
+    ``max_pending`` request threads. With ``max_workers=0`` jobs run inline,
+    which keeps tests and single-process dev servers simple.
+
+    The executor is created lazily and re-created after a fork, so workers are
+    never shared between uvicorn processes.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, wait_seconds: float) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, func: Callable[..., T], *args: Any) -> Future:
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise PoolBusyError(f"{self.name} pool is saturated")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.max_workers <= 0:
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    def warm(self, func: Callable[[], Any] = os.getpid) -> None:
+        """Start every worker now and run ``func`` in it, so first requests skip process start-up."""
+        if self.max_workers <= 0:
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(func) for _ in range(self.max_workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pid = None
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from .cache import get_cache
+from .config import Settings
+from .crud import group as group_crud
+from .database import warm_pool
+from .utils.authentication import warm_hash_pool
+
+logger = logging.getLogger("signup_app.warmup")
+
+PENDING = "pending"
+DONE = "done"
+# Group details of the newest groups are the hottest cache keys right after a deploy.
+WARMUP_GROUPS = 50
+
+_state_lock = threading.Lock()
+# None until this process schedules a warm-up; /ready only waits for one that was started.
+_status: Optional[str] = None
+
+
+def warmup_status() -> Optional[str]:
+    with _state_lock:
+        return _status
+
+
+def start_warmup(settings: Settings) -> threading.Thread:
+    """Run :func:`run_warmup` in the background; ``/ready`` fails until it finishes."""
+    _set_status(PENDING)
+    thread = threading.Thread(target=_run_and_mark_done, args=(settings,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def run_warmup(settings: Settings) -> dict[str, float]:
+    """Touch everything the first requests would otherwise pay for; returns milliseconds per step.
+
+    A failing step is logged and skipped: the readiness checks report a storage
+    backend that is actually down.
+    """
+    steps: dict[str, Callable[[], object]] = {}
+    if not settings.use_file_storage:
+        steps["database_pool"] = warm_pool
+    steps["password_hashing"] = warm_hash_pool
+    if get_cache().enabled:
+        steps["group_details"] = _warm_group_details
+
+    timings: dict[str, float] = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:  # noqa: BLE001 - warm-up must never keep the worker from starting
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Warm-up finished: %s", ", ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
+    return timings
+
+
+def _warm_group_details() -> int:
+    """Fill the cache with the detail documents of the newest groups; returns how many."""
+    group_ids = group_crud.recent_group_ids(WARMUP_GROUPS)
+    for group_id in group_ids:
+        group_crud.get_group_json(group_id)
+    return len(group_ids)
+
+
+def _run_and_mark_done(settings: Settings) -> None:
+    try:
+        run_warmup(settings)
+    finally:
+        _set_status(DONE)
+
+
+def _set_status(status: Optional[str]) -> None:
+    global _status
+    with _state_lock:
+        _status = status
@@ -0,0 +1,232 @@
+"""Time the crud entry points against a large seeded dataset and compare with a stored baseline.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_crud                      # 10k users, 1k groups, 100k expenses
+    python -m benchmarks.bench_crud --expenses 1000000 --backends file
+    python -m benchmarks.bench_crud --save-baseline      # record the current numbers
+
+Each backend gets the same deterministic dataset from :mod:`benchmarks.seed`.
+``file`` writes the JSON storage files; ``sqlite`` bulk-loads the SQLite
+stand-in from ``tests.mysql_standin`` and routes the crud modules'
+``get_connection`` to it.
+The cache tier is disabled so every call reaches storage. One group (the "hot"
+group) holds a tenth of all expenses so the large-group paths are exercised.
+
+Results are compared with ``benchmarks/baselines/bench_crud.json`` when it holds
+numbers for the same dataset shape. A case slower than the baseline by more
+than ``--tolerance`` is flagged and the script exits with status 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from app import config
+from app.crud import analytics as analytics_crud
+from app.crud import expense as expense_crud
+from app.crud import group as group_crud
+from app.crud import user as user_crud
+from app.crud.file_storage import GroupRecord, UserRecord
+from app.database import InstrumentedConnection
+from app.schemas.expense import ExpenseCreate
+from tests.mysql_standin import StandInConnection
+
+from .seed import Dataset, generate, load_sqlite, write_files
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "bench_crud.json"
+BACKENDS = ("file", "sqlite")
+MEMBERS_PER_GROUP = 10
+HOT_GROUP_MEMBERS = 50
+HOT_GROUP_SHARE = 0.1
+
+
+@dataclass
+class BenchData:
+    dataset: Dataset
+    hot_group_id: str
+    busy_user_id: str
+
+    @property
+    def users(self) -> list[UserRecord]:
+        return self.dataset.users
+
+    @property
+    def groups(self) -> list[GroupRecord]:
+        return self.dataset.groups
+
+
+def build_dataset(user_count: int, group_count: int, expense_count: int, seed: int = 7) -> BenchData:
+    dataset = generate(
+        user_count,
+        group_count,
+        expense_count,
+        huge_groups=1,
+        huge_members=HOT_GROUP_MEMBERS,
+        huge_share=HOT_GROUP_SHARE,
+        max_members=MEMBERS_PER_GROUP,
+        seed=seed,
+    )
+    # The busy user belongs to every group, which is the worst case for per-user lookups.
+    busy_user_id = dataset.users[0]["id"]
+    for group in dataset.groups:
+        if busy_user_id not in group["members"]:
+            group["members"].append(busy_user_id)
+    return BenchData(dataset=dataset, hot_group_id=dataset.groups[0]["id"], busy_user_id=busy_user_id)
+
+
+def prepare_file_backend(data: BenchData, directory: Path) -> None:
+    users_path = directory / "users.json"
+    groups_path = directory / "groups.json"
+    write_files(data.dataset, users_path, groups_path, force=True)
+    _configure(USE_FILE_STORAGE="true", DATA_FILE_PATH=str(users_path), GROUPS_FILE_PATH=str(groups_path))
+
+
+def prepare_sqlite_backend(data: BenchData, directory: Path) -> None:
+    path = directory / "bench.db"
+    load_sqlite(data.dataset, path, batch_size=5_000, force=True)
+
+    def connect() -> InstrumentedConnection:
+        return InstrumentedConnection(StandInConnection(path))
+
+    for module in (user_crud, group_crud, expense_crud, analytics_crud):
+        module.get_connection = connect  # type: ignore[attr-defined]
+    _configure(USE_FILE_STORAGE="false")
+
+
+def _configure(**env: str) -> None:
+    os.environ.update({"CACHE_BACKEND": "none", "OUTBOX_WORKER_ENABLED": "false", **env})
+    config.get_settings.cache_clear()
+
+
+def crud_cases(dataset: BenchData) -> dict[str, Callable[[], Any]]:
+    small_group = dataset.groups[-1]
+    emails = {user["id"]: user["email"] for user in dataset.users}
+    payer_email = emails[small_group["members"][1]]
+
+    def add_and_delete_expense() -> None:
+        detail = expense_crud.add_expense_to_group(
+            small_group["id"], ExpenseCreate(payer_email=payer_email, amount=12.5, note="bench")
+        )
+        added = next(expense for expense in detail.expenses if expense.note == "bench")
+        expense_crud.delete_expense_from_group(small_group["id"], added.id)
+
+    return {
+        "list_users": user_crud.list_users,
+        "get_user(busy)": lambda: user_crud.get_user(dataset.busy_user_id),
+        "list_user_groups(busy)": lambda: group_crud.list_user_groups(dataset.busy_user_id),
+        "get_group(hot)": lambda: group_crud.get_group(dataset.hot_group_id),
+        "get_group_json(hot)": lambda: group_crud.get_group_json(dataset.hot_group_id),
+        "get_group(small)": lambda: group_crud.get_group(small_group["id"]),
+        "get_group_analytics(hot)": lambda: analytics_crud.get_group_analytics(dataset.hot_group_id),
+        "add+delete_expense(small)": add_and_delete_expense,
+    }
+
+
+def balance_cases(dataset: BenchData) -> dict[str, Callable[[], Any]]:
+    """Pure in-memory hot paths, independent of the storage backend."""
+    hot_group = dataset.groups[0]
+    users = {user["id"]: user for user in dataset.users}
+    detail = group_crud._group_detail_from_record(hot_group, users)
+    return {
+        "_group_detail_from_record(hot)": lambda: group_crud._group_detail_from_record(hot_group, users),
+        "_calculate_balances(hot)": lambda: group_crud._calculate_balances(
+            detail.members, detail.expenses, detail.base_currency
+        ),
+    }
+
+
+def time_cases(cases: dict[str, Callable[[], Any]], repeat: int) -> dict[str, float]:
+    results: dict[str, float] = {}
+    for name, func in cases.items():
+        func()  # warm-up: imports, pools, page cache
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+        results[name] = round(statistics.median(samples) * 1000, 3)
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    regressions = []
+    for backend, cases in results.items():
+        for name, value in cases.items():
+            previous = baseline.get(backend, {}).get(name)
+            if previous and value > previous * (1 + tolerance):
+                regressions.append(f"{backend} {name}: {value:.1f} ms vs baseline {previous:.1f} ms")
+    return regressions
+
+
+def load_baseline(path: Path, shape: str) -> dict[str, dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get(shape, {})
+
+
+def save_baseline(path: Path, shape: str, results: dict[str, dict[str, float]]) -> None:
+    stored = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    stored.setdefault(shape, {}).update(results)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--groups", type=int, default=1_000)
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data = build_dataset(args.users, args.groups, args.expenses, args.seed)
+    shape = f"{args.users}u-{args.groups}g-{args.expenses}e"
+    print(f"Seeded {shape} in {time.perf_counter() - started:.1f}s")
+
+    results: dict[str, dict[str, float]] = {"memory": time_cases(balance_cases(data), args.repeat)}
+    with tempfile.TemporaryDirectory(prefix="bench-crud-") as directory:
+        for backend in args.backends:
+            prepare = prepare_file_backend if backend == "file" else prepare_sqlite_backend
+            prepare(data, Path(directory))
+            results[backend] = time_cases(crud_cases(data), args.repeat)
+
+    baseline = load_baseline(args.baseline, shape)
+    print(f"{'backend':<8} {'case':<32} {'median ms':>10} {'baseline':>10}")
+    for backend, cases in results.items():
+        for name, value in cases.items():
+            previous = baseline.get(backend, {}).get(name)
+            reference = f"{previous:>10.1f}" if previous else f"{'-':>10}"
+            print(f"{backend:<8} {name:<32} {value:>10.1f} {reference}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, shape, results)
+        print(f"Baseline for {shape} written to {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
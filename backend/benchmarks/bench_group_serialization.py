@@ -0,0 +1,114 @@
+"""Compare the validated and pre-serialized ``GET /groups/{group_id}`` response paths.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_group_serialization --sizes 1000 10000 100000
+
+The validated path mirrors what FastAPI does for a ``GroupDetail`` returned from
+an endpoint: build the Pydantic models, validate them again against the
+``response_model`` and encode with the stdlib ``json`` module. The fast path
+builds plain dicts from storage rows and encodes them once with orjson.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+from uuid import uuid4
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.crud import group as group_crud
+from app.crud.file_storage import GroupRecord, UserRecord
+from app.schemas.group import GroupDetail
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+MEMBER_COUNT = 25
+
+_RESPONSE_FIELD = create_response_field(name="Response_get_group", type_=GroupDetail)
+
+
+def build_dataset(expense_count: int, member_count: int = MEMBER_COUNT) -> tuple[GroupRecord, dict[str, UserRecord]]:
+    base = datetime(2024, 1, 1)
+    users: dict[str, UserRecord] = {}
+    for index in range(member_count):
+        user_id = str(uuid4())
+        users[user_id] = {"id": user_id, "name": f"Member {index}", "email": f"member{index}@example.com"}
+    member_ids = list(users)
+    group_id = str(uuid4())
+    expenses = [
+        {
+            "id": str(uuid4()),
+            "group_id": group_id,
+            "payer_id": member_ids[index % member_count],
+            "amount": float(index % 500) + 0.25,
+            "note": f"Expense {index}",
+            "status": "assigned",
+            "created_at": (base + timedelta(minutes=index)).isoformat(),
+        }
+        for index in range(expense_count)
+    ]
+    record: GroupRecord = {
+        "id": group_id,
+        "name": "Benchmark",
+        "owner_id": member_ids[0],
+        "description": None,
+        "created_at": base.isoformat(),
+        "members": member_ids,
+        "expenses": expenses,
+    }
+    return record, users
+
+
+def validated_path(loop: asyncio.AbstractEventLoop, record: GroupRecord, users: dict[str, UserRecord]) -> bytes:
+    detail = group_crud._group_detail_from_record(record, users)
+    content = loop.run_until_complete(
+        serialize_response(field=_RESPONSE_FIELD, response_content=detail)
+    )
+    return JSONResponse(content).body
+
+
+def fast_path(record: GroupRecord, users: dict[str, UserRecord]) -> bytes:
+    return orjson.dumps(group_crud._group_payload_from_record(record, users))
+
+
+def _time(func: Callable[[], bytes], repeat: int) -> tuple[float, int]:
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func())
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print(f"{'expenses':>10} {'validated ms':>13} {'fast ms':>10} {'speedup':>8} {'bytes':>12}")
+    for size in args.sizes:
+        record, users = build_dataset(size)
+        slow_bytes = validated_path(loop, record, users)
+        fast_bytes = fast_path(record, users)
+        if orjson.loads(slow_bytes) != orjson.loads(fast_bytes):
+            raise SystemExit(f"Response documents differ for {size} expenses")
+        repeat = max(1, args.repeat if size <= 10_000 else args.repeat // 2)
+        slow, _ = _time(lambda: validated_path(loop, record, users), repeat)
+        fast, length = _time(lambda: fast_path(record, users), repeat)
+        print(f"{size:>10} {slow * 1000:>13.1f} {fast * 1000:>10.1f} {slow / fast:>7.1f}x {length:>12}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Measure cold-start import time and memory of ``app.main`` for each storage mode.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_startup                  # file, mysql and s3 modes, 5 runs each
+    python -m benchmarks.bench_startup --modes file --repeat 20
+
+Every run is a fresh interpreter that imports ``app.main`` and reports the
+import time, the peak RSS of the process and which optional drivers ended up in
+``sys.modules``. ``baseline`` is a bare interpreter, so the difference is what
+the app itself costs. ``eager`` imports the MySQL driver and boto3 up front, as
+every worker did before they were loaded on first use.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DRIVERS = ("mysql.connector", "boto3", "botocore")
+MODES: dict[str, dict[str, str]] = {
+    "baseline": {},
+    "file": {"USE_FILE_STORAGE": "true"},
+    "mysql": {"USE_FILE_STORAGE": "false"},
+    "s3": {"USE_FILE_STORAGE": "false", "S3_BUCKET_NAME": "bench-startup"},
+    "eager": {"USE_FILE_STORAGE": "false", "S3_BUCKET_NAME": "bench-startup"},
+}
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+if {eager!r}:
+    import boto3, mysql.connector
+if {import_app!r}:
+    import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "drivers": [name for name in {drivers!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_once(mode: str) -> dict[str, Any]:
+    script = PROBE.format(eager=mode == "eager", import_app=mode != "baseline", drivers=DRIVERS)
+    env = {
+        **os.environ,
+        **MODES[mode],
+        "CACHE_BACKEND": "none",
+        "OUTBOX_WORKER_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(mode: str, repeat: int) -> dict[str, Any]:
+    runs = [run_once(mode) for _ in range(repeat)]
+    return {
+        "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+        "rss_mib": round(statistics.median(run["rss_mib"] for run in runs), 1),
+        "drivers": runs[-1]["drivers"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.repeat) for mode in args.modes}
+    print(f"{'mode':<10} {'import ms':>10} {'peak RSS MiB':>13}  drivers loaded")
+    for mode, result in results.items():
+        drivers = ", ".join(result["drivers"]) or "-"
+        print(f"{mode:<10} {result['import_ms']:>10.1f} {result['rss_mib']:>13.1f}  {drivers}")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Drive a locally started API with a realistic request mix and report throughput and latency percentiles.
+
+Run from ``backend/``::
+
+    python -m benchmarks.load_test --mode file --workers 1 --duration 30
+    python -m benchmarks.load_test --mode sqlite --workers 4 --pool-size 10 --concurrency 100
+    python -m benchmarks.load_test --mode mysql --workers 2   # uses DB_* from the environment
+
+The script starts ``uvicorn`` with the requested worker count and pool size,
+seeds users, groups and memberships through the public API, then runs
+``--concurrency`` virtual users for ``--duration`` seconds. Each virtual user
+picks the next operation from ``--mix`` (weights per operation):
+
+* ``signup``: ``POST /signup`` with a fresh email
+* ``login``: ``POST /login`` as a seeded user
+* ``list_groups``: ``GET /users/{user_id}/groups``
+* ``group_detail``: ``GET /groups/{group_id}``, the polling path
+* ``expense_write``: ``POST /groups/{group_id}/expenses``
+
+``sqlite`` mode serves :mod:`benchmarks.standin_app` against a fresh SQLite
+stand-in database. ``mysql`` expects a reachable server with ``db/schema.sql``
+applied. Rate limiting is disabled unless ``--rate-limit`` is given, since all
+traffic comes from one address. Pass ``--base-url`` to target a server that is
+already running; seeding still goes through the API.
+
+File mode rewrites a whole JSON document per write, so concurrent writes to the
+same file can overwrite each other (last writer wins). Its numbers show what one
+task can serve, not a supported multi-writer setup.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+import httpx
+
+from tests.mysql_standin import create_database
+
+DEFAULT_MIX = "signup=5,login=10,list_groups=25,group_detail=45,expense_write=15"
+PASSWORD = "load-test-secret"
+MODES = ("file", "sqlite", "mysql")
+
+
+@dataclass
+class Fixture:
+    users: list[dict] = field(default_factory=list)
+    groups: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class Samples:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    statuses: dict[str, dict[str, int]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(int)))
+
+    def record(self, operation: str, seconds: float, status: str) -> None:
+        self.latencies[operation].append(seconds)
+        self.statuses[operation][status] += 1
+        if not status.isdigit() or int(status) >= 400:
+            self.errors[operation] += 1
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for entry in raw.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# --- Server -----------------------------------------------------------------
+
+
+def start_server(args: argparse.Namespace, workdir: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "APP_ENV": os.environ.get("APP_ENV", "dev"),
+        "DB_POOL_SIZE": str(args.pool_size),
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        "OUTBOX_SINK": "memory",
+        "CACHE_BACKEND": os.environ.get("CACHE_BACKEND", "none"),
+        "MEDIA_ROOT": str(workdir / "media"),
+        "LOG_LEVEL": "WARNING",
+    }
+    app_path = "app.main:app"
+    if args.mode == "file":
+        env.update(
+            USE_FILE_STORAGE="true",
+            DATA_FILE_PATH=str(workdir / "users.json"),
+            GROUPS_FILE_PATH=str(workdir / "groups.json"),
+        )
+    else:
+        env["USE_FILE_STORAGE"] = "false"
+    if args.mode == "sqlite":
+        env["STANDIN_DB_PATH"] = str(create_database(workdir / "load.db"))
+        # The stand-in has no SKIP LOCKED; queued signup events simply accumulate and
+        # recurring schedules are left for a manual run.
+        env["OUTBOX_WORKER_ENABLED"] = "false"
+        env["RECURRING_SCHEDULER_ENABLED"] = "false"
+        app_path = "benchmarks.standin_app:app"
+    command = [
+        sys.executable, "-m", "uvicorn", app_path,
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ]
+    return subprocess.Popen(command, env=env, cwd=Path(__file__).resolve().parent.parent)
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Server did not become healthy in time")
+
+
+# --- Seeding ----------------------------------------------------------------
+
+
+async def seed(
+    client: httpx.AsyncClient, user_count: int, group_count: int, members: int, parallel: int
+) -> Fixture:
+    fixture = Fixture()
+    run_id = uuid4().hex[:8]
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def signup(index: int) -> None:
+        async with semaphore:
+            email = f"seed-{run_id}-{index}@example.com"
+            body = {"name": f"Seed {index}", "email": email, "password": PASSWORD}
+            response = await client.post("/signup", json=body)
+            response.raise_for_status()
+            fixture.users.append({"id": response.json()["id"], "email": email})
+
+    await asyncio.gather(*(signup(index) for index in range(user_count)))
+    rng = random.Random(7)
+    for index in range(group_count):
+        owner = fixture.users[index % len(fixture.users)]
+        body = {"owner_id": owner["id"], "name": f"Load {run_id} {index}"}
+        response = await client.post("/groups", json=body)
+        response.raise_for_status()
+        group = {"id": response.json()["id"], "members": [owner]}
+        others = [user for user in fixture.users if user is not owner]
+        for member in rng.sample(others, min(members - 1, len(others))):
+            added = await client.post(
+                f"/groups/{group['id']}/members", json={"requester_id": owner["id"], "user_email": member["email"]}
+            )
+            added.raise_for_status()
+            group["members"].append(member)
+        fixture.groups.append(group)
+    return fixture
+
+
+# --- Operations -------------------------------------------------------------
+
+
+async def op_signup(client: httpx.AsyncClient, fixture: Fixture, rng: random.Random) -> httpx.Response:
+    email = f"load-{uuid4().hex}@example.com"
+    return await client.post("/signup", json={"name": "Load User", "email": email, "password": PASSWORD})
+
+
+async def op_login(client: httpx.AsyncClient, fixture: Fixture, rng: random.Random) -> httpx.Response:
+    user = rng.choice(fixture.users)
+    return await client.post("/login", json={"email": user["email"], "password": PASSWORD})
+
+
+async def op_list_groups(client: httpx.AsyncClient, fixture: Fixture, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/users/{rng.choice(fixture.users)['id']}/groups")
+
+
+async def op_group_detail(client: httpx.AsyncClient, fixture: Fixture, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/groups/{rng.choice(fixture.groups)['id']}")
+
+
+async def op_expense_write(client: httpx.AsyncClient, fixture: Fixture, rng: random.Random) -> httpx.Response:
+    group = rng.choice(fixture.groups)
+    payer = rng.choice(group["members"])
+    body = {"payer_email": payer["email"], "amount": round(rng.uniform(1, 200), 2), "note": "load test"}
+    return await client.post(f"/groups/{group['id']}/expenses", json=body)
+
+
+OPERATIONS = {
+    "signup": op_signup,
+    "login": op_login,
+    "list_groups": op_list_groups,
+    "group_detail": op_group_detail,
+    "expense_write": op_expense_write,
+}
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    fixture: Fixture,
+    mix: dict[str, float],
+    deadline: float,
+    samples: Samples,
+    seed: int,
+) -> None:
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.monotonic() < deadline:
+        operation = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await OPERATIONS[operation](client, fixture, rng)
+            status = str(response.status_code)
+        except httpx.HTTPError as exc:
+            status = type(exc).__name__
+        samples.record(operation, time.perf_counter() - started, status)
+
+
+# --- Report -----------------------------------------------------------------
+
+
+def build_report(samples: Samples, elapsed: float, args: argparse.Namespace) -> dict:
+    endpoints = {}
+    total = 0
+    total_errors = 0
+    for operation, latencies in sorted(samples.latencies.items()):
+        ordered = sorted(latencies)
+        errors = samples.errors.get(operation, 0)
+        total += len(ordered)
+        total_errors += errors
+        endpoints[operation] = {
+            "requests": len(ordered),
+            "rps": round(len(ordered) / elapsed, 1),
+            "error_rate": round(errors / len(ordered), 4),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+            "statuses": dict(samples.statuses[operation]),
+        }
+    return {
+        "mode": args.mode,
+        "workers": args.workers,
+        "pool_size": args.pool_size,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(total_errors / total, 4) if total else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"\nmode={report['mode']} workers={report['workers']} pool={report['pool_size']} "
+        f"concurrency={report['concurrency']} duration={report['duration_s']}s"
+    )
+    print(f"{'endpoint':<14} {'requests':>9} {'rps':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in report["endpoints"].items():
+        print(
+            f"{name:<14} {row['requests']:>9} {row['rps']:>8.1f} {row['error_rate']:>7.2%} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+    print(f"{'total':<14} {report['requests']:>9} {report['rps']:>8.1f} {report['error_rate']:>7.2%}")
+
+
+# --- Entry point ------------------------------------------------------------
+
+
+async def run(args: argparse.Namespace, base_url: str) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_healthy(client)
+        started = time.perf_counter()
+        # The JSON files are rewritten whole on every write; concurrent signups would drop each other.
+        parallel = 1 if args.mode == "file" else 16
+        fixture = await seed(client, args.seed_users, args.seed_groups, args.members, parallel)
+        seeded_in = time.perf_counter() - started
+        print(f"Seeded {len(fixture.users)} users and {len(fixture.groups)} groups in {seeded_in:.1f}s")
+        samples = Samples()
+        deadline = time.monotonic() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(virtual_user(client, fixture, mix, deadline, samples, seed) for seed in range(args.concurrency))
+        )
+        return build_report(samples, time.perf_counter() - started, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, default="file")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--pool-size", type=int, default=5, help="DB_POOL_SIZE per worker")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load after seeding")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed-users", type=int, default=200)
+    parser.add_argument("--seed-groups", type=int, default=20)
+    parser.add_argument("--members", type=int, default=8, help="members per seeded group")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limiter enabled")
+    parser.add_argument("--base-url", help="load an already running server instead of starting one")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    server: Optional[subprocess.Popen] = None
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        if args.base_url is None:
+            server = start_server(args, Path(workdir))
+        try:
+            report = asyncio.run(run(args, args.base_url or f"http://127.0.0.1:{args.port}"))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
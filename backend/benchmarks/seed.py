@@ -0,0 +1,270 @@
+"""Generate a deterministic synthetic dataset and bulk-load it into file storage, SQLite or MySQL.
+
+Run from ``backend/``::
+
+    python -m benchmarks.seed --target file --users 10000 --groups 1000 --expenses 1000000
+    python -m benchmarks.seed --target sqlite --sqlite-path /tmp/seed.db --huge-groups 5
+    python -m benchmarks.seed --target mysql --force       # uses DB_* from the environment
+
+Group sizes are skewed: ``--huge-groups`` groups get ``--huge-members`` members
+and ``--huge-share`` of all expenses; every other group has between 2 and
+``--max-members`` members and shares the remaining expenses evenly. Every user
+gets the password ``--password`` (hashed once with the configured KDF), so
+seeded accounts can log in.
+
+Rows are written directly: whole documents for the JSON files, batched
+``executemany`` inserts for the databases. The crud layer is bypassed, so no
+outbox events, cache invalidations or change-feed messages are produced.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+import orjson
+
+from app.config import get_settings
+from app.crud.file_storage import GroupRecord, UserRecord
+from app.utils.authentication import hash_password
+from tests.mysql_standin import create_database
+
+TARGETS = ("file", "sqlite", "mysql")
+DEFAULT_PASSWORD = "password123"
+BASE_TIME = datetime(2024, 1, 1)
+# Version 4 and RFC 4122 variant bits.
+_UUID4_CLEAR = ~((0xF000 << 64) | (0xC000 << 48))
+_UUID4_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+@dataclass
+class Dataset:
+    users: list[UserRecord]
+    groups: list[GroupRecord]  # file layout: members and expenses embedded
+    shape: str
+
+    @property
+    def expense_count(self) -> int:
+        return sum(len(group["expenses"]) for group in self.groups)
+
+
+def generate(
+    user_count: int,
+    group_count: int,
+    expense_count: int,
+    *,
+    huge_groups: int = 3,
+    huge_members: int = 200,
+    huge_share: float = 0.5,
+    max_members: int = 6,
+    seed: int = 7,
+    password_hash: str = "seeded$not-a-real-hash",
+) -> Dataset:
+    rng = random.Random(seed)
+    getrandbits = rng.getrandbits
+
+    def new_id() -> str:
+        # Same value as str(UUID(int=..., version=4)) without building UUID objects.
+        value = "%032x" % (getrandbits(128) & _UUID4_CLEAR | _UUID4_SET)
+        return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+    users: list[UserRecord] = [
+        {
+            "id": new_id(),
+            "name": f"User {index}",
+            "email": f"user{index}@example.com",
+            "password_hash": password_hash,
+            "created_at": (BASE_TIME + timedelta(seconds=index)).isoformat(),
+            "role": "user",
+        }
+        for index in range(user_count)
+    ]
+    user_ids = [user["id"] for user in users]
+    huge_groups = min(huge_groups, group_count)
+    groups: list[GroupRecord] = []
+    for index in range(group_count):
+        size = huge_members if index < huge_groups else rng.randint(2, max(2, max_members))
+        members = rng.sample(user_ids, min(size, user_count))
+        groups.append(
+            {
+                "id": new_id(),
+                "name": f"Group {index:06d}",
+                "owner_id": members[0],
+                "description": "Huge group" if index < huge_groups else None,
+                "created_at": (BASE_TIME + timedelta(minutes=index)).isoformat(),
+                "members": members,
+                "expenses": [],
+            }
+        )
+
+    tiny = groups[huge_groups:] or groups
+    huge = groups[:huge_groups] or groups
+    huge_count = int(expense_count * huge_share) if groups[huge_groups:] else expense_count
+    for index in range(expense_count):
+        group = huge[index % len(huge)] if index < huge_count else tiny[rng.randrange(len(tiny))]
+        members = group["members"]
+        group["expenses"].append(
+            {
+                "id": new_id(),
+                "group_id": group["id"],
+                "payer_id": members[int(rng.random() * len(members))],
+                "amount": round(1 + rng.random() * 499, 2),
+                "note": f"Expense {index}",
+                "status": "assigned",
+                "created_at": (BASE_TIME + timedelta(seconds=index)).isoformat(),
+            }
+        )
+    shape = f"{user_count}u-{group_count}g-{expense_count}e-{huge_groups}x{huge_members}h{huge_share:g}"
+    return Dataset(users=users, groups=groups, shape=shape)
+
+
+def table_rows(dataset: Dataset) -> Iterator[tuple[str, tuple[str, ...], list[tuple[Any, ...]]]]:
+    """``(table, columns, rows)`` in foreign-key order, matching ``db/schema.sql``."""
+    yield "users", ("id", "name", "email", "password_hash", "created_at", "role"), [
+        (u["id"], u["name"], u["email"], u["password_hash"], u["created_at"], u["role"]) for u in dataset.users
+    ]
+    yield "`groups`", ("id", "name", "owner_id", "description", "created_at"), [
+        (g["id"], g["name"], g["owner_id"], g["description"], g["created_at"]) for g in dataset.groups
+    ]
+    yield "user_groups", ("user_id", "group_id"), [
+        (member, g["id"]) for g in dataset.groups for member in g["members"]
+    ]
+    yield "expenses", ("id", "group_id", "payer_id", "amount", "note", "status", "created_at"), [
+        (e["id"], g["id"], e["payer_id"], e["amount"], e["note"], e["status"], e["created_at"])
+        for g in dataset.groups
+        for e in g["expenses"]
+    ]
+    yield "expense_groups", ("expense_id", "group_id"), [
+        (e["id"], g["id"]) for g in dataset.groups for e in g["expenses"]
+    ]
+    cells: dict[tuple[str, str, str, str], list[float]] = {}
+    for g in dataset.groups:
+        for e in g["expenses"]:
+            cell = cells.setdefault((g["id"], e["created_at"][:7], e["payer_id"], e["status"]), [0, 0.0])
+            cell[0] += 1
+            cell[1] += e["amount"]
+    yield "group_expense_rollups", (
+        "group_id", "month", "payer_id", "status", "expense_count", "total_amount"
+    ), [(*key, count, round(amount, 2)) for key, (count, amount) in cells.items()]
+
+
+def write_files(dataset: Dataset, users_path: Path, groups_path: Path, force: bool = False) -> None:
+    for path in (users_path, groups_path):
+        if not force and path.exists() and path.read_bytes().strip() not in (b"", b"[]"):
+            raise SystemExit(f"{path} already holds data; pass --force to replace it")
+        path.parent.mkdir(parents=True, exist_ok=True)
+    users_path.write_bytes(orjson.dumps(dataset.users))
+    groups_path.write_bytes(orjson.dumps(dataset.groups))
+
+
+def load_sqlite(dataset: Dataset, path: Path, batch_size: int, force: bool = False) -> None:
+    if path.exists():
+        if not force:
+            raise SystemExit(f"{path} already exists; pass --force to replace it")
+        path.unlink()
+    create_database(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute("PRAGMA cache_size=-262144")  # 256 MiB: random UUID keys thrash the default cache
+        _bulk_insert(connection, dataset, batch_size, placeholder="?")
+    finally:
+        connection.close()
+
+
+def load_mysql(dataset: Dataset, batch_size: int, force: bool = False) -> None:
+    from mysql.connector import connect
+
+    settings = get_settings()
+    connection = connect(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_password,
+        database=settings.db_name,
+        autocommit=False,
+    )
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        (existing,) = cursor.fetchone()
+        if existing and not force:
+            raise SystemExit(f"users already holds {existing} rows; pass --force to add to it")
+        # Rows are generated consistent; skip per-row FK and unique checks for this session.
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+        _bulk_insert(connection, dataset, batch_size, placeholder="%s")
+    finally:
+        connection.close()
+
+
+def _bulk_insert(connection: Any, dataset: Dataset, batch_size: int, placeholder: str) -> None:
+    cursor = connection.cursor()
+    for table, columns, rows in table_rows(dataset):
+        statement = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+        )
+        for start in range(0, len(rows), batch_size):
+            # mysql-connector rewrites a batched INSERT into one multi-row statement.
+            cursor.executemany(statement, rows[start:start + batch_size])
+        connection.commit()
+    cursor.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=TARGETS, default="file")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--groups", type=int, default=1_000)
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--huge-groups", type=int, default=3)
+    parser.add_argument("--huge-members", type=int, default=200)
+    parser.add_argument("--huge-share", type=float, default=0.5, help="share of expenses in the huge groups")
+    parser.add_argument("--max-members", type=int, default=6, help="largest size of the other groups")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--users-file", type=Path, help="defaults to DATA_FILE_PATH")
+    parser.add_argument("--groups-file", type=Path, help="defaults to GROUPS_FILE_PATH")
+    parser.add_argument("--sqlite-path", type=Path, default=Path("seed.db"))
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--force", action="store_true", help="replace or add to existing data")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = generate(
+        args.users,
+        args.groups,
+        args.expenses,
+        huge_groups=args.huge_groups,
+        huge_members=args.huge_members,
+        huge_share=args.huge_share,
+        max_members=args.max_members,
+        seed=args.seed,
+        password_hash=hash_password(args.password),
+    )
+    generated = time.perf_counter()
+    print(f"Generated {dataset.shape} in {generated - started:.1f}s")
+
+    settings = get_settings()
+    if args.target == "file":
+        users_path = args.users_file or Path(settings.data_file_path)
+        groups_path = args.groups_file or Path(settings.groups_file_path)
+        write_files(dataset, users_path, groups_path, args.force)
+        destination = f"{users_path} and {groups_path}"
+    elif args.target == "sqlite":
+        load_sqlite(dataset, args.sqlite_path, args.batch_size, args.force)
+        destination = str(args.sqlite_path)
+    else:
+        load_mysql(dataset, args.batch_size, args.force)
+        destination = f"mysql://{settings.db_host}:{settings.db_port}/{settings.db_name}"
+    print(f"Wrote {dataset.expense_count} expenses to {destination} in {time.perf_counter() - generated:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
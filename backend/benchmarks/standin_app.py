@@ -0,0 +1,38 @@
+"""The API with its crud modules on the SQLite stand-in for MySQL.
+
+``benchmarks.load_test --mode sqlite`` serves this with uvicorn; the database
+file comes from ``STANDIN_DB_PATH`` and must already hold the stand-in schema.
+"""
+
+from __future__ import annotations
+
+import os
+
+from app import database
+from app.crud import analytics as analytics_crud
+from app.crud import archive as archive_crud
+from app.crud import expense as expense_crud
+from app.crud import export as export_crud
+from app.crud import group as group_crud
+from app.crud import recurring as recurring_crud
+from app.crud import user as user_crud
+from app.database import InstrumentedConnection
+from tests.mysql_standin import StandInConnection
+
+_DB_PATH = os.environ["STANDIN_DB_PATH"]
+
+
+def _connect() -> InstrumentedConnection:
+    return InstrumentedConnection(StandInConnection(_DB_PATH))
+
+
+for _module in (user_crud, group_crud, expense_crud, recurring_crud, analytics_crud, archive_crud):
+    _module.get_connection = _connect  # type: ignore[attr-defined]
+export_crud.open_dedicated_connection = _connect  # type: ignore[attr-defined]
+# There is no MySQL pool to open or warm in the lifespan.
+database.init_pool = lambda: None  # type: ignore[assignment]
+database.warm_pool = lambda: 0
+
+from app.main import app  # noqa: E402  (imported after the crud and pool hooks are rerouted)
+
+__all__ = ["app"]
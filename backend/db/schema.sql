@@ -35,6 +35,10 @@ CREATE TABLE IF NOT EXISTS `groups` (
     owner_id CHAR(36) NOT NULL,
     description VARCHAR(255) NULL,
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- ISO 4217; balances, totals and rollups are in this currency.
+    base_currency CHAR(3) NOT NULL DEFAULT 'USD',
+    -- Expenses moved to archived_expenses; 0 means there is no checkpoint to read.
+    archived_expense_count INT NOT NULL DEFAULT 0,
     CONSTRAINT fk_group_owner FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB
   DEFAULT CHARSET=utf8mb4
@@ -52,12 +56,27 @@ CREATE TABLE IF NOT EXISTS user_groups (
 
 CREATE TABLE IF NOT EXISTS expenses (
     id CHAR(36) NOT NULL PRIMARY KEY,
+    -- Copied from expense_groups so group-scoped reads can lead with it in an index.
+    group_id CHAR(36) NOT NULL,
     payer_id CHAR(36) NOT NULL,
     amount DECIMAL(10,2) NOT NULL,
+    currency CHAR(3) NOT NULL DEFAULT 'USD',
+    -- amount in the group's base currency as added to group_expense_rollups; edits and deletes
+    -- subtract this, not a fresh conversion. NULL on rows written before the column existed.
+    base_amount DECIMAL(14,2) NULL,
     note TEXT NULL,
     status VARCHAR(20) NOT NULL DEFAULT 'assigned',
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_expense_user FOREIGN KEY (payer_id) REFERENCES users(id) ON DELETE CASCADE
+    -- Group detail, search and archiving: a group's expenses by date, optionally by status or payer.
+    INDEX idx_expenses_group_created (group_id, created_at),
+    INDEX idx_expenses_group_status_created (group_id, status, created_at),
+    INDEX idx_expenses_group_payer_created (group_id, payer_id, created_at),
+    -- Settled expenses across every group (python -m app.archive); also serves fk_expense_user.
+    INDEX idx_expenses_status_created (status, created_at),
+    INDEX idx_expenses_payer_created (payer_id, created_at),
+    FULLTEXT INDEX ft_expenses_note (note),
+    CONSTRAINT fk_expense_user FOREIGN KEY (payer_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_expenses_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
 ) ENGINE=InnoDB
   DEFAULT CHARSET=utf8mb4
   COLLATE=utf8mb4_unicode_ci;
@@ -66,8 +85,157 @@ CREATE TABLE IF NOT EXISTS expense_groups (
     expense_id CHAR(36) NOT NULL,
     group_id CHAR(36) NOT NULL,
     PRIMARY KEY (expense_id, group_id),
+    -- A group's expense ids straight from the index (group detail and search).
+    INDEX idx_expense_groups_group (group_id, expense_id),
     CONSTRAINT fk_expense FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE,
     CONSTRAINT fk_expense_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
 ) ENGINE=InnoDB
   DEFAULT CHARSET=utf8mb4
   COLLATE=utf8mb4_unicode_ci;
+
+-- Spend per group, month (UTC), payer and status, maintained by every expense
+-- insert, update and delete in the same transaction. GET /groups/{id}/analytics
+-- reads only this table. Amounts are in the group's base currency, converted at
+-- the FX rate of each expense's day when it was written.
+CREATE TABLE IF NOT EXISTS group_expense_rollups (
+    group_id CHAR(36) NOT NULL,
+    month CHAR(7) NOT NULL,
+    payer_id CHAR(36) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    expense_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, month, payer_id, status),
+    CONSTRAINT fk_rollup_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
+
+-- Recurring expense schedules. The materialization job claims rows with
+-- next_due_on <= today (FOR UPDATE SKIP LOCKED), adds their due occurrences and
+-- moves next_due_on forward, all in one transaction. NULL once a schedule ended.
+CREATE TABLE IF NOT EXISTS recurring_expenses (
+    id CHAR(36) NOT NULL PRIMARY KEY,
+    group_id CHAR(36) NOT NULL,
+    payer_id CHAR(36) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    currency CHAR(3) NOT NULL DEFAULT 'USD',
+    note TEXT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'assigned',
+    frequency VARCHAR(10) NOT NULL,
+    interval_count INT NOT NULL DEFAULT 1,
+    starts_on DATE NOT NULL,
+    ends_on DATE NULL,
+    next_due_on DATE NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_recurring_due (next_due_on),
+    INDEX idx_recurring_group (group_id, created_at),
+    CONSTRAINT fk_recurring_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+    CONSTRAINT fk_recurring_payer FOREIGN KEY (payer_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
+
+-- One row per occurrence a schedule has added: the key that keeps the job idempotent.
+CREATE TABLE IF NOT EXISTS recurring_occurrences (
+    recurring_id CHAR(36) NOT NULL,
+    occurs_on DATE NOT NULL,
+    expense_id CHAR(36) NOT NULL,
+    PRIMARY KEY (recurring_id, occurs_on),
+    CONSTRAINT fk_occurrence_schedule FOREIGN KEY (recurring_id) REFERENCES recurring_expenses(id)
+        ON DELETE CASCADE,
+    CONSTRAINT fk_occurrence_expense FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
+
+-- Settled expenses moved out of the live ledger (POST /groups/{id}/archive,
+-- python -m app.archive). Archived rows are read by the paginated history endpoint
+-- and by exports; group detail reads their per-payer totals from the checkpoint below.
+CREATE TABLE IF NOT EXISTS archived_expenses (
+    id CHAR(36) NOT NULL PRIMARY KEY,
+    group_id CHAR(36) NOT NULL,
+    payer_id CHAR(36) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    currency CHAR(3) NOT NULL DEFAULT 'USD',
+    note TEXT NULL,
+    status VARCHAR(20) NOT NULL,
+    created_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL,
+    INDEX idx_archived_group_created (group_id, created_at, id),
+    CONSTRAINT fk_archived_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
+
+-- Balance checkpoint: what each payer's archived expenses add to the group's
+-- balances and total, in the base currency at the rates of the archiving run.
+CREATE TABLE IF NOT EXISTS group_balance_checkpoints (
+    group_id CHAR(36) NOT NULL,
+    payer_id CHAR(36) NOT NULL,
+    expense_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, payer_id),
+    CONSTRAINT fk_checkpoint_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
+
+-- Databases created before group_expense_rollups existed need a one-off backfill.
+-- SUM(e.amount) adds amounts as they are, so run it before the currency migration
+-- below, while every expense is still in US dollars (the base currency of every group):
+--   INSERT INTO group_expense_rollups (group_id, month, payer_id, status, expense_count, total_amount)
+--   SELECT eg.group_id, DATE_FORMAT(e.created_at, '%Y-%m'), e.payer_id, e.status, COUNT(*), SUM(e.amount)
+--   FROM expenses e INNER JOIN expense_groups eg ON eg.expense_id = e.id
+--   GROUP BY eg.group_id, DATE_FORMAT(e.created_at, '%Y-%m'), e.payer_id, e.status;
+
+-- Databases created before currencies; existing rows become US dollars:
+--   ALTER TABLE `groups` ADD COLUMN base_currency CHAR(3) NOT NULL DEFAULT 'USD';
+--   ALTER TABLE expenses ADD COLUMN currency CHAR(3) NOT NULL DEFAULT 'USD' AFTER amount;
+--   ALTER TABLE recurring_expenses ADD COLUMN currency CHAR(3) NOT NULL DEFAULT 'USD' AFTER amount;
+
+-- Databases created before expenses stored their base amount; rows left NULL are
+-- converted at the current rates when they are next edited or deleted:
+--   ALTER TABLE expenses ADD COLUMN base_amount DECIMAL(14,2) NULL AFTER currency;
+
+-- Databases created before archiving (archived_expenses and group_balance_checkpoints
+-- come from the CREATE TABLE statements above); 0 means no group has a checkpoint yet:
+--   ALTER TABLE `groups` ADD COLUMN archived_expense_count INT NOT NULL DEFAULT 0;
+
+-- Databases created before the expense search indexes:
+--   ALTER TABLE expenses
+--     ADD INDEX idx_expenses_payer_created (payer_id, created_at),
+--     ADD INDEX idx_expenses_status_created (status, created_at);
+--   ALTER TABLE expenses ADD FULLTEXT INDEX ft_expenses_note (note);
+--   ALTER TABLE expense_groups ADD INDEX idx_expense_groups_group (group_id, expense_id);
+
+-- Databases created before expenses carried their group_id:
+--   ALTER TABLE expenses ADD COLUMN group_id CHAR(36) NULL AFTER id;
+--   UPDATE expenses e INNER JOIN expense_groups eg ON eg.expense_id = e.id SET e.group_id = eg.group_id;
+--   ALTER TABLE expenses
+--     MODIFY group_id CHAR(36) NOT NULL,
+--     ADD INDEX idx_expenses_group_created (group_id, created_at),
+--     ADD INDEX idx_expenses_group_status_created (group_id, status, created_at),
+--     ADD INDEX idx_expenses_group_payer_created (group_id, payer_id, created_at),
+--     ADD CONSTRAINT fk_expenses_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE;
+-- Earlier versions of the search-index step also added idx_expenses_created, which the
+-- group indexes replace. Drop it only where this returns 1:
+--   SELECT COUNT(DISTINCT index_name) FROM information_schema.statistics
+--   WHERE table_schema = DATABASE() AND table_name = 'expenses' AND index_name = 'idx_expenses_created';
+--   ALTER TABLE expenses DROP INDEX idx_expenses_created;
+
+-- Transactional outbox: rows are inserted in the same transaction as the change
+-- that produced them and drained by the background outbox worker.
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id CHAR(36) NOT NULL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    available_at DATETIME(3) NOT NULL,
+    created_at DATETIME(3) NOT NULL,
+    processed_at DATETIME(3) NULL,
+    last_error TEXT NULL,
+    INDEX idx_outbox_due (status, available_at)
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,143 @@
+"""SQLite-backed stand-in for a pooled mysql-connector connection, enough for the crud paths
+exercised by the tests and ``benchmarks.bench_crud``."""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Optional
+
+SCHEMA = """
+CREATE TABLE users (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'user', age INTEGER, gender TEXT,
+    address TEXT, bio TEXT, avatar_url TEXT
+);
+CREATE TABLE `groups` (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE, owner_id TEXT NOT NULL, description TEXT,
+    created_at TEXT NOT NULL, base_currency TEXT NOT NULL DEFAULT 'USD',
+    archived_expense_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE user_groups (user_id TEXT NOT NULL, group_id TEXT NOT NULL, PRIMARY KEY (user_id, group_id));
+CREATE INDEX idx_user_groups_group ON user_groups (group_id);
+CREATE TABLE expenses (
+    id TEXT PRIMARY KEY, group_id TEXT NOT NULL, payer_id TEXT NOT NULL, amount REAL NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD', base_amount REAL, note TEXT,
+    status TEXT NOT NULL DEFAULT 'assigned', created_at TEXT NOT NULL
+);
+CREATE INDEX idx_expenses_group_created ON expenses (group_id, created_at);
+CREATE INDEX idx_expenses_group_status_created ON expenses (group_id, status, created_at);
+CREATE INDEX idx_expenses_group_payer_created ON expenses (group_id, payer_id, created_at);
+CREATE INDEX idx_expenses_status_created ON expenses (status, created_at);
+CREATE INDEX idx_expenses_payer_created ON expenses (payer_id, created_at);
+CREATE TABLE expense_groups (expense_id TEXT NOT NULL, group_id TEXT NOT NULL, PRIMARY KEY (expense_id, group_id));
+CREATE INDEX idx_expense_groups_group ON expense_groups (group_id, expense_id);
+CREATE TABLE group_expense_rollups (
+    group_id TEXT NOT NULL, month TEXT NOT NULL, payer_id TEXT NOT NULL, status TEXT NOT NULL,
+    expense_count INTEGER NOT NULL DEFAULT 0, total_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, month, payer_id, status)
+);
+CREATE TABLE archived_expenses (
+    id TEXT PRIMARY KEY, group_id TEXT NOT NULL, payer_id TEXT NOT NULL, amount REAL NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD', note TEXT, status TEXT NOT NULL, created_at TEXT NOT NULL,
+    archived_at TEXT NOT NULL
+);
+CREATE INDEX idx_archived_group_created ON archived_expenses (group_id, created_at, id);
+CREATE TABLE group_balance_checkpoints (
+    group_id TEXT NOT NULL, payer_id TEXT NOT NULL, expense_count INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0, PRIMARY KEY (group_id, payer_id)
+);
+CREATE TABLE recurring_expenses (
+    id TEXT PRIMARY KEY, group_id TEXT NOT NULL, payer_id TEXT NOT NULL, amount REAL NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD', note TEXT, status TEXT NOT NULL DEFAULT 'assigned', frequency TEXT NOT NULL, interval_count INTEGER NOT NULL DEFAULT 1,
+    starts_on TEXT NOT NULL, ends_on TEXT, next_due_on TEXT, created_at TEXT NOT NULL
+);
+CREATE TABLE recurring_occurrences (
+    recurring_id TEXT NOT NULL, occurs_on TEXT NOT NULL, expense_id TEXT NOT NULL,
+    PRIMARY KEY (recurring_id, occurs_on)
+);
+CREATE TABLE outbox_events (
+    id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0, available_at TEXT NOT NULL, created_at TEXT NOT NULL,
+    processed_at TEXT, last_error TEXT
+);
+"""
+
+# MySQL-only syntax the crud modules use, rewritten to its SQLite equivalent.
+_UPSERT_ALIAS = re.compile(r"\bAS\s+(\w+)\s+ON DUPLICATE KEY UPDATE\b")
+_FOR_UPDATE = re.compile(r"\bFOR UPDATE(\s+OF\s+\w+)?(\s+SKIP LOCKED)?\b")
+
+
+def translate(operation: str) -> str:
+    operation = _FOR_UPDATE.sub("", operation.replace("%s", "?"))
+    upsert = _UPSERT_ALIAS.search(operation)
+    if upsert:
+        alias = upsert.group(1)
+        operation = _UPSERT_ALIAS.sub("ON CONFLICT DO UPDATE SET", operation)
+        operation = re.sub(rf"\b{alias}\.", "excluded.", operation)
+    return operation
+
+
+class StandInCursor:
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool) -> None:
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, operation: str, params: Any = None) -> None:
+        if operation.startswith("SET SESSION"):
+            return  # MySQL session variables have no SQLite counterpart
+        self._cursor.execute(translate(operation), tuple(params or ()))
+
+    def executemany(self, operation: str, seq_params: Any) -> None:
+        self._cursor.executemany(translate(operation), seq_params)
+
+    def fetchone(self) -> Optional[Any]:
+        row = self._cursor.fetchone()
+        return self._convert(row) if row is not None else None
+
+    def fetchall(self) -> list[Any]:
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size: int) -> list[Any]:
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def _convert(self, row: sqlite3.Row) -> Any:
+        return dict(row) if self._dictionary else tuple(row)
+
+
+class StandInConnection:
+    def __init__(self, path: Path) -> None:
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+
+    def cursor(self, dictionary: bool = False, buffered: bool = True) -> StandInCursor:
+        return StandInCursor(self._connection.cursor(), dictionary)
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def disconnect(self) -> None:
+        self._connection.close()
+
+
+def create_database(path: Path) -> Path:
+    connection = sqlite3.connect(path)
+    # WAL lets readers in other worker processes proceed while one writer commits.
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    connection.close()
+    return path
@@ -0,0 +1,201 @@
+"""Tiny Redis-protocol server used as a local stand-in by the test suite."""
+
+from __future__ import annotations
+
+import socketserver
+import threading
+import time
+from typing import Optional
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items: list[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+def _int(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def setup(self) -> None:
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels: set[bytes] = set()
+
+    def write(self, payload: bytes) -> None:
+        with self.write_lock:
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+    def read_command(self) -> Optional[list[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self) -> None:
+        try:
+            while True:
+                args = self.read_command()
+                if args is None:
+                    break
+                name = args[0].decode().upper()
+                method = getattr(self, f"cmd_{name.lower()}", None)
+                if method is None:
+                    self.write(f"-ERR unknown command '{name}'\r\n".encode())
+                    continue
+                reply = method(*args[1:])
+                if reply is not None:
+                    self.write(reply)
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self.server.unsubscribe_all(self)
+
+    # --- commands ----------------------------------------------------------
+
+    def cmd_ping(self, *args: bytes) -> bytes:
+        return b"+PONG\r\n"
+
+    def cmd_auth(self, *args: bytes) -> bytes:
+        return b"+OK\r\n"
+
+    def cmd_select(self, *args: bytes) -> bytes:
+        return b"+OK\r\n"
+
+    def cmd_get(self, key: bytes) -> bytes:
+        return _bulk(self.server.read(key))
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes) -> bytes:
+        ttl = None
+        if len(options) >= 2 and options[0].upper() == b"EX":
+            ttl = float(options[1])
+        elif len(options) >= 2 and options[0].upper() == b"PX":
+            ttl = float(options[1]) / 1000
+        self.server.write(key, value, ttl)
+        return b"+OK\r\n"
+
+    def cmd_del(self, *keys: bytes) -> bytes:
+        return _int(sum(self.server.remove(key) for key in keys))
+
+    def cmd_incr(self, key: bytes) -> bytes:
+        return self.cmd_incrby(key, b"1")
+
+    def cmd_incrby(self, key: bytes, amount: bytes) -> bytes:
+        with self.server.lock:
+            current = int(self.server.read(key) or b"0") + int(amount)
+            expires_at = self.server.data.get(key, (b"", None))[1]
+            self.server.data[key] = (str(current).encode(), expires_at)
+        return _int(current)
+
+    def cmd_expire(self, key: bytes, seconds: bytes) -> bytes:
+        with self.server.lock:
+            if self.server.read(key) is None:
+                return _int(0)
+            value, _ = self.server.data[key]
+            self.server.data[key] = (value, time.monotonic() + float(seconds))
+        return _int(1)
+
+    def cmd_publish(self, channel: bytes, message: bytes) -> bytes:
+        return _int(self.server.publish(channel, message))
+
+    def cmd_subscribe(self, *channels: bytes) -> None:
+        for channel in channels:
+            self.channels.add(channel)
+            self.server.subscribe(channel, self)
+            self.write(_array([_bulk(b"subscribe"), _bulk(channel), _int(len(self.channels))]))
+        return None
+
+    def cmd_flushall(self) -> bytes:
+        with self.server.lock:
+            self.server.data.clear()
+        return b"+OK\r\n"
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.RLock()
+        self.data: dict[bytes, tuple[bytes, Optional[float]]] = {}
+        self.subscribers: dict[bytes, set[_Handler]] = {}
+
+    def read(self, key: bytes) -> Optional[bytes]:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def write(self, key: bytes, value: bytes, ttl: Optional[float]) -> None:
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def remove(self, key: bytes) -> int:
+        with self.lock:
+            return 1 if self.data.pop(key, None) is not None else 0
+
+    def subscribe(self, channel: bytes, handler: _Handler) -> None:
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(handler)
+
+    def unsubscribe_all(self, handler: _Handler) -> None:
+        with self.lock:
+            for handlers in self.subscribers.values():
+                handlers.discard(handler)
+
+    def publish(self, channel: bytes, message: bytes) -> int:
+        with self.lock:
+            handlers = list(self.subscribers.get(channel, ()))
+        payload = _array([_bulk(b"message"), _bulk(channel), _bulk(message)])
+        for handler in handlers:
+            handler.write(payload)
+        return len(handlers)
+
+
+class RedisStandIn:
+    def __init__(self) -> None:
+        self._server = _Server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    @property
+    def data(self) -> dict[bytes, tuple[bytes, Optional[float]]]:
+        return self._server.data
+
+    def start(self) -> "RedisStandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "RedisStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
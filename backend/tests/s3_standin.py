@@ -0,0 +1,165 @@
+"""Minimal S3-compatible HTTP server used as a local stand-in by the test suite."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+@dataclass
+class StoredObject:
+    body: bytes
+    headers: dict[str, str]
+    multipart: bool = False
+
+
+@dataclass
+class _Upload:
+    key: str
+    headers: dict[str, str]
+    parts: dict[int, bytes] = field(default_factory=dict)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return None
+
+    def _target(self) -> tuple[str, dict[str, list[str]]]:
+        url = urlsplit(self.path)
+        return unquote(url.path.lstrip("/")), parse_qs(url.query, keep_blank_values=True)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _object_headers(self) -> dict[str, str]:
+        return {
+            name: self.headers[name]
+            for name in ("Content-Type", "Cache-Control")
+            if self.headers.get(name) is not None
+        }
+
+    def do_PUT(self) -> None:
+        path, query = self._target()
+        body = self._read_body()
+        with self.server.lock:
+            if "uploadId" in query:
+                upload = self.server.uploads[query["uploadId"][0]]
+                upload.parts[int(query["partNumber"][0])] = body
+            elif self.headers.get("x-amz-copy-source"):
+                source = self.server.objects[unquote(self.headers["x-amz-copy-source"]).lstrip("/")]
+                self.server.objects[path] = StoredObject(source.body, self._object_headers())
+                payload = f"<CopyObjectResult><ETag>{_etag(source.body)}</ETag></CopyObjectResult>"
+                self._reply(200, payload.encode(), {"Content-Type": "application/xml"})
+                return
+            else:
+                self.server.objects[path] = StoredObject(body, self._object_headers())
+        self._reply(200, headers={"ETag": _etag(body)})
+
+    def do_POST(self) -> None:
+        path, query = self._target()
+        self._read_body()
+        with self.server.lock:
+            if "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                self.server.uploads[upload_id] = _Upload(path, self._object_headers())
+                bucket, _, key = path.partition("/")
+                payload = (
+                    "<InitiateMultipartUploadResult>"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"
+                )
+                self._reply(200, payload.encode(), {"Content-Type": "application/xml"})
+                return
+            upload = self.server.uploads.pop(query["uploadId"][0])
+            body = b"".join(upload.parts[number] for number in sorted(upload.parts))
+            self.server.objects[upload.key] = StoredObject(body, upload.headers, multipart=True)
+        payload = f"<CompleteMultipartUploadResult><Key>{path}</Key><ETag>\"done\"</ETag></CompleteMultipartUploadResult>"
+        self._reply(200, payload.encode(), {"Content-Type": "application/xml"})
+
+    def do_GET(self) -> None:
+        path, _ = self._target()
+        stored = self.server.objects.get(path)
+        if stored is None:
+            self._reply(404, b"<Error><Code>NoSuchKey</Code></Error>", {"Content-Type": "application/xml"})
+            return
+        headers = {**stored.headers, "ETag": _etag(stored.body)}
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            start, _, end = byte_range.removeprefix("bytes=").partition("-")
+            self._reply(206, stored.body[int(start):int(end) + 1], headers)
+            return
+        self._reply(200, stored.body, headers)
+
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_DELETE(self) -> None:
+        path, query = self._target()
+        with self.server.lock:
+            if "uploadId" in query:
+                self.server.uploads.pop(query["uploadId"][0], None)
+            else:
+                self.server.objects.pop(path, None)
+        self._reply(204)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.objects: dict[str, StoredObject] = {}
+        self.uploads: dict[str, _Upload] = {}
+
+
+class S3StandIn:
+    """Accepts path-style PutObject, CopyObject and multipart uploads; keeps objects in memory."""
+
+    def __init__(self) -> None:
+        self._server = _Server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def objects(self) -> dict[str, StoredObject]:
+        return self._server.objects
+
+    def start(self) -> "S3StandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "S3StandIn":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+import pytest
+
+from app import config
+from app.crud import user as user_crud
+from app.crud.file_storage import load_users, lock_is_held, save_users, user_file_path
+from app.schemas.user import UserLogin, UserProfileUpdate, UserSignup
+from app.utils import authentication
+from app.utils.process_pool import BoundedProcessPool, PoolBusyError
+
+
+@pytest.fixture(autouse=True)
+def file_storage_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    config.get_settings.cache_clear()
+    yield
+    config.get_settings.cache_clear()
+
+
+def test_hash_records_kdf_and_work_factors():
+    stored = authentication.hash_password("secret123")
+    assert stored.startswith("scrypt$32768$8$1$")
+    assert authentication.verify_password("secret123", stored)
+    assert not authentication.verify_password("secret124", stored)
+    assert not authentication.needs_rehash(stored)
+
+
+def test_login_transparently_upgrades_legacy_hash():
+    created = user_crud.create_user(UserSignup(name="Lee", email="lee@example.com", password="secret123"))
+    users = load_users()
+    salt = "00ff00ff00ff00ff"
+    users[0]["password_hash"] = f"{salt}${hashlib.sha256(f'{salt}secret123'.encode()).hexdigest()}"
+    save_users(users)
+
+    user_crud.authenticate_user(UserLogin(email="lee@example.com", password="secret123"))
+
+    upgraded = load_users()[0]["password_hash"]
+    assert upgraded.startswith("scrypt$")
+    assert load_users()[0]["id"] == created.id
+    assert user_crud.authenticate_user(UserLogin(email="lee@example.com", password="secret123")).id == created.id
+
+
+
+def test_users_file_writes_hold_the_users_lock(monkeypatch):
+    locked: list[bool] = []
+
+    def checked_save(users):
+        locked.append(lock_is_held(user_file_path()))
+        save_users(users)
+
+    monkeypatch.setattr(user_crud, "save_users", checked_save)
+    created = user_crud.create_user(UserSignup(name="Lee", email="lee@example.com", password="secret123"))
+    users = load_users()
+    users[0]["password_hash"] = f"00ff${hashlib.sha256(b'00ffsecret123').hexdigest()}"
+    save_users(users)
+    user_crud.authenticate_user(UserLogin(email="lee@example.com", password="secret123"))
+    user_crud.update_user_profile(created.id, UserProfileUpdate(bio="hello"))
+    user_crud.update_user_avatar(created.id, "/media/avatars/a.png")
+    assert user_crud.replace_user_avatar(created.id, "/media/avatars/a.png", "/media/avatars/a.webp")
+
+    assert locked == [True, True, True, True, True]
+
+def test_hashing_runs_in_process_pool(monkeypatch):
+    monkeypatch.setenv("PASSWORD_KDF", "pbkdf2_sha256")
+    monkeypatch.setenv("PASSWORD_PBKDF2_ITERATIONS", "1000")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "1")
+    config.get_settings.cache_clear()
+    try:
+        stored = authentication.hash_password("secret123")
+        assert stored.startswith("pbkdf2_sha256$1000$")
+        assert authentication.verify_password("secret123", stored)
+    finally:
+        authentication._hash_pool(config.get_settings()).shutdown()
+
+
+def test_bounded_pool_rejects_when_saturated():
+    pool = BoundedProcessPool("test", max_workers=1, max_pending=1, wait_seconds=0)
+    try:
+        running = pool.submit(time.sleep, 0.5)
+        with pytest.raises(PoolBusyError):
+            pool.submit(time.sleep, 0)
+        running.result()
+    finally:
+        pool.shutdown()
+
+
+def test_prod_settings_require_a_session_secret(monkeypatch):
+    monkeypatch.delenv("SESSION_SECRET", raising=False)
+    with pytest.raises(RuntimeError, match="SESSION_SECRET"):
+        config.Settings(environment="prod")
+    monkeypatch.setenv("SESSION_SECRET", "a-real-secret")
+    assert config.Settings(environment="prod").session_secret == "a-real-secret"
+    monkeypatch.delenv("SESSION_SECRET")
+    assert config.Settings().session_secret == config.DEV_SESSION_SECRET
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app import cache, config
+from app.crud import group as group_crud
+from app.crud import user as user_crud
+from app.external_services.redis import RedisClient
+from app.schemas.group import GroupCreate
+from app.schemas.user import UserProfileUpdate, UserSignup
+from tests.redis_standin import RedisStandIn
+
+
+@pytest.fixture
+def redis_server():
+    with RedisStandIn() as server:
+        yield server
+
+
+@pytest.fixture
+def redis_cache_env(tmp_path, monkeypatch, redis_server):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("CACHE_BACKEND", "redis")
+    monkeypatch.setenv("CACHE_URL", redis_server.url)
+    config.get_settings.cache_clear()
+    yield redis_server
+    cache.get_cache().close()
+    config.get_settings.cache_clear()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = cache.LRUCache(max_entries=2, ttl_seconds=60)
+    lru.set("a", b"1")
+    lru.set("b", b"2")
+    assert lru.get("a") == b"1"
+    lru.set("c", b"3")
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1"
+    assert len(lru) == 2
+
+
+def test_workers_share_one_warm_cache(redis_server):
+    workers = [
+        cache.RedisCache(
+            RedisClient(redis_server.url),
+            ttl_seconds=60,
+            near_cache=cache.LRUCache(max_entries=100, ttl_seconds=60),
+        )
+        for _ in range(3)
+    ]
+    try:
+        assert all(worker.wait_until_subscribed() for worker in workers)
+        key = cache.cache_key(cache.GROUP_DETAIL, "group-1")
+        workers[0].set(key, b'{"id": "group-1"}')
+        for worker in workers[1:]:
+            assert worker.get(key) == b'{"id": "group-1"}'
+            assert worker.near_cache.get(key) is not None
+
+        workers[0].invalidate([key])
+        assert _wait_for(lambda: all(w.near_cache.get(key) is None for w in workers))
+        assert workers[2].get(key) is None
+    finally:
+        for worker in workers:
+            worker.close()
+
+
+def test_crud_reads_are_served_and_invalidated_through_shared_cache(redis_cache_env):
+    created = user_crud.create_user(
+        UserSignup(name="Robin", email="robin@example.com", password="secret123"),
+    )
+    user_crud.get_user(created.id)
+    user_key = cache.cache_key(cache.USERS, created.id).encode()
+    assert user_key in redis_cache_env.data
+
+    updated = user_crud.update_user_profile(created.id, UserProfileUpdate(bio="Cached"))
+    assert updated.bio == "Cached"
+    assert user_key not in redis_cache_env.data
+    assert user_crud.get_user(created.id).bio == "Cached"
+
+    group = group_crud.create_group(GroupCreate(owner_id=created.id, name="Cachers"))
+    assert [entry.id for entry in user_crud.get_user(created.id).groups] == [group.id]
+    assert group_crud.get_group(group.id).member_count == 1
+
+
+def test_group_json_is_validated_before_it_is_shared_with_get_group(redis_cache_env, monkeypatch):
+    owner = user_crud.create_user(UserSignup(name="Rin", email="rin@example.com", password="secret123"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Dojo"))
+    load_payload = group_crud._load_group_payload
+
+    monkeypatch.setattr(group_crud, "_load_group_payload", lambda group_id: {"id": group_id})
+    with pytest.raises(ValidationError):
+        group_crud.get_group_json(group.id)
+    assert cache.get_cache().get(cache.cache_key(cache.GROUP_DETAIL, group.id)) is None
+
+    monkeypatch.setattr(group_crud, "_load_group_payload", load_payload)
+    payload = group_crud.get_group_json(group.id)
+    assert group_crud.get_group(group.id).model_dump_json().encode() == payload
+
+
+def test_warmup_fills_the_cache_with_the_newest_group_details(redis_cache_env, monkeypatch):
+    from app import warmup
+
+    owner = user_crud.create_user(UserSignup(name="Kit", email="kit@example.com", password="secret123"))
+    groups = [group_crud.create_group(GroupCreate(owner_id=owner.id, name=f"Crew {n}")) for n in range(3)]
+    cache.invalidate(*[(cache.GROUP_DETAIL, group.id) for group in groups])
+    monkeypatch.setattr(warmup, "WARMUP_GROUPS", 2)
+
+    timings = warmup.run_warmup(config.get_settings())
+
+    assert "group_details" in timings
+    warmed = [cache.get_cache().get(cache.cache_key(cache.GROUP_DETAIL, group.id)) for group in groups]
+    assert [payload is not None for payload in warmed] == [False, True, True]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app import change_feed, config
+from app.crud import expense as expense_crud
+from app.crud import group as group_crud
+from app.crud import user as user_crud
+from app.external_services.redis import RedisClient
+from app.schemas.expense import ExpenseCreate
+from app.schemas.group import GroupCreate
+from app.schemas.user import UserSignup
+from tests.redis_standin import RedisStandIn
+
+
+@pytest.fixture
+def file_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    config.get_settings.cache_clear()
+    yield
+    config.get_settings.cache_clear()
+
+
+async def _collect(stream, count):
+    return [await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)]
+
+
+async def _never_disconnected():
+    return False
+
+
+def test_expense_mutations_stream_compact_deltas(file_env):
+    owner = user_crud.create_user(UserSignup(name="Kim", email="kim@example.com", password="secret123"))
+    user_crud.create_user(UserSignup(name="Ola", email="ola@example.com", password="secret123"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Trip"))
+    feed = change_feed.get_change_feed()
+
+    async def scenario():
+        stream = change_feed.stream_group_events(feed, group.id, None, _never_disconnected)
+        assert await stream.__anext__() == f"retry: {change_feed.RECONNECT_MILLIS}\n\n"
+        pending = asyncio.ensure_future(_collect(stream, 3))
+        await asyncio.sleep(0)
+        await asyncio.to_thread(group_crud.add_member_to_group, group.id, owner.id, "ola@example.com")
+        detail = await asyncio.to_thread(
+            expense_crud.add_expense_to_group,
+            group.id,
+            ExpenseCreate(payer_email="kim@example.com", amount=30),
+        )
+        await asyncio.to_thread(expense_crud.delete_expense_from_group, group.id, detail.expenses[0].id)
+        chunks = await pending
+        await stream.aclose()
+        return detail, chunks
+
+    detail, chunks = asyncio.run(scenario())
+    assert [chunk.split("\n")[1] for chunk in chunks] == [
+        "event: member.added",
+        "event: expense.added",
+        "event: expense.deleted",
+    ]
+    assert chunks[1].startswith("id: 2\n")
+    assert f'"id":"{detail.expenses[0].id}"' in chunks[1]
+    assert '"balance":15.0' in chunks[1]
+    assert f'"expense_id":"{detail.expenses[0].id}"' in chunks[2]
+    assert feed.subscriber_count(group.id) == 0
+
+
+def test_reconnect_replays_recent_events_or_asks_for_resync():
+    feed = change_feed.ChangeFeed(history=2)
+    for _ in range(3):
+        feed.publish({"type": change_feed.EXPENSE_DELETED, "group_id": "g1", "expense_id": "e"})
+
+    async def first_events(last_event_id, count):
+        stream = change_feed.stream_group_events(feed, "g1", last_event_id, _never_disconnected)
+        chunks = await _collect(stream, count)
+        await stream.aclose()
+        return chunks
+
+    replayed = asyncio.run(first_events("1", 3))
+    assert [chunk.split("\n")[0] for chunk in replayed[1:]] == ["id: 2", "id: 3"]
+    (_, resync) = asyncio.run(first_events("0", 2))
+    assert "event: resync" in resync
+
+
+def test_slow_subscriber_gets_a_single_resync():
+    feed = change_feed.ChangeFeed(max_queue=2)
+
+    async def scenario():
+        subscription = feed.subscribe("g1")
+        # The third event overflows the queue and collapses it into a resync; the fourth follows it.
+        for _ in range(4):
+            feed.publish({"type": change_feed.EXPENSE_DELETED, "group_id": "g1", "expense_id": "e"})
+        await asyncio.sleep(0.01)
+        return [await subscription.get() for _ in range(2)]
+
+    events = asyncio.run(scenario())
+    assert [event["type"] for event in events] == [change_feed.RESYNC, change_feed.EXPENSE_DELETED]
+
+
+def test_redis_feed_reaches_other_workers():
+    with RedisStandIn() as server:
+        workers = [change_feed.RedisChangeFeed(RedisClient(server.url)) for _ in range(2)]
+        try:
+            assert all(worker.wait_until_subscribed() for worker in workers)
+
+            async def scenario():
+                subscription = workers[1].subscribe("g1")
+                await asyncio.to_thread(
+                    workers[0].publish,
+                    {"type": change_feed.EXPENSE_DELETED, "group_id": "g1", "expense_id": "e"},
+                )
+                return await asyncio.wait_for(subscription.get(), 2)
+
+            event = asyncio.run(scenario())
+            assert event["seq"] == 1
+            assert event["expense_id"] == "e"
+        finally:
+            for worker in workers:
+                worker.close()
@@ -0,0 +1,382 @@
+import logging
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from app import config, database
+from app.crud import analytics as analytics_crud
+from app.crud import archive as archive_crud
+from app.crud import expense as expense_crud
+from app.crud import export as export_crud
+from app.crud import group as group_crud
+from app.crud import recurring as recurring_crud
+from app.crud import user as user_crud
+from app.metrics import request_stats
+from app.schemas.expense import ExpenseCreate, ExpenseSearch, ExpenseUpdate, RecurringExpenseCreate
+from tests.mysql_standin import StandInConnection, create_database
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    path = create_database(tmp_path / "app.db")
+    seed = sqlite3.connect(path)
+    seed.executemany(
+        "INSERT INTO users (id, name, email, password_hash, created_at) VALUES (?, ?, ?, 'x', ?)",
+        [(f"user-{n}", f"User {n}", f"user{n}@example.com", f"2024-01-0{n}T00:00:00") for n in (1, 2, 3)],
+    )
+    seed.executemany(
+        "INSERT INTO `groups` (id, name, owner_id, created_at) VALUES (?, ?, 'user-1', '2024-02-01T00:00:00')",
+        [("group-a", "Alpha"), ("group-b", "Beta")],
+    )
+    seed.executemany(
+        "INSERT INTO user_groups (user_id, group_id) VALUES (?, ?)",
+        [("user-1", "group-a"), ("user-1", "group-b"), ("user-2", "group-a")],
+    )
+    seed.commit()
+    seed.close()
+
+    def connect():
+        return database.InstrumentedConnection(StandInConnection(path))
+
+    monkeypatch.setenv("USE_FILE_STORAGE", "false")
+    monkeypatch.setenv("CACHE_BACKEND", "none")
+    config.get_settings.cache_clear()
+    monkeypatch.setattr(user_crud, "get_connection", connect)
+    monkeypatch.setattr(group_crud, "get_connection", connect)
+    monkeypatch.setattr(expense_crud, "get_connection", connect)
+    monkeypatch.setattr(analytics_crud, "get_connection", connect)
+    monkeypatch.setattr(archive_crud, "get_connection", connect)
+    monkeypatch.setattr(export_crud, "open_dedicated_connection", connect)
+    monkeypatch.setattr(recurring_crud, "get_connection", connect)
+    yield path
+    config.get_settings.cache_clear()
+
+
+def test_list_users_loads_memberships_without_a_query_per_user(sqlite_db):
+    with request_stats(query_budget=2, strict_budget=True) as stats:
+        users = user_crud.list_users()
+
+    assert stats.queries == 2
+    assert [user.id for user in users] == ["user-3", "user-2", "user-1"]
+    groups = {user.id: [(group.name, group.member_count) for group in user.groups] for user in users}
+    assert groups == {"user-1": [("Alpha", 2), ("Beta", 1)], "user-2": [("Alpha", 2)], "user-3": []}
+
+
+def test_search_expenses_filters_in_sql(sqlite_db):
+    seed = sqlite3.connect(sqlite_db)
+    seed.executemany(
+        "INSERT INTO expenses (id, group_id, payer_id, amount, note, status, created_at) "
+        "VALUES (?, 'group-a', ?, ?, ?, ?, ?)",
+        [
+            ("exp-1", "user-1", 10.0, "Lunch", "paid", "2024-03-01 12:00:00"),
+            ("exp-2", "user-2", 25.0, "Tickets", "assigned", "2024-03-02 12:00:00"),
+            ("exp-3", "user-1", 40.0, "Hotel", "assigned", "2024-03-03 12:00:00"),
+        ],
+    )
+    seed.executemany(
+        "INSERT INTO expense_groups (expense_id, group_id) VALUES (?, 'group-a')",
+        [("exp-1",), ("exp-2",), ("exp-3",)],
+    )
+    seed.commit()
+    seed.close()
+
+    def search(**filters):
+        result = expense_crud.search_expenses("group-a", ExpenseSearch(**filters))
+        return result.total, [expense.id for expense in result.expenses]
+
+    assert search() == (3, ["exp-3", "exp-2", "exp-1"])
+    assert search(status=["assigned"], min_amount=30) == (1, ["exp-3"])
+    assert search(payer_id="user-1", limit=1, offset=1) == (2, ["exp-1"])
+    assert search(created_from=datetime(2024, 3, 2), created_to=datetime(2024, 3, 2, 23)) == (1, ["exp-2"])
+    with pytest.raises(expense_crud.GroupNotFoundError):
+        expense_crud.search_expenses("group-z", ExpenseSearch())
+
+
+def test_group_analytics_read_rollups_kept_by_expense_writes(sqlite_db):
+    for email, amount, status in [("user1@example.com", 30, "paid"), ("user2@example.com", 20, "assigned")]:
+        detail = expense_crud.add_expense_to_group(
+            "group-a", ExpenseCreate(payer_email=email, amount=amount, status=status)
+        )
+    second = next(expense for expense in detail.expenses if expense.amount == 20)
+    expense_crud.update_expense_in_group("group-a", second.id, ExpenseUpdate(payer_email="user1@example.com"))
+
+    with request_stats() as stats:
+        analytics = analytics_crud.get_group_analytics("group-a")
+    assert stats.queries == 2
+    assert (analytics.expense_count, analytics.total_amount) == (2, 50.0)
+    assert [(spend.user_id, spend.name, spend.expense_count) for spend in analytics.by_member] == [
+        ("user-1", "User 1", 2)
+    ]
+    by_status = {spend.status: spend.total_amount for spend in analytics.by_status}
+    assert by_status == {"paid": 30.0, "assigned": 20.0}
+
+    expense_crud.delete_expense_from_group("group-a", second.id)
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 30.0
+    assert analytics_crud.get_group_analytics("group-b").by_month == []
+
+
+def test_foreign_currency_expenses_convert_in_balances_and_rollups(sqlite_db, tmp_path, monkeypatch):
+    (tmp_path / "fx_rates.csv").write_text("date,currency,rate\n2024-01-01,EUR,0.8\n")
+    monkeypatch.setenv("FX_RATES_PATH", str(tmp_path / "fx_rates.csv"))
+    config.get_settings.cache_clear()
+    expense_crud.add_expense_to_group("group-a", ExpenseCreate(payer_email="user1@example.com", amount=30))
+    detail = expense_crud.add_expense_to_group(
+        "group-a", ExpenseCreate(payer_email="user2@example.com", amount=40, currency="EUR")
+    )
+
+    euros = next(expense for expense in detail.expenses if expense.currency == "EUR")
+    assert (detail.base_currency, detail.total_expense) == ("USD", 80.0)
+    assert {balance.user_id: balance.balance for balance in detail.balances} == {"user-1": 10.0, "user-2": -10.0}
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 80.0
+
+    expense_crud.update_expense_in_group("group-a", euros.id, ExpenseUpdate(currency="USD"))
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 70.0
+    with pytest.raises(expense_crud.ExchangeRateNotFoundError):
+        expense_crud.update_expense_in_group("group-a", euros.id, ExpenseUpdate(currency="CHF"))
+    expense_crud.delete_expense_from_group("group-a", euros.id)
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 30.0
+
+    # Edits and deletes reverse the stored base amount even after the rate table changes.
+    detail = expense_crud.add_expense_to_group(
+        "group-a", ExpenseCreate(payer_email="user2@example.com", amount=40, currency="EUR")
+    )
+    euros = next(expense for expense in detail.expenses if expense.currency == "EUR")
+    (tmp_path / "fx_rates.csv").write_text("date,currency,rate\n2024-01-01,EUR,0.50\n")
+    expense_crud.update_expense_in_group("group-a", euros.id, ExpenseUpdate(status="paid"))
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 80.0
+    expense_crud.delete_expense_from_group("group-a", euros.id)
+    assert analytics_crud.get_group_analytics("group-a").total_amount == 30.0
+
+
+def test_exports_stream_rows_in_batches_and_drop_abandoned_results(sqlite_db, monkeypatch):
+    groups = {n: "group-a" if n < 5 else "group-b" for n in range(1, 6)}
+    seed = sqlite3.connect(sqlite_db)
+    seed.executemany(
+        "INSERT INTO expenses (id, group_id, payer_id, amount, note, status, created_at) "
+        "VALUES (?, ?, ?, ?, ?, 'paid', ?)",
+        [(f"exp-{n}", groups[n], "user-1", n, f"Item {n}", f"2024-03-0{n} 12:00:00") for n in groups],
+    )
+    seed.executemany(
+        "INSERT INTO expense_groups (expense_id, group_id) VALUES (?, ?)",
+        [(f"exp-{n}", group_id) for n, group_id in groups.items()],
+    )
+    seed.commit()
+    seed.close()
+    monkeypatch.setattr(export_crud, "FETCH_BATCH_ROWS", 2)
+
+    rows = list(export_crud.export_group_expenses("group-a"))
+    assert [row[1] for row in rows] == ["exp-4", "exp-3", "exp-2", "exp-1"]
+    assert rows[0][2:] == (
+        "2024-03-04T12:00:00", "user-1", "user1@example.com", 4.0, "USD", "paid", "Item 4", None
+    )
+    assert [row[:2] for row in export_crud.export_all_expenses()][-1] == ("group-b", "exp-5")
+    with pytest.raises(export_crud.GroupNotFoundError):
+        export_crud.export_group_expenses("group-z")
+
+    discarded = []
+    monkeypatch.setattr(database.InstrumentedConnection, "discard", lambda self: discarded.append(self))
+    partial = export_crud.export_group_expenses("group-a")
+    next(partial)
+    partial.close()
+    assert len(discarded) == 1
+
+
+def test_recurring_expenses_materialize_in_batches_and_idempotently(sqlite_db):
+    for email, amount in [("user1@example.com", 900), ("user2@example.com", 15)]:
+        recurring_crud.create_recurring_expense(
+            "group-a",
+            RecurringExpenseCreate(
+                payer_email=email, amount=amount, frequency="monthly", starts_on=date(2024, 1, 5)
+            ),
+        )
+    with pytest.raises(recurring_crud.GroupMembershipError):
+        recurring_crud.create_recurring_expense(
+            "group-b",
+            RecurringExpenseCreate(
+                payer_email="user2@example.com", amount=1, frequency="daily", starts_on=date(2024, 1, 1)
+            ),
+        )
+
+    with request_stats() as stats:
+        result = recurring_crud.materialize_due_expenses(date(2024, 3, 10), batch_size=10)
+    assert (result.schedules, result.expenses, result.groups) == (2, 6, {"group-a"})
+    # Claim, occurrence and base-currency lookups, three batched inserts, one rollup upsert and the
+    # schedule update, then one refresh of the group (three reads): none of it grows with the expenses.
+    assert stats.queries == 11
+    analytics = analytics_crud.get_group_analytics("group-a")
+    assert (analytics.expense_count, analytics.total_amount) == (6, 2745.0)
+
+    # Rewinding a schedule (or a run that lost its update) cannot add an occurrence twice.
+    rewind = sqlite3.connect(sqlite_db)
+    rewind.execute("UPDATE recurring_expenses SET next_due_on = starts_on")
+    rewind.commit()
+    rewind.close()
+    assert recurring_crud.materialize_due_expenses(date(2024, 3, 10)).expenses == 0
+    schedules = recurring_crud.list_recurring_expenses("group-a")
+    assert [schedule.next_due_on for schedule in schedules] == [date(2024, 4, 5), date(2024, 4, 5)]
+    assert len(group_crud.get_group("group-a").expenses) == 6
+
+    # A schedule whose currency has no rate (any more) is skipped; the rest of its batch goes ahead.
+    seed = sqlite3.connect(sqlite_db)
+    seed.execute(
+        "INSERT INTO recurring_expenses (id, group_id, payer_id, amount, currency, frequency, starts_on, "
+        "next_due_on, created_at) VALUES ('rec-gbp', 'group-a', 'user-1', 4, 'GBP', 'monthly', "
+        "'2024-01-01', '2024-01-01', '2024-01-01T00:00:00')"
+    )
+    seed.commit()
+    seed.close()
+    result = recurring_crud.materialize_due_expenses(date(2024, 4, 10), batch_size=1)
+    assert (result.expenses, result.skipped) == (2, {"rec-gbp"})
+    schedules = {schedule.id: schedule for schedule in recurring_crud.list_recurring_expenses("group-a")}
+    assert schedules["rec-gbp"].next_due_on == date(2024, 1, 1)
+
+
+def test_archiving_moves_settled_expenses_behind_a_balance_checkpoint(sqlite_db):
+    for email, amount, status in [
+        ("user1@example.com", 30, "paid"),
+        ("user2@example.com", 12.5, "refunded"),
+        ("user1@example.com", 7.25, "paid"),
+        ("user2@example.com", 20, "assigned"),
+    ]:
+        before = expense_crud.add_expense_to_group(
+            "group-a", ExpenseCreate(payer_email=email, amount=amount, status=status)
+        )
+
+    result = archive_crud.archive_settled_expenses(older_than_days=0, batch_size=2)
+    assert (result.expenses, result.groups) == (3, {"group-a"})
+    with request_stats() as stats:
+        detail = group_crud.refresh_group("group-a")
+    # Group, members and live expenses, plus the checkpoint.
+    assert stats.queries == 4
+    assert [expense.amount for expense in detail.expenses] == [20.0]
+    assert (detail.archived_expense_count, detail.total_expense) == (3, before.total_expense)
+    assert detail.balances == before.balances
+
+    page = archive_crud.list_archived_expenses("group-a", limit=2)
+    assert (page.total, [expense.amount for expense in page.expenses]) == (3, [7.25, 12.5])
+    assert page.expenses[1].payer_name == "User 2"
+    assert archive_crud.list_archived_expenses("group-b").total == 0
+    exported = list(export_crud.export_group_expenses("group-a"))
+    assert [(row[5], row[9] is not None) for row in exported] == [
+        (20.0, False), (7.25, True), (12.5, True), (30.0, True)
+    ]
+    assert [row[1] for row in export_crud.export_all_expenses()] == [row[1] for row in exported[:1]] + [
+        row[1] for row in reversed(exported[1:])
+    ]
+    assert analytics_crud.get_group_analytics("group-a").expense_count == 4
+    with pytest.raises(archive_crud.GroupOwnershipError):
+        archive_crud.archive_group_expenses("group-a", "user-2", older_than_days=0)
+    assert archive_crud.archive_settled_expenses(older_than_days=0).expenses == 0
+
+
+def test_group_existence_check_reads_only_the_group_row(sqlite_db):
+    with request_stats() as stats:
+        group_crud.ensure_group_exists("group-a")
+    assert stats.queries == 1
+    with pytest.raises(group_crud.GroupNotFoundError):
+        group_crud.ensure_group_exists("group-z")
+
+
+def test_strict_budget_fails_the_request_that_exceeds_it(sqlite_db):
+    with request_stats(query_budget=1, strict_budget=True):
+        with pytest.raises(database.QueryBudgetExceededError):
+            user_crud.get_user("user-1")
+
+
+def test_strict_budget_does_not_mask_a_failing_statement(sqlite_db):
+    connection = database.InstrumentedConnection(StandInConnection(sqlite_db))
+    cursor = connection.cursor(dictionary=True)
+    with request_stats(query_budget=1, strict_budget=True) as stats:
+        cursor.execute("SELECT id FROM users")
+        with pytest.raises(sqlite3.OperationalError):
+            cursor.execute("SELECT id FROM no_such_table")
+    connection.close()
+
+    assert stats.queries == 2
+
+
+def test_slow_queries_are_logged_with_parameter_shapes_only(sqlite_db, caplog):
+    connection = database.InstrumentedConnection(StandInConnection(sqlite_db), slow_query_seconds=1e-9)
+    cursor = connection.cursor(dictionary=True)
+    with caplog.at_level(logging.WARNING, logger="signup_app.database"):
+        cursor.execute("SELECT id FROM users WHERE email = %s AND age > %s", ("user1@example.com", 3))
+    connection.close()
+
+    assert "params (str[17], int)" in caplog.text
+    assert "user1@example.com" not in caplog.text
+    assert database.param_shape(tuple(f"id-{index}" for index in range(8))) == "(8 x str[4])"
+
+
+def test_readiness_fails_when_the_pool_is_saturated(monkeypatch):
+    from app import readiness
+
+    monkeypatch.setattr(readiness, "pool_usage", lambda: (5, 5))
+    result = readiness.check_database(max_saturation=0.9)
+
+    assert result["ok"] is False
+    assert result["saturation"] == 1.0
+
+
+def test_driver_errors_surface_as_storage_errors():
+    from mysql.connector import errorcode
+    from mysql.connector.errors import IntegrityError, OperationalError
+
+    from app.crud.exceptions import DuplicateKeyError, StorageError
+
+    class FailingCursor:
+        def __init__(self, error):
+            self.error = error
+
+        def execute(self, *args):
+            raise self.error
+
+        fetchone = fetchall = fetchmany = cursor = rollback = execute
+
+        def __iter__(self):
+            raise self.error
+
+    duplicate = database.InstrumentedCursor(FailingCursor(IntegrityError(errno=errorcode.ER_DUP_ENTRY)))
+    with pytest.raises(DuplicateKeyError):
+        duplicate.execute("INSERT INTO users (id) VALUES (%s)", ("user-1",))
+    lost = database.InstrumentedCursor(FailingCursor(OperationalError(errno=errorcode.CR_SERVER_LOST)))
+    with pytest.raises(StorageError) as excinfo:
+        lost.execute("SELECT 1")
+    assert isinstance(excinfo.value.__cause__, OperationalError)
+    with pytest.raises(ZeroDivisionError):
+        database.InstrumentedCursor(FailingCursor(ZeroDivisionError())).execute("SELECT 1")
+    # Fetches (an unbuffered export losing its connection mid-stream) and connection calls too.
+    for read in (lost.fetchone, lost.fetchall, lost.fetchmany, lambda: list(lost)):
+        with pytest.raises(StorageError):
+            read()
+    connection = database.InstrumentedConnection(FailingCursor(lost._cursor.error))
+    for call in (connection.cursor, connection.rollback):
+        with pytest.raises(StorageError):
+            call()
+
+
+def test_pool_is_rebuilt_in_a_forked_process(monkeypatch):
+    from mysql.connector import pooling
+
+    built = []
+
+    class FakePool:
+        def __init__(self, **kwargs):
+            built.append(kwargs["pool_size"])
+
+        def _remove_connections(self):
+            return 0
+
+    monkeypatch.setattr(pooling, "MySQLConnectionPool", FakePool)
+    monkeypatch.setattr(database, "_connection_pool", None)
+    monkeypatch.setattr(database, "_pool_pid", None)
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    config.get_settings.cache_clear()
+
+    first = database.init_pool()
+    assert database.get_connection_pool() is first
+    monkeypatch.setattr(database.os, "getpid", lambda: -1)  # as seen from a forked child
+    assert database.get_connection_pool() is not first
+    assert built == [3, 3]
+    database.close_pool()
+    config.get_settings.cache_clear()
@@ -0,0 +1,227 @@
+import base64
+import hashlib
+import importlib
+import io
+import json
+
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.datastructures import Headers
+
+from app import config
+import app.main as main_module
+from app.utils import files
+from app.utils.authentication import InvalidUploadTokenError
+from tests.s3_standin import S3StandIn
+
+
+def _png(color: str, size: tuple[int, int] = (640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _upload(payload: bytes, filename: str = "avatar.png") -> UploadFile:
+    return UploadFile(
+        io.BytesIO(payload), filename=filename, headers=Headers({"content-type": "image/png"})
+    )
+
+
+@pytest.fixture
+def s3_settings(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("USE_FILE_STORAGE", "false")
+    monkeypatch.setenv("MEDIA_S3_BUCKET", "avatars-test")
+    monkeypatch.setenv("S3_MULTIPART_THRESHOLD", str(5 * 1024 * 1024))
+    monkeypatch.setenv("AVATAR_MAX_BYTES", str(8 * 1024 * 1024))
+    with S3StandIn() as server:
+        monkeypatch.setenv("MEDIA_S3_ENDPOINT_URL", server.url)
+        config.get_settings.cache_clear()
+        yield server, config.get_settings()
+    config.get_settings.cache_clear()
+
+
+@pytest.fixture
+def upload_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("AVATAR_MAX_BYTES", "4096")
+    monkeypatch.setenv("AVATAR_UPLOAD_DIR", str(tmp_path / "avatar-uploads"))
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+    yield TestClient(main_module.app)
+    monkeypatch.delenv("AVATAR_MAX_BYTES")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+
+
+def test_filesystem_avatars_are_content_addressed(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path))
+    config.get_settings.cache_clear()
+    settings = config.get_settings()
+    try:
+        first = files.save_avatar_file("user-1", _upload(b"first image"), settings).url
+        assert first == files.save_avatar_file("user-1", _upload(b"first image"), settings).url
+        assert files.HASHED_NAME_PATTERN.search(first)
+
+        second = files.save_avatar_file("user-1", _upload(b"second image"), settings).url
+        assert second != first
+        assert [path.name for path in (tmp_path / "user-1").iterdir()] == [second.rsplit("/", 1)[1]]
+
+        with pytest.raises(files.AvatarTooLargeError):
+            files.save_avatar_file("user-1", _upload(b"x" * (settings.avatar_max_bytes + 1)), settings)
+    finally:
+        config.get_settings.cache_clear()
+
+
+def test_s3_uploads_reuse_client_and_switch_to_multipart(s3_settings):
+    server, settings = s3_settings
+    small = files.save_avatar_file("user-1", _upload(b"tiny image"), settings).url
+    assert small.startswith(f"{server.url}/avatars-test/avatars/user-1/avatar-")
+    small_object = server.objects[small[len(server.url) + 1:]]
+    assert small_object.body == b"tiny image"
+    assert small_object.headers["Cache-Control"] == files.AVATAR_CACHE_CONTROL
+    assert not small_object.multipart
+
+    large_payload = b"a" * (6 * 1024 * 1024)
+    large = files.save_avatar_file("user-1", _upload(large_payload), settings).url
+    large_object = server.objects[large[len(server.url) + 1:]]
+    assert large_object.multipart
+    assert large_object.body == large_payload
+    assert files.get_s3_client(settings) is files.get_s3_client(settings)
+
+
+def test_oversized_upload_is_rejected_with_413(upload_client):
+    signup = upload_client.post(
+        "/signup",
+        json={"name": "Quinn", "email": "quinn@example.com", "password": "secret123"},
+    )
+    user_id = signup.json()["id"]
+    # Just over the limit: caught while spooling. Far over: cut off by the middleware.
+    for size in (4097, 512 * 1024):
+        response = upload_client.post(
+            f"/users/{user_id}/avatar",
+            files={"file": ("avatar.png", b"x" * size, "image/png")},
+        )
+        assert response.status_code == 413
+
+    ok = upload_client.post(
+        f"/users/{user_id}/avatar",
+        files={"file": ("avatar.png", b"fake image", "image/png")},
+    )
+    media = upload_client.get(ok.json()["avatar_url"])
+    assert media.status_code == 200
+    assert media.headers["cache-control"] == files.AVATAR_CACHE_CONTROL
+
+
+def test_s3_variants_are_rendered_once_per_image(s3_settings):
+    server, settings = s3_settings
+    stored = files.save_avatar_file("user-1", _upload(_png("red")), settings)
+    variant_url = files.save_avatar_variants(stored, settings)
+    assert variant_url.endswith(files.avatar_variant_name(stored.digest, 128))
+    variant_keys = [key for key in server.objects if "/variants/" in key]
+    assert len(variant_keys) == 3
+    assert all(server.objects[key].headers["Content-Type"] == "image/webp" for key in variant_keys)
+
+    again = files.save_avatar_file("user-2", _upload(_png("red")), settings)
+    assert files.save_avatar_variants(again, settings) == variant_url
+
+
+def test_uploaded_avatar_is_replaced_by_shared_webp_variant(upload_client, tmp_path, monkeypatch):
+    user_ids = []
+    for name in ("Avery", "Blake"):
+        signup = upload_client.post(
+            "/signup",
+            json={"name": name, "email": f"{name.lower()}@example.com", "password": "secret123"},
+        )
+        user_ids.append(signup.json()["id"])
+
+    source = Image.new("RGB", (64, 32), "blue")
+    exif = Image.Exif()
+    exif[0x010E] = "holiday snapshot"
+    buffer = io.BytesIO()
+    source.save(buffer, format="JPEG", exif=exif)
+    for user_id in user_ids:
+        response = upload_client.post(
+            f"/users/{user_id}/avatar",
+            files={"file": ("avatar.jpg", buffer.getvalue(), "image/jpeg")},
+        )
+        assert response.json()["avatar_url"].startswith(f"/media/{user_id}/")
+
+    urls = {upload_client.get(f"/users/{user_id}").json()["avatar_url"] for user_id in user_ids}
+    assert len(urls) == 1
+    url = urls.pop()
+    assert url.startswith("/media/variants/avatar-128-")
+    assert len(list((tmp_path / "media" / "variants").iterdir())) == 3
+
+    media = upload_client.get(url)
+    assert media.headers["cache-control"] == files.AVATAR_CACHE_CONTROL
+    with Image.open(io.BytesIO(media.content)) as variant:
+        assert variant.format == "WEBP"
+        assert variant.size == (128, 128)
+        assert not variant.getexif()
+
+
+def test_signed_local_upload_matches_presigned_flow(upload_client, tmp_path):
+    signup = upload_client.post(
+        "/signup",
+        json={"name": "Drew", "email": "drew@example.com", "password": "secret123"},
+    )
+    user_id = signup.json()["id"]
+    ticket = upload_client.post(f"/users/{user_id}/avatar/uploads", json={"content_type": "image/png"})
+    assert ticket.status_code == 201
+    ticket = ticket.json()
+
+    missing = upload_client.post(
+        f"/users/{user_id}/avatar/uploads/complete", json={"upload_token": ticket["upload_token"]}
+    )
+    assert missing.status_code == 404
+
+    forged = dict(ticket["fields"], token=ticket["fields"]["token"] + "x")
+    rejected = upload_client.post(ticket["url"], data=forged, files={"file": ("a.png", _png("green"))})
+    assert rejected.status_code == 403
+
+    uploaded = upload_client.post(
+        ticket["url"], data=ticket["fields"], files={"file": ("a.png", _png("green"), "image/png")}
+    )
+    assert uploaded.status_code == 204
+
+    completed = upload_client.post(
+        f"/users/{user_id}/avatar/uploads/complete", json={"upload_token": ticket["upload_token"]}
+    )
+    assert completed.status_code == 200
+    assert completed.json()["avatar_url"].startswith(f"/media/{user_id}/avatar-")
+    assert upload_client.get(f"/users/{user_id}").json()["avatar_url"].startswith("/media/variants/")
+    assert not any((tmp_path / "avatar-uploads").iterdir())
+
+
+def test_s3_direct_upload_is_verified_and_moved_to_hashed_key(s3_settings):
+    server, settings = s3_settings
+    ticket = files.create_avatar_upload("user-1", "image/png", settings, "unused")
+    assert ticket.url == f"{server.url}/avatars-test"
+    policy = json.loads(base64.b64decode(ticket.fields["policy"]))
+    assert ["content-length-range", 1, settings.avatar_max_bytes] in policy["conditions"]
+
+    client = files.get_s3_client(settings)
+    client.put_object(
+        Bucket="avatars-test", Key=ticket.fields["key"], Body=b"not an image", ContentType="image/png"
+    )
+    with pytest.raises(files.AvatarVerificationError):
+        files.complete_avatar_upload("user-1", ticket.upload_token, settings)
+
+    payload = _png("purple")
+    client.put_object(Bucket="avatars-test", Key=ticket.fields["key"], Body=payload, ContentType="image/png")
+    with pytest.raises(InvalidUploadTokenError):
+        files.complete_avatar_upload("user-2", ticket.upload_token, settings)
+    stored = files.complete_avatar_upload("user-1", ticket.upload_token, settings)
+    assert stored.digest == hashlib.sha256(payload).hexdigest()
+    assert stored.location == files.save_avatar_file("user-1", _upload(payload), settings).location
+    final = server.objects[f"avatars-test/{stored.location}"]
+    assert final.body == payload
+    assert final.headers["Cache-Control"] == files.AVATAR_CACHE_CONTROL
+    assert f"avatars-test/{ticket.fields['key']}" not in server.objects
@@ -1,9 +1,17 @@
+import gzip
 import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
 
 from app import config
+from app.utils.authentication import issue_session_token
 import app.main as main_module
 
 
@@ -85,6 +93,12 @@ def test_signup_and_login_flow(api_client):
     )
     assert expense_response.status_code == 200
     assert expense_response.json()["expenses"][0]["amount"] == 42.75
+    unpriced = api_client.post(
+        f"/groups/{group_id}/expenses",
+        json={"payer_email": "casey@example.com", "amount": 5000, "currency": "jpy"},
+    )
+    assert unpriced.status_code == 400
+    assert unpriced.json()["detail"] == "No exchange rate for JPY"
 
     user_groups_response = api_client.get(f"/users/{user_id}/groups")
     assert user_groups_response.status_code == 200
@@ -96,3 +110,122 @@ def test_signup_and_login_flow(api_client):
     )
     assert avatar_response.status_code == 200
     assert avatar_response.json()["avatar_url"].startswith("/media/")
+
+
+def test_login_token_serves_me_without_reloading_user(api_client, monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "local")
+    config.get_settings.cache_clear()
+    signup = api_client.post(
+        "/signup",
+        json={"name": "Drew", "email": "drew@example.com", "password": "secret123"},
+    )
+    user_id = signup.json()["id"]
+    login = api_client.post("/login", json={"email": "drew@example.com", "password": "secret123"})
+    token = login.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    me = api_client.get("/me", headers=headers)
+    assert me.status_code == 200
+    assert me.json()["user_id"] == user_id
+    assert me.json()["groups"] == []
+    assert me.json()["access_token"] is None
+
+    api_client.post("/groups", json={"owner_id": user_id, "name": "Climbers"})
+    refreshed = api_client.get("/me", headers=headers).json()
+    assert [group["name"] for group in refreshed["groups"]] == ["Climbers"]
+    assert refreshed["membership_version"] == 1
+    assert refreshed["access_token"]
+
+    assert api_client.get("/me").status_code == 401
+    assert api_client.get("/me", headers={"Authorization": f"Bearer {token}x"}).status_code == 401
+
+
+def test_ledger_exports_stream_csv_and_ndjson(api_client):
+    user_id = api_client.post(
+        "/signup", json={"name": "Emery", "email": "emery@example.com", "password": "secret123"}
+    ).json()["id"]
+    group_id = api_client.post("/groups", json={"owner_id": user_id, "name": "Books"}).json()["id"]
+    for amount, note in [(12.5, "Ledger, vol. 1"), (30, 'Audit "Q1"')]:
+        api_client.post(
+            f"/groups/{group_id}/expenses",
+            json={"payer_email": "emery@example.com", "amount": amount, "note": note},
+        )
+
+    response = api_client.get(f"/groups/{group_id}/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-disposition"] == f'attachment; filename="group-{group_id}-expenses.csv"'
+    lines = response.text.splitlines()
+    assert lines[0] == (
+        "group_id,expense_id,created_at,payer_id,payer_email,amount,currency,status,note,archived_at"
+    )
+    assert lines[1].endswith(',emery@example.com,30.0,USD,assigned,"Audit ""Q1""",')
+    assert lines[2].endswith(',12.5,USD,assigned,"Ledger, vol. 1",')
+
+    ndjson_url = f"/groups/{group_id}/export?format=ndjson"
+    with api_client.stream("GET", ndjson_url, headers={"Accept-Encoding": "gzip"}) as compressed:
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(compressed.iter_raw())).splitlines()]
+    assert [row["note"] for row in rows] == ['Audit "Q1"', "Ledger, vol. 1"]
+    assert rows[0]["amount"] == 30.0
+    plain = api_client.get(ndjson_url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["content-type"] == "application/x-ndjson"
+    assert api_client.get("/groups/missing/export").status_code == 404
+
+    assert api_client.get("/exports/expenses").status_code == 401
+    user_token = issue_session_token(user_id, "user", 0)
+    denied = api_client.get("/exports/expenses", headers={"Authorization": f"Bearer {user_token}"})
+    assert denied.status_code == 403
+    admin_token = issue_session_token(user_id, "admin", 0)
+    everything = api_client.get(
+        "/exports/expenses?format=ndjson", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert [json.loads(line)["group_id"] for line in everything.text.splitlines()] == [group_id, group_id]
+
+
+def test_ready_reports_corrupt_storage_files(api_client, tmp_path):
+    assert api_client.get("/ready").json()["status"] == "ready"
+
+    (tmp_path / "groups.json").write_text("[{not json", encoding="utf-8")
+    response = api_client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["checks"]["groups_file"]["ok"] is False
+    assert response.json()["checks"]["users_file"]["ok"] is True
+
+
+def test_file_mode_import_skips_database_and_aws_drivers(tmp_path):
+    script = (
+        "import sys, app.main; "
+        "print(sorted(name for name in ('mysql.connector', 'boto3', 'botocore') if name in sys.modules))"
+    )
+    env = {
+        **os.environ,
+        "USE_FILE_STORAGE": "true",
+        "DATA_FILE_PATH": str(tmp_path / "users.json"),
+        "GROUPS_FILE_PATH": str(tmp_path / "groups.json"),
+        "CACHE_BACKEND": "none",
+        "OUTBOX_WORKER_ENABLED": "false",
+    }
+    backend_dir = Path(__file__).resolve().parent.parent
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_ready_waits_for_warmup(api_client, monkeypatch):
+    from app import warmup
+
+    release = threading.Event()
+    monkeypatch.setattr(warmup, "_status", None)
+    monkeypatch.setattr(warmup, "run_warmup", lambda settings: release.wait(5))
+    thread = warmup.start_warmup(config.get_settings())
+
+    pending = api_client.get("/ready")
+    assert pending.status_code == 503
+    assert pending.json()["checks"]["warmup"] == {"ok": False, "status": "pending"}
+
+    release.set()
+    thread.join(5)
+    assert api_client.get("/ready").status_code == 200
@@ -0,0 +1,124 @@
+import dataclasses
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app import database
+import app.main as main_module
+
+
+@pytest.fixture
+def metrics_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("OUTBOX_WORKER_ENABLED", "false")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+    yield TestClient(main_module.app)
+    monkeypatch.delenv("OUTBOX_WORKER_ENABLED")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+
+
+def test_metrics_report_route_templates_crud_timings_and_file_bytes(metrics_client):
+    response = metrics_client.post(
+        "/signup", json={"name": "Mira", "email": "mira@example.com", "password": "secret123"}
+    )
+    assert response.status_code == 201
+    assert metrics_client.get(f"/users/{response.json()['id']}").status_code == 200
+
+    body = metrics_client.get("/metrics").text
+
+    assert 'http_request_duration_seconds_count{method="POST",route="/signup",status="201"}' in body
+    assert 'route="/users/{user_id}"' in body
+    assert 'crud_operation_duration_seconds_count{operation="user.create_user"}' in body
+    assert 'crud_operation_duration_seconds_count{operation="user._create_user_file"}' in body
+    assert 'file_storage_bytes_total{direction="written",file="users"}' in body
+    assert "db_queries_per_request_bucket" in body
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, operation, params=None):
+        self.statements.append((operation, params))
+
+    def fetchall(self):
+        return [{"id": 1}]
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.cursor_instance = _FakeCursor()
+
+    def cursor(self, dictionary=False):
+        return self.cursor_instance
+
+
+def test_instrumented_cursor_counts_statements_for_the_current_request():
+    from app import metrics
+
+    with metrics.request_stats() as stats:
+        connection = database.InstrumentedConnection(_FakeConnection())
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT 1")
+        cursor.execute("SELECT %s", (2,))
+        assert cursor.fetchall() == [{"id": 1}]
+
+    assert stats.queries == 2
+    assert connection.cursor_instance.statements == [("SELECT 1", None), ("SELECT %s", (2,))]
+
+
+
+def test_timed_generators_are_timed_until_exhausted_or_closed():
+    import time
+
+    from prometheus_client import REGISTRY
+
+    from app import metrics
+
+    @metrics.timed("test.stream")
+    def stream():
+        yield 1
+        time.sleep(0.05)
+        yield 2
+
+    def observed():
+        labels = {"operation": "test.stream"}
+        count = REGISTRY.get_sample_value("crud_operation_duration_seconds_count", labels) or 0
+        return count, REGISTRY.get_sample_value("crud_operation_duration_seconds_sum", labels) or 0
+
+    rows = stream()
+    assert observed()[0] == 0
+    assert list(rows) == [1, 2]
+    count, total = observed()
+    assert (count, total >= 0.05) == (1, True)
+
+    partial = stream()
+    next(partial)
+    partial.close()
+    assert observed()[0] == 2
+
+def test_metrics_need_the_metrics_token_when_one_is_set(metrics_client, monkeypatch):
+    from app import dependencies
+
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-me")
+    config.get_settings.cache_clear()
+    assert metrics_client.get("/metrics").status_code == 401
+    assert metrics_client.get("/metrics/limiter", headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert metrics_client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+
+    # Without a token, prod does not serve them at all.
+    prod = dataclasses.replace(config.get_settings(), environment="prod", session_secret="s", metrics_token="")
+    monkeypatch.setattr(dependencies, "get_settings", lambda: prod)
+    assert metrics_client.get("/metrics").status_code == 404
+    monkeypatch.delenv("METRICS_TOKEN")
+    config.get_settings.cache_clear()
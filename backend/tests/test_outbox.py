@@ -0,0 +1,102 @@
+import importlib
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, outbox
+import app.main as main_module
+from app.crud import user as user_crud
+from app.schemas.user import UserSignup
+
+
+@pytest.fixture
+def file_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("OUTBOX_FILE_PATH", str(tmp_path / "outbox.jsonl"))
+    config.get_settings.cache_clear()
+    yield outbox.FileOutboxStore(str(tmp_path / "outbox.jsonl"))
+    config.get_settings.cache_clear()
+
+
+def _signup(email):
+    return user_crud.create_user(UserSignup(name="Sam", email=email, password="secret123"))
+
+
+def test_signup_events_are_journaled_and_drained_in_batches(file_env):
+    _signup("sam@example.com")
+    assert sorted(event.kind for event in file_env.pending()) == [
+        outbox.ADMIN_NOTIFICATION,
+        outbox.WELCOME_EMAIL,
+    ]
+
+    sink = outbox.MemorySink()
+    worker = outbox.OutboxWorker(file_env, sink, batch_size=1)
+    assert worker.run_once() == 1
+    assert worker.run_once() == 1
+    assert worker.run_once() == 0
+    assert {event.payload.get("email") for event in sink.delivered} == {"sam@example.com", None}
+    assert file_env.pending() == []
+
+
+def test_failed_deliveries_back_off_then_go_dead(file_env):
+    _signup("retry@example.com")
+    sink = outbox.MemorySink(fail_times=1)
+    worker = outbox.OutboxWorker(file_env, sink, backoff_seconds=30, jitter=lambda: 1.0)
+    assert worker.run_once() == 2
+    assert len(sink.delivered) == 1
+    (waiting,) = file_env.pending()
+    assert waiting.attempts == 1
+    assert waiting.available_at > time.time() + 25
+    assert worker.run_once() == 0
+
+    impatient = outbox.OutboxWorker(
+        file_env, outbox.MemorySink(fail_times=5), max_attempts=3, backoff_seconds=0
+    )
+    file_env.retry(waiting, "reset", 0, dead=False)
+    assert impatient.run_once() == 1
+    assert impatient.run_once() == 1
+    assert file_env.pending() == []
+    assert impatient.run_once() == 0
+
+
+
+def test_compaction_drops_delivered_events_and_keeps_dead_letters(file_env, monkeypatch):
+    monkeypatch.setattr(outbox, "COMPACT_AFTER", 2)
+    delivered = [outbox.new_event(outbox.WELCOME_EMAIL, {"email": f"{n}@example.com"}) for n in range(2)]
+    dead = outbox.new_event(outbox.ADMIN_NOTIFICATION, {})
+    waiting = outbox.new_event(outbox.ADMIN_NOTIFICATION, {})
+    file_env.append([*delivered, dead, waiting])
+    file_env.complete([event.id for event in delivered])
+    file_env.retry(dead, "bounced", 0, dead=True)
+
+    assert [event.id for event in file_env.claim(10, 30)] == [waiting.id]
+    events, done = file_env._replay()
+    assert done == 0
+    assert (events[dead.id].status, events[dead.id].last_error) == (outbox.DEAD, "bounced")
+    assert set(events) == {dead.id, waiting.id}
+
+def test_lifespan_worker_delivers_signup_events(file_env, monkeypatch):
+    monkeypatch.setenv("OUTBOX_SINK", "memory")
+    monkeypatch.setenv("OUTBOX_POLL_SECONDS", "0.05")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+    try:
+        with TestClient(main_module.app) as client:
+            response = client.post(
+                "/signup",
+                json={"name": "Lee", "email": "lee@example.com", "password": "secret123"},
+            )
+            assert response.status_code == 201
+            sink = main_module.outbox_worker.sink
+            deadline = time.monotonic() + 2
+            while len(sink.delivered) < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert len(sink.delivered) == 2
+    finally:
+        monkeypatch.delenv("OUTBOX_SINK")
+        config.get_settings.cache_clear()
+        importlib.reload(main_module)
@@ -0,0 +1,87 @@
+import importlib
+import json
+import os
+import pstats
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+import app.main as main_module
+
+
+@pytest.fixture
+def profiling_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("OUTBOX_WORKER_ENABLED", "false")
+    monkeypatch.setenv("PROFILING_ENABLED", "true")
+    monkeypatch.setenv("PROFILE_SECRET", "let-me-profile")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path / "profiles"))
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+    yield TestClient(main_module.app), tmp_path / "profiles"
+    for name in ("OUTBOX_WORKER_ENABLED", "PROFILING_ENABLED", "PROFILE_SECRET", "PROFILE_DIR"):
+        monkeypatch.delenv(name)
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+
+
+def test_profile_is_written_only_for_requests_with_the_secret(profiling_client):
+    client, profile_dir = profiling_client
+    user = client.post("/signup", json={"name": "Ola", "email": "ola@example.com", "password": "secret123"})
+    assert user.status_code == 201
+    assert client.get(f"/users/{user.json()['id']}", headers={"X-Profile-Token": "wrong"}).status_code == 200
+    assert not profile_dir.exists()
+
+    response = client.get(f"/users/{user.json()['id']}", headers={"X-Profile-Token": "let-me-profile"})
+
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+    summary = json.loads((profile_dir / f"{profile_id}.json").read_text())
+    assert summary["route"] == "/users/{user_id}"
+    assert summary["status"] == 200
+    assert summary["sql"]["count"] == 0
+    assert ("read", "users") in [(io["direction"], io["file"]) for io in summary["file_storage"]]
+    assert any("_get_user_file" in row["function"] for row in summary["top_functions"])
+    stats = pstats.Stats(str(profile_dir / f"{profile_id}.prof"))
+    functions = {function for _, _, function in stats.stats}  # type: ignore[attr-defined]
+    assert {"serialize_response", "_get_user_file"} <= functions
+
+
+def test_request_proceeds_unprofiled_when_another_profiler_is_active(profiling_client, monkeypatch):
+    from app.middleware import profiling
+
+    class BusyProfile(profiling.cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    client, profile_dir = profiling_client
+    monkeypatch.setattr(profiling.cProfile, "Profile", BusyProfile)
+    response = client.post(
+        "/signup",
+        json={"name": "Ola", "email": "ola@example.com", "password": "secret123"},
+        headers={"X-Profile-Token": "let-me-profile"},
+    )
+
+    assert response.status_code == 201
+    assert "X-Profile-Id" not in response.headers
+    assert not profile_dir.exists()
+
+
+def test_profile_dir_keeps_only_recent_profiles(tmp_path):
+    from app.middleware.profiling import ProfileTrace, ProfilingMiddleware
+
+    middleware = ProfilingMiddleware(None, str(tmp_path), max_profiles=2, max_age_seconds=3600)
+    request = {"method": "GET", "path": "/health"}
+    for profile_id in ("20240101T000000-a", "20240101T000001-b", "20240101T000002-c", "20240101T000003-d"):
+        middleware._write(profile_id, request, ProfileTrace())
+    stale = tmp_path / "20240101T000003-d.json"
+    os.utime(stale, (0, 0))
+    middleware._write("20240101T000004-e", request, ProfileTrace())
+
+    # d is past the age limit; of the rest only the newest two are kept.
+    remaining = sorted(path.name for path in tmp_path.iterdir())
+    assert remaining == ["20240101T000002-c.json", "20240101T000004-e.json"]
@@ -0,0 +1,88 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+import app.main as main_module
+from app.external_services.redis import RedisClient
+from app.middleware.rate_limit import MemoryRateStore, RateLimiter, RedisRateStore, classify_route
+from tests.redis_standin import RedisStandIn
+
+
+@pytest.fixture
+def limited_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FILE_STORAGE", "true")
+    monkeypatch.setenv("DATA_FILE_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("GROUPS_FILE_PATH", str(tmp_path / "groups.json"))
+    monkeypatch.setenv("RATE_LIMITS", "auth=0.01/2")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+    yield TestClient(main_module.app)
+    monkeypatch.delenv("RATE_LIMITS")
+    config.get_settings.cache_clear()
+    importlib.reload(main_module)
+
+
+def test_exports_get_their_own_route_class():
+    assert classify_route("GET", "/groups/g-1/export") == "export"
+    assert classify_route("GET", "/exports/expenses") == "export"
+    assert classify_route("GET", "/groups/g-1/expenses") == "read"
+
+
+def test_token_bucket_refuses_after_burst():
+    store = MemoryRateStore({"auth": (1.0, 2)})
+    assert store.take("auth", "10.0.0.1") == 0
+    assert store.take("auth", "10.0.0.1") == 0
+    assert store.take("auth", "10.0.0.1") > 0
+    assert store.take("auth", "10.0.0.2") == 0
+
+
+def test_concurrency_limit_sheds_excess_requests():
+    limiter = RateLimiter(MemoryRateStore({}), {"list": 1})
+    assert limiter.enter("list")
+    assert not limiter.enter("list")
+    limiter.exit("list")
+    assert limiter.enter("list")
+    assert limiter.snapshot()["list"] == {
+        "allowed": 2,
+        "rate_limited": 0,
+        "shed": 1,
+        "in_flight": 1,
+        "concurrency_limit": 1,
+    }
+
+
+
+def test_db_bound_classes_share_a_pool_sized_cap():
+    limiter = RateLimiter(MemoryRateStore({}), {"read": 16, "write": 8}, db_pool_limit=2)
+    assert limiter.enter("read")
+    assert limiter.enter("write")
+    assert not limiter.enter("read")
+    assert limiter.enter("export")
+    limiter.exit("write")
+    assert limiter.enter("read")
+    snapshot = limiter.snapshot()
+    assert snapshot["db_pool"]["in_flight"] == 2
+    assert snapshot["db_pool"]["concurrency_limit"] == 2
+    assert snapshot["db_pool"]["shed"] == 1
+    assert snapshot["read"]["shed"] == 1
+
+def test_middleware_returns_429_with_retry_after(limited_client):
+    credentials = {"email": "nobody@example.com", "password": "secret123"}
+    assert limited_client.post("/login", json=credentials).status_code == 401
+    assert limited_client.post("/login", json=credentials).status_code == 401
+    limited = limited_client.post("/login", json=credentials)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert limited_client.get("/health").status_code == 200
+    assert limited_client.get("/metrics/limiter").json()["auth"]["rate_limited"] == 1
+
+
+def test_redis_store_shares_budget_between_workers():
+    with RedisStandIn() as server:
+        workers = [RedisRateStore(RedisClient(server.url), {"auth": (0.01, 3)}) for _ in range(2)]
+        results = [workers[index % 2].take("auth", "10.0.0.9") for index in range(4)]
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert results[3] > 0
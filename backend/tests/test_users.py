@@ -1,11 +1,28 @@
+import threading
+from datetime import date, datetime
+
 import pytest
+from pydantic import ValidationError
 
 from app import config
+from app.crud import analytics as analytics_crud
+from app.crud import archive as archive_crud
 from app.crud import expense as expense_crud
+from app.crud import export as export_crud
+from app.crud import fx_rates
 from app.crud import group as group_crud
+from app.crud import recurring as recurring_crud
 from app.crud import user as user_crud
-from app.schemas.expense import ExpenseCreate, ExpenseUpdate
-from app.schemas.group import GroupCreate
+from app.crud.file_storage import (
+    append_archived_expenses,
+    archive_file_path,
+    archived_expense_offsets,
+    iter_group_ledgers,
+    read_archived_expenses,
+    save_groups,
+)
+from app.schemas.expense import ExpenseCreate, ExpenseSearch, ExpenseUpdate, RecurringExpenseCreate
+from app.schemas.group import GroupCreate, GroupDetail
 from app.schemas.user import UserLogin, UserProfileUpdate, UserSignup
 
 
@@ -130,3 +147,347 @@ def test_user_group_assignments(file_storage_env):
     after_delete = expense_crud.delete_expense_from_group(group.id, expense_id)
     assert after_delete.expenses == []
     assert after_delete.total_expense == 0.0
+
+
+def test_group_json_matches_validated_detail(file_storage_env):
+    owner = user_crud.create_user(
+        UserSignup(name="Morgan", email="morgan@example.com", password="secret"),
+    )
+    member = user_crud.create_user(
+        UserSignup(name="Riley", email="riley@example.com", password="secret"),
+    )
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Ledger"))
+    group_crud.add_member_to_group(group.id, requester_id=owner.id, user_email=member.email)
+    expense_crud.add_expense_to_group(
+        group.id, ExpenseCreate(payer_email=member.email, amount=10, note="Taxi")
+    )
+    expense_crud.add_expense_to_group(
+        group.id, ExpenseCreate(payer_email=owner.email, amount=33.33, status="paid")
+    )
+
+    fast = GroupDetail.model_validate_json(group_crud.get_group_json(group.id))
+    assert fast == group_crud.get_group(group.id)
+    assert fast.expenses[1].amount == 10.0
+
+
+def test_search_group_expenses_uses_the_file_index(file_storage_env):
+    owner = user_crud.create_user(UserSignup(name="Avery", email="avery@example.com", password="secret"))
+    member = user_crud.create_user(UserSignup(name="Quinn", email="quinn@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Trip"))
+    group_crud.add_member_to_group(group.id, requester_id=owner.id, user_email=member.email)
+    for payer, amount, note, status in [
+        (owner, 120, "Hotel booking, night one", "paid"),
+        (member, 45.5, "Dinner at the harbour", "assigned"),
+        (member, 12, "Taxi to the hotel", "approved"),
+        (owner, 30, "Museum tickets", "assigned"),
+    ]:
+        expense_crud.add_expense_to_group(
+            group.id, ExpenseCreate(payer_email=payer.email, amount=amount, note=note, status=status)
+        )
+
+    def notes(**filters):
+        result = expense_crud.search_expenses(group.id, ExpenseSearch(**filters))
+        return [expense.note for expense in result.expenses]
+
+    assert notes(q="hotel") == ["Taxi to the hotel", "Hotel booking, night one"]
+    assert notes(q="hot boo") == ["Hotel booking, night one"]
+    # Like ft_expenses_note, words under three letters and stopwords are not indexed or matched.
+    assert notes(q="to the hotel") == notes(q="hotel")
+    assert len(notes(q="ni")) == 4
+    assert notes(payer_id=member.id, status=["approved"]) == ["Taxi to the hotel"]
+    assert notes(min_amount=30, max_amount=50) == ["Museum tickets", "Dinner at the harbour"]
+    page = expense_crud.search_expenses(group.id, ExpenseSearch(limit=2, offset=1))
+    assert page.total == 4
+    assert [expense.note for expense in page.expenses] == ["Taxi to the hotel", "Dinner at the harbour"]
+    assert page.expenses[1].payer_email == member.email
+
+    # Writes replace groups.json, so the next search sees them.
+    expense_crud.update_expense_in_group(group.id, page.expenses[1].id, ExpenseUpdate(note="Harbour lunch"))
+    assert notes(q="harbour") == ["Harbour lunch"]
+    with pytest.raises(expense_crud.GroupNotFoundError):
+        expense_crud.search_expenses("missing", ExpenseSearch())
+    with pytest.raises(ValidationError, match="created_from"):
+        ExpenseSearch(created_from=datetime(2024, 3, 2), created_to=datetime(2024, 3, 1))
+    with pytest.raises(ValidationError, match="min_amount"):
+        ExpenseSearch(min_amount=50, max_amount=30)
+    # The index clamps an inverted date range that skipped validation instead of counting backwards.
+    bounds = {"created_from": datetime(2100, 1, 1), "created_to": datetime(2000, 1, 1)}
+    inverted = ExpenseSearch.model_construct(**{**ExpenseSearch().model_dump(), **bounds})
+    assert expense_crud.search_expenses(group.id, inverted).total == 0
+
+
+def test_group_analytics_follow_expense_changes(file_storage_env):
+    owner = user_crud.create_user(UserSignup(name="Avery", email="avery@example.com", password="secret"))
+    member = user_crud.create_user(UserSignup(name="Quinn", email="quinn@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Trip"))
+    group_crud.add_member_to_group(group.id, requester_id=owner.id, user_email=member.email)
+    for payer, amount in [(owner, 100), (member, 40), (member, 10)]:
+        detail = expense_crud.add_expense_to_group(
+            group.id, ExpenseCreate(payer_email=payer.email, amount=amount)
+        )
+    by_amount = {expense.amount: expense for expense in detail.expenses}
+    dinner, taxi = by_amount[40], by_amount[10]
+    expense_crud.update_expense_in_group(group.id, dinner.id, ExpenseUpdate(amount=60, status="paid"))
+    expense_crud.delete_expense_from_group(group.id, taxi.id)
+
+    analytics = analytics_crud.get_group_analytics(group.id)
+    assert (analytics.expense_count, analytics.total_amount) == (2, 160.0)
+    by_member = [(spend.name, spend.total_amount) for spend in analytics.by_member]
+    assert by_member == [("Avery", 100.0), ("Quinn", 60.0)]
+    assert [(spend.status, spend.expense_count) for spend in analytics.by_status] == [
+        ("assigned", 1),
+        ("paid", 1),
+    ]
+    assert len(analytics.by_month) == 1 and analytics.by_month[0].total_amount == 160.0
+    with pytest.raises(analytics_crud.GroupNotFoundError):
+        analytics_crud.get_group_analytics("missing")
+
+
+def test_balances_are_converted_to_the_group_base_currency(file_storage_env, tmp_path):
+    rates = tmp_path / "fx_rates.csv"
+    rates.write_text("date,currency,rate\n2024-01-01,EUR,0.9\n2024-03-01,EUR,0.8\n2024-01-01,GBP,0.8\n")
+    # The earliest rate also covers earlier days; each later row applies from its date on.
+    converted = fx_rates.convert_amounts(
+        [
+            (90, "EUR", "2023-06-01T08:00:00"),
+            (90, "EUR", datetime(2024, 2, 29, 23, 59)),
+            (80, "EUR", "2024-03-01T00:00:00"),
+            (10, "GBP", "2024-05-01T00:00:00"),
+            (5, "USD", "2024-05-01T00:00:00"),
+        ],
+        "USD",
+    )
+    assert converted == pytest.approx([100, 100, 100, 12.5, 5])
+
+    owner = user_crud.create_user(UserSignup(name="Ines", email="ines@example.com", password="secret"))
+    member = user_crud.create_user(UserSignup(name="Tomas", email="tomas@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Lisbon", base_currency="eur"))
+    assert group.base_currency == "EUR"
+    group_crud.add_member_to_group(group.id, requester_id=owner.id, user_email=member.email)
+    expense_crud.add_expense_to_group(group.id, ExpenseCreate(payer_email=owner.email, amount=100))
+    expense_crud.add_expense_to_group(
+        group.id, ExpenseCreate(payer_email=member.email, amount=50, currency="usd")
+    )
+    detail = expense_crud.add_expense_to_group(
+        group.id, ExpenseCreate(payer_email=owner.email, amount=80, currency="GBP")
+    )
+
+    assert [expense.currency for expense in detail.expenses] == ["GBP", "USD", "EUR"]
+    # 100 EUR + 50 USD (40 EUR) + 80 GBP (100 USD, 80 EUR)
+    assert detail.total_expense == 220.0
+    assert {balance.name: (balance.paid, balance.balance) for balance in detail.balances} == {
+        "Ines": (180.0, -70.0),
+        "Tomas": (40.0, 70.0),
+    }
+    assert GroupDetail.model_validate_json(group_crud.get_group_json(group.id)) == detail
+    analytics = analytics_crud.get_group_analytics(group.id)
+    assert (analytics.base_currency, analytics.total_amount) == ("EUR", 220.0)
+
+    usd = detail.expenses[1]
+    detail = expense_crud.update_expense_in_group(group.id, usd.id, ExpenseUpdate(currency="EUR"))
+    assert detail.total_expense == 230.0
+    assert analytics_crud.get_group_analytics(group.id).total_amount == 230.0
+    with pytest.raises(expense_crud.ExchangeRateNotFoundError):
+        expense_crud.add_expense_to_group(
+            group.id, ExpenseCreate(payer_email=owner.email, amount=1, currency="JPY")
+        )
+
+    # A new rate row is picked up without a restart.
+    rates.write_text(rates.read_text() + "2025-01-01,GBP,0.5\n")
+    assert group_crud.refresh_group(group.id).total_expense == 278.0
+    # Rollups subtract the base amount they added (80 EUR), not a conversion at the new rate.
+    expense_crud.delete_expense_from_group(group.id, detail.expenses[0].id)
+    assert analytics_crud.get_group_analytics(group.id).total_amount == 150.0
+
+
+def test_group_ledgers_are_parsed_incrementally(file_storage_env):
+    save_groups(
+        [
+            {"id": "g1", "expenses": [{"id": f"e{n}", "amount": n * 1000.25} for n in range(40)]},
+            {"name": "Late id", "expenses": [{"id": "x", "amount": 123456789}], "id": "g2"},
+            {"id": "g3", "name": "No expenses yet"},
+        ]
+    )
+    # A tiny chunk size splits numbers, strings and keys across reads.
+    ledgers = iter_group_ledgers(chunk_size=5)
+    parsed = [(group_id, [expense["amount"] for expense in expenses]) for group_id, expenses in ledgers]
+    assert parsed == [("g1", [n * 1000.25 for n in range(40)]), ("g2", [123456789]), ("g3", [])]
+    # Skipping a group's expenses still leaves the reader at the next group.
+    assert [group_id for group_id, _ in iter_group_ledgers(5)] == ["g1", "g2", "g3"]
+
+
+def test_recurring_expenses_materialize_once_per_occurrence(file_storage_env, monkeypatch):
+    owner = user_crud.create_user(UserSignup(name="Avery", email="avery@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Flat"))
+    rent = recurring_crud.create_recurring_expense(
+        group.id,
+        RecurringExpenseCreate(
+            payer_email=owner.email, amount=900, note="Rent", frequency="monthly", starts_on=date(2024, 1, 31)
+        ),
+    )
+    recurring_crud.create_recurring_expense(
+        group.id,
+        RecurringExpenseCreate(
+            payer_email=owner.email,
+            amount=10,
+            note="Streaming",
+            frequency="weekly",
+            interval=2,
+            starts_on=date(2024, 3, 1),
+            ends_on=date(2024, 3, 20),
+        ),
+    )
+    published = []
+    monkeypatch.setattr(
+        recurring_crud, "publish_group_change", lambda group_id, kind, **data: published.append(data)
+    )
+
+    result = recurring_crud.materialize_due_expenses(date(2024, 4, 15), batch_size=1)
+    assert (result.schedules, result.expenses) == (2, 5)
+    # Monthly dates keep the start's day, clamped to shorter months.
+    occurrences = sorted((e.note, e.created_at.date()) for e in group_crud.get_group(group.id).expenses)
+    assert occurrences == [
+        ("Rent", date(2024, 1, 31)),
+        ("Rent", date(2024, 2, 29)),
+        ("Rent", date(2024, 3, 31)),
+        ("Streaming", date(2024, 3, 1)),
+        ("Streaming", date(2024, 3, 15)),
+    ]
+    # One event per group and batch, each carrying that batch's expenses.
+    assert [len(data["expenses"]) for data in published] == [3, 2]
+    schedules = {entry.note: entry for entry in recurring_crud.list_recurring_expenses(group.id)}
+    assert schedules["Rent"].next_due_on == date(2024, 4, 30)
+    assert schedules["Streaming"].next_due_on is None
+
+    assert recurring_crud.materialize_due_expenses(date(2024, 4, 15)).expenses == 0
+    analytics = analytics_crud.get_group_analytics(group.id)
+    assert [(month.month, month.total_amount) for month in analytics.by_month] == [
+        ("2024-01", 900.0),
+        ("2024-02", 900.0),
+        ("2024-03", 920.0),
+    ]
+    recurring_crud.delete_recurring_expense(group.id, rent.id)
+    assert recurring_crud.materialize_due_expenses(date(2024, 6, 1)).expenses == 0
+    with pytest.raises(recurring_crud.RecurringExpenseNotFoundError):
+        recurring_crud.delete_recurring_expense(group.id, rent.id)
+
+
+def test_archived_expenses_leave_the_ledger_but_not_the_balances(file_storage_env, monkeypatch):
+    owner = user_crud.create_user(UserSignup(name="Casey", email="casey@example.com", password="secret"))
+    member = user_crud.create_user(UserSignup(name="Drew", email="drew@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Trips"))
+    group_crud.add_member_to_group(group.id, requester_id=owner.id, user_email=member.email)
+    for email, amount, status in [
+        (owner.email, 30, "paid"), (member.email, 12.5, "refunded"), (member.email, 20, "assigned")
+    ]:
+        before = expense_crud.add_expense_to_group(
+            group.id, ExpenseCreate(payer_email=email, amount=amount, status=status)
+        )
+    published = []
+    monkeypatch.setattr(
+        archive_crud, "publish_group_change", lambda group_id, kind, **data: published.append(data)
+    )
+
+    with pytest.raises(archive_crud.GroupOwnershipError):
+        archive_crud.archive_group_expenses(group.id, member.id, older_than_days=0)
+    # Nothing is old enough yet.
+    assert archive_crud.archive_group_expenses(group.id, owner.id).archived_expense_count == 0
+    detail = archive_crud.archive_group_expenses(group.id, owner.id, older_than_days=0)
+
+    assert [expense.status for expense in detail.expenses] == ["assigned"]
+    assert detail.archived_expense_count == 2
+    assert (detail.total_expense, detail.balances) == (before.total_expense, before.balances)
+    assert GroupDetail.model_validate_json(group_crud.get_group_json(group.id)) == detail
+    assert len(published) == 1 and len(published[0]["expense_ids"]) == 2
+
+    page = archive_crud.list_archived_expenses(group.id, limit=1, offset=1)
+    assert (page.total, len(page.expenses)) == (2, 1)
+    assert page.expenses[0].payer_name in {"Casey", "Drew"} and page.expenses[0].archived_at
+    assert analytics_crud.get_group_analytics(group.id).expense_count == 3
+    exported = list(export_crud.export_group_expenses(group.id))
+    assert [(row[7], row[9] is not None) for row in exported] == [
+        ("assigned", False), ("refunded", True), ("paid", True)
+    ]
+    assert [row[1] for row in export_crud.export_all_expenses()] == [row[1] for row in exported]
+    with pytest.raises(expense_crud.ExpenseNotFoundError):
+        expense_crud.delete_expense_from_group(group.id, page.expenses[0].id)
+    assert archive_crud.archive_settled_expenses(older_than_days=0).expenses == 0
+
+
+def test_archive_file_pages_through_an_incremental_offset_index():
+    def archived(day, expense_id):
+        return {"id": expense_id, "created_at": f"2024-03-{day:02d}T00:00:00", "note": day}
+
+    append_archived_expenses("g1", [archived(5, "e5"), archived(9, "e9")])
+    # A later run can archive older expenses; an id repeated after a crash counts once.
+    append_archived_expenses("g1", [archived(1, "e1"), archived(7, "e7"), archived(9, "e9")])
+    offsets = archived_expense_offsets("g1")
+    assert [entry["id"] for entry in read_archived_expenses("g1", offsets)] == ["e9", "e7", "e5", "e1"]
+    assert [entry["id"] for entry in read_archived_expenses("g1", offsets[1:3])] == ["e7", "e5"]
+
+    # Only the new lines are read; a line still being appended waits for its newline.
+    append_archived_expenses("g1", [archived(8, "e8")])
+    with archive_file_path("g1").open("ab") as handle:
+        handle.write(b'{"id": "e6", "created_at": "2024-03-06T00:00:00"')
+    offsets = archived_expense_offsets("g1")
+    assert [entry["id"] for entry in read_archived_expenses("g1", offsets[:3])] == ["e9", "e8", "e7"]
+    assert len(offsets) == 5
+    assert archived_expense_offsets("missing") == []
+
+
+def test_recurring_schedule_without_a_rate_does_not_block_its_batch(file_storage_env, tmp_path):
+    rates = tmp_path / "fx_rates.csv"
+    rates.write_text("date,currency,rate\n2024-01-01,EUR,0.8\n")
+    owner = user_crud.create_user(UserSignup(name="Jordan", email="jordan@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Club"))
+    euros = recurring_crud.create_recurring_expense(
+        group.id,
+        RecurringExpenseCreate(
+            payer_email=owner.email, amount=8, currency="EUR", frequency="monthly",
+            starts_on=date(2024, 1, 1),
+        ),
+    )
+    recurring_crud.create_recurring_expense(
+        group.id,
+        RecurringExpenseCreate(
+            payer_email=owner.email, amount=5, frequency="monthly", starts_on=date(2024, 1, 2)
+        ),
+    )
+    rates.unlink()
+
+    # The EUR schedule sorts first in every batch; it is skipped and stays due instead.
+    result = recurring_crud.materialize_due_expenses(date(2024, 2, 15), batch_size=1)
+    assert (result.expenses, result.skipped) == (2, {euros.id})
+    assert [expense.amount for expense in group_crud.get_group(group.id).expenses] == [5.0, 5.0]
+    schedules = {entry.id: entry for entry in recurring_crud.list_recurring_expenses(group.id)}
+    assert schedules[euros.id].next_due_on == date(2024, 1, 1)
+
+    rates.write_text("date,currency,rate\n2024-01-01,EUR,0.8\n")
+    assert recurring_crud.materialize_due_expenses(date(2024, 2, 15)).expenses == 2
+    assert group_crud.get_group(group.id).total_expense == 30.0
+
+def test_concurrent_file_writes_do_not_overwrite_each_other(file_storage_env):
+    owner = user_crud.create_user(UserSignup(name="Emery", email="emery@example.com", password="secret"))
+    group = group_crud.create_group(GroupCreate(owner_id=owner.id, name="Shared"))
+    recurring_crud.create_recurring_expense(
+        group.id,
+        RecurringExpenseCreate(
+            payer_email=owner.email, amount=5, frequency="daily", starts_on=date(2024, 1, 1)
+        ),
+    )
+
+    def add_expenses():
+        for _ in range(5):
+            expense_crud.add_expense_to_group(group.id, ExpenseCreate(payer_email=owner.email, amount=1))
+
+    threads = [threading.Thread(target=add_expenses) for _ in range(4)]
+    job = threading.Thread(target=recurring_crud.materialize_due_expenses, args=(date(2024, 1, 10),))
+    threads.append(job)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    amounts = [expense.amount for expense in group_crud.get_group(group.id).expenses]
+    assert (amounts.count(1.0), amounts.count(5.0)) == (20, 10)
+    assert recurring_crud.list_recurring_expenses(group.id)[0].next_due_on == date(2024, 1, 11)
@@ -147,6 +147,10 @@ module "backend_service" {
       arn      = aws_secretsmanager_secret.s3.arn
       json_key = "secret_access_key"
     }
+    SESSION_SECRET = {
+      arn      = aws_secretsmanager_secret.session.arn
+      json_key = "signing_key"
+    }
   }
   target_group_arn    = module.alb.backend_target_group_arn
   assign_public_ip    = false
@@ -181,6 +185,22 @@ resource "aws_s3_bucket" "media" {
       storage_class = "GLACIER"
     }
   }
+  lifecycle_rule {
+    id      = "expire-unfinished-avatar-uploads"
+    enabled = true
+    prefix  = "avatars/uploads/"
+
+    expiration {
+      days = 1
+    }
+  }
+  # Browsers POST avatars straight to the bucket with presigned forms.
+  cors_rule {
+    allowed_methods = ["POST"]
+    allowed_origins = ["https://${var.domain_name}"]
+    allowed_headers = ["*"]
+    max_age_seconds = 3000
+  }
   tags = {
     Project = var.project
   }
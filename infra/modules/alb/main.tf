@@ -84,6 +84,9 @@ resource "aws_lb_target_group" "backend" {
   vpc_id      = var.vpc_id
   target_type = "ip"
 
+  # The ECS service registers with this target group, so ECS replaces any task that fails
+  # this check. It probes liveness (/health) only: /ready also fails on transient pool
+  # saturation and during warm-up, and replacing tasks for that would cascade under load.
   health_check {
     healthy_threshold   = 2
     unhealthy_threshold = 5
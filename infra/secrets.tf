@@ -27,6 +27,23 @@ resource "aws_secretsmanager_secret_version" "s3" {
   })
 }
 
+resource "random_password" "session" {
+  length  = 48
+  special = false
+}
+
+resource "aws_secretsmanager_secret" "session" {
+  name        = "${var.project}/session"
+  description = "HMAC key for session tokens issued by ${var.project}"
+}
+
+resource "aws_secretsmanager_secret_version" "session" {
+  secret_id = aws_secretsmanager_secret.session.id
+  secret_string = jsonencode({
+    signing_key = random_password.session.result
+  })
+}
+
 output "db_secret_arn" {
   value = aws_secretsmanager_secret.db.arn
 }